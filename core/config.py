@@ -15,6 +15,12 @@ def _get_env_path(key: str, default: str) -> Path:
     return Path(os.getenv(key, default))
 
 
+def _get_env_optional_path(key: str) -> Optional[Path]:
+    """Получить путь из переменной окружения (None, если не задан)."""
+    value = os.getenv(key, "").strip()
+    return Path(value) if value else None
+
+
 def _get_env_int(key: str, default: int) -> int:
     """Получить целое число из переменной окружения."""
     value = os.getenv(key)
@@ -37,6 +43,35 @@ def _get_env_float(key: str, default: float) -> float:
         return default
 
 
+def _get_env_int_list(key: str) -> list[int]:
+    """Получить список целых чисел из переменной окружения ("4,5,6")."""
+    value = os.getenv(key, "").strip()
+    if not value:
+        return []
+    try:
+        return [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        return []
+
+
+def _get_env_roi(key: str) -> Optional[tuple[int, int, int, int]]:
+    """
+    Получить ROI из переменной окружения в формате "x,y,width,height".
+
+    Пустое или некорректное значение означает отсутствие ROI (полный кадр).
+    """
+    value = os.getenv(key, "").strip()
+    if not value:
+        return None
+    try:
+        x, y, w, h = (int(part) for part in value.split(","))
+    except ValueError:
+        return None
+    if w <= 0 or h <= 0 or x < 0 or y < 0:
+        return None
+    return x, y, w, h
+
+
 @dataclass
 class Settings:
     """Настройки inference сервиса."""
@@ -45,6 +80,23 @@ class Settings:
     model_path: Path = field(default_factory=lambda: Path("weights/best_11s_rknn_model"))
     image_size: int = 1280
     warmup_runs: int = 2
+    model_watch: bool = False           # Перезагружать модель при изменениях в папке весов
+    model_watch_interval: float = 2.0   # Период опроса папки весов (секунды)
+
+    # Бэкенд и пул движков инференса
+    inference_backend: str = "yolo"     # "yolo" (RKNN/ONNX/PT через ultralytics) или "stub"
+    engine_pool_size: int = 1           # Экземпляров модели (RK3588: до 3 ядер NPU)
+    engine_pool_policy: str = "least_loaded"  # "round_robin" или "least_loaded"
+    engine_cpu_cores: list[int] = field(default_factory=list)  # Привязка воркеров к CPU
+    engine_npu_cores: list[int] = field(default_factory=list)  # Привязка экземпляров к NPU
+    stub_class: str = "plastic"         # Результат stub движка
+    stub_latency_ms: float = 20.0       # Задержка stub движка
+
+    # Изоляция инференса в дочернем процессе
+    inference_isolation: bool = False   # Модель в отдельном процессе с watchdog
+    inference_standby: bool = True      # Резервный процесс с загруженной моделью
+    inference_timeout: float = 5.0      # Запрос дольше - воркер считается зависшим
+    inference_start_timeout: float = 120.0  # Загрузка и прогрев модели в воркере
 
     # Камера (2K разрешение)
     camera_index: int = 0
@@ -52,10 +104,19 @@ class Settings:
     camera_height: int = 1440
     camera_fps: int = 30
     camera_fourcc: str = "MJPG"
+    camera_source: str = "v4l2"         # "v4l2", "video", "images" или "synthetic"
+    camera_source_path: Optional[Path] = None  # Видеофайл или папка кадров
+
+    # ROI кадра (x, y, width, height) в пикселях камеры, None - полный кадр
+    roi: Optional[tuple[int, int, int, int]] = None
 
     # Буфер кадров
     frame_buffer_size: int = 3
 
+    # Конвейер инференса
+    inference_frames: int = 1           # Кадров на один запрос (голосование)
+    pipeline_queue_size: int = 2        # Размер очереди между стадиями
+
     # TCP сервер (deprecated, используется WebSocket)
     tcp_host: str = "0.0.0.0"
     tcp_port: int = 8081
@@ -70,6 +131,9 @@ class Settings:
     retry_count: int = 3
     retry_delay: float = 0.5
 
+    # Метрики (HTTP /metrics), 0 - сервер не запускается
+    metrics_port: int = 9109
+
     # Вывод
     output_dir: Path = field(default_factory=lambda: Path("real_time"))
     save_frames: bool = True
@@ -95,6 +159,23 @@ class Settings:
             model_path=_get_env_path("MODEL_PATH", "weights/best_11s_rknn_model"),
             image_size=_get_env_int("IMAGE_SIZE", 1280),
             warmup_runs=_get_env_int("WARMUP_RUNS", 2),
+            model_watch=os.getenv("MODEL_WATCH", "false").lower() in ("true", "1", "yes"),
+            model_watch_interval=_get_env_float("MODEL_WATCH_INTERVAL", 2.0),
+
+            # Бэкенд и пул движков
+            inference_backend=os.getenv("INFERENCE_BACKEND", "yolo").lower(),
+            engine_pool_size=_get_env_int("ENGINE_POOL_SIZE", 1),
+            engine_pool_policy=os.getenv("ENGINE_POOL_POLICY", "least_loaded").lower(),
+            engine_cpu_cores=_get_env_int_list("ENGINE_CPU_CORES"),
+            engine_npu_cores=_get_env_int_list("ENGINE_NPU_CORES"),
+            stub_class=os.getenv("STUB_CLASS", "plastic"),
+            stub_latency_ms=_get_env_float("STUB_LATENCY_MS", 20.0),
+
+            # Изоляция инференса
+            inference_isolation=os.getenv("INFERENCE_ISOLATION", "false").lower() in ("true", "1", "yes"),
+            inference_standby=os.getenv("INFERENCE_STANDBY", "true").lower() in ("true", "1", "yes"),
+            inference_timeout=_get_env_float("INFERENCE_TIMEOUT", 5.0),
+            inference_start_timeout=_get_env_float("INFERENCE_START_TIMEOUT", 120.0),
 
             # Камера (2K разрешение)
             camera_index=_get_env_int("CAMERA_INDEX", 0),
@@ -102,10 +183,17 @@ class Settings:
             camera_height=_get_env_int("CAMERA_HEIGHT", 1440),
             camera_fps=_get_env_int("CAMERA_FPS", 30),
             camera_fourcc=os.getenv("CAMERA_FOURCC", "MJPG"),
+            camera_source=os.getenv("CAMERA_SOURCE", "v4l2").lower(),
+            camera_source_path=_get_env_optional_path("CAMERA_SOURCE_PATH"),
+            roi=_get_env_roi("ROI"),
 
             # Буфер
             frame_buffer_size=_get_env_int("FRAME_BUFFER_SIZE", 3),
 
+            # Конвейер
+            inference_frames=_get_env_int("INFERENCE_FRAMES", 1),
+            pipeline_queue_size=_get_env_int("PIPELINE_QUEUE_SIZE", 2),
+
             # TCP (deprecated)
             tcp_host=os.getenv("TCP_HOST", "0.0.0.0"),
             tcp_port=_get_env_int("TCP_PORT", 8081),
@@ -120,6 +208,9 @@ class Settings:
             retry_count=_get_env_int("RETRY_COUNT", 3),
             retry_delay=_get_env_float("RETRY_DELAY", 0.5),
 
+            # Метрики
+            metrics_port=_get_env_int("VISION_METRICS_PORT", 9109),
+
             # Вывод
             output_dir=_get_env_path("OUTPUT_DIR", "real_time"),
             save_frames=os.getenv("SAVE_FRAMES", "true").lower() in ("true", "1", "yes"),
@@ -0,0 +1,100 @@
+"""
+Events - кодирование событий Application для клиентов WebSocket.
+
+Обеспечивает:
+- Формат {"event": ..., "data": ..., "timestamp": ...} как у прежнего create_event
+- Кэш префиксов по имени события: сериализуются только данные
+- Метку времени из кэша секунд (strftime раз в секунду, далее только микросекунды)
+- orjson, если установлен, иначе стандартный json (байты как у json.dumps);
+  orjson пишет не-ASCII символы как UTF-8 без экранирования - разобранные данные те же
+
+Событие кодируется один раз и публикуется всем подписчикам
+(websocket.server.WebSocket.publish), а не по разу на клиента.
+
+Использование:
+    encoder = EventEncoder()
+    message = encoder.encode("container_detected", {"container_type": "plastic"})
+    data_json = encoder.encode_data(device_info)          # кэшируется вызывающим
+    message = encoder.encode_prepared("device_info", data_json)
+"""
+import json
+import time
+from datetime import datetime
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:  # Опциональная зависимость
+    orjson = None
+
+_EMPTY_DATA = "{}"
+
+
+def _dumps_stdlib(data) -> str:
+    # Параметры по умолчанию, как у прежнего create_event (не-ASCII как \uXXXX)
+    return json.dumps(data)
+
+
+def _dumps_orjson(data) -> str:
+    return orjson.dumps(data).decode("utf-8")
+
+
+class EventEncoder:
+    """Кодировщик событий с кэшем префиксов и метки времени."""
+
+    def __init__(self, backend: Optional[str] = None):
+        """
+        Инициализация кодировщика.
+
+        Args:
+            backend: "orjson" или "json". None - orjson, если установлен.
+        """
+        if backend is None:
+            backend = "orjson" if orjson is not None else "json"
+        if backend == "orjson" and orjson is None:
+            raise ValueError("orjson не установлен")
+        if backend not in ("orjson", "json"):
+            raise ValueError(f"Неизвестный JSON бэкенд: {backend}")
+        self.backend = backend
+        self._dumps = _dumps_orjson if backend == "orjson" else _dumps_stdlib
+        self._prefixes: dict[str, str] = {}
+        # (секунда, её текст) - одна пара: читается и заменяется одним
+        # присваиванием, потоки не видят секунду без её текста
+        self._second = (None, "")
+
+    def encode_data(self, data: Optional[dict]) -> str:
+        """Сериализовать данные события (для повторного использования в encode_prepared)."""
+        if not data:
+            return _EMPTY_DATA
+        return self._dumps(data)
+
+    def encode(self, event: str, data: Optional[dict] = None) -> str:
+        """
+        Закодировать событие.
+
+        Args:
+            event: Название события.
+            data: Данные события (None - пустой объект).
+
+        Returns:
+            JSON строка события.
+        """
+        return self.encode_prepared(event, self.encode_data(data))
+
+    def encode_prepared(self, event: str, data_json: str) -> str:
+        """Закодировать событие с уже сериализованными данными."""
+        prefix = self._prefixes.get(event)
+        if prefix is None:
+            prefix = self._prefixes[event] = '{"event": %s, "data": ' % json.dumps(event)
+        return f'{prefix}{data_json}, "timestamp": "{self.timestamp()}"}}'
+
+    def timestamp(self, now: Optional[float] = None) -> str:
+        """Локальное время ISO 8601 с микросекундами (как datetime.isoformat)."""
+        if now is None:
+            now = time.time()
+        second = int(now)
+        cached, text = self._second
+        if second != cached:
+            text = datetime.fromtimestamp(second).strftime("%Y-%m-%dT%H:%M:%S")
+            self._second = (second, text)
+        return f"{text}.{int((now - second) * 1_000_000):06d}"
@@ -0,0 +1,186 @@
+"""
+Journal - журнал транзакций контейнеров в JSONL.
+
+Обеспечивает:
+- Запись без блокировки вызывающего потока (очередь + фоновый поток)
+- Пакетную запись: одна операция write/flush на пачку записей
+- Ротацию по размеру: transactions.jsonl → transactions.1.jsonl → ...
+- Чтение всех файлов журнала (от старых к новым) для tools/journal_query.py
+
+Использование:
+    journal = TransactionJournal(Path("journal"))
+    journal.start()
+    journal.record({"kind": "container", "status": "ok", ...})
+    journal.close()
+"""
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_STOP = object()
+
+
+class TransactionJournal:
+    """Журнал транзакций с фоновой пакетной записью и ротацией."""
+
+    FILE_NAME = "transactions.jsonl"
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 10,
+        flush_interval: float = 1.0,
+        batch_size: int = 100,
+    ):
+        """
+        Инициализация журнала.
+
+        Args:
+            directory: Папка журнала.
+            max_bytes: Размер файла, после которого выполняется ротация.
+            backups: Количество хранимых старых файлов.
+            flush_interval: Максимальная задержка записи пачки (секунды).
+            batch_size: Максимальный размер пачки.
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._written = 0
+        self._dropped = 0
+
+    @property
+    def path(self) -> Path:
+        """Текущий файл журнала."""
+        return self.directory / self.FILE_NAME
+
+    def start(self) -> None:
+        """Запустить фоновый поток записи."""
+        if self._thread is not None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="TransactionJournal", daemon=True)
+        self._thread.start()
+        logger.info(f"Журнал транзакций: {self.path}")
+
+    def record(self, entry: dict) -> None:
+        """
+        Добавить запись (не блокирует).
+
+        Время записи (ts) добавляется, если не задано.
+        """
+        if self._thread is None:
+            self._dropped += 1
+            return
+        entry.setdefault("ts", datetime.now().isoformat(timespec="milliseconds"))
+        self._queue.put(entry)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Записать оставшиеся записи и остановить поток."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        """Количество записанных и отброшенных (журнал не запущен) записей."""
+        return {"written": self._written, "dropped": self._dropped, "path": str(self.path)}
+
+    def _run(self) -> None:
+        """Цикл записи: собрать пачку за flush_interval и записать одной операцией."""
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: list[dict]) -> None:
+        """Записать пачку (с ротацией перед записью)."""
+        lines = "".join(json.dumps(entry, ensure_ascii=False, default=str) + "\n" for entry in batch)
+        try:
+            if self.path.exists() and self.path.stat().st_size + len(lines) > self.max_bytes:
+                self._rotate()
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(lines)
+            self._written += len(batch)
+        except OSError as e:
+            self._dropped += len(batch)
+            logger.error(f"Ошибка записи журнала транзакций: {e}")
+
+    def _rotate(self) -> None:
+        """transactions.jsonl → transactions.1.jsonl, старые сдвигаются, последний удаляется."""
+        for index in range(self.backups - 1, 0, -1):
+            src = self._backup_path(index)
+            if src.exists():
+                src.replace(self._backup_path(index + 1))
+        if self.backups > 0:
+            self.path.replace(self._backup_path(1))
+        else:
+            self.path.unlink()
+        logger.info(f"Ротация журнала транзакций: {self.path}")
+
+    def _backup_path(self, index: int) -> Path:
+        stem = self.FILE_NAME.rsplit(".", 1)[0]
+        return self.directory / f"{stem}.{index}.jsonl"
+
+
+def read_journal(directory: Path) -> Iterator[dict]:
+    """
+    Прочитать все записи журнала от старых к новым.
+
+    Повреждённые строки (например, оборванные при отключении питания) пропускаются.
+
+    Args:
+        directory: Папка журнала (или путь к одному файлу .jsonl).
+    """
+    directory = Path(directory)
+    if directory.is_file():
+        files = [directory]
+    else:
+        stem = TransactionJournal.FILE_NAME.rsplit(".", 1)[0]
+        backups = sorted(
+            directory.glob(f"{stem}.*.jsonl"),
+            key=lambda p: int(p.name.split(".")[1]) if p.name.split(".")[1].isdigit() else 0,
+            reverse=True,
+        )
+        files = backups + [directory / TransactionJournal.FILE_NAME]
+
+    for path in files:
+        if not path.exists():
+            continue
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
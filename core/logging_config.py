@@ -7,21 +7,42 @@
 - WARNING: предупреждения (таймауты, повторные попытки)
 - ERROR: ошибки (исключения, сбои)
 
+Неблокирующий вывод:
+    Записи кладутся в очередь (QueueHandler), форматирование и запись
+    в stderr/journald выполняет отдельный поток (QueueListener). Потоки
+    захвата кадров и state machine не ждут синхронной записи в journald.
+
+    В горячих путях используйте %-форматирование: строка собирается
+    только если запись прошла по уровню, и уже в потоке логирования.
+
 Использование:
     from logging_config import get_logger
     logger = get_logger(__name__)
     logger.info("Сообщение")
-    logger.debug("Детали для отладки")
+    logger.debug("Кадр %d: %s", index, result)
+
+    # Сообщения на каждый кадр: не чаще раза в 5 сек на шаблон
+    frame_logger = get_rate_limited_logger(__name__, interval=5.0)
+    frame_logger.warning("Ошибка чтения кадра: %s", error)
 
 Переменные окружения:
     LOG_LEVEL: уровень логирования (DEBUG, INFO, WARNING, ERROR)
     LOG_FORMAT: формат сообщений (simple, detailed)
+    LOG_QUEUE: вывод через очередь и фоновый поток (true/false, по умолчанию true)
 """
 
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
 from typing import Optional
 
+# Фоновый поток вывода (один на процесс)
+_listener: Optional[logging.handlers.QueueListener] = None
+
 
 def get_log_level() -> int:
     """Получить уровень логирования из переменной окружения."""
@@ -44,27 +65,132 @@ def get_log_format() -> str:
     return "[%(levelname)s] %(name)s: %(message)s"
 
 
+def use_log_queue() -> bool:
+    """Включён ли вывод через очередь (LOG_QUEUE)."""
+    return os.getenv("LOG_QUEUE", "true").lower() in ("true", "1", "yes")
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке.
+
+    Стандартный QueueHandler.prepare() форматирует сообщение до постановки
+    в очередь (рассчитано на передачу между процессами). Очередь здесь
+    внутрипроцессная, поэтому запись передаётся как есть, а msg % args
+    вычисляется в потоке QueueListener. Поэтому аргументы записи не должны
+    изменяться после вызова логгера.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Пропускает запись с одним шаблоном сообщения не чаще раза в interval секунд.
+
+    Ключ - (уровень, шаблон msg), поэтому сообщения с %-аргументами
+    ограничиваются вместе. К следующей пропущенной записи добавляется
+    количество подавленных.
+    """
+
+    # Защита от роста словаря, если в логгер попадают f-строки (каждая - новый ключ)
+    MAX_KEYS = 1000
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self._last: dict[tuple, float] = {}
+        self._suppressed: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            if len(self._last) >= self.MAX_KEYS:
+                self._last.clear()
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.msg = f"{record.msg} (подавлено повторов: {suppressed})"
+        return True
+
+
 def setup_logging(level: Optional[int] = None) -> None:
     """
     Настроить базовое логирование для всего приложения.
 
+    При LOG_QUEUE=true (по умолчанию) корневой логгер пишет в очередь,
+    а вывод в stderr выполняет фоновый поток.
+
     Args:
         level: Уровень логирования (если None, берётся из LOG_LEVEL).
     """
+    global _listener
+
     if level is None:
         level = get_log_level()
 
-    logging.basicConfig(
-        level=level,
-        format=get_log_format(),
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    if logging.root.handlers:
+        # Уже настроено (повторный вызов из другого модуля)
+        logging.root.setLevel(level)
+        return
+
+    if use_log_queue():
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(get_log_format(), datefmt="%Y-%m-%d %H:%M:%S"))
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        logging.root.addHandler(LazyQueueHandler(log_queue))
+        logging.root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        logging.basicConfig(
+            level=level,
+            format=get_log_format(),
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
 
     # Подавляем излишние логи от библиотек
     logging.getLogger("websockets").setLevel(logging.WARNING)
     logging.getLogger("asyncio").setLevel(logging.WARNING)
 
 
+def stop_logging() -> None:
+    """Дописать очередь и остановить фоновый поток вывода."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_rate_limited_logger(name: str, interval: float = 5.0) -> logging.Logger:
+    """
+    Получить логгер для сообщений на каждый кадр / каждую итерацию цикла.
+
+    Записи с одинаковым шаблоном проходят не чаще раза в interval секунд.
+
+    Args:
+        name: Имя модуля (обычно __name__).
+        interval: Минимальный интервал между записями одного шаблона (секунды).
+
+    Returns:
+        Логгер "<name>.rate" с RateLimitFilter.
+    """
+    logger = get_logger(f"{name}.rate")
+    if not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+        logger.addFilter(RateLimitFilter(interval))
+    return logger
+
+
 def get_logger(name: str) -> logging.Logger:
     """
     Получить логгер для модуля.
@@ -0,0 +1,374 @@
+"""
+Metrics - лёгкий реестр метрик (счётчики, gauge, гистограммы).
+
+Обеспечивает:
+- Counter / Gauge / Histogram с фиксированными корзинами
+- Метки (labels): дочерняя метрика на каждый набор значений
+- Экспорт в текстовом формате Prometheus и в JSON (с p50/p90/p99)
+- HTTP сервер /metrics в фоновом потоке
+
+Стоимость на горячем пути - одна блокировка и сложение: метрики
+создаются один раз (в __init__ компонента), а в цикле только inc/observe.
+
+Использование:
+    from core.metrics import get_registry
+
+    registry = get_registry()
+    frames = registry.counter("fandomat_camera_frames_total", "Захвачено кадров")
+    latency = registry.histogram("fandomat_inference_seconds", "Время инференса")
+
+    frames.inc()
+    latency.observe(0.183)
+"""
+import bisect
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Корзины по умолчанию (секунды): от 1 мс до 10 сек
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Монотонный счётчик."""
+
+    kind = "counter"
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Увеличить счётчик."""
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        """Текущее значение."""
+        return self._value
+
+    def snapshot(self):
+        """Значение для JSON."""
+        return self._value
+
+
+class Gauge:
+    """Текущее значение (может уменьшаться)."""
+
+    kind = "gauge"
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        """Установить значение."""
+        self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Увеличить значение."""
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Уменьшить значение."""
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        """Текущее значение."""
+        return self._value
+
+    def snapshot(self):
+        """Значение для JSON."""
+        return self._value
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (верхние границы, включительно)."""
+
+    kind = "histogram"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # Последняя корзина - +Inf
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Добавить наблюдение."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        """Количество наблюдений."""
+        return self._count
+
+    def cumulative(self) -> tuple[list[int], float, int]:
+        """Накопленные счётчики по корзинам, сумма и количество."""
+        with self._lock:
+            counts = list(self._counts)
+            total_sum, total = self._sum, self._count
+        cumulative = []
+        running = 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total_sum, total
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Оценить перцентиль по корзинам (линейная интерполяция внутри корзины).
+
+        Args:
+            q: Квантиль 0..1.
+
+        Returns:
+            Оценка или None, если наблюдений нет. Для +Inf корзины -
+            верхняя конечная граница.
+        """
+        cumulative, _, total = self.cumulative()
+        return percentile_from_buckets(self.buckets, cumulative, total, q)
+
+    def snapshot(self) -> dict:
+        """Сводка для JSON: количество, сумма, среднее и p50/p90/p99."""
+        cumulative, total_sum, total = self.cumulative()
+        return {
+            "count": total,
+            "sum": round(total_sum, 6),
+            "avg": round(total_sum / total, 6) if total else None,
+            "p50": percentile_from_buckets(self.buckets, cumulative, total, 0.50),
+            "p90": percentile_from_buckets(self.buckets, cumulative, total, 0.90),
+            "p99": percentile_from_buckets(self.buckets, cumulative, total, 0.99),
+        }
+
+
+def percentile_from_buckets(buckets, cumulative: list[int], total: int, q: float) -> Optional[float]:
+    """
+    Перцентиль по накопленным счётчикам корзин.
+
+    Args:
+        buckets: Верхние границы конечных корзин (по возрастанию).
+        cumulative: Накопленные счётчики (len(buckets) + 1, последняя - +Inf).
+        total: Общее количество наблюдений.
+        q: Квантиль 0..1.
+    """
+    if not total:
+        return None
+    rank = q * total
+    index = bisect.bisect_left(cumulative, rank)
+    if index >= len(buckets):
+        return buckets[-1] if buckets else None
+    lower = buckets[index - 1] if index > 0 else 0.0
+    upper = buckets[index]
+    prev = cumulative[index - 1] if index > 0 else 0
+    in_bucket = cumulative[index] - prev
+    if in_bucket <= 0:
+        return upper
+    return round(lower + (upper - lower) * (rank - prev) / in_bucket, 6)
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса.
+
+    Повторный вызов counter()/gauge()/histogram() с тем же именем и метками
+    возвращает ту же метрику.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        """Получить (создать) счётчик."""
+        return self._get(name, help_text, Counter, labels)
+
+    def gauge(self, name: str, help_text: str = "", **labels) -> Gauge:
+        """Получить (создать) gauge."""
+        return self._get(name, help_text, Gauge, labels)
+
+    def histogram(self, name: str, help_text: str = "", buckets=DEFAULT_BUCKETS, **labels) -> Histogram:
+        """Получить (создать) гистограмму."""
+        return self._get(name, help_text, lambda: Histogram(buckets), labels, kind="histogram")
+
+    def _get(self, name: str, help_text: str, factory, labels: dict, kind: Optional[str] = None):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        family = self._metrics.get(name)
+        if family is not None:
+            metric = family["children"].get(key)
+            if metric is not None:
+                return metric
+
+        with self._lock:
+            family = self._metrics.setdefault(name, {
+                "help": help_text,
+                "kind": kind or factory.kind,
+                "children": {},
+            })
+            metric = family["children"].get(key)
+            if metric is None:
+                metric = factory()
+                if metric.kind != family["kind"]:
+                    raise ValueError(f"Метрика {name} уже зарегистрирована как {family['kind']}")
+                family["children"][key] = metric
+            return metric
+
+    def snapshot(self) -> dict:
+        """
+        Все метрики в виде словаря для JSON.
+
+        Returns:
+            {name: value} для метрик без меток,
+            {name: {"label=value,...": value}} для метрик с метками.
+        """
+        with self._lock:
+            families = {name: dict(f["children"]) for name, f in self._metrics.items()}
+
+        result = {}
+        for name, children in sorted(families.items()):
+            if list(children) == [()]:
+                result[name] = children[()].snapshot()
+            else:
+                result[name] = {
+                    ",".join(f"{k}={v}" for k, v in key): metric.snapshot()
+                    for key, metric in children.items()
+                }
+        return result
+
+    def render_prometheus(self) -> str:
+        """Все метрики в текстовом формате Prometheus (version 0.0.4)."""
+        with self._lock:
+            families = [(name, f["help"], f["kind"], dict(f["children"])) for name, f in self._metrics.items()]
+
+        lines = []
+        for name, help_text, kind, children in sorted(families):
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in children.items():
+                if kind == "histogram":
+                    cumulative, total_sum, total = metric.cumulative()
+                    bounds = [_format_value(b) for b in metric.buckets] + ["+Inf"]
+                    for bound, count in zip(bounds, cumulative):
+                        lines.append(f"{name}_bucket{_format_labels(key, le=bound)} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(total_sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {total}")
+                else:
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(metric.value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(key: tuple, **extra) -> str:
+    """Метки в формате {a="1",b="2"}."""
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Число в формате Prometheus."""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricsServer:
+    """
+    HTTP сервер метрик в фоновом потоке.
+
+    GET /metrics - текст Prometheus, GET /metrics.json - JSON.
+    """
+
+    def __init__(self, registry: "MetricsRegistry", port: int, host: str = "127.0.0.1"):
+        """
+        Инициализация сервера.
+
+        Args:
+            registry: Реестр метрик.
+            port: Порт (0 - выбрать свободный).
+            host: Адрес (по умолчанию только локальный).
+        """
+        self._registry = registry
+        self._host = host
+        self._port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        """Фактический порт сервера."""
+        return self._server.server_address[1] if self._server else self._port
+
+    def start(self) -> bool:
+        """Запустить сервер. Возвращает False, если порт занят."""
+        registry = self._registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body = registry.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self._host, self._port), Handler)
+        except OSError as e:
+            logger.error(f"Не удалось запустить сервер метрик на {self._host}:{self._port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        logger.info(f"Метрики: http://{self._host}:{self.port}/metrics")
+        return True
+
+    def stop(self) -> None:
+        """Остановить сервер."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Реестр процесса (vision и Application - разные процессы, у каждого свой)
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """Получить реестр метрик процесса."""
+    return _registry
@@ -0,0 +1,206 @@
+"""
+Scheduler - монотонные дедлайны для таймаутов state machine.
+
+Обеспечивает:
+- Именованные таймеры: повторный arm заменяет таймер с тем же именем
+- Монотонное время (time.monotonic): переводы часов (NTP) не влияют на таймауты
+- Выполнение просроченных callback в потоке state machine (run_due)
+- Время до ближайшего дедлайна (next_delay) для сна цикла без опроса
+
+Таймеры хранятся в куче; отменённые и заменённые записи удаляются
+лениво, поэтому arm/cancel стоят O(log n), а проверка без просроченных
+таймеров - один взгляд на вершину кучи.
+
+SchedulerThread выполняет те же таймеры в собственном потоке - для
+действий, точность которых не должна зависеть от загрузки главного
+цикла (сброс импульсных команд ПЛК).
+
+Использование:
+    scheduler = DeadlineScheduler()
+    scheduler.arm("vision", 2.0, on_vision_timeout)
+    scheduler.cancel("vision")          # ответ пришёл вовремя
+    scheduler.run_due()                 # в каждом шаге state machine
+    timeout = scheduler.next_delay()    # None - таймеров нет
+
+    pulses = SchedulerThread("plc-pulse")
+    pulses.arm("bit7", 2.0, release)    # поток стартует при первом arm
+    pulses.stop()
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Optional
+
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class DeadlineScheduler:
+    """Именованные таймеры на монотонных дедлайнах."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        """
+        Инициализация планировщика.
+
+        Args:
+            clock: Источник монотонного времени (секунды).
+        """
+        self._clock = clock
+        self._heap: list[tuple[float, int, str]] = []
+        self._timers: dict[str, tuple[float, int, Callable[[], None]]] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        """Текущее время планировщика."""
+        return self._clock()
+
+    def arm(self, name: str, delay: float, callback: Callable[[], None]) -> float:
+        """
+        Взвести таймер (заменяет таймер с тем же именем).
+
+        Args:
+            name: Имя таймера.
+            delay: Через сколько секунд вызвать callback.
+            callback: Вызывается из run_due без аргументов.
+
+        Returns:
+            Дедлайн по часам планировщика.
+        """
+        deadline = self._clock() + delay
+        with self._lock:
+            seq = next(self._seq)
+            self._timers[name] = (deadline, seq, callback)
+            heapq.heappush(self._heap, (deadline, seq, name))
+        return deadline
+
+    def cancel(self, name: str) -> bool:
+        """Отменить таймер. Возвращает True, если он был взведён."""
+        with self._lock:
+            return self._timers.pop(name, None) is not None
+
+    def is_armed(self, name: str) -> bool:
+        """Проверить, взведён ли таймер."""
+        with self._lock:
+            return name in self._timers
+
+    def remaining(self, name: str) -> Optional[float]:
+        """Секунд до срабатывания таймера (None - не взведён)."""
+        with self._lock:
+            timer = self._timers.get(name)
+        if timer is None:
+            return None
+        return max(0.0, timer[0] - self._clock())
+
+    def next_delay(self) -> Optional[float]:
+        """Секунд до ближайшего дедлайна (None - таймеров нет)."""
+        with self._lock:
+            self._drop_stale()
+            if not self._heap:
+                return None
+            deadline = self._heap[0][0]
+        return max(0.0, deadline - self._clock())
+
+    def run_due(self) -> int:
+        """
+        Выполнить callback просроченных таймеров (в порядке дедлайнов).
+
+        Callback может взвести или отменить таймеры; взведённые с нулевой
+        задержкой выполняются в этом же вызове. Исключение callback
+        логируется и не мешает остальным.
+
+        Returns:
+            Количество выполненных callback.
+        """
+        fired = 0
+        now = self._clock()
+        while True:
+            with self._lock:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    return fired
+                _, _, name = heapq.heappop(self._heap)
+                _, _, callback = self._timers.pop(name)
+            fired += 1
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Ошибка в таймере {name}: {e}", exc_info=True)
+
+    def clear(self) -> None:
+        """Отменить все таймеры."""
+        with self._lock:
+            self._timers.clear()
+            self._heap.clear()
+
+    def _drop_stale(self) -> None:
+        """Убрать с вершины кучи отменённые и заменённые записи (под lock)."""
+        while self._heap:
+            deadline, seq, name = self._heap[0]
+            timer = self._timers.get(name)
+            if timer is not None and timer[1] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._timers)
+
+
+class SchedulerThread:
+    """DeadlineScheduler с собственным потоком: callback выполняются в нём по дедлайну."""
+
+    def __init__(self, name: str, clock: Callable[[], float] = time.monotonic):
+        """
+        Инициализация.
+
+        Args:
+            name: Имя потока.
+            clock: Источник монотонного времени (секунды).
+        """
+        self.name = name
+        self.scheduler = DeadlineScheduler(clock)
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def arm(self, name: str, delay: float, callback: Callable[[], None]) -> float:
+        """Взвести таймер и разбудить поток (стартует при первом вызове)."""
+        deadline = self.scheduler.arm(name, delay, callback)
+        with self._cond:
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+                self._thread.start()
+            self._cond.notify()
+        return deadline
+
+    def cancel(self, name: str) -> bool:
+        """Отменить таймер. Возвращает True, если он был взведён."""
+        return self.scheduler.cancel(name)
+
+    def is_armed(self, name: str) -> bool:
+        """Проверить, взведён ли таймер."""
+        return self.scheduler.is_armed(name)
+
+    def stop(self, timeout: float = 1.0) -> None:
+        """Остановить поток; невыполненные таймеры отбрасываются."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.scheduler.clear()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                delay = self.scheduler.next_delay()
+                if delay is None or delay > 0:
+                    self._cond.wait(delay)
+                if self._stopped:
+                    return
+            self.scheduler.run_due()
@@ -0,0 +1,175 @@
+"""
+Tracing - сквозная трассировка обработки контейнера.
+
+Обеспечивает:
+- Trace на каждый контейнер: метки времени этапов (завеса, запрос vision,
+  захват кадра, ответ vision, команда ПЛК, датчик каретки)
+- Длительности стадий vision (preprocess, infer, ...) из ответа vision
+- Кольцевой буфер последних трасс с выдачей по WebSocket и выгрузкой в JSONL
+
+Метки - wall clock (time.time()): vision и Application работают на одной
+плате, поэтому метки двух процессов сравнимы между собой.
+
+Использование:
+    tracer = Tracer(capacity=200)
+    trace = tracer.start(plc_type="plastic")
+    trace.mark("veil_cleared")
+    ...
+    tracer.finish(trace, status="ok")
+    tracer.recent(10)
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def new_trace_id() -> str:
+    """Короткий уникальный идентификатор трассы."""
+    return uuid.uuid4().hex[:16]
+
+
+class Trace:
+    """Трасса одного контейнера: метки времени, стадии vision и атрибуты."""
+
+    def __init__(self, trace_id: Optional[str] = None, **attrs):
+        """
+        Инициализация трассы.
+
+        Args:
+            trace_id: Идентификатор (по умолчанию генерируется).
+            **attrs: Атрибуты трассы (тип по ПЛК, результат vision и т.д.).
+        """
+        self.trace_id = trace_id or new_trace_id()
+        self.attrs = dict(attrs)
+        self.marks: list[tuple[str, float]] = []
+        self.stages: dict[str, float] = {}
+        self.status: Optional[str] = None
+
+    def mark(self, name: str, at: Optional[float] = None) -> None:
+        """
+        Отметить этап.
+
+        Args:
+            name: Имя этапа.
+            at: Время этапа (time.time()). None - текущее время.
+        """
+        self.marks.append((name, at if at is not None else time.time()))
+
+    def has(self, name: str) -> bool:
+        """Проверить, отмечен ли этап."""
+        return any(mark == name for mark, _ in self.marks)
+
+    def add_stages(self, stages: dict) -> None:
+        """Добавить длительности стадий (мс), например из ответа vision."""
+        for name, duration_ms in stages.items():
+            self.stages[name] = round(float(duration_ms), 3)
+
+    def to_dict(self) -> dict:
+        """
+        Представление трассы для JSON.
+
+        Returns:
+            Словарь с метками (смещение в мс от первой метки), интервалами
+            между соседними метками, стадиями vision и общей длительностью.
+        """
+        marks = sorted(self.marks, key=lambda m: m[1])
+        start = marks[0][1] if marks else None
+        offsets = [{"name": name, "t_ms": round((at - start) * 1000, 3)} for name, at in marks]
+        spans = {
+            f"{prev['name']}->{cur['name']}": round(cur["t_ms"] - prev["t_ms"], 3)
+            for prev, cur in zip(offsets, offsets[1:])
+        }
+        return {
+            "trace_id": self.trace_id,
+            "started_at": datetime.fromtimestamp(start).isoformat() if start else None,
+            "status": self.status,
+            "attrs": self.attrs,
+            "marks": offsets,
+            "spans": spans,
+            "stages": self.stages,
+            "total_ms": offsets[-1]["t_ms"] if offsets else 0.0,
+        }
+
+
+class Tracer:
+    """
+    Кольцевой буфер завершённых трасс.
+
+    Потокобезопасен: трассы завершаются в главном цикле, а читаются
+    из обработчиков команд.
+    """
+
+    def __init__(self, capacity: int = 200):
+        """
+        Инициализация буфера.
+
+        Args:
+            capacity: Количество хранимых трасс (старые вытесняются).
+        """
+        self._traces: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def start(self, trace_id: Optional[str] = None, **attrs) -> Trace:
+        """Начать новую трассу."""
+        return Trace(trace_id, **attrs)
+
+    def finish(self, trace: Trace, status: str = "ok", **attrs) -> dict:
+        """
+        Завершить трассу и сохранить в буфер.
+
+        Returns:
+            Трасса в виде словаря.
+        """
+        trace.status = status
+        trace.attrs.update(attrs)
+        data = trace.to_dict()
+        with self._lock:
+            self._traces.append(data)
+        logger.info("Трасса %s: %s, %.1f мс", trace.trace_id, status, data["total_ms"])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Трасса %s: стадии %s", trace.trace_id,
+                         ", ".join(f"{k} {v:.1f}" for k, v in data["spans"].items()))
+        return data
+
+    def recent(self, limit: Optional[int] = None) -> list[dict]:
+        """Последние трассы (от старых к новым)."""
+        with self._lock:
+            traces = list(self._traces)
+        return traces[-limit:] if limit else traces
+
+    def get(self, trace_id: str) -> Optional[dict]:
+        """Найти трассу по идентификатору."""
+        with self._lock:
+            for data in reversed(self._traces):
+                if data["trace_id"] == trace_id:
+                    return data
+        return None
+
+    def dump(self, path: Path) -> int:
+        """
+        Выгрузить трассы в JSONL файл (по одной трассе на строку).
+
+        Args:
+            path: Путь к файлу (папка создаётся при необходимости).
+
+        Returns:
+            Количество выгруженных трасс.
+        """
+        traces = self.recent()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            for data in traces:
+                f.write(json.dumps(data, ensure_ascii=False) + "\n")
+        logger.info(f"Выгружено трасс: {len(traces)} → {path}")
+        return len(traces)
@@ -1,15 +1,23 @@
+import asyncio
 import time
 import json
 import base64
 from pathlib import Path
 from datetime import datetime
 from plc.plc import PLC
+from plc import register_map
 import threading
+import uuid
 import signal
 import sys
 from websocket import WebSocket
 from enum import Enum
+from core.events import EventEncoder
 from core.logging_config import get_logger, setup_logging
+from core.journal import TransactionJournal
+from core.metrics import MetricsServer, get_registry
+from core.scheduler import DeadlineScheduler
+from core.tracing import Tracer
 
 # Инициализация логирования
 setup_logging()
@@ -24,8 +32,17 @@ class AppState(Enum):
     DUMPING_ALUMINUM = "dumping_aluminum"
     ERROR = "error"
 
+
+# Режимы выполнения (APP_RUNTIME):
+#   threads - главный цикл с опросом каждые 10 мс, ПЛК и WebSocket в своих потоках
+#   asyncio - state machine, WebSocket сервер, опрос ПЛК и таймеры в одном event loop
+RUNTIMES = ("threads", "asyncio")
+
+
 class Application:
-    def __init__(self, serial_port, baudrate, slave_address, cmd_register = 25, status_register = 26, update_data_period = 0.1, web_socket_port = 8765, web_socket_host = 'localhost', speed = 500, photos_dir = 'imgs'):
+    def __init__(self, serial_port, baudrate, slave_address, cmd_register = 25, status_register = 26, update_data_period = 0.1, web_socket_port = 8765, web_socket_host = 'localhost', speed = 500, photos_dir = 'imgs', traces_dir = 'traces', metrics_port = 9108, journal_dir = 'journal', runtime = 'threads', ws_send_queue_size = 256, ws_overflow_policy = 'drop_oldest', ws_batch_window = 0.005, ws_compression_roles = ('app', 'monitor', 'remote'), ws_compression_level = 6, ws_max_message_size = 8 * 2**20, ws_write_limit = 2**15, device_info_delta_interval = 0.25, plc_link_timeout = 2.0):
+        if runtime not in RUNTIMES:
+            raise ValueError(f"Неизвестный runtime: {runtime} (допустимо: {', '.join(RUNTIMES)})")
         self.PLC = None
         self.websocket_server = None
         self.serial_port = serial_port
@@ -36,11 +53,28 @@ class Application:
         self.update_data_period = update_data_period
         self.web_socket_port = web_socket_port
         self.web_socket_host = web_socket_host
+        self.ws_send_queue_size = ws_send_queue_size    # Очередь отправки на клиента WebSocket
+        self.ws_overflow_policy = ws_overflow_policy    # drop_oldest, coalesce или disconnect
+        self.ws_batch_window = ws_batch_window          # Окно пакетной отправки событий (секунды)
+        self.ws_compression_roles = ws_compression_roles  # Роли handshake со сжатием deflate
+        self.ws_compression_level = ws_compression_level  # Уровень zlib 1-9
+        self.ws_max_message_size = ws_max_message_size  # Байт во входящем сообщении WebSocket
+        self.ws_write_limit = ws_write_limit            # Байт в буфере записи подключения
         self.running = True
         self.speed = speed
         self.photos_dir = Path(photos_dir)
         # Создаём папку для фото, если её нет
         self.photos_dir.mkdir(parents=True, exist_ok=True)
+        self.traces_dir = Path(traces_dir)   # Папка для dump_traces (создаётся при выгрузке)
+        self.metrics_port = metrics_port     # Порт HTTP /metrics (0 - не запускать)
+        self.journal_dir = Path(journal_dir) if journal_dir else None  # Журнал транзакций (None - выключен)
+        self.runtime = runtime
+
+        # asyncio runtime: цикл, событие пробуждения state machine и фоновые задачи
+        self._loop = None
+        self._wake = None
+        self._tasks = set()
+        self.idle_wakeup = 1.0              # Максимальный сон state machine без событий (секунды)
 
         # Конфигурация устройства
         self.device_config = None
@@ -62,37 +96,70 @@ class Application:
         # Таймауты (секунды)
         self.vision_timeout = 2.0           # Таймаут ответа от vision
         self.dump_timeout = 3.0             # Таймаут движения каретки
+        self.model_reload_timeout = 180.0   # Таймаут загрузки новой модели в vision
+
+        # Таймауты state machine: монотонные дедлайны, взводятся при входе в состояние
+        self.scheduler = DeadlineScheduler()
 
         # Временные данные для state machine
         self.current_plc_detection = None   # "bottle" или "bank" - что детектировал ПЛК
-        self.vision_request_time = None     # Время отправки запроса к vision
-        self.dump_started_time = None       # Время начала сброса каретки
+        self.vision_request_time = None     # Время отправки запроса к vision (monotonic)
+        self.dump_started_time = None       # Время начала сброса каретки (monotonic)
 
         # Отслеживание завесы
         self.prev_veil_state = 0            # Предыдущее состояние завесы
         self.veil_just_cleared = False      # Флаг: завеса только что освободилась
         self.veil_cleared_time = None       # Время когда veil_just_cleared стал True
 
-        # Отслеживание движения каретки после детекции
-        self.carriage_moving_bottle = False  # Флаг: каретка движется после детекции бутылки
-        self.carriage_moving_bank = False   # Флаг: каретка движется после детекции банки
-        self.carriage_moving_start_time = None  # Время начала движения каретки
-        self.carriage_reset_timeout = 2.0   # Таймаут для обнуления регистров (секунды)
+        # Команда детекции - импульс ПЛК, бит сбрасывается потоком PLC (plc-pulse)
+        self.carriage_reset_timeout = 2.0   # Длительность импульса cmd_radxa_detected_* (секунды)
 
         # Отслеживание состояния приёмника и ошибок (для событий)
         self._prev_receiver_state = False      # Предыдущее состояние приёмника (есть контейнер?)
-        self._prev_weight_error = False        # Предыдущее состояние ошибки веса
-        self._prev_weight_too_small = False    # Предыдущее состояние "вес слишком маленький"
-        self._prev_left_movement_error = False # Предыдущее состояние ошибки движения влево
-        self._prev_right_movement_error = False # Предыдущее состояние ошибки движения вправо
+        self._prev_status_word = 0             # Предыдущее слово статуса ПЛК (фронты ошибок)
 
         # Защита от повторного инференса для одного контейнера
         self._inference_requested = False      # Флаг: инференс уже запрошен для текущего контейнера
         self._pending_vision_response = None   # Ответ vision, ожидающий ответа ПЛК
+        self._pending_vision_details = {}      # Доп. поля ответа vision (error_code и т.д.)
+
+        # Кодирование событий: префиксы по имени события, orjson при наличии
+        self.events = EventEncoder()
+
+        # Документ device_info: обновляется по снимку регистров ПЛК, изменения
+        # рассылаются событиями device_info_delta с номером последовательности
+        self.device_info_delta_interval = device_info_delta_interval  # Мин. интервал delta (0 - без push)
+        self.plc_link_timeout = plc_link_timeout  # Пауза опроса ПЛК до plc_link_degraded (секунды)
+        self._device_info = {}                 # Текущий документ
+        self._device_info_key = None           # Регистры/состояние/дверь, по которым он собран
+        self._device_info_sent = {}            # Документ на момент последнего seq
+        self._device_info_seq = 0              # Номер последнего device_info / device_info_delta
+        self._device_info_sent_at = float("-inf")  # Время последней delta (monotonic)
+        self._device_info_json = None          # Сериализованные данные device_info для seq
+        self._device_info_json_seq = None
+
+        # Трассировка: от освобождения завесы до датчика каретки
+        self.tracer = Tracer(capacity=200)
+        self._trace = None                     # Трасса текущего контейнера
+
+        # Журнал транзакций (запускается в start_threads)
+        self.journal = None
+
+        # Метрики
+        self.metrics = get_registry()
+        self.metrics_server = None
+        self._container_seconds = self.metrics.histogram(
+            "fandomat_container_seconds", "От освобождения завесы до завершения обработки контейнера")
+        self._vision_reply_seconds = self.metrics.histogram(
+            "fandomat_vision_reply_seconds", "От запроса vision до ответа")
 
         # Command Registry: команда → (handler, требует_param)
         self._command_handlers = {
             "get_photo": (self.handle_get_photo, False),
+            "reload_model": (self.handle_reload_model, True),
+            "get_traces": (self.handle_get_traces, True),
+            "get_metrics": (self.handle_get_metrics, False),
+            "dump_traces": (self.handle_dump_traces, True),
             "get_device_info": (self.handle_get_device_info, False),
             "device_init": (self.handle_device_init, True),
             "dump_container": (self.handle_container_dump, True),
@@ -136,6 +203,12 @@ class Application:
     def signal_handler(self, sig, frame):
         self.running = False
 
+    def request_stop(self):
+        """Остановить главный цикл (из любого потока)."""
+        self.running = False
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
     def start_threads(self):
         self.thread_update_data = threading.Thread(target=self.PLC_update_data)
         self.thread_update_data.start()
@@ -143,6 +216,18 @@ class Application:
         # self.websocket_server = WebSocket(self.PLC, self.web_socket_host, self.web_socket_port)
         self.websocket_server.start()
 
+        self._start_services()
+
+    def _start_services(self):
+        """Сервер метрик и журнал транзакций (свои потоки в обоих режимах)."""
+        if self.metrics_port:
+            self.metrics_server = MetricsServer(self.metrics, self.metrics_port)
+            self.metrics_server.start()
+
+        if self.journal_dir:
+            self.journal = TransactionJournal(self.journal_dir)
+            self.journal.start()
+
     def stop(self):
         self.running = False
         if self.thread_update_data and self.thread_update_data.is_alive():
@@ -151,6 +236,10 @@ class Application:
             self.PLC.stop()
         if self.websocket_server:
             self.websocket_server.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.journal:
+            self.journal.close()
         logger.info("Application stopped")
 
 
@@ -166,10 +255,22 @@ class Application:
 
     def setup(self):
         try:
-            self.PLC = PLC(self.serial_port, self.baudrate, self.slave_address, self.cmd_register, self.status_register, self.speed)
-            self.websocket_server = WebSocket(self.PLC, self.web_socket_host, self.web_socket_port)
+            self.PLC = PLC(self.serial_port, self.baudrate, self.slave_address, self.cmd_register, self.status_register, self.speed,
+                           link_timeout=self.plc_link_timeout)
+            self.websocket_server = WebSocket(self.PLC, self.web_socket_host, self.web_socket_port,
+                                              send_queue_size=self.ws_send_queue_size,
+                                              overflow_policy=self.ws_overflow_policy,
+                                              batch_window=self.ws_batch_window,
+                                              compression_roles=self.ws_compression_roles,
+                                              compression_level=self.ws_compression_level,
+                                              max_message_size=self.ws_max_message_size,
+                                              write_limit=self.ws_write_limit)
             time.sleep(1) 
-            self.start_threads()
+            if self.runtime == "asyncio":
+                # ПЛК и WebSocket запускаются в run_async
+                self._start_services()
+            else:
+                self.start_threads()
 
         except Exception as e:
             logger.error(f"Ошибка инициализации: {e}")
@@ -180,151 +281,12 @@ class Application:
 
     def run(self):
         signal.signal(signal.SIGINT, self.signal_handler)
+        if self.runtime == "asyncio":
+            asyncio.run(self.run_async())
+            return
         try:
             while self.running:
-                # ОБРАБОТКА СОСТОЯНИЙ STATE MACHINE
-                if self.state in (AppState.DUMPING_PLASTIC, AppState.DUMPING_ALUMINUM):
-                    self._handle_dumping_state(self.state)
-
-                # Проверка таймаута для обнуления регистров после детекции
-                if self.carriage_moving_bottle and self.carriage_moving_start_time:
-                    if time.time() - self.carriage_moving_start_time > self.carriage_reset_timeout:
-                        logger.info("Таймаут движения каретки (бутылка) → обнуление регистра")
-                        self.PLC.cmd_radxa_stop_detected_bottle()
-                        self.carriage_moving_bottle = False
-                        self.carriage_moving_start_time = None
-                
-                if self.carriage_moving_bank and self.carriage_moving_start_time:
-                    if time.time() - self.carriage_moving_start_time > self.carriage_reset_timeout:
-                        logger.info("Таймаут движения каретки (банка) → обнуление регистра")
-                        self.PLC.cmd_radxa_stop_detected_bank()
-                        self.carriage_moving_bank = False
-                        self.carriage_moving_start_time = None
-
-                if self.state == AppState.WAITING_VISION:
-                    # Получаем ответ от vision (одноразовое чтение)
-                    vision_response = self.websocket_server.get_command("vision")
-
-                    # Сохраняем ответ vision, если получен
-                    if vision_response and vision_response != "" and self._pending_vision_response is None:
-                        logger.info(f"Vision ответил: {vision_response}")
-                        self._pending_vision_response = vision_response
-
-                        # Вычисляем дельту времени между veil_just_cleared и ответом от vision
-                        if self.veil_cleared_time is not None:
-                            delta_ms = (time.time() - self.veil_cleared_time) * 1000
-                            print(f"[TIMING] Дельта: {delta_ms:.2f} мс (veil_cleared → vision_response)")
-                            self.veil_cleared_time = None
-
-                    # Обновляем current_plc_detection из ПЛК если ещё не определён
-                    if self.current_plc_detection is None:
-                        if self.PLC.get_bottle_exist() == 1:
-                            self.current_plc_detection = "plastic"
-                            logger.info("ПЛК определил: plastic")
-                        elif self.PLC.get_bank_exist() == 1:
-                            self.current_plc_detection = "aluminum"
-                            logger.info("ПЛК определил: aluminum")
-
-                    # Проверяем готовность обоих результатов
-                    if self._pending_vision_response is not None and self.current_plc_detection is not None:
-                        # Оба готовы - принимаем решение
-                        self._handle_vision_response_with_events(self._pending_vision_response)
-                        with self.state_lock:
-                            self.state = AppState.IDLE
-                        self.vision_request_time = None
-                        self.current_plc_detection = None
-                        self._pending_vision_response = None
-                    elif time.time() - self.vision_request_time > self.vision_timeout:
-                        # Таймаут ожидания
-                        if self._pending_vision_response is None:
-                            logger.warning("ТАЙМАУТ ожидания vision → IDLE")
-                        else:
-                            logger.warning("ТАЙМАУТ ожидания ПЛК → IDLE")
-
-                        # Вычисляем дельту времени даже при таймауте
-                        if self.veil_cleared_time is not None:
-                            delta_ms = (time.time() - self.veil_cleared_time) * 1000
-                            print(f"[TIMING] Дельта (таймаут): {delta_ms:.2f} мс (veil_cleared → timeout)")
-                            self.veil_cleared_time = None
-
-                        with self.state_lock:
-                            self.state = AppState.IDLE
-                        self.vision_request_time = None
-                        self.current_plc_detection = None
-                        self._pending_vision_response = None
-                        # Событие: контейнер не распознан
-                        self.send_event_to_app("container_not_recognized", {})
-
-                elif self.state == AppState.ERROR:
-                    # В состоянии ошибки принимаем команды, но обрабатываем только некоторые
-                    self._handle_error_state_commands()
-
-                # ОБРАБОТКА КОМАНД ТОЛЬКО В СОСТОЯНИИ IDLE
-                elif self.state == AppState.IDLE:
-                    
-                    # Проверка подключения нового клиента (app)
-                    if self.websocket_server.is_client_just_connected("app"):
-                        logger.info("Новое подключение app → отправка device_info")
-                        self.handle_get_device_info()
-
-                    # Отслеживание завесы
-                    current_veil = self.PLC.get_state_veil()
-                    bottle_exist = self.PLC.get_bottle_exist()
-                    bank_exist = self.PLC.get_bank_exist()
-                    container_detected = bottle_exist == 1 or bank_exist == 1
-
-                    # Сброс флага инференса когда контейнер убран из приёмника
-                    if not container_detected:
-                        self._inference_requested = False
-
-                    # Детект перехода завесы: пересечена → свободна (рука убрана)
-                    # Запуск инференса СРАЗУ при освобождении завесы (параллельно с ПЛК)
-                    if self.prev_veil_state == 1 and current_veil == 0 and not self._inference_requested:
-                        self.veil_just_cleared = True
-                        self.veil_cleared_time = time.time()
-                        self._inference_requested = True  # Помечаем что инференс запрошен
-
-                        logger.info("Завеса освободилась → WAITING_VISION (инференс запущен)")
-                        self.vision_request_time = time.time()
-
-                        # Определяем тип контейнера по ПЛК (если уже есть) или используем bottle_exist по умолчанию
-                        if self.PLC.get_bottle_exist() == 1:
-                            self.current_plc_detection = "plastic"
-                            vision_cmd = "bottle_exist"
-                        elif self.PLC.get_bank_exist() == 1:
-                            self.current_plc_detection = "aluminum"
-                            vision_cmd = "bank_exist"
-                        else:
-                            # ПЛК ещё не определил тип - запускаем инференс всё равно
-                            self.current_plc_detection = None
-                            vision_cmd = "bottle_exist"  # Команда для запуска инференса
-
-                        # Событие: контейнер обнаружен
-                        self.send_event_to_app("container_detected", {"container_type": self.current_plc_detection or "unknown"})
-                        # Сброс старых ответов vision перед новым запросом
-                        self.websocket_server.get_command("vision")
-                        self.websocket_server.send_to_client("vision", vision_cmd)
-                        with self.state_lock:
-                            self.state = AppState.WAITING_VISION
-
-                    # Сброс флага если завеса снова пересечена
-                    if current_veil == 1:
-                        self.veil_just_cleared = False
-                        self.veil_cleared_time = None
-
-                    self.prev_veil_state = current_veil
-
-                    # Обработка команд от app через command registry
-                    app_message = self.websocket_server.get_command("app")
-                    if app_message:
-                        app_command, params = self.parse_command(app_message)
-                        if app_command:
-                            self._dispatch_command(app_command, params)
-
-                # Проверка состояния приёмника и ошибок (отправка событий при изменении)
-                self._check_receiver_state()
-                self._check_hardware_errors()
-
+                self._step()
                 time.sleep(0.01)
 
         except Exception as e:
@@ -332,6 +294,215 @@ class Application:
         finally:
             self.stop()
 
+    async def run_async(self):
+        """
+        asyncio runtime: state machine, WebSocket сервер, опрос ПЛК и таймеры в одном цикле.
+
+        State machine выполняет шаг при изменении регистров ПЛК, сообщении
+        клиента или наступлении ближайшего таймаута; без событий цикл спит.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        try:
+            self._loop.add_signal_handler(signal.SIGINT, self.request_stop)
+        except (NotImplementedError, RuntimeError):
+            pass  # Не главный поток (тесты)
+
+        self.websocket_server.on_message = self._on_ws_message
+        await self.websocket_server.start_async()
+        poller = self._spawn(self._poll_plc_async())
+        try:
+            while self.running:
+                self._wake.clear()
+                state = self.state
+                self._step()
+                if self.state != state:
+                    # Новое состояние обрабатывается сразу (команды app, ожидавшие IDLE)
+                    await asyncio.sleep(0)
+                    continue
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self._next_wakeup())
+                except asyncio.TimeoutError:
+                    pass
+        except Exception as e:
+            logger.error(f"Ошибка в главном цикле: {e}")
+        finally:
+            self.running = False
+            poller.cancel()
+            for task in list(self._tasks):
+                task.cancel()
+            await self.websocket_server.stop_async()
+            self._loop = None
+            self.stop()
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """Запустить фоновую задачу в цикле Application (ссылка хранится до завершения)."""
+        task = self._loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _on_ws_message(self, client_name: str):
+        """Сообщение или подключение клиента - разбудить state machine."""
+        self._wake.set()
+
+    async def _poll_plc_async(self):
+        """Опрос ПЛК в executor; state machine будится только при изменении регистров."""
+        previous = None
+        try:
+            while self.running:
+                snapshot = await self._loop.run_in_executor(None, self._read_plc)
+                if snapshot != previous:
+                    previous = snapshot
+                    self._wake.set()
+                await asyncio.sleep(self.update_data_period)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка обновления данных PLC: {e}")
+
+    def _read_plc(self) -> tuple:
+        """Синхронизировать регистры ПЛК и вернуть их значения (в потоке executor)."""
+        self.PLC.update_data()
+        return self.PLC.registers_snapshot()
+
+    def _next_wakeup(self) -> float:
+        """Секунд до ближайшего таймаута state machine (не больше idle_wakeup)."""
+        delay = self.scheduler.next_delay()
+        if delay is None:
+            return self.idle_wakeup
+        return min(self.idle_wakeup, delay)
+
+    def _step(self):
+        """Один шаг state machine: состояния, таймауты, команды и события."""
+        # Таймауты (vision, сброс, обнуление регистров после детекции)
+        self.scheduler.run_due()
+
+        # ОБРАБОТКА СОСТОЯНИЙ STATE MACHINE
+        if self.state in (AppState.DUMPING_PLASTIC, AppState.DUMPING_ALUMINUM):
+            self._handle_dumping_state(self.state)
+
+        # Трасса завершается, когда каретка дошла до датчика
+        self._check_trace_carriage()
+
+        if self.state == AppState.WAITING_VISION:
+            # Получаем ответ от vision (одноразовое чтение)
+            vision_response = self.websocket_server.get_command("vision")
+
+            # Сохраняем ответ vision, если получен
+            if vision_response and self._pending_vision_response is None:
+                vision_result, vision_details = self._parse_vision_response(vision_response)
+                if vision_result is not None:
+                    logger.info("Vision ответил: %s", vision_result)
+                    self._pending_vision_response = vision_result
+                    self._pending_vision_details = vision_details
+                    self._trace_vision_reply(vision_details)
+                    self.veil_cleared_time = None
+
+            # Обновляем current_plc_detection из ПЛК если ещё не определён
+            if self.current_plc_detection is None:
+                if self.PLC.get_bottle_exist() == 1:
+                    self.current_plc_detection = "plastic"
+                    logger.info("ПЛК определил: plastic")
+                elif self.PLC.get_bank_exist() == 1:
+                    self.current_plc_detection = "aluminum"
+                    logger.info("ПЛК определил: aluminum")
+
+            # Проверяем готовность обоих результатов
+            if self._pending_vision_response is not None and self.current_plc_detection is not None:
+                # Оба готовы - принимаем решение
+                self._handle_vision_response_with_events(
+                    self._pending_vision_response, self._pending_vision_details
+                )
+                self.scheduler.cancel("vision")
+                with self.state_lock:
+                    self.state = AppState.IDLE
+                self.vision_request_time = None
+                self.current_plc_detection = None
+                self._pending_vision_response = None
+                self._pending_vision_details = {}
+
+        elif self.state == AppState.ERROR:
+            # В состоянии ошибки принимаем команды, но обрабатываем только некоторые
+            self._handle_error_state_commands()
+
+        # ОБРАБОТКА КОМАНД ТОЛЬКО В СОСТОЯНИИ IDLE
+        elif self.state == AppState.IDLE:
+            
+            # Проверка подключения нового клиента (app)
+            if self.websocket_server.is_client_just_connected("app"):
+                logger.info("Новое подключение app → отправка device_info")
+                self.handle_get_device_info()
+
+            # Отслеживание завесы
+            current_veil = self.PLC.get_state_veil()
+            bottle_exist = self.PLC.get_bottle_exist()
+            bank_exist = self.PLC.get_bank_exist()
+            container_detected = bottle_exist == 1 or bank_exist == 1
+
+            # Сброс флага инференса когда контейнер убран из приёмника
+            if not container_detected:
+                self._inference_requested = False
+
+            # Детект перехода завесы: пересечена → свободна (рука убрана)
+            # Запуск инференса СРАЗУ при освобождении завесы (параллельно с ПЛК)
+            if self.prev_veil_state == 1 and current_veil == 0 and not self._inference_requested:
+                self.veil_just_cleared = True
+                self.veil_cleared_time = time.time()
+                self._inference_requested = True  # Помечаем что инференс запрошен
+
+                logger.info("Завеса освободилась → WAITING_VISION (инференс запущен)")
+                self.vision_request_time = time.monotonic()
+                self.scheduler.arm("vision", self.vision_timeout, self._on_vision_timeout)
+
+                # Определяем тип контейнера по ПЛК (если уже есть) или используем bottle_exist по умолчанию
+                if self.PLC.get_bottle_exist() == 1:
+                    self.current_plc_detection = "plastic"
+                    vision_cmd = "bottle_exist"
+                elif self.PLC.get_bank_exist() == 1:
+                    self.current_plc_detection = "aluminum"
+                    vision_cmd = "bank_exist"
+                else:
+                    # ПЛК ещё не определил тип - запускаем инференс всё равно
+                    self.current_plc_detection = None
+                    vision_cmd = "bottle_exist"  # Команда для запуска инференса
+
+                # Трасса контейнера: запрос vision несёт trace_id
+                self._trace_start(plc_type=self.current_plc_detection)
+                self._trace.mark("veil_cleared", self.veil_cleared_time)
+
+                # Событие: контейнер обнаружен
+                self.send_event_to_app("container_detected", {"container_type": self.current_plc_detection or "unknown"})
+                # Сброс старых ответов vision перед новым запросом
+                self.websocket_server.get_command("vision")
+                self.websocket_server.send_to_client("vision", json.dumps({
+                    "command": vision_cmd,
+                    "trace_id": self._trace.trace_id,
+                }))
+                self._trace.mark("request_sent")
+                with self.state_lock:
+                    self.state = AppState.WAITING_VISION
+
+            # Сброс флага если завеса снова пересечена
+            if current_veil == 1:
+                self.veil_just_cleared = False
+                self.veil_cleared_time = None
+
+            self.prev_veil_state = current_veil
+
+            # Обработка команд от app через command registry
+            app_message = self.websocket_server.get_command("app")
+            if app_message:
+                app_command, params = self.parse_command(app_message)
+                if app_command:
+                    self._dispatch_command(app_command, params)
+
+        # Проверка состояния приёмника и ошибок (отправка событий при изменении)
+        self._check_receiver_state()
+        self._check_hardware_errors()
+        self._check_plc_link()
+        self._check_device_info()
+
     # === ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ДЛЯ СОБЫТИЙ И КОМАНД ===
 
     def _handle_dumping_state(self, state: AppState) -> None:
@@ -344,7 +515,14 @@ class Application:
         config = self._dumping_config[state]
 
         if config["sensor_getter"]() == 1:
-            logger.info(f"Датчик {config['direction']} достигнут, обнуляем регистры")
+            logger.info("Датчик %s достигнут, обнуляем регистры", config["direction"])
+            self._journal_record({
+                "kind": "dump",
+                "container_type": config["type"],
+                "result": "ok",
+                "duration_ms": round((time.monotonic() - self.dump_started_time) * 1000, 1),
+            })
+            self.scheduler.cancel("dump")
             self.PLC.cmd_full_clear_register()
             with self.state_lock:
                 self.state = AppState.IDLE
@@ -353,16 +531,53 @@ class Application:
                 "container_type": config["type"],
                 "counter": config["counter_getter"]()
             })
-        elif time.time() - self.dump_started_time > self.dump_timeout:
-            logger.warning(f"ТАЙМАУТ при движении {config['direction']}! → ERROR")
-            self.PLC.cmd_full_clear_register()
-            with self.state_lock:
-                self.state = AppState.ERROR
-            self.dump_started_time = None
-            self.send_event_to_app("hardware_error", {
-                "error_code": config["error_code"],
-                "message": config["error_message"]
-            })
+
+    # === ТАЙМАУТЫ (callback DeadlineScheduler, выполняются в шаге state machine) ===
+
+    def _on_vision_timeout(self):
+        """Таймаут WAITING_VISION: нет ответа vision или типа от ПЛК."""
+        if self.state != AppState.WAITING_VISION:
+            return
+        if self._pending_vision_response is None:
+            logger.warning("ТАЙМАУТ ожидания vision → IDLE")
+        else:
+            logger.warning("ТАЙМАУТ ожидания ПЛК → IDLE")
+
+        self.veil_cleared_time = None
+        self._trace_finish(
+            "vision_timeout" if self._pending_vision_response is None else "plc_timeout",
+            vision_type=self._pending_vision_response,
+        )
+
+        with self.state_lock:
+            self.state = AppState.IDLE
+        self.vision_request_time = None
+        self.current_plc_detection = None
+        self._pending_vision_response = None
+        self._pending_vision_details = {}
+        # Событие: контейнер не распознан
+        self.send_event_to_app("container_not_recognized", {})
+
+    def _on_dump_timeout(self):
+        """Таймаут DUMPING_*: каретка не дошла до датчика."""
+        config = self._dumping_config.get(self.state)
+        if config is None:
+            return
+        logger.warning("ТАЙМАУТ при движении %s! → ERROR", config["direction"])
+        self._journal_record({
+            "kind": "dump",
+            "container_type": config["type"],
+            "result": config["error_code"],
+            "duration_ms": round((time.monotonic() - self.dump_started_time) * 1000, 1),
+        })
+        self.PLC.cmd_full_clear_register()
+        with self.state_lock:
+            self.state = AppState.ERROR
+        self.dump_started_time = None
+        self.send_event_to_app("hardware_error", {
+            "error_code": config["error_code"],
+            "message": config["error_message"]
+        })
 
     def _dispatch_command(self, command: str, params: dict) -> bool:
         """
@@ -406,23 +621,22 @@ class Application:
         Returns:
             JSON строка с событием.
         """
-        return json.dumps({
-            "event": event_name,
-            "data": data or {},
-            "timestamp": datetime.now().isoformat()
-        })
+        return self.events.encode(event_name, data)
 
     def send_event_to_app(self, event_name: str, data: dict = None):
         """
-        Отправить событие клиенту app.
+        Отправить событие клиенту app и подписчикам темы события (мониторы).
+
+        Событие сериализуется один раз; сервер ставит его в очередь каждого
+        подписчика (см. websocket.server.EVENT_TOPICS).
 
         Args:
             event_name: Название события.
             data: Данные события (опционально).
         """
         event = self.create_event(event_name, data)
-        self.websocket_server.send_to_client("app", event)
-        logger.debug(f"Event → app: {event_name}: {data}")
+        self.websocket_server.publish(event_name, event)
+        logger.debug("Event → subscribers: %s: %s", event_name, data)
 
     def _check_receiver_state(self):
         """Проверить и отправить событие состояния приёмника."""
@@ -440,43 +654,49 @@ class Application:
                 self.send_event_to_app("receiver_empty", {})
             self._prev_receiver_state = current_state
 
+    def _check_plc_link(self):
+        """Отправить plc_link_degraded / plc_link_restored при смене состояния канала ПЛК."""
+        transition = self.PLC.check_link()
+        if transition == "degraded":
+            self.send_event_to_app("plc_link_degraded", self.PLC.link.stats())
+        elif transition == "restored":
+            self.send_event_to_app("plc_link_restored", self.PLC.link.stats())
+
     def _check_hardware_errors(self):
-        """Проверить и отправить события об ошибках оборудования."""
-        # Ошибка веса
-        weight_error = self.PLC.get_state_weight_error()
-        if weight_error and not self._prev_weight_error:
+        """Отправить hardware_error по фронту 0 → 1 битов ошибок (register_map.ERROR_BITS)."""
+        status = self.PLC.get_status_word()
+        for bit in register_map.rising_edges(self._prev_status_word, status):
             self.send_event_to_app("hardware_error", {
-                "error_code": "weight_error",
-                "message": "Ошибка взвешивания"
+                "error_code": bit.error_code,
+                "message": bit.message
             })
-        self._prev_weight_error = weight_error
+        self._prev_status_word = status
 
-        # Вес слишком маленький
-        weight_small = self.PLC.get_weight_too_small()
-        if weight_small and not self._prev_weight_too_small:
-            self.send_event_to_app("hardware_error", {
-                "error_code": "weight_too_small",
-                "message": "Вес слишком маленький"
-            })
-        self._prev_weight_too_small = weight_small
+    def _parse_vision_response(self, message: str) -> tuple:
+        """
+        Разобрать ответ vision на запрос классификации.
 
-        # Ошибка движения влево
-        left_error = self.PLC.get_left_movement_error()
-        if left_error and not self._prev_left_movement_error:
-            self.send_event_to_app("hardware_error", {
-                "error_code": "left_movement_error",
-                "message": "Ошибка движения каретки влево"
-            })
-        self._prev_left_movement_error = left_error
+        Поддерживает форматы:
+        - Строка: "plastic", "aluminum", "none"
+        - JSON: {"result": "none", "error_code": "inference_worker_crashed"}
 
-        # Ошибка движения вправо
-        right_error = self.PLC.get_right_movement_error()
-        if right_error and not self._prev_right_movement_error:
-            self.send_event_to_app("hardware_error", {
-                "error_code": "right_movement_error",
-                "message": "Ошибка движения каретки вправо"
-            })
-        self._prev_right_movement_error = right_error
+        JSON без поля result (например, ответ на get_photo) результатом не считается.
+
+        Args:
+            message: Сообщение от vision.
+
+        Returns:
+            Tuple (result или None, details_dict).
+        """
+        if message.startswith("{"):
+            try:
+                data = json.loads(message)
+            except json.JSONDecodeError:
+                return None, {}
+            if "result" not in data:
+                return None, {}
+            return data["result"], data
+        return message.strip(), {}
 
     def parse_command(self, message: str) -> tuple:
         """
@@ -505,6 +725,10 @@ class Application:
                 data["param"] = data["container_type"]
             elif "config" in data:
                 data["param"] = data["config"]
+            elif "model_path" in data:
+                data["param"] = data["model_path"]
+            elif "limit" in data:
+                data["param"] = data["limit"]
             
             return command, data
         except json.JSONDecodeError:
@@ -538,28 +762,84 @@ class Application:
         """
         Обработчик команды get_device_info.
 
-        Собирает информацию с ПЛК и отправляет событие device_info.
-        """
-        device_info = {
-            "bottle_count": self.PLC.get_bottle_count(),
-            "bank_count": self.PLC.get_bank_count(),
-            "bottle_fill_percent": self.PLC.get_bottle_fill_percent(),
-            "bank_fill_percent": self.PLC.get_bank_fill_percent(),
-            "state": self.state.value,
-            "left_sensor": self.PLC.get_state_left_sensor_carriage(),
-            "center_sensor": self.PLC.get_state_center_sensor_carriage(),
-            "right_sensor": self.PLC.get_state_right_sensor_carriage(),
-            "weight_error": self.PLC.get_state_weight_error(),
-            "door_locked": self.door_locked,  # Добавляем статус двери
-        }
-        self.send_event_to_app("device_info", device_info)
+        Отправляет полный документ device_info с текущим seq (ресинхронизация
+        клиента после пропуска delta). Неотправленные изменения входят в
+        документ под новым seq, отложенная delta отменяется. Данные
+        сериализуются заново только при смене seq.
+        """
+        self._refresh_device_info()
+        if self._device_info != self._device_info_sent:
+            self._device_info_seq += 1
+            self._device_info_sent = dict(self._device_info)
+        self.scheduler.cancel("device_info_delta")
+        cached = self._device_info_json_seq == self._device_info_seq
+        if not cached:
+            self._device_info_json = self.events.encode_data({**self._device_info, "seq": self._device_info_seq})
+            self._device_info_json_seq = self._device_info_seq
+        event = self.events.encode_prepared("device_info", self._device_info_json)
+        self.websocket_server.publish("device_info", event)
+        logger.debug("Event → subscribers: device_info seq=%d (cached=%s)", self._device_info_seq, cached)
+
+    def _read_device_info(self) -> dict:
+        """Собрать документ device_info из геттеров ПЛК."""
+        info = {value.field: getattr(self.PLC, value.name)() for value in register_map.VALUE_REGISTERS}
+        info["state"] = self.state.value
+        info.update(register_map.status_fields(self.PLC.get_status_word()))
+        info["door_locked"] = self.door_locked  # Добавляем статус двери
+        info["plc_link"] = self.PLC.get_link_state()
+        info["modbus_errors"] = self.PLC.get_modbus_errors()
+        return info
+
+    def _refresh_device_info(self) -> bool:
+        """
+        Обновить документ device_info, если изменились регистры ПЛК, состояние или дверь.
+
+        Returns:
+            True - документ собран заново.
+        """
+        key = (self.PLC.registers_snapshot(), self.state, self.door_locked,
+               self.PLC.get_link_state(), self.PLC.get_modbus_errors())
+        if key == self._device_info_key:
+            return False
+        self._device_info = self._read_device_info()
+        self._device_info_key = key
+        return True
+
+    def _check_device_info(self):
+        """Запланировать device_info_delta, если документ изменился (не чаще интервала)."""
+        first = self._device_info_key is None
+        if not self._refresh_device_info():
+            return
+        if first:
+            # Первый документ - точка отсчёта, клиенты получают его целиком
+            self._device_info_sent = dict(self._device_info)
+            return
+        if self.device_info_delta_interval <= 0 or self.scheduler.is_armed("device_info_delta"):
+            return
+        delay = self._device_info_sent_at + self.device_info_delta_interval - self.scheduler.now()
+        self.scheduler.arm("device_info_delta", max(0.0, delay), self._send_device_info_delta)
+
+    def _send_device_info_delta(self):
+        """Отправить поля, изменившиеся с последнего seq, событием device_info_delta."""
+        changes = {key: value for key, value in self._device_info.items()
+                   if self._device_info_sent.get(key) != value}
+        if not changes:
+            return
+        self._device_info_seq += 1
+        self._device_info_sent = dict(self._device_info)
+        self._device_info_sent_at = self.scheduler.now()
+        self.send_event_to_app("device_info_delta", {"seq": self._device_info_seq, "changes": changes})
 
     def handle_get_photo(self):
         """
         Обработчик команды get_photo.
 
-        Запускает фоновый поток, чтобы не блокировать главный цикл state machine.
+        Запускает фоновую задачу (asyncio runtime) или поток, чтобы не
+        блокировать главный цикл state machine.
         """
+        if self._loop is not None:
+            self._spawn(self._get_photo_async())
+            return
         threading.Thread(
             target=self._handle_get_photo_worker,
             daemon=True,
@@ -578,41 +858,297 @@ class Application:
         self.websocket_server.send_to_client("vision", '{"command": "get_photo"}')
 
         # Ждём ответа с таймаутом (одноразовое чтение)
-        start_time = time.time()
-        while self.running and time.time() - start_time < 2.0:
+        start_time = time.monotonic()
+        while self.running and time.monotonic() - start_time < 2.0:
             response = self.websocket_server.get_command("vision")
-            if not response:
-                time.sleep(0.1)
-                continue
-            if response.startswith("{"):
-                try:
-                    data = json.loads(response)
-                    if "photo_base64" in data:
-                        # Сохраняем фото в файл
-                        photo_path = self._save_photo(data["photo_base64"])
-
-                        # Формируем ответ клиенту: ТОЛЬКО ПУТЬ
-                        response_data = {"timestamp": data.get("timestamp")}
-
-                        if photo_path:
-                            # Возвращаем абсолютный путь к файлу
-                            response_data["photo_path"] = str(photo_path.absolute())
-                            logger.info(f"Фото сохранено: {photo_path}")
-                        else:
-                            response_data["error"] = "save_failed"
-
-                        self.send_event_to_app("photo_ready", response_data)
-                        return
-                    elif "error" in data:
-                        self.send_event_to_app("photo_ready", {"error": data["error"]})
-                        return
-                except json.JSONDecodeError:
-                    pass
+            if response and self._process_photo_response(response):
+                return
             time.sleep(0.1)
 
         # Таймаут - vision недоступен
         self.send_event_to_app("photo_ready", {"error": "vision_unavailable"})
 
+    async def _get_photo_async(self):
+        """get_photo в asyncio runtime: ожидание ответа vision без опроса."""
+        self.websocket_server.get_command("vision")
+        self.websocket_server.send_to_client("vision", '{"command": "get_photo"}')
+
+        deadline = time.monotonic() + 2.0
+        while self.running:
+            response = self.websocket_server.get_command("vision")
+            if response and self._process_photo_response(response):
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await self.websocket_server.wait_message(remaining):
+                break
+
+        self.send_event_to_app("photo_ready", {"error": "vision_unavailable"})
+
+    def _process_photo_response(self, response: str) -> bool:
+        """
+        Обработать сообщение vision на get_photo.
+
+        Args:
+            response: Сообщение от vision.
+
+        Returns:
+            True, если событие photo_ready отправлено.
+        """
+        if not response.startswith("{"):
+            return False
+        try:
+            data = json.loads(response)
+        except json.JSONDecodeError:
+            return False
+
+        if "photo_base64" in data:
+            # Сохраняем фото в файл
+            photo_path = self._save_photo(data["photo_base64"])
+
+            # Формируем ответ клиенту: ТОЛЬКО ПУТЬ
+            response_data = {"timestamp": data.get("timestamp")}
+
+            if photo_path:
+                # Возвращаем абсолютный путь к файлу
+                response_data["photo_path"] = str(photo_path.absolute())
+                logger.info("Фото сохранено: %s", photo_path)
+            else:
+                response_data["error"] = "save_failed"
+
+            self.send_event_to_app("photo_ready", response_data)
+            return True
+        if "error" in data:
+            self.send_event_to_app("photo_ready", {"error": data["error"]})
+            return True
+        return False
+
+    def handle_reload_model(self, model_path: str = None):
+        """
+        Обработчик команды reload_model (горячая замена модели в vision).
+
+        Запускает фоновую задачу или поток: загрузка модели занимает десятки секунд.
+
+        Args:
+            model_path: Путь к новой модели на устройстве. None - перезагрузить текущую.
+        """
+        if self._loop is not None:
+            self._spawn(self._reload_model_async(model_path))
+            return
+        threading.Thread(
+            target=self._handle_reload_model_worker,
+            args=(model_path,),
+            daemon=True,
+            name="model-reload-worker",
+        ).start()
+
+    def _send_reload_model(self, model_path: str = None) -> str:
+        """
+        Отправить команду reload_model в vision.
+
+        Returns:
+            request_id: vision возвращает его в ответе, ответ забирается
+            через take_reply и не смешивается с ответами классификации.
+        """
+        request_id = uuid.uuid4().hex
+        command = {"command": "reload_model", "request_id": request_id}
+        if model_path:
+            command["model_path"] = model_path
+        self.websocket_server.send_to_client("vision", json.dumps(command))
+        logger.info("Запрошена замена модели: %s", model_path or "текущая")
+        return request_id
+
+    def _handle_reload_model_worker(self, model_path: str = None):
+        """
+        Фоновая обработка reload_model.
+
+        Отправляет команду в vision и ждёт ответа {"model_reload": ...} с тем же
+        request_id. Ответы классификации идут через слот vision и не затрагиваются.
+        """
+        request_id = self._send_reload_model(model_path)
+
+        start_time = time.monotonic()
+        while self.running and time.monotonic() - start_time < self.model_reload_timeout:
+            if self._process_model_reload_response(self.websocket_server.take_reply(request_id)):
+                return
+            time.sleep(0.1)
+
+        self.send_event_to_app("model_reloaded", {"status": "error", "error_code": "vision_unavailable"})
+
+    async def _reload_model_async(self, model_path: str = None):
+        """reload_model в asyncio runtime: ожидание ответа vision без опроса."""
+        request_id = self._send_reload_model(model_path)
+
+        deadline = time.monotonic() + self.model_reload_timeout
+        while self.running:
+            if self._process_model_reload_response(self.websocket_server.take_reply(request_id)):
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await self.websocket_server.wait_message(remaining):
+                break
+
+        self.send_event_to_app("model_reloaded", {"status": "error", "error_code": "vision_unavailable"})
+
+    def _process_model_reload_response(self, response: str) -> bool:
+        """
+        Обработать ответ vision на reload_model.
+
+        Args:
+            response: Ответ из take_reply (пустая строка - ещё не пришёл).
+
+        Returns:
+            True, если событие model_reloaded отправлено.
+        """
+        if not response:
+            return False
+        try:
+            data = json.loads(response)
+        except json.JSONDecodeError:
+            return False
+        if "model_reload" not in data:
+            return False
+        data.pop("request_id", None)
+        status = data.pop("model_reload")
+        data["status"] = "ok" if status == "ok" else "error"
+        self.send_event_to_app("model_reloaded", data)
+        return True
+
+    def handle_get_traces(self, limit=None):
+        """
+        Обработчик команды get_traces.
+
+        Args:
+            limit: Количество последних трасс (None - все из буфера).
+        """
+        try:
+            limit = int(limit) if limit is not None else None
+        except (TypeError, ValueError):
+            limit = None
+        self.send_event_to_app("traces", {"traces": self.tracer.recent(limit)})
+
+    def handle_get_metrics(self):
+        """Обработчик команды get_metrics: счётчики, gauge и перцентили гистограмм."""
+        self.send_event_to_app("metrics", self.metrics.snapshot())
+
+    def handle_dump_traces(self, path: str = None):
+        """
+        Обработчик команды dump_traces: выгрузка буфера трасс в JSONL.
+
+        Args:
+            path: Имя файла внутри traces_dir. None - traces_<время>.jsonl.
+        """
+        if path:
+            target = self._traces_target(path)
+            if target is None:
+                logger.warning("dump_traces: недопустимое имя файла %r", path)
+                self.send_event_to_app("traces_dumped", {"error": "invalid_path"})
+                return
+        else:
+            target = self.traces_dir / f"traces_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        try:
+            count = self.tracer.dump(target)
+            self.send_event_to_app("traces_dumped", {"path": str(target.absolute()), "count": count})
+        except OSError as e:
+            logger.error(f"Ошибка выгрузки трасс: {e}")
+            self.send_event_to_app("traces_dumped", {"error": "save_failed"})
+
+    def _traces_target(self, name: str):
+        """Файл выгрузки трасс внутри traces_dir (None - абсолютный путь, подпапка или "..")."""
+        relative = Path(name)
+        if relative.is_absolute() or len(relative.parts) != 1 or relative.name in (".", ".."):
+            return None
+        base = self.traces_dir.resolve()
+        target = (base / relative).resolve()
+        if target.parent != base:
+            return None  # Символическая ссылка наружу
+        return target
+
+    # === ТРАССИРОВКА ===
+
+    def _trace_start(self, **attrs):
+        """Начать трассу нового контейнера (незавершённая предыдущая закрывается)."""
+        self._trace_finish("superseded")
+        self._trace = self.tracer.start(**attrs)
+
+    def _trace_mark(self, name: str, at: float = None, **attrs):
+        """Отметить этап текущей трассы."""
+        if self._trace is None:
+            return
+        self._trace.mark(name, at)
+        self._trace.attrs.update(attrs)
+
+    def _trace_finish(self, status: str, **attrs):
+        """Завершить текущую трассу."""
+        if self._trace is None:
+            return
+        trace, self._trace = self._trace, None
+        if trace.attrs.get("plc_type") is None and self.current_plc_detection:
+            # ПЛК мог определить тип уже после открытия трассы
+            attrs.setdefault("plc_type", self.current_plc_detection)
+        data = self.tracer.finish(trace, status, **attrs)
+
+        trace_attrs = data["attrs"]
+        self._journal_record({
+            "kind": "container",
+            "trace_id": data["trace_id"],
+            "status": status,
+            "plc_type": trace_attrs.get("plc_type"),
+            "vision_type": trace_attrs.get("vision_type"),
+            "confidence": trace_attrs.get("confidence"),
+            "total_ms": data["total_ms"],
+            "marks": {m["name"]: m["t_ms"] for m in data["marks"]},
+            "stages": data["stages"],
+        })
+
+        self.metrics.counter("fandomat_containers_total", "Обработано контейнеров", status=status).inc()
+        self._container_seconds.observe(data["total_ms"] / 1000)
+        marks = dict(trace.marks)
+        if "request_sent" in marks and "reply_received" in marks:
+            self._vision_reply_seconds.observe(marks["reply_received"] - marks["request_sent"])
+
+    def _trace_vision_reply(self, details: dict):
+        """Отметить ответ vision и перенести в трассу метки стадий vision."""
+        if self._trace is None:
+            return
+        self._trace_mark("reply_received")
+        vision_trace = details.get("trace")
+        if details.get("trace_id") != self._trace.trace_id or not isinstance(vision_trace, dict):
+            return
+        for name, key in (("vision_received", "received_at"),
+                          ("frame_captured", "frame_captured_at"),
+                          ("vision_replied", "replied_at")):
+            if vision_trace.get(key):
+                self._trace.mark(name, vision_trace[key])
+        self._trace.add_stages(vision_trace.get("stages", {}))
+        if "confidence" in details:
+            self._trace.attrs["confidence"] = details["confidence"]
+
+    def _journal_record(self, entry: dict):
+        """Записать транзакцию в журнал (без блокировки главного цикла)."""
+        if self.journal is not None:
+            self.journal.record(entry)
+
+    def _check_trace_carriage(self):
+        """
+        Завершить трассу, когда каретка после команды ПЛК дошла до датчика.
+
+        Импульс команды сброшен, а датчик не сработал - carriage_timeout.
+        """
+        trace = self._trace
+        if trace is None or not trace.has("plc_command"):
+            return
+        if trace.attrs.get("vision_type") == "plastic":
+            reached = self.PLC.get_state_left_sensor_carriage() == 1
+            bit = register_map.CMD_DETECTED_BOTTLE
+        else:
+            reached = self.PLC.get_state_right_sensor_carriage() == 1
+            bit = register_map.CMD_DETECTED_BANK
+        if reached:
+            self._trace_mark("carriage_reached")
+            self._trace_finish("ok")
+        elif not self.PLC.is_pulse_active(bit):
+            logger.info("Импульс команды сброшен, каретка не дошла до датчика")
+            self._trace_finish("carriage_timeout")
+
     def handle_container_dump(self, container_type: str):
         """
         Обработчик команды container_dump.
@@ -624,18 +1160,20 @@ class Application:
             logger.info("Команда: сброс пластика (влево)")
             with self.state_lock:
                 self.state = AppState.DUMPING_PLASTIC
-            self.dump_started_time = time.time()
+            self.dump_started_time = time.monotonic()
+            self.scheduler.arm("dump", self.dump_timeout, self._on_dump_timeout)
             self.PLC.cmd_force_move_carriage_left()
             self.send_event_to_app("container_dumped", {"container_type": "plastic"})
         elif container_type == "aluminum":
             logger.info("Команда: сброс алюминия (вправо)")
             with self.state_lock:
                 self.state = AppState.DUMPING_ALUMINUM
-            self.dump_started_time = time.time()
+            self.dump_started_time = time.monotonic()
+            self.scheduler.arm("dump", self.dump_timeout, self._on_dump_timeout)
             self.PLC.cmd_force_move_carriage_right()
             self.send_event_to_app("container_dumped", {"container_type": "aluminum"})
         else:
-            logger.warning(f"Неизвестный тип контейнера: {container_type}")
+            logger.warning("Неизвестный тип контейнера: %s", container_type)
 
     def handle_container_unloaded(self, container_type: str):
         """
@@ -671,7 +1209,7 @@ class Application:
         Args:
             command_name: Название команды.
         """
-        logger.debug(f"Заглушка команды: {command_name}")
+        logger.debug("Заглушка команды: %s", command_name)
         self.send_event_to_app(f"{command_name}_ack", {"status": "not_implemented"})
 
     def _save_photo(self, photo_base64: str) -> Path:
@@ -723,51 +1261,58 @@ class Application:
             logger.info("Vision: подтверждено aluminum → PLC cmd")
             self.PLC.cmd_radxa_detected_bank()
         else:
-            logger.warning(f"Vision: несовпадение! ПЛК: {self.current_plc_detection}, Vision: {vision_response}")
+            logger.warning("Vision: несовпадение! ПЛК: %s, Vision: %s", self.current_plc_detection, vision_response)
 
-    def _handle_vision_response_with_events(self, vision_response: str):
+    def _handle_vision_response_with_events(self, vision_response: str, details: dict = None):
         """
         Обработка ответа от vision сервиса с отправкой событий.
 
         Args:
             vision_response: Ответ vision ("plastic", "aluminum", "none").
+            details: Доп. поля ответа vision (error_code при недоступности инференса).
         """
+        details = details or {}
+        confidence = details.get("confidence", 1.0)
+
         if vision_response == "none":
-            logger.info("Vision: контейнер не распознан")
-            # Событие: контейнер не распознан
-            self.send_event_to_app("container_not_recognized", {})
+            # Событие: контейнер не распознан (с кодом ошибки, если инференс недоступен)
+            if details.get("error_code"):
+                logger.warning("Vision: инференс недоступен (%s)", details["error_code"])
+                self.send_event_to_app("container_not_recognized", {"error_code": details["error_code"]})
+                self._trace_finish(details["error_code"], vision_type="none")
+            else:
+                logger.info("Vision: контейнер не распознан")
+                self.send_event_to_app("container_not_recognized", {})
+                self._trace_finish("not_recognized", vision_type="none")
             return
 
         # Проверяем совпадение с детектом ПЛК
         if self.current_plc_detection == "plastic" and vision_response == "plastic":
             logger.info("Vision: plastic → PLC cmd")
-            self.PLC.cmd_radxa_detected_bottle()
-            # Устанавливаем флаг начала движения каретки
-            self.carriage_moving_bottle = True
-            self.carriage_moving_start_time = time.time()
+            self.PLC.cmd_radxa_detected_bottle(duration=self.carriage_reset_timeout)
+            self._trace_mark("plc_command", plc_type="plastic", vision_type="plastic")
             # Событие: контейнер распознан
             self.send_event_to_app("container_recognized", {
                 "container_type": "plastic",
-                "confidence": 1.0  # TODO: получать от vision
+                "confidence": confidence
             })
         elif self.current_plc_detection == "aluminum" and vision_response == "aluminum":
             logger.info("Vision: aluminum → PLC cmd")
-            self.PLC.cmd_radxa_detected_bank()
-            # Устанавливаем флаг начала движения каретки
-            self.carriage_moving_bank = True
-            self.carriage_moving_start_time = time.time()
+            self.PLC.cmd_radxa_detected_bank(duration=self.carriage_reset_timeout)
+            self._trace_mark("plc_command", plc_type="aluminum", vision_type="aluminum")
             # Событие: контейнер распознан
             self.send_event_to_app("container_recognized", {
                 "container_type": "aluminum",
-                "confidence": 1.0  # TODO: получать от vision
+                "confidence": confidence
             })
         else:
-            logger.warning(f"Vision: несовпадение! ПЛК: {self.current_plc_detection}, Vision: {vision_response}")
+            logger.warning("Vision: несовпадение! ПЛК: %s, Vision: %s", self.current_plc_detection, vision_response)
             # Событие: несовпадение детекта
             self.send_event_to_app("container_not_recognized", {
                 "plc_type": self.current_plc_detection,
                 "vision_type": vision_response
             })
+            self._trace_finish("mismatch", plc_type=self.current_plc_detection, vision_type=vision_response)
 
     def _handle_error_state_commands(self):
         """
@@ -799,7 +1344,7 @@ class Application:
                 self.state = AppState.IDLE
             self.send_event_to_app("restore_device_ack", {"status": "ok"})
         else:
-            logger.debug(f"ERROR State: команда {app_command} игнорируется")
+            logger.debug("ERROR State: команда %s игнорируется", app_command)
             self.send_event_to_app("command_error", {
                 "command": app_command,
                 "error": "not_allowed_in_error_state"
@@ -812,17 +1357,47 @@ if __name__ == "__main__":
     serial_port = os.getenv('PLC_SERIAL_PORT', '/dev/ttyUSB0')
     baudrate = int(os.getenv('PLC_BAUDRATE', '115200'))
     slave_address = int(os.getenv('PLC_SLAVE_ADDRESS', '2'))
+    metrics_port = int(os.getenv('METRICS_PORT', '9108'))
+    journal_dir = os.getenv('JOURNAL_DIR', 'journal')
+    web_socket_host = os.getenv('WEBSOCKET_HOST', 'localhost')
+    web_socket_port = int(os.getenv('WEBSOCKET_PORT', '8765'))
+    runtime = os.getenv('APP_RUNTIME', 'threads').lower()
+    ws_send_queue_size = int(os.getenv('WS_SEND_QUEUE_SIZE', '256'))
+    ws_overflow_policy = os.getenv('WS_OVERFLOW_POLICY', 'drop_oldest').lower()
+    ws_batch_window = float(os.getenv('WS_BATCH_WINDOW_MS', '5')) / 1000
+    ws_compression_roles = tuple(r.strip() for r in os.getenv('WS_COMPRESSION_ROLES', 'app,monitor,remote').split(',') if r.strip())
+    ws_compression_level = int(os.getenv('WS_COMPRESSION_LEVEL', '6'))
+    ws_max_message_size = int(float(os.getenv('WS_MAX_MESSAGE_MB', '8')) * 2**20)
+    ws_write_limit = int(os.getenv('WS_WRITE_LIMIT_KB', '32')) * 1024
+    device_info_delta_interval = float(os.getenv('DEVICE_INFO_DELTA_MS', '250')) / 1000
+    plc_link_timeout = float(os.getenv('PLC_LINK_TIMEOUT', '2.0'))
     
     logger.info(f"Запуск Application с параметрами:")
     logger.info(f"  serial_port: {serial_port}")
     logger.info(f"  baudrate: {baudrate}")
     logger.info(f"  slave_address: {slave_address}")
+    logger.info(f"  websocket: {web_socket_host}:{web_socket_port}")
+    logger.info(f"  runtime: {runtime}")
     
     try:
         app = Application(
             serial_port=serial_port,
             baudrate=baudrate,
-            slave_address=slave_address
+            slave_address=slave_address,
+            web_socket_port=web_socket_port,
+            web_socket_host=web_socket_host,
+            metrics_port=metrics_port,
+            journal_dir=journal_dir,
+            runtime=runtime,
+            ws_send_queue_size=ws_send_queue_size,
+            ws_overflow_policy=ws_overflow_policy,
+            ws_batch_window=ws_batch_window,
+            ws_compression_roles=ws_compression_roles,
+            ws_compression_level=ws_compression_level,
+            ws_max_message_size=ws_max_message_size,
+            ws_write_limit=ws_write_limit,
+            device_info_delta_interval=device_info_delta_interval,
+            plc_link_timeout=plc_link_timeout
         )
     
         if not app.setup():
@@ -0,0 +1,256 @@
+"""
+Link Monitor - состояние канала Modbus RTU между ПЛК (master) и Radxa (slave).
+
+Radxa работает как slave (modbus_rtu.RtuServer): ПЛК сам опрашивает и пишет
+регистры, поэтому обрыв канала или зависание ПЛК видно только по отсутствию
+запросов. Монитор подключается к hooks modbus_tk и считает:
+- Частоту запросов master и время с последнего запроса (опроса)
+- Паузы между запросами (гистограмма)
+- Ошибки: CRC / некорректные запросы и ошибки последовательного порта.
+  modbus_tk отбрасывает кадры с неверным CRC молча (только пишет в лог),
+  поэтому CRC и длина проверяются по сырому кадру в hook after_read
+- Интервал обновления каждого регистра, который пишет master (счётчики, статус)
+
+check() вызывается из шага state machine: при паузе опроса дольше timeout
+канал переходит в degraded (Application отправляет plc_link_degraded),
+при возобновлении - обратно в ok (plc_link_restored).
+
+Использование:
+    link = LinkMonitor(timeout=2.0)
+    link.install()                  # hooks modbus_tk, до RtuServer.start()
+    transition = link.check()       # "degraded", "restored" или None
+    link.stats()                    # для событий и device_info
+"""
+import struct
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from core.logging_config import get_logger
+from core.metrics import get_registry
+
+logger = get_logger(__name__)
+metrics = get_registry()
+
+# Состояния канала: unknown - запросов ещё не было и timeout не истёк
+LINK_STATES = ("unknown", "ok", "degraded")
+
+# Коды функций Modbus, которые использует ПЛК
+FUNCTION_NAMES = {
+    3: "read_holding",
+    6: "write_single",
+    16: "write_multiple",
+    23: "read_write_multiple",
+}
+
+# Регистры, которые пишет master: счётчики, проценты, статус
+WATCHED_REGISTERS = (20, 21, 22, 23, 26)
+
+
+def written_registers(pdu: bytes) -> range:
+    """Регистры, которые записывает запрос (пусто - запрос чтения или не разобран)."""
+    try:
+        function = pdu[0]
+        if function == 6:
+            _, address, _ = struct.unpack(">BHH", pdu[:5])
+            return range(address, address + 1)
+        if function == 16:
+            _, start, count = struct.unpack(">BHH", pdu[:5])
+            return range(start, start + count)
+        if function == 23:
+            _, _, _, start, count = struct.unpack(">BHHHH", pdu[:9])
+            return range(start, start + count)
+    except (IndexError, struct.error):
+        pass
+    return range(0)
+
+
+class LinkMonitor:
+    """Статистика и состояние канала Modbus RTU."""
+
+    def __init__(self, timeout: float = 2.0, rate_window: float = 10.0,
+                 registers=WATCHED_REGISTERS, clock: Callable[[], float] = time.monotonic):
+        """
+        Инициализация монитора.
+
+        Args:
+            timeout: Пауза опроса (секунды), после которой канал degraded.
+            rate_window: Окно расчёта частоты запросов (секунды).
+            registers: Регистры, для которых считается интервал обновления.
+            clock: Источник монотонного времени.
+        """
+        self.timeout = timeout
+        self.rate_window = rate_window
+        self.registers = tuple(registers)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._started = clock()
+        self._last_request: Optional[float] = None
+        self._recent = deque()                 # Времена запросов в окне rate_window
+        self._last_write: dict[int, float] = {}
+        self._installed = []
+        self._calculate_crc = None
+        self.state = "unknown"
+        self.requests_total = 0
+        self.errors: dict[str, int] = {}
+
+        self._gap = metrics.histogram(
+            "fandomat_modbus_poll_gap_seconds", "Пауза между запросами master",
+            buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+        )
+        self._poll_age = metrics.gauge("fandomat_modbus_poll_age_seconds", "Секунд с последнего запроса master")
+        self._rate = metrics.gauge("fandomat_modbus_request_rate", "Запросов master в секунду")
+        self._degraded = metrics.gauge("fandomat_plc_link_degraded", "Канал ПЛК деградировал (1) или в норме (0)")
+        self._intervals = {
+            register: metrics.histogram(
+                "fandomat_modbus_register_update_interval_seconds", "Интервал записи регистра master",
+                buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0), register=str(register),
+            )
+            for register in self.registers
+        }
+
+    # === Hooks modbus_tk (поток RtuServer) ===
+
+    def install(self) -> None:
+        """Подключить hooks modbus_tk (глобальные для процесса)."""
+        from modbus_tk import hooks, utils
+
+        self._calculate_crc = utils.calculate_crc
+        self._installed = [
+            ("modbus_rtu.RtuServer.after_read", self._hook_read),
+            ("modbus.Slave.handle_request", self._hook_request),
+            ("modbus.Databank.on_error", self._hook_request_error),
+            ("modbus_rtu.RtuServer.on_error", self._hook_serial_error),
+        ]
+        for name, hook in self._installed:
+            hooks.install_hook(name, hook)
+
+    def uninstall(self) -> None:
+        """Отключить hooks modbus_tk."""
+        if not self._installed:
+            return
+        from modbus_tk import hooks
+
+        for name, hook in self._installed:
+            try:
+                hooks.uninstall_hook(name, hook)
+            except (KeyError, ValueError):
+                pass
+        self._installed = []
+
+    # Hooks возвращают None: иначе modbus_tk подменяет кадр или ответ результатом
+    def _hook_read(self, args) -> None:
+        # Те же проверки, что RtuQuery.parse_request: по ним кадр отбрасывается
+        request = args[1]
+        if len(request) < 3:
+            self.on_error("invalid_request")
+        elif struct.unpack(">H", request[-2:])[0] != self._calculate_crc(request[:-2]):
+            self.on_error("crc")
+
+    def _hook_request(self, args) -> None:
+        self.on_request(args[1])
+
+    def _hook_request_error(self, args) -> None:
+        self.on_error("invalid_request")
+
+    def _hook_serial_error(self, args) -> None:
+        self.on_error("serial")
+
+    # === Учёт ===
+
+    def on_request(self, pdu: bytes) -> None:
+        """Учесть запрос master (PDU без адреса slave и CRC)."""
+        now = self._clock()
+        function = FUNCTION_NAMES.get(pdu[0] if pdu else None, "other")
+        with self._lock:
+            if self._last_request is not None:
+                self._gap.observe(now - self._last_request)
+            self._last_request = now
+            self.requests_total += 1
+            self._recent.append(now)
+            for register in written_registers(pdu):
+                histogram = self._intervals.get(register)
+                if histogram is None:
+                    continue
+                last = self._last_write.get(register)
+                if last is not None:
+                    histogram.observe(now - last)
+                self._last_write[register] = now
+        metrics.counter("fandomat_modbus_requests_total", "Запросов master", function=function).inc()
+
+    def on_error(self, kind: str) -> None:
+        """Учесть ошибку канала (crc, invalid_request, serial)."""
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+        metrics.counter("fandomat_modbus_errors_total", "Ошибок канала Modbus", kind=kind).inc()
+
+    @property
+    def errors_total(self) -> int:
+        """Всего ошибок канала."""
+        with self._lock:
+            return sum(self.errors.values())
+
+    def seconds_since_poll(self) -> float:
+        """Секунд с последнего запроса master (или с запуска, если запросов не было)."""
+        with self._lock:
+            last = self._last_request if self._last_request is not None else self._started
+        return max(0.0, self._clock() - last)
+
+    def request_rate(self) -> float:
+        """Запросов master в секунду за rate_window."""
+        now = self._clock()
+        with self._lock:
+            while self._recent and self._recent[0] < now - self.rate_window:
+                self._recent.popleft()
+            count = len(self._recent)
+        return count / self.rate_window
+
+    def check(self) -> Optional[str]:
+        """
+        Обновить состояние канала и gauge метрик.
+
+        Returns:
+            "degraded" - опрос прекратился, "restored" - возобновился, иначе None.
+        """
+        age = self.seconds_since_poll()
+        self._poll_age.set(age)
+        self._rate.set(self.request_rate())
+        with self._lock:
+            if age > self.timeout:
+                state = "degraded"
+            elif self._last_request is not None:
+                state = "ok"
+            else:
+                state = "unknown"
+            previous, self.state = self.state, state
+        if state == previous:
+            return None
+        self._degraded.set(1 if state == "degraded" else 0)
+        if state == "degraded":
+            logger.warning("Канал ПЛК: нет опроса master %.1f сек (ошибок: %d)", age, self.errors_total)
+            return "degraded"
+        if previous == "degraded":
+            logger.info("Канал ПЛК: опрос master возобновился")
+            return "restored"
+        return None
+
+    def register_ages(self) -> dict:
+        """Секунд с последней записи master для каждого отслеживаемого регистра."""
+        now = self._clock()
+        with self._lock:
+            return {register: round(now - last, 3) for register, last in self._last_write.items()}
+
+    def stats(self) -> dict:
+        """Сводка для событий plc_link_* и отладки."""
+        with self._lock:
+            errors = dict(self.errors)
+            requests = self.requests_total
+        return {
+            "state": self.state,
+            "poll_age_ms": round(self.seconds_since_poll() * 1000, 1),
+            "request_rate": round(self.request_rate(), 2),
+            "requests_total": requests,
+            "errors": errors,
+            "register_age_ms": {str(r): round(age * 1000, 1) for r, age in self.register_ages().items()},
+        }
@@ -1,11 +1,21 @@
 import threading
 
+from core.metrics import get_registry
+
+_writes = get_registry().counter("fandomat_modbus_writes_total", "Записей в регистры Modbus")
+
+
 class ModbusRegister:
-    def __init__(self, slave, register_number):
-        self.lock = threading.Lock()
+    def __init__(self, slave, register_number, lock=None):
+        # Общий RLock ПЛК (PLC._modbus_lock) или собственный для отдельного регистра
+        self.lock = lock if lock is not None else threading.RLock()
         self.slave = slave
         self.register_number = register_number
         self.value = 0x0000
+        # Отложенная запись (PLC.batch): изменения копятся в value до commit
+        self._deferred = 0
+        self._dirty = False
+        self._committed = 0x0000
 
     def set_bit(self, bit_num, state):
         with self.lock:
@@ -13,17 +23,17 @@ class ModbusRegister:
                 self.value |= (1 << bit_num)
             else:
                 self.value &= ~(1 << bit_num)
-            self.sync_to_device()
+            self._write()
 
     def get_bit(self, bit_num):
         with self.lock:
             return (self.value >> bit_num) & 1
 
-    
+
     def set_value(self, value):
         with self.lock:
             self.value = value
-            self.sync_to_device()
+            self._write()
 
     def get_value(self):
         with self.lock:
@@ -32,13 +42,44 @@ class ModbusRegister:
     def reset_all_bits(self):
         with self.lock:
             self.value = 0x0000
+            self._write()
+
+    def begin(self):
+        """Начать отложенную запись (вложенные begin/commit допускаются)."""
+        with self.lock:
+            if self._deferred == 0:
+                self._committed = self.value
+                self._dirty = False
+            self._deferred += 1
+
+    def commit(self):
+        """Завершить отложенную запись: один set_values, если значение изменилось."""
+        with self.lock:
+            self._deferred -= 1
+            if self._deferred == 0:
+                if self._dirty and self.value != self._committed:
+                    self.sync_to_device()
+                self._dirty = False
+
+    def rollback(self):
+        """Отменить отложенную запись: вернуть значение до begin без записи."""
+        with self.lock:
+            self._deferred = 0
+            self._dirty = False
+            self.value = self._committed
+
+    def _write(self):
+        if self._deferred:
+            self._dirty = True
+        else:
             self.sync_to_device()
 
-    def sync_to_device(self):         
+    def sync_to_device(self):
         self.slave.set_values('holding', self.register_number, self.value)
+        _writes.inc()
 
     def sync_from_device(self):
         status = self.slave.get_values('holding', self.register_number, 1)
         if status:
             with self.lock:
-                self.value = status[0]
\ No newline at end of file
+                self.value = status[0]
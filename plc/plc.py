@@ -1,14 +1,22 @@
+from plc.link_monitor import LinkMonitor
 from plc.modbus_register import ModbusRegister
+from plc import register_map
 import modbus_tk.defines as cst
 import serial
 from modbus_tk import modbus_rtu
 import logging
 import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from core.metrics import get_registry
+from core.scheduler import SchedulerThread
 
 logging.getLogger('modbus_tk').setLevel(logging.CRITICAL)
 
 class PLC:
-    def __init__(self, serial_port, baudrate, slave_address, cmd_register = 25, status_register = 26, speed = 500):
+    def __init__(self, serial_port, baudrate, slave_address, cmd_register = 25, status_register = 26, speed = 500, link_timeout = 2.0):
         self.serial_port = serial_port
         self.baudrate = baudrate
 
@@ -26,81 +34,215 @@ class PLC:
 
         self.server = modbus_rtu.RtuServer(self.ser)
         self.slave = self.server.add_slave(slave_address)
+
+        # Состояние канала: запросы master, паузы опроса, ошибки CRC/порта
+        self.link = LinkMonitor(timeout=link_timeout)
+        self.link.install()
         self.server.start()
 
-        self.modbus_register_cmd = ModbusRegister(self.slave, self.cmd_register)
-        self.modbus_register_status = ModbusRegister(self.slave, self.status_register)
-        self.modbus_register_speed = ModbusRegister(self.slave, 24)
-        # self.modbus_register_counter = ModbusRegister(self.slave, 25)
+        # Один реентерабельный lock на все регистры: cmd_*, batch и update_data
+        # не берут второй уровень блокировки внутри ModbusRegister
+        self._modbus_lock = threading.RLock()
+        lock = self._modbus_lock
+
+        self.modbus_register_cmd = ModbusRegister(self.slave, self.cmd_register, lock)
+        self.modbus_register_status = ModbusRegister(self.slave, self.status_register, lock)
+        self.modbus_register_speed = ModbusRegister(self.slave, register_map.REG_SPEED, lock)
+
+        # Счетчики и проценты заполнения (register_map.VALUE_REGISTERS)
+        for value in register_map.VALUE_REGISTERS:
+            setattr(self, value.attr, ModbusRegister(self.slave, value.register, lock))
+        self._value_registers = tuple(getattr(self, value.attr) for value in register_map.VALUE_REGISTERS)
+
+        # Регистры, которые пишет Radxa (откладываются в batch)
+        self._write_registers = (self.modbus_register_cmd, self.modbus_register_speed)
+        self._batch_depth = 0
+        self._batch_pulse_ops = []  # Операции с таймерами импульсов, отложенные до commit
 
-        # Счетчики и проценты заполнения
-        self.modbus_register_bank_counter = ModbusRegister(self.slave, 20)
-        self.modbus_register_bottle_counter = ModbusRegister(self.slave, 21)
-        self.modbus_register_bottle_percent = ModbusRegister(self.slave, 22)
-        self.modbus_register_bank_percent = ModbusRegister(self.slave, 23)
+        # Импульсные команды: бит сбрасывается фоновым потоком по монотонному дедлайну
+        self._pulses = SchedulerThread("plc-pulse")
 
         self.slave.add_block('holding', cst.HOLDING_REGISTERS, 10, 17)
         self.modbus_register_speed.set_value(speed)
 
-        # Lock для потокобезопасного доступа к Modbus
-        self._modbus_lock = threading.Lock()
+        # Метрики опроса регистров
+        registry = get_registry()
+        self._update_seconds = registry.histogram(
+            "fandomat_plc_update_seconds", "Время синхронизации регистров ПЛК",
+            buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+        )
+        self._pulse_lag_seconds = registry.histogram(
+            "fandomat_plc_pulse_release_lag_seconds", "Опоздание сброса импульсной команды",
+            buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+        )
 
     def stop(self):
+        self._pulses.stop()
         self.server.stop()
+        self.link.uninstall()
         self.ser.close()
 
     def update_data(self):
         """Синхронизировать данные с устройства (потокобезопасно)."""
+        start = time.perf_counter()
         with self._modbus_lock:
             self.modbus_register_status.sync_from_device()
-            # self.modbus_register_counter.sync_from_device()
-            self.modbus_register_bank_counter.sync_from_device()
-            self.modbus_register_bottle_counter.sync_from_device()
-            self.modbus_register_bottle_percent.sync_from_device()
-            self.modbus_register_bank_percent.sync_from_device()
+            for register in self._value_registers:
+                register.sync_from_device()
+        self._update_seconds.observe(time.perf_counter() - start)
+
+    @contextmanager
+    def batch(self):
+        """
+        Транзакция записи команд.
+
+        Изменения битов внутри блока копятся в значении регистра и
+        записываются одним set_values на регистр при выходе, поэтому ПЛК
+        не видит промежуточных состояний (например, сброс и новое
+        направление). При исключении значения возвращаются к исходным
+        без записи. Вложенные batch объединяются с внешним.
+
+        Взвод и отмена таймеров импульсов (pulse, cmd_radxa_stop_detected_*,
+        cmd_full_clear_register) выполняются после commit, а при откате
+        отбрасываются: таймеры всегда соответствуют записанному значению.
+
+        Использование:
+            with plc.batch():
+                plc.cmd_radxa_stop_detected_bank()
+                plc.cmd_radxa_detected_bottle()
+        """
+        with self._modbus_lock:
+            if self._batch_depth:
+                self._batch_depth += 1
+                try:
+                    yield self
+                finally:
+                    self._batch_depth -= 1
+                return
+            for register in self._write_registers:
+                register.begin()
+            self._batch_depth = 1
+            self._batch_pulse_ops = []
+            try:
+                yield self
+            except BaseException:
+                for register in self._write_registers:
+                    register.rollback()
+                raise
+            else:
+                for register in self._write_registers:
+                    register.commit()
+                for operation in self._batch_pulse_ops:
+                    operation()
+            finally:
+                self._batch_depth = 0
+                self._batch_pulse_ops = []
+
+    def _pulse_timer(self, operation) -> None:
+        """Выполнить операцию с таймерами импульсов сразу или после commit batch."""
+        if self._batch_depth:
+            self._batch_pulse_ops.append(operation)
+        else:
+            operation()
+
+    def pulse(self, bit: int, duration: float) -> None:
+        """
+        Импульсная команда: установить бит регистра команд на duration секунд.
+
+        Сброс выполняет фоновый поток по монотонному дедлайну, независимо
+        от загрузки главного цикла. Повторный импульс того же бита
+        продлевает его; cmd_full_clear_register и явный сброс бита
+        отменяют ожидающий сброс.
+
+        Args:
+            bit: Номер бита регистра команд (25).
+            duration: Длительность импульса (секунды).
+        """
+        with self._modbus_lock:
+            self.modbus_register_cmd.set_bit(bit, 1)
+            self._pulse_timer(lambda: self._arm_pulse(bit, duration))
+
+    def _arm_pulse(self, bit: int, duration: float) -> None:
+        """Взвести сброс бита импульса через duration секунд."""
+        deadline = self._pulses.scheduler.now() + duration
+        self._pulses.arm(f"bit{bit}", duration, lambda: self._release_pulse(bit, deadline))
+
+    def _release_pulse(self, bit: int, deadline: float) -> None:
+        """Сбросить бит импульса (в потоке plc-pulse)."""
+        with self._modbus_lock:
+            if self._pulses.is_armed(f"bit{bit}"):
+                return  # Пока ждали lock, бит взведён новым импульсом
+            self.modbus_register_cmd.set_bit(bit, 0)
+        self._pulse_lag_seconds.observe(max(0.0, self._pulses.scheduler.now() - deadline))
 
-    # Команды на получение статуса (регистр 26)
+    def is_pulse_active(self, bit: int) -> bool:
+        """Ожидает ли бит сброса импульса."""
+        return self._pulses.is_armed(f"bit{bit}")
+
+    def check_link(self):
+        """Обновить состояние канала Modbus: "degraded", "restored" или None."""
+        return self.link.check()
+
+    def get_link_state(self) -> str:
+        """Состояние канала Modbus: unknown, ok, degraded."""
+        return self.link.state
+
+    def get_modbus_errors(self) -> int:
+        """Всего ошибок канала Modbus (CRC, некорректные запросы, порт)."""
+        return self.link.errors_total
+
+    def registers_snapshot(self) -> tuple:
+        """Значения опрашиваемых регистров (статус, счётчики, проценты) для поиска изменений."""
+        return (self.modbus_register_status.get_value(),) + tuple(
+            register.get_value() for register in self._value_registers
+        )
+
+    def get_status_word(self) -> int:
+        """Слово регистра статуса (26) целиком: поиск фронтов по register_map."""
+        return self.modbus_register_status.get_value()
+
+    # Команды на получение статуса (регистр 26, биты - register_map.BIT_*)
     def get_state_veil(self):
-        return self.modbus_register_status.get_bit(0)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_VEIL)
+
     def get_state_left_sensor_carriage(self):
-        return self.modbus_register_status.get_bit(1)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_LEFT_SENSOR)
+
     def get_state_center_sensor_carriage(self):
-        return self.modbus_register_status.get_bit(2)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_CENTER_SENSOR)
+
     def get_state_right_sensor_carriage(self):
-        return self.modbus_register_status.get_bit(3)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_RIGHT_SENSOR)
+
     def get_state_unknown_sensor_carriage(self):
-        return self.modbus_register_status.get_bit(4)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_UNKNOWN_SENSOR)
+
     def get_state_weight_error(self):
-        return self.modbus_register_status.get_bit(5)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_WEIGHT_ERROR)
+
     def get_bank_exist(self):
-        return self.modbus_register_status.get_bit(6)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_BANK_EXIST)
+
     def get_bottle_exist(self):
-        return self.modbus_register_status.get_bit(7)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_BOTTLE_EXIST)
+
     def get_weight_too_small(self):
-        return self.modbus_register_status.get_bit(8)
+        return self.modbus_register_status.get_bit(register_map.BIT_WEIGHT_TOO_SMALL)
 
     def get_bottle_weight_ok(self):
-        return self.modbus_register_status.get_bit(9)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_BOTTLE_WEIGHT_OK)
+
     def get_bank_weight_ok(self):
-        return self.modbus_register_status.get_bit(10)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_BANK_WEIGHT_OK)
+
     def get_status_work(self):
-        return self.modbus_register_status.get_bit(11)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_STATUS_WORK)
+
     def get_left_movement_error(self):
-        return self.modbus_register_status.get_bit(12)
-    
+        return self.modbus_register_status.get_bit(register_map.BIT_LEFT_MOVEMENT_ERROR)
+
     def get_right_movement_error(self):
-        return self.modbus_register_status.get_bit(13)
+        return self.modbus_register_status.get_bit(register_map.BIT_RIGHT_MOVEMENT_ERROR)
 
     # Счетчики и проценты заполнения (регистры 20-23)
     def get_bank_count(self) -> int:
@@ -119,51 +261,62 @@ class PLC:
         """Получить процент заполнения мешка банок (регистр 23)."""
         return self.modbus_register_bank_percent.get_value()
 
-    # Команды на отправку команд (регистр 25) - потокобезопасные
+    # Команды на отправку команд (регистр 25, биты - register_map.CMD_*) - потокобезопасные
     def cmd_lock_and_block_carriage(self):
         with self._modbus_lock:
-            self.modbus_register_cmd.set_bit(0, 1)
+            self.modbus_register_cmd.set_bit(register_map.CMD_LOCK_CARRIAGE, 1)
 
     def cmd_weight_error_reset(self):
         with self._modbus_lock:
-            self.modbus_register_cmd.set_bit(1, 1)
+            self.modbus_register_cmd.set_bit(register_map.CMD_WEIGHT_ERROR_RESET, 1)
 
     def cmd_reset_bank_counters(self):
         with self._modbus_lock:
-            self.modbus_register_cmd.set_bit(2, 1)
+            self.modbus_register_cmd.set_bit(register_map.CMD_RESET_BANK_COUNTERS, 1)
 
     def cmd_reset_bottle_counters(self):
         with self._modbus_lock:
-            self.modbus_register_cmd.set_bit(3, 1)
+            self.modbus_register_cmd.set_bit(register_map.CMD_RESET_BOTTLE_COUNTERS, 1)
 
     def cmd_force_move_carriage_left(self):
         with self._modbus_lock:
-            self.modbus_register_cmd.set_bit(4, 1)
+            self.modbus_register_cmd.set_bit(register_map.CMD_MOVE_CARRIAGE_LEFT, 1)
 
     def cmd_force_move_carriage_right(self):
         with self._modbus_lock:
-            self.modbus_register_cmd.set_bit(5, 1)
+            self.modbus_register_cmd.set_bit(register_map.CMD_MOVE_CARRIAGE_RIGHT, 1)
 
-    def cmd_radxa_detected_bank(self):
+    def cmd_radxa_detected_bank(self, duration: Optional[float] = None):
+        """Банка подтверждена (бит 6). duration - импульс с автоматическим сбросом."""
+        if duration is not None:
+            self.pulse(register_map.CMD_DETECTED_BANK, duration)
+            return
         with self._modbus_lock:
-            self.modbus_register_cmd.set_bit(6, 1)
+            self.modbus_register_cmd.set_bit(register_map.CMD_DETECTED_BANK, 1)
 
-    def cmd_radxa_detected_bottle(self):
+    def cmd_radxa_detected_bottle(self, duration: Optional[float] = None):
+        """Бутылка подтверждена (бит 7). duration - импульс с автоматическим сбросом."""
+        if duration is not None:
+            self.pulse(register_map.CMD_DETECTED_BOTTLE, duration)
+            return
         with self._modbus_lock:
-            self.modbus_register_cmd.set_bit(7, 1)
+            self.modbus_register_cmd.set_bit(register_map.CMD_DETECTED_BOTTLE, 1)
 
     def cmd_radxa_stop_detected_bank(self):
         with self._modbus_lock:
-            self.modbus_register_cmd.set_bit(6, 0)
+            self._pulse_timer(lambda: self._pulses.cancel(f"bit{register_map.CMD_DETECTED_BANK}"))
+            self.modbus_register_cmd.set_bit(register_map.CMD_DETECTED_BANK, 0)
 
     def cmd_radxa_stop_detected_bottle(self):
         with self._modbus_lock:
-            self.modbus_register_cmd.set_bit(7, 0)
+            self._pulse_timer(lambda: self._pulses.cancel(f"bit{register_map.CMD_DETECTED_BOTTLE}"))
+            self.modbus_register_cmd.set_bit(register_map.CMD_DETECTED_BOTTLE, 0)
 
     def cmd_reset_weight_reading(self):
         with self._modbus_lock:
-            self.modbus_register_cmd.set_bit(8, 1)
+            self.modbus_register_cmd.set_bit(register_map.CMD_RESET_WEIGHT_READING, 1)
 
     def cmd_full_clear_register(self):
         with self._modbus_lock:
+            self._pulse_timer(self._pulses.scheduler.clear)
             self.modbus_register_cmd.reset_all_bits()
@@ -0,0 +1,153 @@
+"""
+Register Map - карта регистров ПЛК как данные.
+
+Номера битов регистра команд (25) и регистра статуса (26) и регистры
+значений (20-23) описаны здесь; PLC читает номера отсюда. По таблицам
+STATUS_BITS и VALUE_REGISTERS Application собирает поля device_info и
+события ошибок оборудования: новый датчик или ошибка - строка таблицы,
+без нового кода на каждый бит в шаге state machine.
+
+Фронты ищутся сразу по всему слову регистра: (current ^ previous) & mask,
+затем перебираются только изменившиеся биты.
+
+Использование:
+    from plc.register_map import ERROR_MASK, rising_edges
+    for bit in rising_edges(previous_word, status_word, ERROR_MASK):
+        print(bit.error_code, bit.message)
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+# Номера регистров (holding, блок 10..26)
+REG_BANK_COUNTER = 20
+REG_BOTTLE_COUNTER = 21
+REG_BOTTLE_PERCENT = 22
+REG_BANK_PERCENT = 23
+REG_SPEED = 24
+REG_CMD = 25
+REG_STATUS = 26
+
+
+@dataclass(frozen=True)
+class Bit:
+    """Бит регистра статуса."""
+
+    name: str                           # Геттер PLC
+    bit: int                            # Номер бита в регистре
+    field: Optional[str] = None         # Поле device_info (None - не входит)
+    error_code: Optional[str] = None    # Код hardware_error по фронту 0 → 1
+    message: Optional[str] = None       # Текст hardware_error
+
+    @property
+    def mask(self) -> int:
+        return 1 << self.bit
+
+
+@dataclass(frozen=True)
+class ValueRegister:
+    """Регистр значения, который пишет ПЛК (счётчики, проценты)."""
+
+    name: str                           # Имя метода PLC (get_*)
+    register: int
+    attr: str                           # Атрибут PLC с ModbusRegister
+    field: str                          # Поле device_info
+    description: str
+
+
+# Биты регистра статуса (26): пишет ПЛК
+BIT_VEIL = 0
+BIT_LEFT_SENSOR = 1
+BIT_CENTER_SENSOR = 2
+BIT_RIGHT_SENSOR = 3
+BIT_UNKNOWN_SENSOR = 4
+BIT_WEIGHT_ERROR = 5
+BIT_BANK_EXIST = 6
+BIT_BOTTLE_EXIST = 7
+BIT_WEIGHT_TOO_SMALL = 8
+BIT_BOTTLE_WEIGHT_OK = 9
+BIT_BANK_WEIGHT_OK = 10
+BIT_STATUS_WORK = 11
+BIT_LEFT_MOVEMENT_ERROR = 12
+BIT_RIGHT_MOVEMENT_ERROR = 13
+
+# Биты регистра команд (25): пишет Radxa
+CMD_LOCK_CARRIAGE = 0
+CMD_WEIGHT_ERROR_RESET = 1
+CMD_RESET_BANK_COUNTERS = 2
+CMD_RESET_BOTTLE_COUNTERS = 3
+CMD_MOVE_CARRIAGE_LEFT = 4
+CMD_MOVE_CARRIAGE_RIGHT = 5
+CMD_DETECTED_BANK = 6
+CMD_DETECTED_BOTTLE = 7
+CMD_RESET_WEIGHT_READING = 8
+
+STATUS_BITS = (
+    Bit("get_state_veil", BIT_VEIL),
+    Bit("get_state_left_sensor_carriage", BIT_LEFT_SENSOR, field="left_sensor"),
+    Bit("get_state_center_sensor_carriage", BIT_CENTER_SENSOR, field="center_sensor"),
+    Bit("get_state_right_sensor_carriage", BIT_RIGHT_SENSOR, field="right_sensor"),
+    Bit("get_state_unknown_sensor_carriage", BIT_UNKNOWN_SENSOR),
+    Bit("get_state_weight_error", BIT_WEIGHT_ERROR, field="weight_error",
+        error_code="weight_error", message="Ошибка взвешивания"),
+    Bit("get_bank_exist", BIT_BANK_EXIST),
+    Bit("get_bottle_exist", BIT_BOTTLE_EXIST),
+    Bit("get_weight_too_small", BIT_WEIGHT_TOO_SMALL,
+        error_code="weight_too_small", message="Вес слишком маленький"),
+    Bit("get_bottle_weight_ok", BIT_BOTTLE_WEIGHT_OK),
+    Bit("get_bank_weight_ok", BIT_BANK_WEIGHT_OK),
+    Bit("get_status_work", BIT_STATUS_WORK),
+    Bit("get_left_movement_error", BIT_LEFT_MOVEMENT_ERROR,
+        error_code="left_movement_error", message="Ошибка движения каретки влево"),
+    Bit("get_right_movement_error", BIT_RIGHT_MOVEMENT_ERROR,
+        error_code="right_movement_error", message="Ошибка движения каретки вправо"),
+)
+
+VALUE_REGISTERS = (
+    ValueRegister("get_bank_count", REG_BANK_COUNTER, "modbus_register_bank_counter",
+                  "bank_count", "Общее количество банок"),
+    ValueRegister("get_bottle_count", REG_BOTTLE_COUNTER, "modbus_register_bottle_counter",
+                  "bottle_count", "Общее количество бутылок"),
+    ValueRegister("get_bottle_fill_percent", REG_BOTTLE_PERCENT, "modbus_register_bottle_percent",
+                  "bottle_fill_percent", "Процент заполнения мешка бутылок"),
+    ValueRegister("get_bank_fill_percent", REG_BANK_PERCENT, "modbus_register_bank_percent",
+                  "bank_fill_percent", "Процент заполнения мешка банок"),
+)
+
+STATUS_BY_BIT = {bit.bit: bit for bit in STATUS_BITS}
+
+# Биты ошибок оборудования (hardware_error по фронту 0 → 1)
+ERROR_BITS = tuple(bit for bit in STATUS_BITS if bit.error_code)
+ERROR_MASK = sum(bit.mask for bit in ERROR_BITS)
+
+# Биты статуса в device_info
+FIELD_BITS = tuple(bit for bit in STATUS_BITS if bit.field)
+
+
+def rising_edges(previous: int, current: int, mask: int = ERROR_MASK) -> list[Bit]:
+    """
+    Биты статуса, перешедшие 0 → 1.
+
+    Args:
+        previous: Прежнее слово регистра статуса.
+        current: Текущее слово регистра статуса.
+        mask: Рассматриваемые биты.
+
+    Returns:
+        Описания битов по возрастанию номера.
+    """
+    previous, current = int(previous), int(current)
+    edges = (current ^ previous) & current & mask
+    result = []
+    while edges:
+        low = edges & -edges
+        bit = STATUS_BY_BIT.get(low.bit_length() - 1)
+        if bit is not None:
+            result.append(bit)
+        edges ^= low
+    return result
+
+
+def status_fields(word: int) -> dict:
+    """Поля device_info из слова регистра статуса."""
+    word = int(word)
+    return {bit.field: (word >> bit.bit) & 1 for bit in FIELD_BITS}
@@ -108,6 +108,7 @@ class TestVisionResponseHandler:
                 slave_address=2
             )
             app.PLC = MagicMock()
+            app.PLC.get_status_word.return_value = 0
             yield app
 
     def test_bottle_confirmed(self, app_with_mocks):
@@ -165,6 +166,7 @@ class TestErrorStateHandler:
                 slave_address=2
             )
             app.PLC = MagicMock()
+            app.PLC.get_status_word.return_value = 0
             app.websocket_server = MagicMock()
             app.state = AppState.ERROR
             yield app
@@ -274,9 +276,9 @@ class TestHelperFunctions:
 
         app.send_event_to_app("test_event", {"key": "value"})
 
-        app.websocket_server.send_to_client.assert_called_once()
-        call_args = app.websocket_server.send_to_client.call_args
-        assert call_args[0][0] == "app"
+        app.websocket_server.publish.assert_called_once()
+        call_args = app.websocket_server.publish.call_args
+        assert call_args[0][0] == "test_event"
 
     def test_parse_command_json(self, app_with_mocks):
         """Проверить парсинг JSON команды."""
@@ -358,6 +360,7 @@ class TestCommandHandlers:
                 slave_address=2
             )
             app.PLC = MagicMock()
+            app.PLC.get_status_word.return_value = 0
             app.websocket_server = MagicMock()
 
             # Настроим возвращаемые значения PLC
@@ -369,6 +372,9 @@ class TestCommandHandlers:
             app.PLC.get_state_center_sensor_carriage.return_value = 1
             app.PLC.get_state_right_sensor_carriage.return_value = 0
             app.PLC.get_state_weight_error.return_value = 0
+            app.PLC.get_status_word.return_value = 1 << 2  # center_sensor
+            app.PLC.get_link_state.return_value = "ok"
+            app.PLC.get_modbus_errors.return_value = 0
 
             yield app
 
@@ -379,9 +385,9 @@ class TestCommandHandlers:
 
         app.handle_get_device_info()
 
-        app.websocket_server.send_to_client.assert_called_once()
-        call_args = app.websocket_server.send_to_client.call_args
-        assert call_args[0][0] == "app"
+        app.websocket_server.publish.assert_called_once()
+        call_args = app.websocket_server.publish.call_args
+        assert call_args[0][0] == "device_info"
 
         # Проверяем содержимое события
         event_json = call_args[0][1]
@@ -390,6 +396,156 @@ class TestCommandHandlers:
         assert event["data"]["bottle_count"] == 10
         assert event["data"]["bank_count"] == 5
 
+    def test_device_info_reuses_encoded_data(self, app_with_mocks):
+        """device_info сериализуется заново только при изменении регистров."""
+        import json
+        app = app_with_mocks
+        app.PLC.registers_snapshot.return_value = (0, 5, 10, 50, 25)
+
+        app.handle_get_device_info()
+        app.handle_get_device_info()
+        assert app.PLC.get_bottle_count.call_count == 1
+
+        app.PLC.registers_snapshot.return_value = (0, 5, 11, 50, 25)
+        app.PLC.get_bottle_count.return_value = 11
+        app.handle_get_device_info()
+
+        assert app.PLC.get_bottle_count.call_count == 2
+        event = json.loads(app.websocket_server.publish.call_args[0][1])
+        assert event["data"]["bottle_count"] == 11
+
+    def test_device_info_delta_pushes_changed_fields(self, app_with_mocks):
+        """Изменения регистров рассылаются device_info_delta с seq, не чаще интервала."""
+        import json
+        from core.scheduler import DeadlineScheduler
+        from plc import AppState
+        app = app_with_mocks
+        clock = [100.0]
+        app.scheduler = DeadlineScheduler(clock=lambda: clock[0])
+        app.PLC.registers_snapshot.return_value = (0, 5, 10, 50, 25)
+
+        app._check_device_info()           # первый документ - без события
+        app.scheduler.run_due()
+        app.websocket_server.publish.assert_not_called()
+
+        app.PLC.registers_snapshot.return_value = (0, 5, 11, 55, 25)
+        app.PLC.get_bottle_count.return_value = 11
+        app.PLC.get_bottle_fill_percent.return_value = 55
+        app._check_device_info()
+        app.scheduler.run_due()
+
+        event = json.loads(app.websocket_server.publish.call_args[0][1])
+        assert event["event"] == "device_info_delta"
+        assert event["data"] == {"seq": 1, "changes": {"bottle_count": 11, "bottle_fill_percent": 55}}
+
+        # Следующее изменение ждёт интервал и уходит вместе с последующими
+        app.PLC.registers_snapshot.return_value = (0, 5, 12, 55, 25)
+        app.PLC.get_bottle_count.return_value = 12
+        app._check_device_info()
+        app.state = AppState.WAITING_VISION
+        app._check_device_info()
+        app.scheduler.run_due()
+        assert app.websocket_server.publish.call_count == 1
+
+        clock[0] += app.device_info_delta_interval
+        app.scheduler.run_due()
+        event = json.loads(app.websocket_server.publish.call_args[0][1])
+        assert event["data"] == {"seq": 2, "changes": {"bottle_count": 12, "state": "waiting_vision"}}
+
+    def test_full_device_info_supersedes_pending_delta(self, app_with_mocks):
+        """get_device_info отправляет документ с новым seq и отменяет отложенную delta."""
+        import json
+        app = app_with_mocks
+        app.PLC.registers_snapshot.return_value = (0, 5, 10, 50, 25)
+        app._check_device_info()
+
+        app.PLC.registers_snapshot.return_value = (0, 6, 10, 50, 25)
+        app.PLC.get_bank_count.return_value = 6
+        app._check_device_info()
+        app.handle_get_device_info()
+        app.scheduler.run_due()
+
+        app.websocket_server.publish.assert_called_once()
+        event = json.loads(app.websocket_server.publish.call_args[0][1])
+        assert event["event"] == "device_info"
+        assert event["data"]["seq"] == 1
+        assert event["data"]["bank_count"] == 6
+        assert not app.scheduler.is_armed("device_info_delta")
+
+    def test_dump_traces_inside_traces_dir(self, app_with_mocks, tmp_path):
+        """dump_traces пишет только в traces_dir, пути наружу отклоняются."""
+        import json
+        app = app_with_mocks
+        app.traces_dir = tmp_path / "traces"
+
+        app.handle_dump_traces("shift.jsonl")
+        event = json.loads(app.websocket_server.publish.call_args[0][1])
+        assert event["data"]["path"] == str((tmp_path / "traces" / "shift.jsonl").resolve())
+        assert (tmp_path / "traces" / "shift.jsonl").exists()
+
+        for path in ("../escape.jsonl", str(tmp_path / "abs.jsonl"), "sub/file.jsonl", ".."):
+            app.handle_dump_traces(path)
+            event = json.loads(app.websocket_server.publish.call_args[0][1])
+            assert event["data"] == {"error": "invalid_path"}
+        assert not (tmp_path / "escape.jsonl").exists()
+        assert not (tmp_path / "abs.jsonl").exists()
+
+    def test_plc_link_events(self, app_with_mocks):
+        """Смена состояния канала ПЛК отправляется событиями plc_link_*."""
+        import json
+        app = app_with_mocks
+        app.PLC.link.stats.return_value = {"state": "degraded", "poll_age_ms": 2500.0}
+
+        app.PLC.check_link.return_value = None
+        app._check_plc_link()
+        app.websocket_server.publish.assert_not_called()
+
+        app.PLC.check_link.return_value = "degraded"
+        app._check_plc_link()
+        event = json.loads(app.websocket_server.publish.call_args[0][1])
+        assert event["event"] == "plc_link_degraded"
+        assert event["data"]["poll_age_ms"] == 2500.0
+
+        app.PLC.check_link.return_value = "restored"
+        app._check_plc_link()
+        event = json.loads(app.websocket_server.publish.call_args[0][1])
+        assert event["event"] == "plc_link_restored"
+
+    def test_reload_model_forwards_vision_reply(self, app_with_mocks):
+        """reload_model отправляется в vision, ответ пересылается как model_reloaded."""
+        import json
+        app = app_with_mocks
+        app.running = True
+        app.websocket_server.take_reply.side_effect = lambda request_id: json.dumps({
+            "model_reload": "ok", "model_path": "weights/new", "elapsed_s": 1.0, "request_id": request_id,
+        })
+
+        app._handle_reload_model_worker("weights/new")
+
+        client, message = app.websocket_server.send_to_client.call_args_list[0][0]
+        command = json.loads(message)
+        assert client == "vision"
+        assert command["command"] == "reload_model"
+        assert command["model_path"] == "weights/new"
+        app.websocket_server.take_reply.assert_called_with(command["request_id"])
+        # Слот ответов классификации vision не затрагивается
+        app.websocket_server.get_command.assert_not_called()
+        app.websocket_server.get_state.assert_not_called()
+        event = json.loads(app.websocket_server.publish.call_args[0][1])
+        assert event["event"] == "model_reloaded"
+        assert event["data"]["status"] == "ok"
+        assert event["data"]["model_path"] == "weights/new"
+        assert "request_id" not in event["data"]
+
+    def test_reload_model_param_from_model_path(self, app_with_mocks):
+        """model_path в JSON команды передаётся обработчику как параметр."""
+        app = app_with_mocks
+
+        command, params = app.parse_command('{"command": "reload_model", "model_path": "weights/new"}')
+
+        assert command == "reload_model"
+        assert params["param"] == "weights/new"
+
     def test_handle_container_dump_plastic(self, app_with_mocks):
         """Проверить обработку dump_container:plastic."""
         from plc import AppState
@@ -410,6 +566,32 @@ class TestCommandHandlers:
         assert app.state == AppState.DUMPING_ALUMINUM
         app.PLC.cmd_force_move_carriage_right.assert_called_once()
 
+    def test_dump_timeout_fires_on_monotonic_deadline(self, app_with_mocks):
+        """Таймаут сброса срабатывает по монотонному дедлайну, успешный сброс его отменяет."""
+        import json
+        from plc import AppState
+        from core.scheduler import DeadlineScheduler
+        app = app_with_mocks
+        clock = [0.0]
+        app.scheduler = DeadlineScheduler(clock=lambda: clock[0])
+
+        app.handle_container_dump("plastic")
+        clock[0] = 2.9
+        app.scheduler.run_due()
+        assert app.state == AppState.DUMPING_PLASTIC
+
+        clock[0] = 3.1
+        app.scheduler.run_due()
+        assert app.state == AppState.ERROR
+        event = json.loads(app.websocket_server.publish.call_args[0][1])
+        assert event["data"]["error_code"] == "carriage_left_timeout"
+
+        app.handle_container_dump("aluminum")
+        app.PLC.get_state_right_sensor_carriage.return_value = 1
+        app._handle_dumping_state(app.state)
+        assert app.state == AppState.IDLE
+        assert not app.scheduler.is_armed("dump")
+
     def test_handle_container_unloaded_plastic(self, app_with_mocks):
         """Проверить обработку container_unloaded:plastic."""
         app = app_with_mocks
@@ -434,8 +616,8 @@ class TestCommandHandlers:
         app.handle_stub_command("open_shutter")
 
         # Проверяем, что отправлено событие с ack
-        app.websocket_server.send_to_client.assert_called_once()
-        call_args = app.websocket_server.send_to_client.call_args
+        app.websocket_server.publish.assert_called_once()
+        call_args = app.websocket_server.publish.call_args
         event_json = call_args[0][1]
         event = json.loads(event_json)
         assert event["event"] == "open_shutter_ack"
@@ -458,9 +640,58 @@ class TestVisionResponseWithEvents:
                 slave_address=2
             )
             app.PLC = MagicMock()
+            app.PLC.get_status_word.return_value = 0
             app.websocket_server = MagicMock()
             yield app
 
+    def test_trace_follows_container(self, app_with_mocks):
+        """Трасса собирает метки vision и завершается на датчике каретки."""
+        app = app_with_mocks
+        app.current_plc_detection = "plastic"
+        app._trace_start(plc_type="plastic")
+        app._trace.mark("veil_cleared")
+        trace_id = app._trace.trace_id
+
+        vision_reply = (
+            '{"result": "plastic", "trace_id": "%s", "confidence": 0.97, '
+            '"trace": {"received_at": 1.0, "frame_captured_at": 1.01, "replied_at": 1.2, '
+            '"stages": {"preprocess": 8.0, "infer": 150.0}}}' % trace_id
+        )
+        result, details = app._parse_vision_response(vision_reply)
+        app._trace_vision_reply(details)
+        app._handle_vision_response_with_events(result, details)
+
+        app.PLC.get_state_left_sensor_carriage.return_value = 1
+        app._check_trace_carriage()
+
+        trace = app.tracer.get(trace_id)
+        names = [m["name"] for m in trace["marks"]]
+        assert trace["status"] == "ok"
+        assert {"frame_captured", "reply_received", "plc_command", "carriage_reached"} <= set(names)
+        assert trace["stages"]["infer"] == 150.0
+        assert trace["attrs"]["confidence"] == 0.97
+        assert app._trace is None
+
+    def test_trace_times_out_when_pulse_released(self, app_with_mocks):
+        """Команда детекции - импульс ПЛК; сброшен без датчика каретки - carriage_timeout."""
+        app = app_with_mocks
+        app.current_plc_detection = "aluminum"
+        app._trace_start(plc_type="aluminum")
+        trace_id = app._trace.trace_id
+        app.PLC.get_state_right_sensor_carriage.return_value = 0
+        app.PLC.is_pulse_active.return_value = True
+
+        app._handle_vision_response_with_events("aluminum", {"confidence": 0.9})
+        app.PLC.cmd_radxa_detected_bank.assert_called_once_with(duration=app.carriage_reset_timeout)
+        app._check_trace_carriage()
+        assert app._trace is not None
+
+        app.PLC.is_pulse_active.return_value = False
+        app._check_trace_carriage()
+
+        app.PLC.is_pulse_active.assert_called_with(6)
+        assert app.tracer.get(trace_id)["status"] == "carriage_timeout"
+
     def test_bottle_confirmed_sends_container_recognized(self, app_with_mocks):
         """Проверить отправку события container_recognized при подтверждении бутылки."""
         import json
@@ -472,7 +703,7 @@ class TestVisionResponseWithEvents:
         app.PLC.cmd_radxa_detected_bottle.assert_called_once()
 
         # Проверяем событие
-        call_args = app.websocket_server.send_to_client.call_args
+        call_args = app.websocket_server.publish.call_args
         event_json = call_args[0][1]
         event = json.loads(event_json)
         assert event["event"] == "container_recognized"
@@ -489,7 +720,7 @@ class TestVisionResponseWithEvents:
         app.PLC.cmd_radxa_detected_bank.assert_called_once()
 
         # Проверяем событие
-        call_args = app.websocket_server.send_to_client.call_args
+        call_args = app.websocket_server.publish.call_args
         event_json = call_args[0][1]
         event = json.loads(event_json)
         assert event["event"] == "container_recognized"
@@ -504,7 +735,7 @@ class TestVisionResponseWithEvents:
         app._handle_vision_response_with_events("none")
 
         # Проверяем событие
-        call_args = app.websocket_server.send_to_client.call_args
+        call_args = app.websocket_server.publish.call_args
         event_json = call_args[0][1]
         event = json.loads(event_json)
         assert event["event"] == "container_not_recognized"
@@ -522,9 +753,137 @@ class TestVisionResponseWithEvents:
         app.PLC.cmd_radxa_detected_bank.assert_not_called()
 
         # Проверяем событие
-        call_args = app.websocket_server.send_to_client.call_args
+        call_args = app.websocket_server.publish.call_args
         event_json = call_args[0][1]
         event = json.loads(event_json)
         assert event["event"] == "container_not_recognized"
         assert event["data"]["plc_type"] == "bottle"
         assert event["data"]["vision_type"] == "bank"
+
+    def test_worker_error_code_forwarded(self, app_with_mocks):
+        """Проверить передачу error_code при недоступном инференсе."""
+        import json
+        app = app_with_mocks
+        app.current_plc_detection = "plastic"
+
+        app._handle_vision_response_with_events("none", {"error_code": "inference_worker_crashed"})
+
+        event = json.loads(app.websocket_server.publish.call_args[0][1])
+        assert event["event"] == "container_not_recognized"
+        assert event["data"]["error_code"] == "inference_worker_crashed"
+
+    def test_parse_vision_response(self, app_with_mocks):
+        """Проверить разбор строкового и JSON ответа vision."""
+        app = app_with_mocks
+
+        assert app._parse_vision_response("plastic") == ("plastic", {})
+        result, details = app._parse_vision_response('{"result": "none", "error_code": "x"}')
+        assert result == "none"
+        assert details["error_code"] == "x"
+        # Ответ на get_photo не является результатом классификации
+        assert app._parse_vision_response('{"photo_base64": "..."}') == (None, {})
+
+
+class TestAsyncioRuntime:
+    """Тесты для asyncio runtime (APP_RUNTIME=asyncio)."""
+
+    @pytest.fixture
+    def running_app(self):
+        """Application в asyncio runtime с реальным WebSocket сервером и замоканным ПЛК."""
+        import asyncio
+        import socket
+        import threading
+        from plc import Application
+        from websocket import WebSocket
+
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+
+        app = Application(
+            serial_port='/dev/ttyUSB0',
+            baudrate=115200,
+            slave_address=2,
+            metrics_port=0,
+            journal_dir=None,
+            runtime="asyncio",
+        )
+        app.PLC = MagicMock()
+        app.PLC.get_status_word.return_value = 0
+        app.PLC.registers_snapshot.return_value = (0, 0, 0, 0, 0)
+        for getter in ("get_state_veil", "get_bottle_exist", "get_bank_exist", "get_state_weight_error",
+                       "get_weight_too_small", "get_left_movement_error", "get_right_movement_error",
+                       "get_state_left_sensor_carriage", "get_state_center_sensor_carriage",
+                       "get_state_right_sensor_carriage", "get_bottle_count", "get_bank_count",
+                       "get_bottle_fill_percent", "get_bank_fill_percent"):
+            getattr(app.PLC, getter).return_value = 0
+        app.PLC.get_link_state.return_value = "ok"
+        app.PLC.get_modbus_errors.return_value = 0
+        app.websocket_server = WebSocket(app.PLC, "localhost", port)
+
+        thread = threading.Thread(target=asyncio.run, args=(app.run_async(),), daemon=True)
+        thread.start()
+        deadline = time.time() + 5
+        while not app.websocket_server.is_running() and time.time() < deadline:
+            time.sleep(0.01)
+        yield app, f"ws://localhost:{port}"
+        app.request_stop()
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+    @staticmethod
+    def _exchange(uri, messages, expect, timeout=3.0):
+        """Подключиться как app, отправить сообщения и дождаться события expect."""
+        import json
+        from websockets.sync.client import connect
+
+        with connect(uri) as ws:
+            ws.send(json.dumps({"client_id": "app"}))
+            start = time.monotonic()
+            for message in messages:
+                ws.send(message)
+            while True:
+                event = json.loads(ws.recv(timeout=timeout))
+                if event["event"] == expect:
+                    return event, time.monotonic() - start
+
+    def test_command_handled_without_polling(self, running_app):
+        """Команда app обрабатывается сразу по приходу сообщения."""
+        import json
+        app, uri = running_app
+
+        event, _ = self._exchange(uri, [], "device_info")   # при подключении app
+        assert event["data"]["state"] == "idle"
+
+        event, _ = self._exchange(uri, [json.dumps({"command": "lock_door"})], "up_door_locked")
+        assert event["data"]["status"] == "ok"
+        assert app.door_locked is True
+
+    def test_vision_timeout_wakes_state_machine(self, running_app):
+        """Таймаут ожидания vision срабатывает по сроку, без событий ПЛК и клиентов."""
+        from plc import AppState
+        app, uri = running_app
+        app.vision_timeout = 0.3
+        app.idle_wakeup = 5.0
+
+        def start_waiting():
+            app.vision_request_time = time.monotonic()
+            app.scheduler.arm("vision", app.vision_timeout, app._on_vision_timeout)
+            app.state = AppState.WAITING_VISION
+            app._wake.set()
+        app._loop.call_soon_threadsafe(start_waiting)
+
+        event, elapsed = self._exchange(uri, [], "container_not_recognized")
+        assert app.state == AppState.IDLE
+        assert elapsed < 1.0
+
+    def test_idle_loop_sleeps(self, running_app):
+        """Без событий state machine не крутится в цикле опроса."""
+        app, _ = running_app
+        steps = []
+        original = app._step
+        app._step = lambda: (steps.append(1), original())
+
+        time.sleep(0.5)
+
+        assert len(steps) <= 2
@@ -0,0 +1,402 @@
+"""
+Тесты для модулей core.
+
+Проверяет трассировку и другие вспомогательные компоненты.
+"""
+import json
+
+
+class TestTracer:
+    """Тесты для Tracer и Trace."""
+
+    def test_trace_marks_and_spans(self):
+        """Метки пересчитываются в смещения и интервалы между соседними метками."""
+        from core.tracing import Tracer
+
+        tracer = Tracer()
+        trace = tracer.start(plc_type="plastic")
+        trace.mark("veil_cleared", 100.0)
+        trace.mark("reply_received", 100.25)
+        trace.mark("request_sent", 100.001)
+        trace.add_stages({"infer": 180.5})
+
+        data = tracer.finish(trace, "ok")
+
+        assert [m["name"] for m in data["marks"]] == ["veil_cleared", "request_sent", "reply_received"]
+        assert data["spans"]["request_sent->reply_received"] == 249.0
+        assert data["total_ms"] == 250.0
+        assert data["stages"] == {"infer": 180.5}
+        assert data["attrs"] == {"plc_type": "plastic"}
+        assert tracer.get(trace.trace_id)["status"] == "ok"
+
+    def test_ring_buffer_capacity(self):
+        """Буфер хранит только последние трассы."""
+        from core.tracing import Tracer
+
+        tracer = Tracer(capacity=3)
+        ids = []
+        for _ in range(5):
+            trace = tracer.start()
+            trace.mark("veil_cleared")
+            tracer.finish(trace)
+            ids.append(trace.trace_id)
+
+        assert [t["trace_id"] for t in tracer.recent()] == ids[-3:]
+        assert [t["trace_id"] for t in tracer.recent(1)] == ids[-1:]
+
+    def test_dump_jsonl(self, tmp_path):
+        """Трассы выгружаются по одной на строку."""
+        from core.tracing import Tracer
+
+        tracer = Tracer()
+        for _ in range(2):
+            trace = tracer.start()
+            trace.mark("veil_cleared")
+            tracer.finish(trace)
+
+        path = tmp_path / "traces" / "dump.jsonl"
+        assert tracer.dump(path) == 2
+        lines = path.read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["status"] for line in lines] == ["ok", "ok"]
+
+
+class TestMetrics:
+    """Тесты для реестра метрик."""
+
+    def test_counter_with_labels(self):
+        """Одинаковое имя и метки возвращают одну метрику."""
+        from core.metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Запросы", result="plastic").inc()
+        registry.counter("requests_total", result="plastic").inc(2)
+        registry.counter("requests_total", result="none").inc()
+
+        assert registry.snapshot()["requests_total"] == {"result=plastic": 3.0, "result=none": 1.0}
+
+    def test_histogram_percentiles(self):
+        """Перцентили оцениваются интерполяцией внутри корзины."""
+        from core.metrics import Histogram
+
+        histogram = Histogram(buckets=(0.1, 0.2, 0.5))
+        for value in [0.05] * 50 + [0.15] * 40 + [0.4] * 9 + [3.0]:
+            histogram.observe(value)
+
+        snapshot = histogram.snapshot()
+        assert snapshot["count"] == 100
+        assert snapshot["p50"] == 0.1
+        assert 0.1 < snapshot["p90"] <= 0.2
+        assert 0.2 < snapshot["p99"] <= 0.5
+        assert Histogram().percentile(0.5) is None
+
+    def test_prometheus_format(self):
+        """Текстовый формат: HELP/TYPE, корзины накопительные, +Inf = count."""
+        from core.metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        registry.gauge("clients", "Клиенты").set(2)
+        latency = registry.histogram("latency_seconds", "Задержка", buckets=(0.1, 1.0), stage="infer")
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5.0)
+
+        text = registry.render_prometheus()
+
+        assert "# TYPE clients gauge\nclients 2\n" in text
+        assert 'latency_seconds_bucket{stage="infer",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{stage="infer",le="1"} 2' in text
+        assert 'latency_seconds_bucket{stage="infer",le="+Inf"} 3' in text
+        assert 'latency_seconds_count{stage="infer"} 3' in text
+
+    def test_http_endpoint(self):
+        """Сервер отдаёт /metrics и /metrics.json."""
+        import urllib.request
+        from core.metrics import MetricsRegistry, MetricsServer
+
+        registry = MetricsRegistry()
+        registry.counter("frames_total").inc(5)
+        server = MetricsServer(registry, port=0)
+        assert server.start()
+        try:
+            base = f"http://127.0.0.1:{server.port}"
+            text = urllib.request.urlopen(f"{base}/metrics", timeout=2).read().decode()
+            data = json.loads(urllib.request.urlopen(f"{base}/metrics.json", timeout=2).read())
+        finally:
+            server.stop()
+
+        assert "frames_total 5" in text
+        assert data == {"frames_total": 5.0}
+
+
+class TestLogging:
+    """Тесты для неблокирующего логирования."""
+
+    def test_queue_handler_formats_lazily(self):
+        """Запись уходит в очередь без форматирования, msg % args - в потоке вывода."""
+        import logging
+        import queue
+        from core.logging_config import LazyQueueHandler
+
+        log_queue = queue.SimpleQueue()
+        logger = logging.getLogger("tests.lazy_queue")
+        logger.propagate = False
+        logger.addHandler(LazyQueueHandler(log_queue))
+
+        logger.warning("Кадр %d: %s", 7, "plastic")
+
+        record = log_queue.get_nowait()
+        assert record.msg == "Кадр %d: %s"
+        assert record.args == (7, "plastic")
+        assert record.getMessage() == "Кадр 7: plastic"
+
+    def test_rate_limit_filter(self, monkeypatch):
+        """Один шаблон - не чаще раза в интервал, затем счётчик подавленных."""
+        import logging
+        from core import logging_config
+        from core.logging_config import RateLimitFilter
+
+        now = [100.0]
+        monkeypatch.setattr(logging_config.time, "monotonic", lambda: now[0])
+        rate_filter = RateLimitFilter(interval=5.0)
+
+        def record(msg="Ошибка чтения кадра: %s"):
+            return logging.LogRecord("camera", logging.WARNING, __file__, 1, msg, ("timeout",), None)
+
+        assert rate_filter.filter(record())
+        assert not rate_filter.filter(record())
+        assert not rate_filter.filter(record())
+        assert rate_filter.filter(record("Другое сообщение"))
+
+        now[0] += 5.0
+        passed = record()
+        assert rate_filter.filter(passed)
+        assert "подавлено повторов: 2" in passed.getMessage()
+
+
+class TestTransactionJournal:
+    """Тесты для TransactionJournal и read_journal."""
+
+    def test_records_are_written_on_close(self, tmp_path):
+        """Записи накапливаются в пачку и записываются при закрытии."""
+        from core.journal import TransactionJournal, read_journal
+
+        journal = TransactionJournal(tmp_path, flush_interval=10.0)
+        journal.record({"kind": "container", "status": "ok"})
+        assert journal.stats()["dropped"] == 1
+
+        journal.start()
+        for i in range(3):
+            journal.record({"kind": "container", "status": "ok", "n": i})
+        journal.close()
+
+        entries = list(read_journal(tmp_path))
+        assert [e["n"] for e in entries] == [0, 1, 2]
+        assert all("ts" in e for e in entries)
+        assert journal.stats()["written"] == 3
+
+    def test_rotation_keeps_order(self, tmp_path):
+        """После ротации записи читаются от старых к новым, лишние файлы удаляются."""
+        from core.journal import TransactionJournal, read_journal
+
+        journal = TransactionJournal(tmp_path, max_bytes=60, backups=2)
+        for i in range(5):
+            journal._write([{"n": i, "pad": "x" * 20}])
+
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "transactions.1.jsonl", "transactions.2.jsonl", "transactions.jsonl",
+        ]
+        assert [e["n"] for e in read_journal(tmp_path)] == [2, 3, 4]
+
+    def test_corrupt_lines_are_skipped(self, tmp_path):
+        """Оборванная строка не мешает чтению остальных записей."""
+        from core.journal import read_journal
+
+        path = tmp_path / "transactions.jsonl"
+        path.write_text('{"n": 1}\n{"n": 2, "sta\n{"n": 3}\n', encoding="utf-8")
+
+        assert [e["n"] for e in read_journal(path)] == [1, 3]
+
+    def test_journal_query_summary(self):
+        """Сводка по журналу: статусы, совпадение ПЛК/vision и задержки."""
+        from tools.journal_query import summarize
+
+        entries = [
+            {"kind": "container", "ts": "2025-01-15T10:00:00", "status": "ok",
+             "plc_type": "plastic", "vision_type": "plastic",
+             "total_ms": 900.0, "marks": {"request_sent": 1.0, "reply_received": 201.0},
+             "stages": {"infer": 180.0}},
+            {"kind": "container", "ts": "2025-01-15T10:30:00", "status": "mismatch",
+             "plc_type": "aluminum", "vision_type": "plastic", "total_ms": 300.0, "marks": {}},
+            {"kind": "dump", "ts": "2025-01-15T11:00:00", "result": "ok", "duration_ms": 1500.0},
+        ]
+
+        summary = summarize(entries)
+
+        assert summary["containers"]["total"] == 2
+        assert summary["containers"]["per_hour"] == 2.0
+        assert summary["containers"]["agreement"] == 0.5
+        assert summary["containers"]["mismatch_rate"] == 0.5
+        assert summary["containers"]["matrix"]["aluminum"] == {"plastic": 1}
+        assert summary["latency_ms"]["cycle_ok"]["p50"] == 900.0
+        assert summary["latency_ms"]["vision_reply"]["p50"] == 200.0
+        assert summary["latency_ms"]["stages"]["infer"]["count"] == 1
+        assert summary["dumps"]["results"] == {"ok": 1}
+
+
+class TestDeadlineScheduler:
+    """Тесты для DeadlineScheduler."""
+
+    def _scheduler(self):
+        from core.scheduler import DeadlineScheduler
+
+        clock = [100.0]
+        return DeadlineScheduler(clock=lambda: clock[0]), clock
+
+    def test_fires_at_deadline_in_order(self):
+        """Callback выполняются только после дедлайна и в порядке дедлайнов."""
+        scheduler, clock = self._scheduler()
+        fired = []
+        scheduler.arm("dump", 3.0, lambda: fired.append("dump"))
+        scheduler.arm("vision", 2.0, lambda: fired.append("vision"))
+
+        assert scheduler.next_delay() == 2.0
+        clock[0] = 101.9
+        assert scheduler.run_due() == 0
+        clock[0] = 103.5
+        assert scheduler.run_due() == 2
+        assert fired == ["vision", "dump"]
+        assert scheduler.next_delay() is None
+
+    def test_cancel_and_rearm(self):
+        """Отменённый таймер не срабатывает, повторный arm заменяет дедлайн."""
+        scheduler, clock = self._scheduler()
+        fired = []
+        scheduler.arm("vision", 1.0, lambda: fired.append("first"))
+        scheduler.arm("vision", 5.0, lambda: fired.append("second"))
+        scheduler.arm("carriage", 1.0, lambda: fired.append("carriage"))
+        assert scheduler.cancel("carriage") is True
+        assert scheduler.cancel("carriage") is False
+
+        clock[0] = 102.0
+        assert scheduler.run_due() == 0
+        assert scheduler.next_delay() == 3.0
+        assert scheduler.remaining("vision") == 3.0
+        clock[0] = 105.0
+        scheduler.run_due()
+        assert fired == ["second"]
+        assert len(scheduler) == 0
+
+    def test_callback_error_does_not_stop_others(self):
+        """Исключение в callback не мешает остальным таймерам."""
+        scheduler, clock = self._scheduler()
+        fired = []
+        scheduler.arm("bad", 0.0, lambda: 1 / 0)
+        scheduler.arm("good", 0.0, lambda: fired.append("good"))
+
+        assert scheduler.run_due() == 2
+        assert fired == ["good"]
+
+
+class TestEventEncoder:
+    """Тесты для EventEncoder."""
+
+    def test_matches_json_dumps(self):
+        """Сообщение разбирается так же, как прежний json.dumps события."""
+        from core import events
+        from core.events import EventEncoder
+
+        backends = ["json"] + (["orjson"] if events.orjson is not None else [])
+        for backend in backends:
+            encoder = EventEncoder(backend=backend)
+            data = {"container_type": "plastic", "confidence": 0.93, "name": "бутылка"}
+            event = json.loads(encoder.encode("container_detected", data))
+            assert event["event"] == "container_detected"
+            assert event["data"] == data
+            assert set(event) == {"event", "data", "timestamp"}
+
+            empty = json.loads(encoder.encode("receiver_empty"))
+            assert empty["data"] == {}
+
+    def test_timestamp_isoformat(self):
+        """Метка времени совпадает с datetime.isoformat, в т.ч. на границе секунды."""
+        from datetime import datetime
+        from core.events import EventEncoder
+
+        encoder = EventEncoder(backend="json")
+        for now in (1700000000.25, 1700000000.999999, 1700000001.000001):
+            expected = datetime.fromtimestamp(int(now)).isoformat()
+            micro = round((now - int(now)) * 1_000_000)
+            assert encoder.timestamp(now)[:19] == expected
+            assert abs(int(encoder.timestamp(now)[20:]) - micro) <= 1
+
+    def test_timestamp_threads(self):
+        """Общий кодировщик из нескольких потоков: секунда метки всегда своя."""
+        import threading
+        from datetime import datetime
+        from core.events import EventEncoder
+
+        encoder = EventEncoder(backend="json")
+        wrong = []
+
+        def stamp(offset):
+            for i in range(2000):
+                now = 1700000000 + (i + offset) % 7 + 0.5
+                if encoder.timestamp(now)[:19] != datetime.fromtimestamp(int(now)).isoformat():
+                    wrong.append(now)
+
+        threads = [threading.Thread(target=stamp, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert wrong == []
+
+    def test_prepared_data_reused(self):
+        """encode_prepared подставляет готовый JSON данных без повторной сериализации."""
+        from core.events import EventEncoder
+
+        encoder = EventEncoder(backend="json")
+        data_json = encoder.encode_data({"state": "idle", "bottle_count": 3})
+        first = json.loads(encoder.encode_prepared("device_info", data_json))
+        second = json.loads(encoder.encode_prepared("device_info", data_json))
+        assert first["data"] == second["data"] == {"state": "idle", "bottle_count": 3}
+
+    def test_stdlib_bytes_match_previous(self):
+        """Бэкенд json даёт те же байты данных, что прежний json.dumps (ASCII с \\u-экранированием)."""
+        from core import events
+        from core.events import EventEncoder
+
+        data = {"container_type": "plastic", "name": "бутылка"}
+        assert EventEncoder(backend="json").encode_data(data) == json.dumps(data)
+        if events.orjson is not None:
+            # orjson пишет не-ASCII как UTF-8: байты другие, разобранные данные те же
+            assert json.loads(EventEncoder(backend="orjson").encode_data(data)) == data
+
+
+class TestSchedulerThread:
+    """Тесты для SchedulerThread."""
+
+    def test_fires_in_own_thread(self):
+        """Callback выполняется в потоке планировщика по дедлайну; stop отбрасывает остальные."""
+        import threading
+        import time
+        from core.scheduler import SchedulerThread
+
+        pulses = SchedulerThread("test-pulse")
+        fired = threading.Event()
+        threads = []
+
+        def callback():
+            threads.append(threading.current_thread().name)
+            fired.set()
+
+        start = time.monotonic()
+        pulses.arm("a", 0.05, callback)
+        pulses.arm("late", 10.0, callback)
+        assert fired.wait(2.0)
+        elapsed = time.monotonic() - start
+        pulses.stop()
+
+        assert threads == ["test-pulse"]
+        assert 0.05 <= elapsed < 1.0
+        assert not pulses.is_armed("late")
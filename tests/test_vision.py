@@ -0,0 +1,710 @@
+"""
+Тесты для модуля vision.
+
+Проверяет вспомогательные компоненты, не требующие камеры и модели.
+"""
+import numpy as np
+import pytest
+
+
+class TestRoi:
+    """Тесты для обрезки и калибровки ROI."""
+
+    def test_clamp_roi_inside(self):
+        """ROI внутри кадра не меняется."""
+        from vision.roi import clamp_roi
+
+        assert clamp_roi((10, 20, 100, 50), 640, 480) == (10, 20, 100, 50)
+
+    def test_clamp_roi_outside(self):
+        """ROI за пределами кадра обрезается."""
+        from vision.roi import clamp_roi
+
+        assert clamp_roi((600, 400, 100, 100), 640, 480) == (600, 400, 40, 80)
+        assert clamp_roi((700, 0, 10, 10), 640, 480) is None
+        assert clamp_roi(None, 640, 480) is None
+
+    def test_crop_roi_is_view(self):
+        """Обрезка возвращает view нужного размера."""
+        from vision.roi import crop_roi
+
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        cropped = crop_roi(frame, (100, 50, 200, 120))
+
+        assert cropped.shape == (120, 200, 3)
+        assert np.shares_memory(cropped, frame)
+        assert crop_roi(frame, None) is frame
+
+    def test_derive_roi_finds_changing_area(self):
+        """Калибровка находит область, где кадры отличаются."""
+        from vision.roi import derive_roi
+
+        rng = np.random.default_rng(0)
+        frames = []
+        for _ in range(4):
+            frame = np.full((480, 640), 128, dtype=np.uint8)
+            frame[200:300, 300:400] = rng.integers(0, 255, size=(100, 100))
+            frames.append(frame)
+
+        roi = derive_roi(frames, margin=0.0, square=False, scale=4)
+
+        assert roi == (300, 200, 100, 100)
+
+    def test_derive_roi_square(self):
+        """Квадратная ROI остаётся в пределах кадра."""
+        from vision.roi import derive_roi
+
+        background = np.zeros((480, 640), dtype=np.uint8)
+        frame = background.copy()
+        frame[0:100, 0:50] = 255
+
+        x, y, w, h = derive_roi([frame], background=background, margin=0.0, scale=2)
+
+        assert w == h == 100
+        assert x >= 0 and y >= 0
+
+
+class TestSettingsRoi:
+    """Тесты для загрузки ROI из окружения."""
+
+    def test_roi_from_env(self, monkeypatch):
+        """ROI парсится из строки x,y,w,h."""
+        from core.config import _get_env_roi
+
+        monkeypatch.setenv("ROI", "328,0,1944,1944")
+        assert _get_env_roi("ROI") == (328, 0, 1944, 1944)
+
+    @pytest.mark.parametrize("value", ["", "1,2,3", "a,b,c,d", "0,0,0,10"])
+    def test_invalid_roi_ignored(self, monkeypatch, value):
+        """Некорректная ROI означает полный кадр."""
+        from core.config import _get_env_roi
+
+        monkeypatch.setenv("ROI", value)
+        assert _get_env_roi("ROI") is None
+
+
+class TestPipeline:
+    """Тесты для конвейера стадий."""
+
+    def test_results_in_order(self):
+        """Результаты проходят все стадии по порядку."""
+        from vision.pipeline import Pipeline, Stage
+
+        pipeline = Pipeline([
+            Stage("add", lambda x: x + 1),
+            Stage("mul", lambda x: x * 10),
+        ])
+        pipeline.start()
+        try:
+            futures = [pipeline.submit(i) for i in range(5)]
+            assert [f.result(timeout=2) for f in futures] == [10, 20, 30, 40, 50]
+        finally:
+            pipeline.stop()
+
+    def test_stage_error_propagates(self):
+        """Ошибка стадии передаётся в future и не проходит дальше."""
+        from vision.pipeline import Pipeline, Stage
+
+        def fail(_):
+            raise RuntimeError("boom")
+
+        after = []
+        pipeline = Pipeline([Stage("fail", fail), Stage("after", after.append)])
+        pipeline.start()
+        try:
+            future = pipeline.submit(1)
+            with pytest.raises(RuntimeError):
+                future.result(timeout=2)
+            assert after == []
+            assert pipeline.stats()["fail"]["errors"] == 1
+        finally:
+            pipeline.stop()
+
+    def test_stages_overlap(self):
+        """Стадии работают параллельно: серия быстрее последовательной обработки."""
+        import time
+        from vision.pipeline import Pipeline, Stage
+
+        def slow(x):
+            time.sleep(0.05)
+            return x
+
+        pipeline = Pipeline([Stage("a", slow), Stage("b", slow), Stage("c", slow)])
+        pipeline.start()
+        try:
+            start = time.perf_counter()
+            futures = [pipeline.submit(i) for i in range(4)]
+            for f in futures:
+                f.result(timeout=2)
+            elapsed = time.perf_counter() - start
+        finally:
+            pipeline.stop()
+
+        # Последовательно: 4 * 3 * 50 мс = 600 мс, конвейер: ~(4 + 2) * 50 мс
+        assert elapsed < 0.5
+
+    def test_stats_and_timings(self):
+        """Статистика и время по стадиям доступны."""
+        from vision.pipeline import Pipeline, Stage
+
+        pipeline = Pipeline([Stage("only", lambda x: x, maxsize=3)])
+        pipeline.start()
+        try:
+            future = pipeline.submit("x")
+            future.result(timeout=2)
+            stats = pipeline.stats()["only"]
+        finally:
+            pipeline.stop()
+
+        assert stats["processed"] == 1
+        assert stats["queue_size"] == 3
+        assert "avg_service_ms" in stats
+        assert "only" in future.job.timings
+
+
+class TestPreprocess:
+    """Тесты для препроцессинга InferenceEngine."""
+
+    def test_preprocess_square(self):
+        """Кадр приводится к квадрату image_size."""
+        from core.config import Settings
+        from vision.inference_engine import InferenceEngine
+
+        engine = InferenceEngine(Settings(image_size=64))
+        frame = np.zeros((144, 256, 3), dtype=np.uint8)
+
+        assert engine.preprocess(frame).shape == (64, 64, 3)
+
+
+class TestNpuPinning:
+    """Тесты для привязки RKNN runtime к ядру NPU."""
+
+    def test_pinning_not_applied_without_rknn_backend(self, tmp_path):
+        """Без RKNN backend или при неверном ядре привязка не применяется."""
+        from types import SimpleNamespace
+        from core.config import Settings
+        from vision.inference_engine import InferenceEngine
+
+        engine = InferenceEngine(Settings(model_path=tmp_path), npu_core=1)
+        engine._model = SimpleNamespace()
+        assert engine._pin_npu_core() is False
+
+        engine._model = SimpleNamespace(predictor=SimpleNamespace(model=SimpleNamespace()))
+        assert engine._pin_npu_core() is False
+
+        rknn = SimpleNamespace(release=lambda: None)
+        engine._model = SimpleNamespace(predictor=SimpleNamespace(model=SimpleNamespace(rknn_model=rknn)))
+        assert engine._pin_npu_core() is False  # .rknn файла нет
+        engine._npu_core = 5
+        assert engine._pin_npu_core() is False
+        assert engine._model.predictor.model.rknn_model is rknn
+
+
+class TestEnginePool:
+    """Тесты для пула движков (stub воркеры, без NPU)."""
+
+    @pytest.fixture
+    def settings(self):
+        """Настройки stub движка."""
+        from core.config import Settings
+
+        return Settings(inference_backend="stub", stub_latency_ms=50.0, engine_pool_size=3)
+
+    def _ready_pool(self, settings, **kwargs):
+        from vision.engine_pool import EnginePool
+
+        pool = EnginePool(settings, **kwargs)
+        assert pool.load_model()
+        assert pool.warmup()
+        return pool
+
+    def test_create_engine(self, settings):
+        """create_engine выбирает пул или одиночный движок."""
+        from vision.engine_pool import EnginePool, create_engine
+        from vision.stub_engine import StubEngine
+
+        assert isinstance(create_engine(settings), EnginePool)
+        settings.engine_pool_size = 1
+        assert isinstance(create_engine(settings), StubEngine)
+
+    def test_parallel_predict(self, settings):
+        """N экземпляров обрабатывают N кадров параллельно."""
+        import time
+
+        pool = self._ready_pool(settings)
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+        try:
+            start = time.perf_counter()
+            futures = [pool.submit(frame) for _ in range(3)]
+            results = [f.result(timeout=2) for f in futures]
+            elapsed = time.perf_counter() - start
+        finally:
+            pool.close()
+
+        assert results == [("plastic", 1.0)] * 3
+        # Последовательно было бы 150 мс
+        assert elapsed < 0.12
+
+    def test_round_robin(self, settings):
+        """round_robin распределяет кадры по очереди."""
+        pool = self._ready_pool(settings, policy="round_robin")
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+        try:
+            for f in [pool.submit(frame) for _ in range(6)]:
+                f.result(timeout=2)
+            processed = [s["processed"] for s in pool.stats()]
+        finally:
+            pool.close()
+
+        assert processed == [2, 2, 2]
+
+    def test_least_loaded_prefers_idle_worker(self, settings):
+        """least_loaded не ставит кадр к занятому экземпляру."""
+        pool = self._ready_pool(settings, size=2, policy="least_loaded")
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+        try:
+            futures = [pool.submit(frame) for _ in range(2)]
+            depths = [s["queue_depth"] + s["busy"] for s in pool.stats()]
+            for f in futures:
+                f.result(timeout=2)
+        finally:
+            pool.close()
+
+        assert depths == [1, 1]
+
+    def test_not_started_returns_none(self, settings):
+        """Пул без прогрева возвращает NONE."""
+        from vision.engine_pool import EnginePool
+
+        pool = EnginePool(settings)
+        assert pool.predict(np.zeros((8, 8, 3), dtype=np.uint8)) == ("NONE", 0.0)
+
+
+class TestInferenceWorkerProcess:
+    """Тесты для изолированного воркера инференса (stub движок в дочернем процессе)."""
+
+    @pytest.fixture
+    def worker(self):
+        """Запущенный воркер с резервом."""
+        from core.config import Settings
+        from vision.worker_process import InferenceWorkerProcess
+
+        settings = Settings(
+            inference_backend="stub",
+            stub_latency_ms=0.0,
+            inference_isolation=True,
+            inference_timeout=1.0,
+            inference_start_timeout=30.0,
+            camera_width=64,
+            camera_height=48,
+            image_size=32,
+        )
+        worker = InferenceWorkerProcess(settings)
+        assert worker.load_model()
+        yield worker
+        worker.close()
+
+    def test_predict_through_shared_memory(self, worker):
+        """Кадр передаётся в процесс, ответ возвращается."""
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+
+        assert worker.predict(frame) == ("plastic", 1.0)
+
+    def test_crash_recovery(self, worker):
+        """После падения процесса воркер заменяется резервом."""
+        import time
+        from vision.worker_process import WorkerUnavailableError
+
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        old_pid = worker.stats()["pid"]
+        worker._active.process.kill()
+
+        deadline = time.monotonic() + 30
+        result = None
+        while time.monotonic() < deadline:
+            try:
+                result = worker.predict(frame)
+                if worker.stats()["pid"] != old_pid:
+                    break
+            except WorkerUnavailableError as e:
+                assert e.error_code.startswith("inference_worker")
+            time.sleep(0.1)
+
+        assert result == ("plastic", 1.0)
+        assert worker.stats()["pid"] != old_pid
+        assert worker.stats()["restarts"] == 1
+
+    def test_pool_error_still_replies(self, monkeypatch):
+        """Ошибка future пула внутри воркера - ответ NONE на тот же seq, а не тишина."""
+        import queue
+        from concurrent.futures import Future
+        from multiprocessing import shared_memory
+        from core.config import Settings
+        from vision import engine_pool
+        from vision.worker_process import _worker_main
+
+        class PoolEngine:
+            def load_model(self):
+                return True
+
+            def warmup(self):
+                return True
+
+            def submit(self, frame):
+                future = Future()
+                future.set_exception(RuntimeError("npu"))
+                return future
+
+        class Conn:
+            def __init__(self):
+                self.incoming = queue.Queue()
+                self.sent = []
+
+            def recv(self):
+                return self.incoming.get(timeout=2)
+
+            def send(self, msg):
+                self.sent.append(msg)
+
+        monkeypatch.setattr(engine_pool, "create_engine", lambda settings: PoolEngine())
+        shm = shared_memory.SharedMemory(create=True, size=64)
+        conn = Conn()
+        conn.incoming.put(("predict", 7, 0, (4, 4, 3), "uint8"))
+        conn.incoming.put(("stop",))
+        try:
+            _worker_main(Settings(inference_backend="stub"), conn, shm.name, 64)
+        finally:
+            shm.close()
+            shm.unlink()
+
+        assert conn.sent == [("ready", True), ("result", 7, "NONE", 0.0)]
+
+    def test_failed_restart_backs_off(self, monkeypatch):
+        """Неудачный перезапуск оставляет воркер недоступным и повторяется с нарастающей паузой."""
+        from unittest.mock import MagicMock
+        from core.config import Settings
+        from vision import worker_process
+        from vision.worker_process import InferenceWorkerProcess, WorkerUnavailableError
+
+        worker = InferenceWorkerProcess(Settings(inference_backend="stub", inference_standby=False))
+        spawned = []
+        monkeypatch.setattr(worker, "_spawn", lambda settings=None: spawned.append(MagicMock()) or spawned[-1])
+        monkeypatch.setattr(worker, "_wait_ready", lambda handle: False)
+        failed = MagicMock()
+        worker._active = failed
+
+        worker._recover(failed, "inference_worker_crashed")
+
+        assert worker._active is None
+        spawned[0].terminate.assert_called_once()
+        with pytest.raises(WorkerUnavailableError) as exc:
+            worker.predict(np.zeros((8, 8, 3), dtype=np.uint8))
+        assert exc.value.error_code == "inference_worker_crashed"
+        assert worker._respawn_delay == 2 * worker_process.RESPAWN_BACKOFF_INITIAL
+
+        worker._replace_active(None)
+        assert worker._respawn_delay == 4 * worker_process.RESPAWN_BACKOFF_INITIAL
+
+        monkeypatch.setattr(worker, "_wait_ready", lambda handle: True)
+        worker._replace_active(None)
+        assert worker._active is spawned[-1]
+        assert worker._respawn_delay == worker_process.RESPAWN_BACKOFF_INITIAL
+
+
+class TestModelSwap:
+    """Тесты для горячей замены модели (stub движок, metadata.yaml во временной папке)."""
+
+    def _model_dir(self, root, name, names=("CAN", "FOREIGN", "PET")):
+        """Создать папку модели с metadata.yaml."""
+        model_dir = root / name
+        model_dir.mkdir()
+        classes = "".join(f"  {i}: {n}\n" for i, n in enumerate(names))
+        (model_dir / "metadata.yaml").write_text(f"task: classify\nnames:\n{classes}")
+        return model_dir
+
+    def test_read_class_names(self, project_root):
+        """Классы читаются из metadata.yaml модели в репозитории."""
+        from vision.model_swap import read_class_names
+
+        names = read_class_names(project_root / "weights" / "best_11s_rknn_model")
+
+        assert names == ["CAN", "FOREIGN", "PET"]
+
+    @pytest.mark.parametrize("names,error_code", [
+        (("CAN", "PET", "GLASS"), "unknown_classes"),
+        (("PET", "FOREIGN"), "missing_classes"),
+    ])
+    def test_invalid_classes_rejected(self, tmp_path, names, error_code):
+        """Модель с неподходящими классами не проходит проверку."""
+        from vision.inference_engine import InferenceEngine
+        from vision.model_swap import ModelSwapError, validate_model
+
+        model_dir = self._model_dir(tmp_path, "bad", names)
+
+        with pytest.raises(ModelSwapError) as exc:
+            validate_model(model_dir, InferenceEngine.CLASS_MAPPING)
+        assert exc.value.error_code == error_code
+
+    def test_metadata_missing(self, tmp_path):
+        """Без metadata.yaml замена запрещена."""
+        from vision.inference_engine import InferenceEngine
+        from vision.model_swap import ModelSwapError, validate_model
+
+        (tmp_path / "empty").mkdir()
+
+        with pytest.raises(ModelSwapError) as exc:
+            validate_model(tmp_path / "empty", InferenceEngine.CLASS_MAPPING)
+        assert exc.value.error_code == "metadata_missing"
+
+    def test_pool_swap_keeps_serving(self, tmp_path):
+        """Пул переключается на новую модель, запросы продолжают обрабатываться."""
+        from core.config import Settings
+        from vision.engine_pool import EnginePool
+        from vision.model_swap import ModelSwapError
+
+        settings = Settings(inference_backend="stub", stub_latency_ms=0.0,
+                            engine_pool_size=2, model_path=self._model_dir(tmp_path, "old"))
+        pool = EnginePool(settings)
+        assert pool.load_model() and pool.warmup()
+        old_engines = [w.engine for w in pool._workers]
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+        try:
+            with pytest.raises(ModelSwapError):
+                pool.swap_model(self._model_dir(tmp_path, "bad", ("PET", "GLASS")))
+            assert [w.engine for w in pool._workers] == old_engines
+
+            new_dir = self._model_dir(tmp_path, "new")
+            pool.swap_model(new_dir)
+            assert pool.model_path == new_dir
+            assert all(w.engine is not e for w, e in zip(pool._workers, old_engines))
+            assert pool.predict(frame) == ("plastic", 1.0)
+        finally:
+            pool.close()
+
+    def test_engine_swap_releases_previous_model(self, tmp_path, monkeypatch):
+        """После замены RKNN runtime старой модели освобождается, в работе - после запроса."""
+        import threading
+        from unittest.mock import MagicMock
+        from core.config import Settings
+        from vision.inference_engine import InferenceEngine
+
+        def fake_load(engine):
+            model = MagicMock()
+            model.names = {0: "CAN", 1: "FOREIGN", 2: "PET"}
+            model.predict.return_value = []
+            engine._model = model
+            return True
+
+        monkeypatch.setattr(InferenceEngine, "load_model", fake_load)
+        engine = InferenceEngine(Settings(model_path=self._model_dir(tmp_path, "first"), warmup_runs=0))
+        assert engine.load_model() and engine.warmup()
+        first = engine._model
+
+        engine.swap_model(self._model_dir(tmp_path, "second"))
+        second = engine._model
+        first.predictor.model.rknn_model.release.assert_called_once()
+
+        # Запрос, начатый на второй модели, задерживает её освобождение
+        started, finish = threading.Event(), threading.Event()
+        second.predict.side_effect = lambda **_: (started.set(), finish.wait(5), [])[2]
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+        request = threading.Thread(target=engine.predict, args=(frame,))
+        request.start()
+        assert started.wait(5)
+
+        engine.swap_model(self._model_dir(tmp_path, "third"))
+        second.predictor.model.rknn_model.release.assert_not_called()
+        finish.set()
+        request.join(5)
+
+        second.predictor.model.rknn_model.release.assert_called_once()
+        engine._model.predictor.model.rknn_model.release.assert_not_called()
+
+    def test_watcher_waits_for_copy_to_finish(self, tmp_path):
+        """Наблюдатель срабатывает, когда новая папка модели перестала меняться."""
+        from vision.model_swap import ModelWatcher
+
+        self._model_dir(tmp_path, "old")
+        changed = []
+        watcher = ModelWatcher(tmp_path, changed.append)
+        watcher._known = watcher._scan()
+
+        new_dir = self._model_dir(tmp_path, "new")
+        assert watcher.poll() == []          # папка только появилась
+        (new_dir / "model.rknn").write_bytes(b"\0" * 16)
+        assert watcher.poll() == []          # файлы ещё копируются
+        assert watcher.poll() == [new_dir]   # изменений нет - модель готова
+        assert watcher.poll() == []
+
+        assert changed == [new_dir]
+
+
+class TestBenchInference:
+    """Тесты для офлайн бенчмарка (stub движок)."""
+
+    def test_label_from_name(self):
+        """Метка в имени файла переводится в ответ vision."""
+        from pathlib import Path
+
+        from tools.bench_inference import label_from_name
+
+        assert label_from_name(Path("20251111_105124_shot2_PET.jpg")) == "plastic"
+        assert label_from_name(Path("20251111_105205_shot2_can.jpg")) == "aluminum"
+        assert label_from_name(Path("20251111_104852_shot2_FOREIGN.jpg")) == "none"
+        assert label_from_name(Path("20251111_104852_shot2.jpg")) is None
+
+    def test_run_reports_stages_and_accuracy(self, tmp_path):
+        """Прогон считает стадии, пропускную способность и точность по меткам."""
+        import cv2
+
+        from core.config import Settings
+        from tools.bench_inference import run
+        from vision.stub_engine import StubEngine
+
+        frame = np.zeros((32, 48, 3), dtype=np.uint8)
+        for name in ("a_PET.jpg", "b_CAN.jpg", "c_PET.jpg"):
+            cv2.imwrite(str(tmp_path / name), frame)
+        paths = sorted(tmp_path.glob("*.jpg"))
+
+        engine = StubEngine(Settings(inference_backend="stub", stub_latency_ms=0.0))
+        assert engine.load_model() and engine.warmup()
+
+        result = run(engine, paths, mode="roi", batch=2, repeat=2, roi=(0, 0, 16, 16))
+
+        assert result["frames"] == 6
+        assert result["errors"] == 0
+        assert result["stages_ms"]["roi"]["count"] == 6
+        assert result["accuracy"] == round(4 / 6, 4)
+        assert result["confusion"]["aluminum"] == {"plastic": 2}
+        assert result["throughput_fps"] > 0
+
+
+class TestFrameSource:
+    """Тесты для источников кадров без камеры."""
+
+    def test_synthetic_is_deterministic(self):
+        """Одинаковый seed даёт одинаковую последовательность кадров."""
+        from vision.frame_source import SyntheticSource
+
+        first, second = SyntheticSource(64, 48, fps=0), SyntheticSource(64, 48, fps=0)
+        assert first.open() and second.open()
+
+        frames = [first.read()[1] for _ in range(3)]
+        assert frames[0].shape == (48, 64, 3)
+        assert not np.array_equal(frames[0], frames[1])
+        assert all(np.array_equal(f, second.read()[1]) for f in frames)
+
+    def test_synthetic_paced_at_fps(self):
+        """read() выдаёт кадры не чаще заданной частоты."""
+        import time
+
+        from vision.frame_source import SyntheticSource
+
+        source = SyntheticSource(32, 32, fps=50)
+        assert source.open()
+        start = time.perf_counter()
+        for _ in range(6):
+            source.read()
+        assert time.perf_counter() - start >= 5 / 50 * 0.9
+
+    def test_image_dir_loops_and_skips_corrupt(self, tmp_path):
+        """Папка кадров выдаётся по кругу, повреждённые файлы пропускаются."""
+        import cv2
+
+        from vision.frame_source import ImageDirSource
+
+        for value, name in ((10, "a.jpg"), (200, "c.png")):
+            cv2.imwrite(str(tmp_path / name), np.full((8, 8, 3), value, dtype=np.uint8))
+        (tmp_path / "b.jpg").write_bytes(b"not a jpeg")
+        (tmp_path / "notes.txt").write_text("skip")
+
+        source = ImageDirSource(tmp_path, fps=0)
+        assert source.open()
+        values = [int(source.read()[1][0, 0, 0]) for _ in range(4)]
+        assert values == [10, 200, 10, 200]
+
+        assert not ImageDirSource(tmp_path / "missing").open()
+
+    def test_create_frame_source(self, tmp_path):
+        """Источник выбирается по CAMERA_SOURCE, без пути video/images - ошибка."""
+        from core.config import Settings
+        from vision.frame_source import ImageDirSource, V4L2Source, create_frame_source
+
+        assert isinstance(create_frame_source(Settings(), camera_index=2), V4L2Source)
+        assert create_frame_source(Settings(), camera_index=2).index == 2
+        settings = Settings(camera_source="images", camera_source_path=tmp_path)
+        assert isinstance(create_frame_source(settings), ImageDirSource)
+        with pytest.raises(ValueError):
+            create_frame_source(Settings(camera_source="images"))
+        with pytest.raises(ValueError):
+            create_frame_source(Settings(camera_source="gige"))
+
+    def test_camera_manager_captures_from_synthetic(self):
+        """CameraManager захватывает кадры из синтетического источника и обрезает по ROI."""
+        from core.config import Settings
+        from vision.camera_manager import CameraManager
+
+        settings = Settings(camera_source="synthetic", camera_width=64, camera_height=48,
+                            camera_fps=100, roi=(0, 0, 32, 32), retry_delay=0.0)
+        camera = CameraManager(settings)
+        assert camera.open()
+        try:
+            assert camera.start_capture()
+            frame, first_ts = camera.wait_for_frame(timeout=1.0)
+            assert frame.shape == (32, 32, 3)
+            _, next_ts = camera.wait_for_frame(newer_than=first_ts, timeout=1.0)
+            assert next_ts > first_ts
+            assert camera.get_frame(full=True).shape == (48, 64, 3)
+        finally:
+            camera.close()
+
+
+class TestInferenceClient:
+    """Тесты для клиента инференса (без WebSocket соединения)."""
+
+    @pytest.fixture
+    def client(self):
+        from core.config import Settings
+        from vision.inference_service import InferenceClient
+
+        client = InferenceClient(Settings(inference_backend="stub", stub_latency_ms=0.0))
+        yield client
+        client._cleanup()
+
+    def test_replies_keep_request_order(self, client):
+        """Ответы уходят в порядке запросов, даже если первый обрабатывается дольше."""
+        import asyncio
+
+        delays = {"slow": 0.05, "fast": 0.0}
+        sent = []
+
+        async def handle(message):
+            await asyncio.sleep(delays[message])
+            return message
+
+        class Socket:
+            async def send(self, message):
+                sent.append(message)
+
+        async def run():
+            socket = Socket()
+            first = asyncio.create_task(client._respond(socket, "slow"))
+            second = asyncio.create_task(client._respond(socket, "fast", first))
+            await asyncio.gather(first, second)
+
+        client._handle_message = handle
+        asyncio.run(run())
+        assert sent == ["slow", "fast"]
+
+    def test_stale_frame_keeps_capture_time(self, client):
+        """Повторно взятый из буфера кадр сохраняет своё время захвата."""
+        from unittest.mock import MagicMock
+
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+        client._camera = MagicMock()
+        client._camera.wait_for_frame.return_value = (None, None)
+        client._camera.get_frame_with_timestamp.return_value = (frame, 123.5)
+
+        item = client._stage_capture({})
+        assert item["captured_at"] == 123.5
+        assert client._last_frame_time == 123.5
@@ -0,0 +1,355 @@
+"""
+Тесты для WebSocket сервера.
+
+Проверяет очереди отправки клиентам: порядок и политики переполнения.
+"""
+import json
+import socket
+import time
+
+import pytest
+
+
+def _event(name: str, value: int) -> str:
+    return json.dumps({"event": name, "data": {"value": value}})
+
+
+class TestOutbox:
+    """Тесты для очереди отправки _Outbox."""
+
+    def _outbox(self, policy: str, maxsize: int = 3):
+        from websocket.server import _Outbox
+
+        return _Outbox(f"test-{policy}", websocket=None, maxsize=maxsize, policy=policy)
+
+    def test_drop_oldest(self):
+        """При переполнении выбрасывается самое старое сообщение."""
+        outbox = self._outbox("drop_oldest")
+        for i in range(5):
+            assert outbox.put(_event("receiver_empty", i))
+
+        assert [json.loads(m)["data"]["value"] for _, m in outbox._queue] == [2, 3, 4]
+
+    def test_coalesce_by_event(self):
+        """coalesce выбрасывает более старое событие того же типа, порядок остальных сохраняется."""
+        outbox = self._outbox("coalesce")
+        outbox.put(_event("container_detected", 1))
+        outbox.put(_event("receiver_not_empty", 2))
+        outbox.put(_event("container_recognized", 3))
+        outbox.put(_event("receiver_not_empty", 4))
+        outbox.put(_event("hardware_error", 5))
+
+        assert [json.loads(m)["event"] for _, m in outbox._queue] == [
+            "container_recognized", "receiver_not_empty", "hardware_error"]
+
+    def test_coalesce_without_parsing(self, monkeypatch):
+        """coalesce сравнивает сохранённые имена событий, сообщения не разбираются."""
+        from core.events import EventEncoder
+        from websocket import server
+
+        outbox = self._outbox("coalesce", maxsize=2)
+        encoder = EventEncoder()
+        monkeypatch.setattr(server.json, "loads", lambda *_: pytest.fail("json.loads в put"))
+        outbox.put(encoder.encode("device_info_delta", {"seq": 1}), "device_info_delta")
+        outbox.put(encoder.encode("receiver_empty"))
+        outbox.put(encoder.encode("device_info_delta", {"seq": 2}), "device_info_delta")
+
+        assert [event for event, _ in outbox._queue] == ["receiver_empty", "device_info_delta"]
+
+    def test_disconnect(self):
+        """disconnect не выбрасывает сообщения, а сообщает о переполнении."""
+        outbox = self._outbox("disconnect", maxsize=2)
+
+        assert outbox.put("a") and outbox.put("b")
+        assert outbox.put("c") is False
+        assert [m for _, m in outbox._queue] == ["a", "b"]
+
+    def test_unknown_policy(self):
+        """Неизвестная политика - ошибка конфигурации."""
+        from websocket import WebSocket
+
+        with pytest.raises(ValueError):
+            WebSocket(None, overflow_policy="block")
+
+
+class TestSendQueue:
+    """Тесты для отправки через реальный сервер."""
+
+    def test_messages_delivered_in_order(self):
+        """Сообщения из другого потока приходят клиенту в порядке отправки."""
+        from websockets.sync.client import connect
+        from websocket import WebSocket
+
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+        server = WebSocket(None, "localhost", port)
+        server.start()
+        try:
+            deadline = time.time() + 5
+            while not server.is_running() and time.time() < deadline:
+                time.sleep(0.01)
+            with connect(f"ws://localhost:{port}", open_timeout=5) as ws:
+                ws.send(json.dumps({"client_id": "app"}))
+                while not server.is_client_just_connected("app") and time.time() < deadline:
+                    time.sleep(0.01)
+
+                for i in range(200):
+                    server.send_to_client("app", _event("receiver_empty", i))
+
+                values = [json.loads(ws.recv(timeout=5))["data"]["value"] for _ in range(200)]
+        finally:
+            server.stop()
+
+        assert values == list(range(200))
+
+
+    def test_vision_reply_with_request_id(self):
+        """Ответ vision с request_id не занимает слот ответа классификации."""
+        from websockets.sync.client import connect
+        from websocket import WebSocket
+
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+        server = WebSocket(None, "localhost", port)
+        server.start()
+        try:
+            deadline = time.time() + 5
+            while not server.is_running() and time.time() < deadline:
+                time.sleep(0.01)
+            with connect(f"ws://localhost:{port}", open_timeout=5) as ws:
+                ws.send(json.dumps({"client_id": "vision"}))
+                while not server.is_client_just_connected("vision") and time.time() < deadline:
+                    time.sleep(0.01)
+
+                ws.send("plastic")
+                reply = json.dumps({"model_reload": "ok", "request_id": "r1"})
+                ws.send(reply)
+                taken = ""
+                while not taken and time.time() < deadline:
+                    time.sleep(0.01)
+                    taken = server.take_reply("r1")
+                command = server.get_command("vision")
+        finally:
+            server.stop()
+
+        assert taken == reply
+        assert command == "plastic"
+
+class TestSubscriptions:
+    """Тесты для ролей и подписки на темы событий."""
+
+    def test_topic_fanout(self):
+        """Событие получают все подписчики темы, включая несколько мониторов с одним именем."""
+        from websockets.sync.client import connect
+        from websocket import WebSocket
+
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+        server = WebSocket(None, "localhost", port)
+        server.start()
+        uri = f"ws://localhost:{port}"
+        try:
+            deadline = time.time() + 5
+            while not server.is_running() and time.time() < deadline:
+                time.sleep(0.01)
+            with connect(uri) as app, connect(uri) as monitor, connect(uri) as monitor2, \
+                    connect(uri) as hardware:
+                app.send(json.dumps({"client_id": "app"}))
+                monitor.send(json.dumps({"client_id": "dashboard", "role": "monitor"}))
+                monitor2.send(json.dumps({"client_id": "dashboard", "role": "monitor"}))
+                hardware.send(json.dumps({"client_id": "alerts", "role": "monitor", "topics": ["hardware"]}))
+                while len(server.subscribers("hardware")) < 4 and time.time() < deadline:
+                    time.sleep(0.01)
+
+                assert server.subscribers("container") == ["app", "dashboard", "dashboard#2"]
+                server.publish("container_detected", _event("container_detected", 1))
+                server.publish("hardware_error", _event("hardware_error", 2))
+                server.publish("photo_ready", _event("photo_ready", 3))
+
+                def events(ws, count):
+                    return [json.loads(ws.recv(timeout=5))["event"] for _ in range(count)]
+
+                assert events(app, 3) == ["container_detected", "hardware_error", "photo_ready"]
+                assert events(monitor, 2) == ["container_detected", "hardware_error"]
+                assert events(monitor2, 2) == ["container_detected", "hardware_error"]
+                assert events(hardware, 1) == ["hardware_error"]
+        finally:
+            server.stop()
+
+    def test_slow_subscriber_does_not_block_others(self):
+        """Зависший подписчик копит свою очередь, остальные получают события."""
+        import asyncio
+        from websocket import WebSocket
+        from websocket.server import _Outbox
+
+        class FakeConnection:
+            def __init__(self, stuck: bool):
+                self.stuck = stuck
+                self.received = []
+
+            async def send(self, message):
+                if self.stuck:
+                    await asyncio.Event().wait()
+                self.received.append(message)
+
+        async def scenario():
+            server = WebSocket(None, send_queue_size=10)
+            server.loop = asyncio.get_running_loop()
+            fast, slow = FakeConnection(False), FakeConnection(True)
+            outboxes = []
+            for name, connection in (("fast", fast), ("slow", slow)):
+                outbox = _Outbox(name, connection, 10, "drop_oldest", "monitor", ["container"])
+                outbox.task = asyncio.create_task(outbox.run())
+                server._outboxes[name] = outbox
+                server._subscribers["container"].add(outbox)
+                outboxes.append(outbox)
+
+            for i in range(50):
+                server.publish("container_detected", _event("container_detected", i))
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.05)
+            slow_depth = len(outboxes[1])
+            for outbox in outboxes:
+                outbox.close()
+            return fast, slow_depth
+
+        fast, slow_depth = asyncio.run(scenario())
+
+        assert len(fast.received) == 50
+        assert slow_depth == 10  # ограничена send_queue_size
+
+
+class TestBatching:
+    """Тесты для пакетной отправки событий."""
+
+    def test_same_tick_events_sent_as_one_frame(self):
+        """События, поставленные до пробуждения писателя, уходят одним JSON массивом."""
+        import asyncio
+        from websocket.server import _Outbox
+
+        class FakeConnection:
+            def __init__(self):
+                self.frames = []
+
+            async def send(self, message):
+                self.frames.append(message)
+
+        async def scenario(batch: bool):
+            connection = FakeConnection()
+            outbox = _Outbox("batch", connection, 100, "drop_oldest", batch=batch, batch_window=0.0)
+            outbox.task = asyncio.create_task(outbox.run())
+            for i, name in enumerate(("receiver_not_empty", "container_detected", "container_recognized")):
+                outbox.put(_event(name, i))
+            await asyncio.sleep(0.01)
+            outbox.close()
+            return connection.frames
+
+        frames = asyncio.run(scenario(batch=True))
+        assert len(frames) == 1
+        assert [m["data"]["value"] for m in json.loads(frames[0])] == [0, 1, 2]
+
+        frames = asyncio.run(scenario(batch=False))
+        assert [json.loads(f)["data"]["value"] for f in frames] == [0, 1, 2]
+
+    def test_batch_negotiated_at_registration(self):
+        """Клиент с "batch": true получает события окна одним кадром, старый клиент - по одному."""
+        from websockets.sync.client import connect
+        from websocket import WebSocket
+
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+        server = WebSocket(None, "localhost", port, batch_window=0.05)
+        server.start()
+        uri = f"ws://localhost:{port}"
+        try:
+            deadline = time.time() + 5
+            while not server.is_running() and time.time() < deadline:
+                time.sleep(0.01)
+            with connect(uri) as app, connect(uri) as monitor:
+                app.send(json.dumps({"client_id": "app", "batch": True}))
+                monitor.send(json.dumps({"client_id": "dashboard", "role": "monitor"}))
+                while len(server.subscribers("container")) < 2 and time.time() < deadline:
+                    time.sleep(0.01)
+
+                names = ["receiver_not_empty", "container_detected", "container_recognized",
+                         "container_dumped", "container_accepted"]
+                for i, name in enumerate(names):
+                    server.publish(name, _event(name, i))
+                    time.sleep(0.002)
+
+                batch = json.loads(app.recv(timeout=5))
+                single = [json.loads(monitor.recv(timeout=5))["event"] for _ in names]
+        finally:
+            server.stop()
+
+        assert [m["event"] for m in batch] == names
+        assert single == names
+
+
+class TestLinkPolicy:
+    """Тесты для политики сжатия и размеров сообщений."""
+
+    def test_handshake_role(self):
+        """Роль handshake: из URI, иначе local/remote по адресу клиента."""
+        from websocket.server import handshake_role
+
+        assert handshake_role("/?role=monitor", ("10.0.0.5", 4000)) == "monitor"
+        assert handshake_role("/?client_id=vision", ("127.0.0.1", 4000)) == "vision"
+        assert handshake_role("/", ("127.0.0.1", 4000)) == "local"
+        assert handshake_role("/", ("::1", 4000, 0, 0)) == "local"
+        assert handshake_role("/?role=bogus", ("10.0.0.5", 4000)) == "remote"
+
+    def test_compression_by_role_and_max_size(self):
+        """deflate согласуется только для ролей из compression_roles; большое сообщение закрывает соединение."""
+        from websockets.exceptions import ConnectionClosed
+        from websockets.sync.client import connect
+        from websocket import WebSocket
+
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+        server = WebSocket(None, "localhost", port, compression_roles=("monitor",), max_message_size=1024)
+        server.start()
+        try:
+            deadline = time.time() + 5
+            while not server.is_running() and time.time() < deadline:
+                time.sleep(0.01)
+            with connect(f"ws://localhost:{port}/?role=monitor") as monitor, \
+                    connect(f"ws://localhost:{port}/") as local:
+                assert monitor.protocol.extensions
+                assert not local.protocol.extensions
+
+                local.send(json.dumps({"client_id": "vision"}))
+                local.send("x" * 2048)
+                with pytest.raises(ConnectionClosed) as closed:
+                    local.recv(timeout=5)
+                assert closed.value.rcvd.code == 1009
+        finally:
+            server.stop()
+
+    def test_bench_deflate_roundtrip(self):
+        """Бенчмарк сжимает события с общим контекстом и восстанавливает их без потерь."""
+        from core.events import EventEncoder
+        from tools.bench_ws_compression import run
+
+        encoder = EventEncoder()
+        messages = [encoder.encode("container_recognized", {"container_type": "plastic", "index": i})
+                    for i in range(50)]
+
+        off = run(messages, None, 1)
+        deflate = run(messages, 6, 1)
+
+        assert off["wire_bytes"] == off["raw_bytes"]
+        assert deflate["ratio"] > 3
+        assert deflate["compress_us"]["count"] == 50
+
+    def test_unknown_compression_role(self):
+        """Неизвестная роль в compression_roles - ошибка конфигурации."""
+        from websocket import WebSocket
+
+        with pytest.raises(ValueError):
+            WebSocket(None, compression_roles=("backend",))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Bench Events - стоимость кодирования событий Application.
+
+Сравнивает на типичном device_info:
+- naive    - прежний create_event: json.dumps события + datetime.isoformat
+- encode   - EventEncoder.encode (шаблон префикса, кэш метки времени)
+- prepared - EventEncoder.encode_prepared с уже сериализованными данными
+для бэкендов json и orjson (если установлен).
+
+Замер по времени выполнения, поэтому не входит в тесты: запускать на
+целевой плате без посторонней нагрузки.
+
+Использование:
+    python -m tools.bench_events
+    python -m tools.bench_events --count 20000 --rounds 7
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from core import events
+from core.events import EventEncoder
+
+DEVICE_INFO = {
+    "bottle_count": 120, "bank_count": 45, "bottle_fill_percent": 60,
+    "bank_fill_percent": 30, "state": "idle", "left_sensor": 0,
+    "center_sensor": 1, "right_sensor": 0, "weight_error": 0, "door_locked": True,
+}
+
+
+def best_of(func, rounds: int, count: int) -> float:
+    """Лучшее среднее время вызова (мкс) из rounds прогонов по count вызовов."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(count):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / count * 1e6
+
+
+def naive() -> str:
+    """Прежний create_event."""
+    return json.dumps({"event": "device_info", "data": DEVICE_INFO,
+                       "timestamp": datetime.now().isoformat()})
+
+
+def parse_args():
+    """Парсинг аргументов командной строки."""
+    parser = argparse.ArgumentParser(description="Бенчмарк кодирования событий")
+    parser.add_argument("--count", type=int, default=5000, help="Вызовов в прогоне")
+    parser.add_argument("--rounds", type=int, default=5, help="Прогонов (берётся лучший)")
+    return parser.parse_args()
+
+
+def main():
+    """Точка входа."""
+    args = parse_args()
+    baseline = best_of(naive, args.rounds, args.count)
+    print(f"[Bench] naive: {baseline:.2f} мкс")
+
+    backends = ["json"] + (["orjson"] if events.orjson is not None else [])
+    for backend in backends:
+        encoder = EventEncoder(backend=backend)
+        data_json = encoder.encode_data(DEVICE_INFO)
+        encoded = best_of(lambda: encoder.encode("device_info", DEVICE_INFO), args.rounds, args.count)
+        prepared = best_of(lambda: encoder.encode_prepared("device_info", data_json), args.rounds, args.count)
+        print(f"[Bench] {backend}: encode {encoded:.2f} мкс (x{baseline / encoded:.2f}), "
+              f"prepared {prepared:.2f} мкс (x{baseline / prepared:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Bench Inference - офлайн бенчмарк инференса на сохранённых кадрах.
+
+Прогоняет кадры из папок (imgs/, real_time/) через движок vision
+(create_engine: yolo/stub, пул, изолированный процесс) и считает:
+- Перцентили по стадиям: decode → roi → preprocess → infer
+- Пропускную способность (кадров/сек) для каждого размера пачки
+- Пиковое потребление памяти (max RSS процесса и дочерних процессов)
+- Точность по метке в имени файла (_PET, _CAN, _FOREIGN)
+
+Размер пачки - количество кадров в обработке одновременно: движки
+принимают по одному кадру, поэтому пачка раздаётся параллельным
+запросам (имеет смысл с --pool N или --isolation).
+
+Результат сохраняется в JSON; --compare показывает разницу с прошлым
+прогоном (например, с другого коммита).
+
+Использование:
+    python -m tools.bench_inference imgs real_time
+    python -m tools.bench_inference imgs --backend stub --batch 1 2 4 --pool 3
+    python -m tools.bench_inference imgs --preprocess engine roi raw --output bench.json
+    python -m tools.bench_inference imgs --output new.json --compare old.json
+"""
+import argparse
+import dataclasses
+import json
+import re
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+import cv2
+
+from core.config import Settings
+from tools.journal_query import distribution
+from vision.engine_pool import ENGINE_BACKENDS, create_engine
+from vision.inference_engine import InferenceEngine
+from vision.roi import crop_roi
+
+# Метка класса в имени файла: 20251111_105124_shot2_PET.jpg
+LABEL_PATTERN = re.compile(r"_(PET|CAN|FOREIGN)(?:[_.]|$)", re.IGNORECASE)
+
+# Режимы препроцессинга:
+#   engine - engine.preprocess на полном кадре
+#   roi    - обрезка по ROI, затем engine.preprocess
+#   raw    - кадр как есть (ресайз внутри модели)
+PREPROCESS_MODES = ("engine", "roi", "raw")
+
+STAGES = ("decode", "roi", "preprocess", "infer", "total")
+
+
+def label_from_name(path: Path) -> Optional[str]:
+    """Ожидаемый результат vision по метке в имени файла (None - метки нет)."""
+    match = LABEL_PATTERN.search(path.name)
+    if match is None:
+        return None
+    return InferenceEngine.CLASS_MAPPING[match.group(1).upper()]
+
+
+def collect_images(dirs: List[Path], limit: int = 0) -> List[Path]:
+    """Собрать пути к кадрам в стабильном порядке (по имени)."""
+    paths: List[Path] = []
+    for directory in dirs:
+        if directory.is_file():
+            paths.append(directory)
+        elif directory.is_dir():
+            paths.extend(sorted(p for p in directory.glob("*.jpg") if p.is_file()))
+    return paths[:limit] if limit else paths
+
+
+def max_rss_mb() -> float:
+    """Пиковый RSS процесса и завершённых дочерних процессов (МБ)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux: ru_maxrss в килобайтах
+    return round(max(own, children) / 1024, 1)
+
+
+def _process(engine, path: Path, mode: str, roi) -> dict:
+    """Обработать один кадр с замером стадий (мс)."""
+    timings = {}
+    start = time.perf_counter()
+
+    frame = cv2.imread(str(path))
+    t = time.perf_counter()
+    timings["decode"] = (t - start) * 1000
+    if frame is None:
+        return {"path": path, "error": "decode_failed", "timings": timings}
+
+    if mode == "roi":
+        frame = crop_roi(frame, roi)
+        t_roi = time.perf_counter()
+        timings["roi"] = (t_roi - t) * 1000
+        t = t_roi
+
+    if mode != "raw":
+        frame = engine.preprocess(frame)
+        t_pre = time.perf_counter()
+        timings["preprocess"] = (t_pre - t) * 1000
+        t = t_pre
+
+    class_name, confidence = engine.predict(frame)
+    end = time.perf_counter()
+    timings["infer"] = (end - t) * 1000
+    timings["total"] = (end - start) * 1000
+    return {"path": path, "class_name": class_name, "confidence": confidence, "timings": timings}
+
+
+def run(engine, paths: List[Path], mode: str, batch: int, repeat: int, roi) -> dict:
+    """
+    Один прогон: все кадры repeat раз, batch кадров одновременно.
+
+    Returns:
+        Перцентили стадий, пропускная способность, точность и память.
+    """
+    jobs = [path for _ in range(repeat) for path in paths]
+
+    start = time.perf_counter()
+    if batch > 1:
+        with ThreadPoolExecutor(max_workers=batch, thread_name_prefix="bench") as executor:
+            results = list(executor.map(lambda p: _process(engine, p, mode, roi), jobs))
+    else:
+        results = [_process(engine, p, mode, roi) for p in jobs]
+    wall = time.perf_counter() - start
+
+    stages = {
+        name: distribution([r["timings"][name] for r in results if name in r["timings"]])
+        for name in STAGES
+    }
+
+    labelled = [(label_from_name(r["path"]), r) for r in results if "class_name" in r]
+    labelled = [(expected, r) for expected, r in labelled if expected is not None]
+    confusion: dict = {}
+    correct = 0
+    for expected, r in labelled:
+        predicted = r["class_name"].lower()
+        row = confusion.setdefault(expected, {})
+        row[predicted] = row.get(predicted, 0) + 1
+        correct += predicted == expected
+
+    return {
+        "preprocess": mode,
+        "batch": batch,
+        "frames": len(results),
+        "errors": sum(1 for r in results if "error" in r),
+        "wall_s": round(wall, 3),
+        "throughput_fps": round(len(results) / wall, 2) if wall else None,
+        "stages_ms": stages,
+        "accuracy": round(correct / len(labelled), 4) if labelled else None,
+        "labelled": len(labelled),
+        "confusion": confusion,
+        "max_rss_mb": max_rss_mb(),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    """Текущий коммит (для сравнения прогонов)."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _run_key(item: dict) -> tuple:
+    return item["preprocess"], item["batch"]
+
+
+def print_run(item: dict) -> None:
+    """Вывести результат одного прогона."""
+    print(f"[Bench] preprocess={item['preprocess']} batch={item['batch']}: "
+          f"{item['frames']} кадров за {item['wall_s']} сек, {item['throughput_fps']} кадр/сек, "
+          f"точность {item['accuracy']} ({item['labelled']} с меткой), max RSS {item['max_rss_mb']} МБ")
+    for name, dist in item["stages_ms"].items():
+        if dist.get("count"):
+            print(f"    {name:<11} p50={dist['p50']:<9} p90={dist['p90']:<9} "
+                  f"p99={dist['p99']:<9} max={dist['max']}")
+
+
+def print_comparison(current: dict, baseline: dict) -> None:
+    """Разница с прошлым прогоном: пропускная способность и p50/p90 инференса."""
+    previous = {_run_key(item): item for item in baseline.get("runs", [])}
+    print(f"[Bench] Сравнение с {baseline.get('meta', {}).get('commit') or 'baseline'}:")
+    for item in current["runs"]:
+        old = previous.get(_run_key(item))
+        if old is None:
+            continue
+
+        def delta(new_value, old_value):
+            if new_value is None or not old_value:
+                return "n/a"
+            return f"{(new_value - old_value) / old_value * 100:+.1f}%"
+
+        infer, old_infer = item["stages_ms"]["infer"], old["stages_ms"]["infer"]
+        print(f"    preprocess={item['preprocess']} batch={item['batch']}: "
+              f"fps {delta(item['throughput_fps'], old['throughput_fps'])}, "
+              f"infer p50 {delta(infer.get('p50'), old_infer.get('p50'))}, "
+              f"p90 {delta(infer.get('p90'), old_infer.get('p90'))}, "
+              f"accuracy {old['accuracy']} → {item['accuracy']}")
+
+
+def parse_args():
+    """Парсинг аргументов командной строки."""
+    parser = argparse.ArgumentParser(description="Офлайн бенчмарк инференса на сохранённых кадрах")
+    parser.add_argument("dirs", nargs="*", type=Path, default=[Path("imgs"), Path("real_time")],
+                        help="Папки с кадрами (по умолчанию: imgs real_time)")
+    parser.add_argument("--backend", choices=sorted(ENGINE_BACKENDS), help="Движок (по умолчанию из .env)")
+    parser.add_argument("--model", type=Path, help="Путь к модели (по умолчанию из .env)")
+    parser.add_argument("--imgsz", type=int, help="Размер входа модели")
+    parser.add_argument("--pool", type=int, help="Экземпляров модели (ENGINE_POOL_SIZE)")
+    parser.add_argument("--isolation", action="store_true", help="Модель в отдельном процессе")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1], help="Размеры пачки")
+    parser.add_argument("--preprocess", nargs="+", choices=PREPROCESS_MODES, default=["engine"],
+                        help="Режимы препроцессинга")
+    parser.add_argument("--repeat", type=int, default=1, help="Проходов по кадрам")
+    parser.add_argument("--limit", type=int, default=0, help="Максимум кадров (0 - все)")
+    parser.add_argument("--output", type=Path, help="Сохранить результат в JSON")
+    parser.add_argument("--compare", type=Path, help="JSON прошлого прогона для сравнения")
+    return parser.parse_args()
+
+
+def main():
+    """Точка входа."""
+    args = parse_args()
+
+    paths = collect_images(args.dirs, args.limit)
+    if not paths:
+        print("[Bench] Кадры не найдены")
+        sys.exit(1)
+
+    overrides = {"inference_isolation": args.isolation}
+    if args.backend:
+        overrides["inference_backend"] = args.backend
+    if args.model:
+        overrides["model_path"] = args.model
+    if args.imgsz:
+        overrides["image_size"] = args.imgsz
+    if args.pool:
+        overrides["engine_pool_size"] = args.pool
+    settings = dataclasses.replace(Settings.from_env(), **overrides)
+
+    if "roi" in args.preprocess and settings.roi is None:
+        print("[Bench] ROI не задана (ROI в .env) - режим roi совпадёт с engine")
+
+    engine = create_engine(settings)
+    start = time.perf_counter()
+    if not engine.load_model() or not engine.warmup():
+        print("[Bench] Не удалось загрузить модель")
+        sys.exit(1)
+    load_s = time.perf_counter() - start
+    print(f"[Bench] Движок {settings.inference_backend} ({settings.model_path}) готов за {load_s:.2f} сек, "
+          f"кадров: {len(paths)}")
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "backend": settings.inference_backend,
+            "model_path": str(settings.model_path),
+            "image_size": settings.image_size,
+            "pool_size": settings.engine_pool_size,
+            "isolation": settings.inference_isolation,
+            "roi": settings.roi,
+            "images": len(paths),
+            "repeat": args.repeat,
+            "load_s": round(load_s, 3),
+        },
+        "runs": [],
+    }
+
+    try:
+        for mode in args.preprocess:
+            for batch in args.batch:
+                item = run(engine, paths, mode, batch, args.repeat, settings.roi)
+                report["runs"].append(item)
+                print_run(item)
+    finally:
+        close = getattr(engine, "close", None)
+        if close is not None:
+            close()
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[Bench] Результат сохранён: {args.output}")
+
+    if args.compare:
+        print_comparison(report, json.loads(args.compare.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Bench WS Compression - CPU и трафик permessage-deflate на типичных сообщениях.
+
+Прогоняет сообщения Application через zlib с теми же параметрами, что
+permessage-deflate в websockets (raw deflate, Z_SYNC_FLUSH, общий контекст
+между сообщениями подключения), и считает для каждого уровня сжатия:
+- Размер на проводе и коэффициент сжатия
+- CPU на сжатие (сервер) и распаковку (клиент) на сообщение
+- Время передачи по каналу заданной скорости (--link-kbps) и итог CPU + передача
+
+Сообщения:
+- event       - container_recognized (core/events.py)
+- device_info - ответ get_device_info
+- batch       - цикл контейнера пакетом (см. "batch" в docs/COMMANDS.md)
+- photo       - JPEG base64 как в get_photo (кадры из --images или синтетика 2560x1440)
+
+Запускать на целевой плате (RK3588): результат показывает, где сжатие
+окупается на сотовом канале, а где только тратит CPU.
+
+Использование:
+    python -m tools.bench_ws_compression
+    python -m tools.bench_ws_compression --levels 1 6 9 --link-kbps 256 1000 --output wsbench.json
+    python -m tools.bench_ws_compression --images imgs --photos 5
+"""
+import argparse
+import base64
+import json
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import cv2
+
+from core.events import EventEncoder
+from tools.journal_query import distribution
+from vision.frame_source import SyntheticSource
+from websocket.server import DEFLATE_MEM_LEVEL, DEFLATE_WINDOW_BITS
+
+# Хвост Z_SYNC_FLUSH, который permessage-deflate не передаёт
+_SYNC_TAIL = b"\x00\x00\xff\xff"
+
+
+def _container_events(encoder: EventEncoder, index: int) -> list[str]:
+    """События одного цикла контейнера."""
+    container_type = "plastic" if index % 2 else "aluminum"
+    return [
+        encoder.encode("receiver_not_empty", {"bottle_exist": index % 2 == 1, "bank_exist": index % 2 == 0}),
+        encoder.encode("container_detected", {"container_type": container_type}),
+        encoder.encode("container_recognized", {"container_type": container_type,
+                                                "confidence": round(0.9 + index % 10 / 100, 3)}),
+        encoder.encode("container_dumped", {"container_type": container_type}),
+        encoder.encode("container_accepted", {"container_type": container_type,
+                                              "bottle_count": 100 + index, "bank_count": 50 + index}),
+    ]
+
+
+def build_payloads(images: Optional[Path], photos: int, count: int) -> dict:
+    """
+    Наборы сообщений по типам.
+
+    Args:
+        images: Папка с JPEG для photo (None или пусто - синтетические кадры).
+        photos: Количество фото.
+        count: Количество сообщений остальных типов.
+
+    Returns:
+        {тип: [сообщение, ...]}
+    """
+    encoder = EventEncoder()
+    events = [_container_events(encoder, i) for i in range(count)]
+    payloads = {
+        "event": [cycle[2] for cycle in events],
+        "device_info": [encoder.encode("device_info", {
+            "bottle_count": 100 + i, "bank_count": 50 + i, "bottle_fill_percent": i % 100,
+            "bank_fill_percent": i // 2 % 100, "state": "idle", "left_sensor": 0, "center_sensor": 1,
+            "right_sensor": 0, "weight_error": 0, "door_locked": True,
+        }) for i in range(count)],
+        "batch": ["[" + ",".join(cycle) + "]" for cycle in events],
+    }
+
+    frames = []
+    paths = sorted(images.glob("*.jpg"))[:photos] if images and images.is_dir() else []
+    for path in paths:
+        frame = cv2.imread(str(path))
+        if frame is not None:
+            frames.append(frame)
+    if not frames:
+        source = SyntheticSource(2560, 1440, fps=0)
+        source.open()
+        frames = [source.read()[1] for _ in range(photos)]
+        source.release()
+    payloads["photo"] = []
+    for frame in frames:
+        _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        payloads["photo"].append(json.dumps({
+            "photo_base64": base64.b64encode(buffer).decode("utf-8"), "status": "ok",
+        }))
+    return payloads
+
+
+def run(messages: list[str], level: Optional[int], repeat: int) -> dict:
+    """
+    Прогнать сообщения через одно подключение.
+
+    Args:
+        messages: Сообщения в порядке отправки.
+        level: Уровень zlib (None - без сжатия).
+        repeat: Проходов по сообщениям.
+
+    Returns:
+        Байты, коэффициент и CPU на сообщение (мкс).
+    """
+    raw = [m.encode("utf-8") for m in messages] * repeat
+    raw_bytes = sum(len(m) for m in raw)
+    if level is None:
+        return {"raw_bytes": raw_bytes, "wire_bytes": raw_bytes, "ratio": 1.0,
+                "compress_us": {"count": 0}, "decompress_us": {"count": 0}}
+
+    encoder = zlib.compressobj(level, zlib.DEFLATED, -DEFLATE_WINDOW_BITS, DEFLATE_MEM_LEVEL)
+    decoder = zlib.decompressobj(-DEFLATE_WINDOW_BITS)
+    compress_us, decompress_us = [], []
+    wire_bytes = 0
+    for message in raw:
+        start = time.perf_counter()
+        data = encoder.compress(message) + encoder.flush(zlib.Z_SYNC_FLUSH)
+        data = data[:-4] if data.endswith(_SYNC_TAIL) else data
+        middle = time.perf_counter()
+        restored = decoder.decompress(data + _SYNC_TAIL)
+        end = time.perf_counter()
+        if restored != message:
+            raise RuntimeError("Сообщение не восстановлено после распаковки")
+        compress_us.append((middle - start) * 1e6)
+        decompress_us.append((end - middle) * 1e6)
+        wire_bytes += len(data)
+    return {
+        "raw_bytes": raw_bytes,
+        "wire_bytes": wire_bytes,
+        "ratio": round(raw_bytes / max(1, wire_bytes), 2),
+        "compress_us": distribution(compress_us),
+        "decompress_us": distribution(decompress_us),
+    }
+
+
+def link_cost(item: dict, messages: int, kbps: float) -> float:
+    """Среднее время на сообщение: CPU сжатия и распаковки плюс передача (мс)."""
+    cpu_us = item["compress_us"].get("avg", 0) + item["decompress_us"].get("avg", 0)
+    transfer_ms = item["wire_bytes"] / messages * 8 / kbps
+    return round(cpu_us / 1000 + transfer_ms, 3)
+
+
+def print_payload(name: str, runs: list[dict], links: list[float]) -> None:
+    """Вывести результаты одного типа сообщений."""
+    first = runs[0]
+    print(f"[Bench] {name}: {first['messages']} сообщений, "
+          f"{first['raw_bytes'] // first['messages']} байт в среднем")
+    for item in runs:
+        level = "off" if item["level"] is None else f"level={item['level']}"
+        cpu = item["compress_us"]
+        cpu_text = f"сжатие p50={cpu['p50']} мкс p99={cpu['p99']} мкс" if cpu.get("count") else "без CPU"
+        costs = ", ".join(f"{kbps:g} кбит/с {item['link_ms'][str(kbps)]} мс" for kbps in links)
+        print(f"    {level:<9} x{item['ratio']:<6} {item['wire_bytes'] // item['messages']:>8} байт, "
+              f"{cpu_text}; на сообщение: {costs}")
+
+
+def parse_args():
+    """Парсинг аргументов командной строки."""
+    parser = argparse.ArgumentParser(description="Бенчмарк permessage-deflate на сообщениях Application")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9], help="Уровни zlib")
+    parser.add_argument("--link-kbps", type=float, nargs="+", default=[256.0, 2000.0],
+                        help="Скорости канала для оценки (кбит/с)")
+    parser.add_argument("--count", type=int, default=500, help="Событий каждого типа")
+    parser.add_argument("--photos", type=int, default=3, help="Фото")
+    parser.add_argument("--images", type=Path, help="Папка JPEG для photo (по умолчанию синтетика)")
+    parser.add_argument("--repeat", type=int, default=1, help="Проходов по сообщениям")
+    parser.add_argument("--output", type=Path, help="Сохранить результат в JSON")
+    return parser.parse_args()
+
+
+def main():
+    """Точка входа."""
+    args = parse_args()
+    payloads = build_payloads(args.images, args.photos, args.count)
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "window_bits": DEFLATE_WINDOW_BITS,
+            "mem_level": DEFLATE_MEM_LEVEL,
+            "event_backend": EventEncoder().backend,
+            "link_kbps": args.link_kbps,
+        },
+        "payloads": {},
+    }
+    for name, messages in payloads.items():
+        runs = []
+        for level in [None] + args.levels:
+            item = run(messages, level, args.repeat)
+            item["level"] = level
+            item["messages"] = len(messages) * args.repeat
+            item["link_ms"] = {str(kbps): link_cost(item, item["messages"], kbps) for kbps in args.link_kbps}
+            runs.append(item)
+        report["payloads"][name] = runs
+        print_payload(name, runs, args.link_kbps)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[Bench] Результат сохранён: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
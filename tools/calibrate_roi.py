@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Calibrate ROI - вычисление области интереса по сохранённым кадрам.
+
+Берёт кадры из папок (imgs/, real_time/), находит область, в которой
+кадры отличаются друг от друга (или от кадра пустого приёмника),
+и печатает строку ROI для .env.
+
+Использование:
+    python -m tools.calibrate_roi imgs real_time
+    python -m tools.calibrate_roi imgs --background empty.jpg --preview roi.jpg
+"""
+import argparse
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from vision.roi import Roi, clamp_roi, derive_roi
+
+# JPEG декодируется сразу в 1/8 разрешения - быстро и без лишней памяти
+REDUCE_FACTOR = 8
+REDUCE_FLAG = cv2.IMREAD_REDUCED_GRAYSCALE_8
+
+
+def _collect_images(dirs: List[Path], max_images: int) -> List[Path]:
+    """Собрать пути к кадрам (новые первыми)."""
+    paths: List[Path] = []
+    for directory in dirs:
+        if directory.is_file():
+            paths.append(directory)
+            continue
+        paths.extend(p for p in directory.glob("*.jpg") if p.is_file())
+    paths.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    return paths[:max_images]
+
+
+def _full_size(path: Path) -> Optional[tuple[int, int]]:
+    """Размер кадра (width, height) в исходном разрешении."""
+    image = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    return image.shape[1], image.shape[0]
+
+
+def _load_reduced(paths: List[Path]) -> tuple[List[Path], List[np.ndarray]]:
+    """
+    Загрузить кадры в уменьшенном разрешении.
+
+    Кадры другого размера (например, уже обрезанные по ROI) отбрасываются:
+    остаются только кадры самого частого размера.
+
+    Returns:
+        Пути использованных кадров и сами кадры (в одном порядке).
+    """
+    loaded = [(p, cv2.imread(str(p), REDUCE_FLAG)) for p in paths]
+    loaded = [(p, f) for p, f in loaded if f is not None]
+    if not loaded:
+        return [], []
+    common_shape, _ = Counter(f.shape for _, f in loaded).most_common(1)[0]
+    used = [(p, f) for p, f in loaded if f.shape == common_shape]
+    return [p for p, _ in used], [f for _, f in used]
+
+
+def calibrate(args: argparse.Namespace) -> Optional[tuple[Roi, Path]]:
+    """
+    Вычислить ROI по аргументам командной строки.
+
+    Returns:
+        ROI в исходном разрешении и первый использованный кадр (для превью)
+        или None.
+    """
+    paths = _collect_images(args.dirs, args.max_images)
+    if not paths:
+        print("[Calibrate] Кадры не найдены")
+        return None
+
+    used, frames = _load_reduced(paths)
+    print(f"[Calibrate] Кадров: {len(frames)} (из {len(paths)} найденных)")
+
+    background = None
+    if args.background:
+        background = cv2.imread(str(args.background), REDUCE_FLAG)
+        if background is None or (frames and background.shape != frames[0].shape):
+            print(f"[Calibrate] Некорректный кадр фона: {args.background}")
+            return None
+
+    roi = derive_roi(
+        frames,
+        background=background,
+        threshold=args.threshold,
+        min_fraction=args.min_fraction,
+        margin=args.margin,
+        square=not args.no_square,
+        scale=1,
+    )
+    if roi is None:
+        print("[Calibrate] Не удалось выделить область (мало кадров или нет различий)")
+        return None
+
+    # Размер берётся с кадра, вошедшего в расчёт: отброшенные кадры
+    # другого размера (например, уже обрезанные) не в счёт
+    size = _full_size(used[0])
+    if size is None:
+        return None
+    x, y, w, h = (v * REDUCE_FACTOR for v in roi)
+    return clamp_roi((x, y, w, h), *size), used[0]
+
+
+def _save_preview(path: Path, source: Path, roi: Roi) -> None:
+    """Сохранить кадр с нарисованной ROI."""
+    image = cv2.imread(str(source))
+    if image is None:
+        return
+    x, y, w, h = roi
+    cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 0), 8)
+    cv2.imwrite(str(path), image)
+    print(f"[Calibrate] Превью сохранено: {path}")
+
+
+def parse_args():
+    """Парсинг аргументов командной строки."""
+    parser = argparse.ArgumentParser(
+        description="Вычисление ROI по сохранённым кадрам"
+    )
+    parser.add_argument(
+        "dirs",
+        nargs="*",
+        type=Path,
+        default=[Path("imgs"), Path("real_time")],
+        help="Папки с кадрами (по умолчанию: imgs real_time)"
+    )
+    parser.add_argument("--background", type=Path, help="Кадр пустого приёмника")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Порог отличия яркости")
+    parser.add_argument("--min-fraction", type=float, default=0.02,
+                        help="Минимальная доля активных пикселей в строке/столбце")
+    parser.add_argument("--margin", type=float, default=0.1, help="Запас вокруг области")
+    parser.add_argument("--no-square", action="store_true", help="Не расширять до квадрата")
+    parser.add_argument("--max-images", type=int, default=500, help="Максимум кадров")
+    parser.add_argument("--preview", type=Path, help="Сохранить кадр с нарисованной ROI")
+    return parser.parse_args()
+
+
+def main():
+    """Точка входа."""
+    args = parse_args()
+    args.dirs = [d for d in args.dirs if d.exists()]
+
+    result = calibrate(args)
+    if result is None:
+        sys.exit(1)
+
+    roi, source = result
+    x, y, w, h = roi
+    print(f"[Calibrate] ROI: x={x} y={y} {w}x{h}")
+    print(f"ROI={x},{y},{w},{h}")
+
+    if args.preview:
+        _save_preview(args.preview, source, roi)
+
+
+if __name__ == "__main__":
+    main()
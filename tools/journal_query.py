@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Journal Query - отчёт по журналу транзакций контейнеров.
+
+Читает journal/transactions*.jsonl (см. core/journal.py) и считает:
+- Количество контейнеров и пропускную способность (контейнеров в час)
+- Совпадение ПЛК/vision, долю несовпадений и нераспознанных
+- Матрицу ПЛК × vision
+- Перцентили задержек: полный цикл, ответ vision, стадии vision
+- Результаты сброса каретки
+
+Использование:
+    python -m tools.journal_query journal
+    python -m tools.journal_query journal --since 2025-01-15 --json
+    python -m tools.journal_query journal1/ journal2/     # несколько устройств
+"""
+import argparse
+import json
+import sys
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from core.journal import read_journal
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    """Перцентиль с линейной интерполяцией между соседними значениями."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return round(ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower), 3)
+
+
+def distribution(values: list[float]) -> dict:
+    """Количество, среднее, перцентили и максимум."""
+    if not values:
+        return {"count": 0}
+    result = {"count": len(values), "avg": round(sum(values) / len(values), 3)}
+    for q in PERCENTILES:
+        result[f"p{int(q * 100)}"] = percentile(values, q)
+    result["max"] = round(max(values), 3)
+    return result
+
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def load_entries(dirs: list[Path], since: Optional[datetime] = None,
+                 until: Optional[datetime] = None) -> list[dict]:
+    """Прочитать записи из нескольких журналов с фильтром по времени."""
+    entries = []
+    for directory in dirs:
+        for entry in read_journal(directory):
+            ts = _parse_ts(entry.get("ts"))
+            if since and (ts is None or ts < since):
+                continue
+            if until and (ts is None or ts >= until):
+                continue
+            entries.append(entry)
+    return entries
+
+
+def summarize(entries: list[dict]) -> dict:
+    """
+    Сводка по записям журнала.
+
+    Returns:
+        Словарь с разделами containers, latency_ms, dumps.
+    """
+    containers = [e for e in entries if e.get("kind") == "container"]
+    dumps = [e for e in entries if e.get("kind") == "dump"]
+
+    timestamps = sorted(ts for ts in (_parse_ts(e.get("ts")) for e in entries) if ts)
+    hours = (timestamps[-1] - timestamps[0]).total_seconds() / 3600 if len(timestamps) > 1 else 0.0
+
+    statuses = Counter(e.get("status") for e in containers)
+    total = len(containers)
+
+    # Совпадение ПЛК и vision - среди записей, где известны оба типа
+    compared = [e for e in containers if e.get("plc_type") and e.get("vision_type") not in (None, "none")]
+    agreed = sum(1 for e in compared if e["plc_type"] == e["vision_type"])
+
+    matrix: dict = defaultdict(Counter)
+    for e in containers:
+        matrix[e.get("plc_type") or "unknown"][e.get("vision_type") or "none"] += 1
+
+    def rate(count: int, of: int) -> Optional[float]:
+        return round(count / of, 4) if of else None
+
+    reply_ms = []
+    stages: dict = defaultdict(list)
+    for e in containers:
+        marks = e.get("marks") or {}
+        if "request_sent" in marks and "reply_received" in marks:
+            reply_ms.append(marks["reply_received"] - marks["request_sent"])
+        for name, value in (e.get("stages") or {}).items():
+            stages[name].append(value)
+
+    completed = [e["total_ms"] for e in containers if e.get("status") == "ok" and "total_ms" in e]
+
+    return {
+        "period": {
+            "from": timestamps[0].isoformat() if timestamps else None,
+            "to": timestamps[-1].isoformat() if timestamps else None,
+            "hours": round(hours, 3),
+        },
+        "containers": {
+            "total": total,
+            "per_hour": round(total / hours, 1) if hours else None,
+            "statuses": dict(statuses),
+            "agreement": rate(agreed, len(compared)),
+            "mismatch_rate": rate(statuses.get("mismatch", 0), total),
+            "not_recognized_rate": rate(statuses.get("not_recognized", 0), total),
+            "timeout_rate": rate(statuses.get("vision_timeout", 0) + statuses.get("plc_timeout", 0), total),
+            "matrix": {plc: dict(row) for plc, row in matrix.items()},
+        },
+        "latency_ms": {
+            "cycle_ok": distribution(completed),
+            "vision_reply": distribution(reply_ms),
+            "stages": {name: distribution(values) for name, values in sorted(stages.items())},
+        },
+        "dumps": {
+            "total": len(dumps),
+            "results": dict(Counter(e.get("result") for e in dumps)),
+            "duration_ms": distribution([e["duration_ms"] for e in dumps if "duration_ms" in e]),
+        },
+    }
+
+
+def _format_distribution(name: str, dist: dict) -> str:
+    if not dist.get("count"):
+        return f"  {name:<22} нет данных"
+    return (f"  {name:<22} n={dist['count']:<6} avg={dist['avg']:<9} p50={dist['p50']:<9} "
+            f"p90={dist['p90']:<9} p99={dist['p99']:<9} max={dist['max']}")
+
+
+def print_report(summary: dict) -> None:
+    """Вывести сводку в текстовом виде."""
+    period = summary["period"]
+    containers = summary["containers"]
+    print(f"Период: {period['from']} — {period['to']} ({period['hours']} ч)")
+    print(f"Контейнеров: {containers['total']} (в час: {containers['per_hour']})")
+    print(f"Совпадение ПЛК/vision: {containers['agreement']}")
+    print(f"Несовпадения: {containers['mismatch_rate']}, не распознано: {containers['not_recognized_rate']}, "
+          f"таймауты: {containers['timeout_rate']}")
+    print("Статусы:")
+    for status, count in sorted(containers["statuses"].items(), key=lambda kv: -kv[1]):
+        print(f"  {status:<22} {count}")
+    print("ПЛК × vision:")
+    for plc, row in sorted(containers["matrix"].items()):
+        print(f"  {plc:<10} " + ", ".join(f"{v}={c}" for v, c in sorted(row.items())))
+
+    latency = summary["latency_ms"]
+    print("Задержки (мс):")
+    print(_format_distribution("цикл (ok)", latency["cycle_ok"]))
+    print(_format_distribution("ответ vision", latency["vision_reply"]))
+    for name, dist in latency["stages"].items():
+        print(_format_distribution(f"vision/{name}", dist))
+
+    dumps = summary["dumps"]
+    print(f"Сбросы каретки: {dumps['total']} {dumps['results']}")
+    print(_format_distribution("длительность сброса", dumps["duration_ms"]))
+
+
+def parse_args():
+    """Парсинг аргументов командной строки."""
+    parser = argparse.ArgumentParser(description="Отчёт по журналу транзакций контейнеров")
+    parser.add_argument("dirs", nargs="*", type=Path, default=[Path("journal")],
+                        help="Папки журнала или файлы .jsonl (по умолчанию: journal)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Начало периода (ISO)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Конец периода (ISO)")
+    parser.add_argument("--json", action="store_true", help="Вывести сводку в JSON")
+    return parser.parse_args()
+
+
+def main():
+    """Точка входа."""
+    args = parse_args()
+    entries = load_entries(args.dirs, args.since, args.until)
+    if not entries:
+        print("[Journal] Записи не найдены")
+        sys.exit(1)
+
+    summary = summarize(entries)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print_report(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+"""
+PLC Simulator - имитация ПЛК (Modbus RTU master) через псевдотерминал.
+
+Radxa - slave (plc.PLC, modbus_tk RtuServer), ПЛК - master. Симулятор
+создаёт пару pty, отдаёт slave-сторону Application (PLC_SERIAL_PORT)
+и со стороны master ведёт себя как ПЛК:
+- Пишет статус (регистр 26): завеса, датчики каретки, bottle/bank exist
+- Пишет счётчики и проценты заполнения (регистры 20-23)
+- Читает команды Radxa (регистр 25) и двигает каретку по биту 6/7
+
+Контейнеры идут по сценарию (JSON) или случайно с заданной частотой.
+В конце - отчёт: исходы контейнеров, время решения Radxa,
+задержки и ошибки Modbus.
+
+Использование:
+    python -m tools.plc_simulator --link /tmp/ttyPLC --rate 30
+    PLC_SERIAL_PORT=/tmp/ttyPLC python -m plc.application
+
+    python -m tools.plc_simulator --rate 60 --count 500 --report sim.json
+    python -m tools.plc_simulator --scenario scenario.json
+        # [{"kind": "plastic", "gap_s": 2.0}, {"kind": "aluminum", "gap_s": 1.5, "veil_s": 0.5}]
+"""
+import argparse
+import json
+import os
+import random
+import select
+import struct
+import sys
+import termios
+import time
+import tty
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from tools.journal_query import distribution
+
+# Регистры (см. plc/plc.py)
+REG_COUNTERS = 20          # 20-23: банки, бутылки, % бутылок, % банок
+REG_CMD = 25
+REG_STATUS = 26
+
+# Биты статуса (регистр 26)
+BIT_VEIL = 0
+BIT_LEFT = 1
+BIT_CENTER = 2
+BIT_RIGHT = 3
+BIT_BANK_EXIST = 6
+BIT_BOTTLE_EXIST = 7
+BIT_STATUS_WORK = 11
+
+# Биты команд Radxa (регистр 25)
+CMD_BANK = 6
+CMD_BOTTLE = 7
+
+# Функции Modbus
+FC_READ_HOLDING = 0x03
+FC_WRITE_SINGLE = 0x06
+FC_WRITE_MULTIPLE = 0x10
+
+
+def crc16(data: bytes) -> int:
+    """CRC-16/MODBUS (полином 0xA001, начальное значение 0xFFFF)."""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def build_frame(slave: int, pdu: bytes) -> bytes:
+    """RTU кадр: адрес + PDU + CRC (младший байт первым)."""
+    frame = bytes([slave]) + pdu
+    return frame + struct.pack("<H", crc16(frame))
+
+
+class ModbusError(RuntimeError):
+    """Ошибка обмена: timeout, crc, bad_slave или exception (ответ с кодом ошибки)."""
+
+    def __init__(self, error_code: str, message: str = ""):
+        super().__init__(message or error_code)
+        self.error_code = error_code
+
+
+class RtuMaster:
+    """
+    Modbus RTU master поверх файлового дескриптора (master-сторона pty).
+
+    Каждый запрос замеряется: latencies[функция] - время ответа (мс),
+    errors - счётчик ошибок по коду.
+    """
+
+    def __init__(self, fd: int, slave: int, timeout: float = 0.1, baudrate: int = 115200):
+        """
+        Инициализация master.
+
+        Args:
+            fd: Дескриптор канала (неблокирующий).
+            slave: Адрес slave (PLC_SLAVE_ADDRESS).
+            timeout: Таймаут ответа (секунды).
+            baudrate: Скорость линии (для паузы 3.5 символа между кадрами).
+        """
+        self.fd = fd
+        self.slave = slave
+        self.timeout = timeout
+        self._gap = 3.5 * 11 / baudrate
+        self._last_response = 0.0
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+
+    def read_registers(self, start: int, count: int) -> list[int]:
+        """Прочитать holding регистры (функция 0x03)."""
+        response = self._transact(struct.pack(">BHH", FC_READ_HOLDING, start, count), "read")
+        return list(struct.unpack(f">{count}H", response[3:3 + 2 * count]))
+
+    def write_register(self, register: int, value: int) -> None:
+        """Записать один регистр (функция 0x06)."""
+        self._transact(struct.pack(">BHH", FC_WRITE_SINGLE, register, value & 0xFFFF), "write")
+
+    def write_registers(self, start: int, values: list[int]) -> None:
+        """Записать несколько регистров (функция 0x10)."""
+        pdu = struct.pack(f">BHHB{len(values)}H", FC_WRITE_MULTIPLE, start, len(values),
+                          2 * len(values), *(v & 0xFFFF for v in values))
+        self._transact(pdu, "write_multiple")
+
+    def _transact(self, pdu: bytes, kind: str) -> bytes:
+        """Отправить запрос и дождаться ответа."""
+        self._drain()
+        silence = self._gap - (time.perf_counter() - self._last_response)
+        if silence > 0:
+            time.sleep(silence)
+
+        start = time.perf_counter()
+        try:
+            os.write(self.fd, build_frame(self.slave, pdu))
+            response = self._read_response(pdu[0], start + self.timeout)
+        except ModbusError as e:
+            self.errors[e.error_code] += 1
+            raise
+        except BlockingIOError:
+            # Буфер pty переполнен - slave не читает
+            self.errors["timeout"] += 1
+            raise ModbusError("timeout", "Канал переполнен")
+        finally:
+            self._last_response = time.perf_counter()
+
+        self.latencies[kind].append((self._last_response - start) * 1000)
+        return response
+
+    def _read_response(self, function: int, deadline: float) -> bytes:
+        """Прочитать ответ: длина определяется по функции и байту счётчика."""
+        buffer = b""
+        expected = None
+        while expected is None or len(buffer) < expected:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise ModbusError("timeout", f"Нет ответа от slave {self.slave}")
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                continue
+            try:
+                buffer += os.read(self.fd, 256)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                # EIO - slave-сторона pty закрыта
+                raise ModbusError("timeout", "Канал закрыт")
+
+            if expected is None and len(buffer) >= 3:
+                if buffer[1] == function | 0x80:
+                    expected = 5
+                elif function == FC_READ_HOLDING:
+                    expected = 5 + buffer[2]
+                else:
+                    expected = 8
+
+        frame = buffer[:expected]
+        if crc16(frame[:-2]) != struct.unpack("<H", frame[-2:])[0]:
+            raise ModbusError("crc", f"Неверная CRC: {frame.hex()}")
+        if frame[0] != self.slave:
+            raise ModbusError("bad_slave", f"Ответ от slave {frame[0]}")
+        if frame[1] & 0x80:
+            raise ModbusError("exception", f"Modbus exception {frame[2]}")
+        return frame
+
+    def _drain(self) -> None:
+        """Отбросить запоздавшие байты прошлых ответов."""
+        while select.select([self.fd], [], [], 0)[0]:
+            try:
+                if not os.read(self.fd, 256):
+                    return
+            except OSError:
+                return
+
+
+class PtyLink:
+    """
+    Пара pty: master - симулятору, slave - Application.
+
+    Slave-сторона остаётся открытой в симуляторе, чтобы перезапуск
+    Application не закрывал канал.
+    """
+
+    def __init__(self, link: Optional[Path] = None):
+        """
+        Создать pty.
+
+        Args:
+            link: Симлинк на slave-устройство (стабильный путь для PLC_SERIAL_PORT).
+        """
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.slave_name = os.ttyname(self.slave_fd)
+        self.link = Path(link) if link else None
+        if self.link:
+            if self.link.is_symlink() or self.link.exists():
+                self.link.unlink()
+            self.link.symlink_to(self.slave_name)
+
+    @property
+    def port(self) -> str:
+        """Путь для PLC_SERIAL_PORT."""
+        return str(self.link or self.slave_name)
+
+    def flush(self) -> None:
+        """Отбросить запросы, которые slave не прочитал (Application не запущен)."""
+        termios.tcflush(self.slave_fd, termios.TCIFLUSH)
+
+    def close(self) -> None:
+        """Закрыть pty и удалить симлинк."""
+        if self.link and self.link.is_symlink():
+            self.link.unlink()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+
+@dataclass
+class Container:
+    """Контейнер сценария."""
+
+    kind: str                # "plastic" или "aluminum"
+    arrive_at: float         # Время появления (секунды от старта)
+    veil_s: float = 0.3      # Сколько рука пересекает завесу
+
+
+def random_scenario(rate_per_min: float, count: int, mix: dict[str, float],
+                    seed: Optional[int] = None, veil_s: float = 0.3, jitter: float = 0.2) -> list[Container]:
+    """
+    Случайный сценарий: count контейнеров с частотой rate_per_min.
+
+    Args:
+        rate_per_min: Контейнеров в минуту.
+        count: Количество контейнеров.
+        mix: Доли типов, например {"plastic": 0.6, "aluminum": 0.4}.
+        seed: Seed генератора (одинаковый seed - одинаковый сценарий).
+        veil_s: Время пересечения завесы.
+        jitter: Разброс интервала между контейнерами (доля интервала).
+    """
+    rng = random.Random(seed)
+    interval = 60.0 / rate_per_min
+    kinds, weights = zip(*mix.items())
+    containers = []
+    at = 1.0
+    for _ in range(count):
+        containers.append(Container(rng.choices(kinds, weights)[0], round(at, 3),
+                                    round(veil_s * rng.uniform(0.7, 1.3), 3)))
+        at += interval * rng.uniform(1 - jitter, 1 + jitter)
+    return containers
+
+
+def load_scenario(path: Path) -> list[Container]:
+    """
+    Загрузить сценарий из JSON.
+
+    Формат: [{"kind": "plastic", "gap_s": 2.0, "veil_s": 0.3}, ...],
+    gap_s - пауза перед контейнером.
+    """
+    containers = []
+    at = 0.0
+    for item in json.loads(Path(path).read_text(encoding="utf-8")):
+        at += float(item.get("gap_s", 2.0))
+        containers.append(Container(item["kind"], at, float(item.get("veil_s", 0.3))))
+    return containers
+
+
+class SimulatedPlc:
+    """
+    Модель ПЛК: завеса, определение типа, каретка и счётчики.
+
+    Цикл контейнера:
+        insert (завеса пересечена) → weigh (завеса свободна, ПЛК определяет тип)
+        → wait_cmd (ждём бит 7/6 от Radxa) → move → hold (датчик каретки) → return
+
+    Бит команды срабатывает по фронту: после принятого контейнера бит
+    должен опуститься, прежде чем его можно будет принять снова.
+    Без команды за decision_timeout контейнер возвращается (rejected).
+    """
+
+    def __init__(
+        self,
+        containers: list[Container],
+        detect_s: float = 0.1,
+        move_s: float = 0.6,
+        hold_s: float = 0.3,
+        return_s: float = 0.6,
+        decision_timeout: float = 3.0,
+        capacity: int = 500,
+    ):
+        """
+        Инициализация модели.
+
+        Args:
+            containers: Сценарий (по возрастанию arrive_at).
+            detect_s: Задержка определения типа после освобождения завесы.
+            move_s: Движение каретки до датчика.
+            hold_s: Каретка на датчике.
+            return_s: Возврат каретки в центр.
+            decision_timeout: Ожидание команды Radxa после освобождения завесы.
+            capacity: Вместимость мешка (для процентов заполнения).
+        """
+        self._queue = sorted(containers, key=lambda c: c.arrive_at)
+        self.detect_s = detect_s
+        self.move_s = move_s
+        self.hold_s = hold_s
+        self.return_s = return_s
+        self.decision_timeout = decision_timeout
+        self.capacity = capacity
+
+        self.bits = {BIT_CENTER: 1, BIT_STATUS_WORK: 1}
+        self.bank_count = 0
+        self.bottle_count = 0
+        self.results: list[dict] = []
+
+        self._armed = {CMD_BANK: True, CMD_BOTTLE: True}
+        self._current: Optional[Container] = None
+        self._phase = "idle"
+        self._phase_at = 0.0
+        self._record: dict = {}
+
+    @property
+    def done(self) -> bool:
+        """Сценарий отработан."""
+        return not self._queue and self._phase == "idle"
+
+    def status_word(self) -> int:
+        """Значение регистра 26."""
+        return sum(1 << bit for bit, value in self.bits.items() if value)
+
+    def counters(self) -> list[int]:
+        """Значения регистров 20-23."""
+        return [
+            self.bank_count,
+            self.bottle_count,
+            min(100, self.bottle_count * 100 // self.capacity),
+            min(100, self.bank_count * 100 // self.capacity),
+        ]
+
+    def tick(self, now: float, cmd: int) -> None:
+        """
+        Шаг модели.
+
+        Args:
+            now: Время от старта (секунды).
+            cmd: Значение регистра 25 (команды Radxa).
+        """
+        for bit in (CMD_BANK, CMD_BOTTLE):
+            if not (cmd >> bit) & 1:
+                self._armed[bit] = True
+
+        if self._phase == "idle":
+            if self._queue and now >= self._queue[0].arrive_at:
+                self._current = self._queue.pop(0)
+                self._record = {"kind": self._current.kind, "arrived_at": round(now, 3)}
+                self.bits[BIT_VEIL] = 1
+                self._enter("insert", now)
+
+        elif self._phase == "insert":
+            if now - self._phase_at >= self._current.veil_s:
+                self.bits[BIT_VEIL] = 0
+                self._record["veil_cleared_at"] = now
+                self._enter("weigh", now)
+
+        elif self._phase == "weigh":
+            if now - self._phase_at >= self.detect_s:
+                self.bits[self._exist_bit()] = 1
+                self._enter("wait_cmd", now)
+
+        elif self._phase == "wait_cmd":
+            self._wait_cmd(now, cmd)
+
+        elif self._phase == "move":
+            if now - self._phase_at >= self.move_s:
+                self.bits[self._sensor_bit()] = 1
+                self.bits[self._exist_bit()] = 0
+                if self._current.kind == "plastic":
+                    self.bottle_count += 1
+                else:
+                    self.bank_count += 1
+                self._enter("hold", now)
+
+        elif self._phase == "hold":
+            if now - self._phase_at >= self.hold_s:
+                self.bits[self._sensor_bit()] = 0
+                self._enter("return", now)
+
+        elif self._phase == "return":
+            if now - self._phase_at >= self.return_s:
+                self.bits[BIT_CENTER] = 1
+                self._finish(now, "accepted")
+
+    def _wait_cmd(self, now: float, cmd: int) -> None:
+        """Ожидание команды Radxa."""
+        expected = CMD_BOTTLE if self._current.kind == "plastic" else CMD_BANK
+        other = CMD_BANK if expected == CMD_BOTTLE else CMD_BOTTLE
+        cleared_at = self._record["veil_cleared_at"]
+
+        if (cmd >> expected) & 1 and self._armed[expected]:
+            self._armed[expected] = False
+            self._record["decision_ms"] = round((now - cleared_at) * 1000, 1)
+            self.bits[BIT_CENTER] = 0
+            self._enter("move", now)
+        elif (cmd >> other) & 1 and self._armed[other]:
+            self._armed[other] = False
+            self._record["decision_ms"] = round((now - cleared_at) * 1000, 1)
+            self.bits[self._exist_bit()] = 0
+            self._finish(now, "wrong_command")
+        elif now - cleared_at > self.decision_timeout:
+            self.bits[self._exist_bit()] = 0
+            self._finish(now, "rejected")
+
+    def _enter(self, phase: str, now: float) -> None:
+        self._phase = phase
+        self._phase_at = now
+
+    def _finish(self, now: float, outcome: str) -> None:
+        record = self._record
+        record["outcome"] = outcome
+        record["cycle_ms"] = round((now - record["arrived_at"]) * 1000, 1)
+        record.pop("veil_cleared_at", None)
+        self.results.append(record)
+        self._current = None
+        self._enter("idle", now)
+
+    def _exist_bit(self) -> int:
+        return BIT_BOTTLE_EXIST if self._current.kind == "plastic" else BIT_BANK_EXIST
+
+    def _sensor_bit(self) -> int:
+        return BIT_LEFT if self._current.kind == "plastic" else BIT_RIGHT
+
+
+def run_simulation(master: RtuMaster, plc: SimulatedPlc, poll_s: float = 0.02,
+                   duration: Optional[float] = None, link: Optional[PtyLink] = None,
+                   progress_s: float = 10.0) -> float:
+    """
+    Цикл опроса: прочитать команды, шаг модели, записать статус и счётчики.
+
+    Args:
+        master: RTU master.
+        plc: Модель ПЛК.
+        poll_s: Период опроса.
+        duration: Ограничение по времени (None - до конца сценария).
+        link: pty (для сброса непрочитанных запросов при таймауте).
+        progress_s: Период вывода прогресса.
+
+    Returns:
+        Длительность прогона (секунды).
+    """
+    start = time.monotonic()
+    cmd = 0
+    last_counters = None
+    next_progress = progress_s
+    next_tick = start
+
+    try:
+        while not plc.done:
+            now = time.monotonic() - start
+            if duration is not None and now >= duration:
+                break
+
+            try:
+                cmd = master.read_registers(REG_CMD, 1)[0]
+                plc.tick(now, cmd)
+                master.write_register(REG_STATUS, plc.status_word())
+                counters = plc.counters()
+                if counters != last_counters:
+                    master.write_registers(REG_COUNTERS, counters)
+                    last_counters = counters
+            except ModbusError as e:
+                # Модель идёт дальше: ПЛК не ждёт Radxa
+                plc.tick(now, cmd)
+                if e.error_code == "timeout":
+                    last_counters = None
+                    if link is not None:
+                        link.flush()
+
+            if now >= next_progress:
+                outcomes = Counter(r["outcome"] for r in plc.results)
+                print(f"[PLC-sim] {now:.0f} сек: контейнеров {len(plc.results)} {dict(outcomes)}, "
+                      f"ошибок Modbus {dict(master.errors)}")
+                next_progress += progress_s
+
+            next_tick += poll_s
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+    except KeyboardInterrupt:
+        print("[PLC-sim] Остановлено")
+
+    return time.monotonic() - start
+
+
+def summarize(plc: SimulatedPlc, master: RtuMaster, elapsed: float) -> dict:
+    """Сводка прогона."""
+    results = plc.results
+    return {
+        "elapsed_s": round(elapsed, 1),
+        "containers": {
+            "total": len(results),
+            "per_min": round(len(results) / elapsed * 60, 1) if elapsed else None,
+            "outcomes": dict(Counter(r["outcome"] for r in results)),
+            "decision_ms": distribution([r["decision_ms"] for r in results if "decision_ms" in r]),
+            "cycle_ms": distribution([r["cycle_ms"] for r in results]),
+        },
+        "modbus": {
+            "requests": sum(len(v) for v in master.latencies.values()) + sum(master.errors.values()),
+            "errors": dict(master.errors),
+            "latency_ms": {kind: distribution(values) for kind, values in sorted(master.latencies.items())},
+        },
+        "results": results,
+    }
+
+
+def print_report(summary: dict) -> None:
+    """Вывести сводку."""
+    containers = summary["containers"]
+    print(f"[PLC-sim] Прогон {summary['elapsed_s']} сек: контейнеров {containers['total']} "
+          f"({containers['per_min']} в минуту), исходы {containers['outcomes']}")
+    for name, dist in (("решение Radxa", containers["decision_ms"]), ("цикл контейнера", containers["cycle_ms"])):
+        if dist.get("count"):
+            print(f"    {name:<16} p50={dist['p50']} p90={dist['p90']} p99={dist['p99']} max={dist['max']} мс")
+    modbus = summary["modbus"]
+    print(f"[PLC-sim] Modbus: запросов {modbus['requests']}, ошибок {modbus['errors']}")
+    for kind, dist in modbus["latency_ms"].items():
+        if dist.get("count"):
+            print(f"    {kind:<16} p50={dist['p50']} p90={dist['p90']} p99={dist['p99']} max={dist['max']} мс")
+
+
+def _parse_mix(value: str) -> dict[str, float]:
+    """"plastic=0.6,aluminum=0.4" → {"plastic": 0.6, "aluminum": 0.4}."""
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in ("plastic", "aluminum"):
+            raise argparse.ArgumentTypeError(f"Неизвестный тип: {kind}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def parse_args():
+    """Парсинг аргументов командной строки."""
+    parser = argparse.ArgumentParser(description="Симулятор ПЛК (Modbus RTU master) через pty")
+    parser.add_argument("--link", type=Path, default=Path("/tmp/ttyPLC"),
+                        help="Симлинк на порт для PLC_SERIAL_PORT (по умолчанию: /tmp/ttyPLC)")
+    parser.add_argument("--slave", type=int, default=int(os.getenv("PLC_SLAVE_ADDRESS", "2")),
+                        help="Адрес slave (PLC_SLAVE_ADDRESS)")
+    parser.add_argument("--scenario", type=Path, help="Сценарий JSON (иначе случайный)")
+    parser.add_argument("--rate", type=float, default=20.0, help="Контейнеров в минуту (случайный сценарий)")
+    parser.add_argument("--count", type=int, default=100, help="Контейнеров (случайный сценарий)")
+    parser.add_argument("--mix", type=_parse_mix, default={"plastic": 0.6, "aluminum": 0.4},
+                        help="Доли типов: plastic=0.6,aluminum=0.4")
+    parser.add_argument("--seed", type=int, help="Seed случайного сценария")
+    parser.add_argument("--poll-ms", type=float, default=20.0, help="Период опроса ПЛК (мс)")
+    parser.add_argument("--timeout-ms", type=float, default=100.0, help="Таймаут ответа Modbus (мс)")
+    parser.add_argument("--duration", type=float, help="Ограничение по времени (секунды)")
+    parser.add_argument("--wait", type=float, default=30.0,
+                        help="Ожидание первого ответа Application (секунды)")
+    parser.add_argument("--report", type=Path, help="Сохранить отчёт в JSON")
+    return parser.parse_args()
+
+
+def main():
+    """Точка входа."""
+    args = parse_args()
+    if args.scenario:
+        containers = load_scenario(args.scenario)
+    else:
+        containers = random_scenario(args.rate, args.count, args.mix, args.seed)
+
+    link = PtyLink(args.link)
+    master = RtuMaster(link.master_fd, args.slave, timeout=args.timeout_ms / 1000)
+    print(f"[PLC-sim] Порт: {link.port} → {link.slave_name}")
+    print(f"[PLC-sim] Запустите: PLC_SERIAL_PORT={link.port} python -m plc.application")
+
+    try:
+        # Ждём, пока Application откроет порт и начнёт отвечать
+        deadline = time.monotonic() + args.wait
+        while True:
+            try:
+                master.read_registers(REG_CMD, 1)
+                break
+            except ModbusError:
+                link.flush()
+                if time.monotonic() > deadline:
+                    print("[PLC-sim] Application не отвечает")
+                    sys.exit(1)
+                time.sleep(0.5)
+        master.errors.clear()
+        master.latencies.clear()
+
+        print(f"[PLC-sim] Сценарий: {len(containers)} контейнеров")
+        plc = SimulatedPlc(containers)
+        elapsed = run_simulation(master, plc, args.poll_ms / 1000, args.duration, link)
+    finally:
+        link.close()
+
+    summary = summarize(plc, master, elapsed)
+    print_report(summary)
+    if args.report:
+        args.report.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[PLC-sim] Отчёт сохранён: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Soak Test - сквозной нагрузочный прогон без оборудования.
+
+Запускает дерево процессов:
+- plc.application на порту симулятора ПЛК (pty, tools/plc_simulator.py)
+- vision.inference_service с источником кадров без камеры
+  (CAMERA_SOURCE=synthetic|images) и движком stub или yolo (ONNX/RKNN)
+- N клиентов backend: "app" (события и опрос get_device_info)
+  и мониторы (role=monitor, темы container/hardware/device_info)
+
+Прогоняет тысячи контейнеров и считает:
+- Потерянные события (container_detected / recognized / not_recognized)
+- Зависания: состояние не idle дольше --stuck-after, нет ответа на опрос
+- Пропускную способность и перцентили задержек (ПЛК, backend, Application)
+- Рост памяти Application и vision (RSS с дочерними процессами)
+
+Логи процессов, журнал и отчёт - в --workdir.
+
+Использование:
+    python -m tools.soak_test --containers 2000 --rate 40
+    python -m tools.soak_test --backend yolo --model weights/model.onnx --camera images --images imgs
+    python -m tools.soak_test --containers 300 --clients 5 --report soak.json
+    python -m tools.soak_test --containers 300 --clients 3 --batch   # события пакетами
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from tools.journal_query import distribution
+from tools.plc_simulator import (REG_CMD, ModbusError, PtyLink, RtuMaster, SimulatedPlc,
+                                 _parse_mix, random_scenario, run_simulation)
+
+# События, по которым считаются потери
+OUTCOME_EVENTS = ("container_recognized", "container_not_recognized")
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """RSS процесса и всех его потомков (МБ) по /proc. None - процесс завершён."""
+    total_kb = 0
+    pending = [pid]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            with open(f"/proc/{current}/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children", encoding="ascii") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            if current == pid:
+                return None
+    return round(total_kb / 1024, 1)
+
+
+def memory_trend(samples: list[tuple[float, float]], warmup_s: float = 0.0) -> dict:
+    """
+    Тренд памяти по замерам (время, МБ).
+
+    Args:
+        samples: Замеры (секунды от старта, RSS в МБ).
+        warmup_s: Замеры до этого времени не учитываются (загрузка модели, кэши).
+
+    Returns:
+        Начало, конец, максимум, прирост и наклон (МБ в час, МНК).
+    """
+    points = [(t, v) for t, v in samples if t >= warmup_s] or samples
+    if not points:
+        return {"samples": 0}
+    result = {
+        "samples": len(points),
+        "start_mb": points[0][1],
+        "end_mb": points[-1][1],
+        "max_mb": max(v for _, v in points),
+        "growth_mb": round(points[-1][1] - points[0][1], 1),
+        "slope_mb_per_hour": None,
+    }
+    if len(points) > 2:
+        n = len(points)
+        mean_t = sum(t for t, _ in points) / n
+        mean_v = sum(v for _, v in points) / n
+        var_t = sum((t - mean_t) ** 2 for t, _ in points)
+        if var_t > 0:
+            slope = sum((t - mean_t) * (v - mean_v) for t, v in points) / var_t
+            result["slope_mb_per_hour"] = round(slope * 3600, 1)
+    return result
+
+
+class BackendClient:
+    """
+    Клиент backend: подключение с переподключением, запись событий.
+
+    Клиент "app" дополнительно раз в probe_interval отправляет
+    get_device_info и замеряет время ответа и состояние автомата.
+    Мониторы подписываются на события и проверяются на потери так же, как app.
+    """
+
+    def __init__(self, uri: str, name: str, probe_interval: float = 0.0, role: Optional[str] = None,
+                 batch: bool = False):
+        """
+        Инициализация клиента.
+
+        Args:
+            uri: Адрес WebSocket сервера Application.
+            name: Имя клиента (client_id).
+            role: Роль при регистрации (None - по имени).
+            probe_interval: Период опроса get_device_info (0 - без опроса).
+            batch: Запросить пакетную отправку событий (кадр - JSON массив).
+        """
+        self.uri = uri
+        self.name = name
+        self.probe_interval = probe_interval
+        self.role = role
+        self.batch = batch
+        self.frames = 0
+        self.seq: Optional[int] = None   # seq последнего device_info / device_info_delta
+        self.seq_gaps = 0
+        self._ws = None
+        self.events: list[tuple[float, str, dict]] = []
+        self.probe_rtts: list[float] = []
+        self.states: list[tuple[float, Optional[str]]] = []
+        self.disconnects = 0
+        self.connected = threading.Event()
+        self._probe_sent: Optional[float] = None
+
+    async def run(self, stop: threading.Event) -> None:
+        """Работать до stop, переподключаясь при обрыве."""
+        while not stop.is_set():
+            try:
+                async with websockets.connect(self.uri) as ws:
+                    registration = {"client_id": self.name}
+                    if self.role:
+                        registration["role"] = self.role
+                    if self.batch:
+                        registration["batch"] = True
+                    await ws.send(json.dumps(registration))
+                    self._ws = ws
+                    self.connected.set()
+                    tasks = [asyncio.create_task(self._receive(ws))]
+                    if self.probe_interval > 0:
+                        tasks.append(asyncio.create_task(self._probe(ws, stop)))
+                    while not stop.is_set() and not any(t.done() for t in tasks):
+                        await asyncio.sleep(0.1)
+                    for task in tasks:
+                        task.cancel()
+                    if stop.is_set():
+                        return
+            except (OSError, ConnectionClosed):
+                pass
+            if self.connected.is_set():
+                self.disconnects += 1
+                self.connected.clear()
+            await asyncio.sleep(0.5)
+
+    async def _receive(self, ws) -> None:
+        """Приём событий."""
+        async for message in ws:
+            now = time.monotonic()
+            try:
+                data = json.loads(message)
+            except json.JSONDecodeError:
+                continue
+            self.frames += 1
+            for item in data if isinstance(data, list) else [data]:
+                self._record(now, item)
+
+    def _record(self, now: float, data: dict) -> None:
+        """Записать одно событие."""
+        event = data.get("event")
+        if not event:
+            return
+        payload = data.get("data") or {}
+        self.events.append((now, event, payload))
+        if event == "device_info_delta":
+            seq = payload.get("seq")
+            if self.seq is not None and seq is not None and seq > self.seq + 1:
+                # Пропущена delta - ресинхронизация полным документом (команды принимаются от app)
+                self.seq_gaps += 1
+                if self.name == "app":
+                    asyncio.ensure_future(self._ws.send(json.dumps({"command": "get_device_info"})))
+            if seq is not None and (self.seq is None or seq > self.seq):
+                self.seq = seq
+        if event == "device_info":
+            self.seq = payload.get("seq", self.seq)
+            if self._probe_sent is not None:
+                self.probe_rtts.append((now - self._probe_sent) * 1000)
+                self._probe_sent = None
+            self.states.append((now, payload.get("state")))
+
+    async def _probe(self, ws, stop: threading.Event) -> None:
+        """Опрос состояния автомата."""
+        while not stop.is_set():
+            if self._probe_sent is not None:
+                # Прошлый опрос без ответа - автомат не в idle или завис
+                self.states.append((time.monotonic(), None))
+            self._probe_sent = time.monotonic()
+            await ws.send(json.dumps({"command": "get_device_info"}))
+            await asyncio.sleep(self.probe_interval)
+
+
+def account_events(results: list[dict], client: BackendClient) -> dict:
+    """
+    Сверить контейнеры симулятора ПЛК с событиями клиента app.
+
+    На каждый контейнер ожидаются container_detected и одно из
+    container_recognized / container_not_recognized.
+    """
+    counts = Counter(event for _, event, _ in client.events)
+    total = len(results)
+    outcomes = sum(counts[e] for e in OUTCOME_EVENTS)
+
+    # Задержка, видимая backend: container_detected → итоговое событие
+    latencies = []
+    detected_at = None
+    for at, event, _ in client.events:
+        if event == "container_detected":
+            detected_at = at
+        elif event in OUTCOME_EVENTS and detected_at is not None:
+            latencies.append((at - detected_at) * 1000)
+            detected_at = None
+
+    return {
+        "containers": total,
+        "events": {name: counts[name] for name in ("container_detected",) + OUTCOME_EVENTS},
+        "lost_detected": max(0, total - counts["container_detected"]),
+        "lost_outcome": max(0, total - outcomes),
+        "backend_latency_ms": distribution(latencies),
+    }
+
+
+def find_stuck(states: list[tuple[float, Optional[str]]], stuck_after: float) -> list[dict]:
+    """
+    Найти интервалы, когда автомат дольше stuck_after был не в idle
+    или не отвечал на опрос (state None).
+    """
+    incidents = []
+    since = None
+    state = None
+    for at, current in states + [(float("inf"), "idle")]:
+        if current != "idle":
+            if since is None:
+                since, state = at, current
+            continue
+        if since is not None and at - since >= stuck_after:
+            end = at if at != float("inf") else states[-1][0]
+            incidents.append({"state": state or "no_reply", "duration_s": round(end - since, 1)})
+        since = None
+    return incidents
+
+
+def fetch_metrics(port: int) -> dict:
+    """Снимок метрик сервиса (/metrics.json), пустой словарь при ошибке."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics.json", timeout=2) as response:
+            return json.loads(response.read())
+    except (OSError, ValueError):
+        return {}
+
+
+def _start(cmd: list[str], env: dict, log_path: Path) -> subprocess.Popen:
+    """Запустить сервис с логом в файл."""
+    log = log_path.open("w", encoding="utf-8")
+    return subprocess.Popen(cmd, env=env, stdout=log, stderr=subprocess.STDOUT,
+                            cwd=Path(__file__).resolve().parent.parent)
+
+
+def _stop(process: subprocess.Popen, timeout: float = 10.0) -> None:
+    """Остановить сервис: SIGINT, затем kill."""
+    if process.poll() is not None:
+        return
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def parse_args():
+    """Парсинг аргументов командной строки."""
+    parser = argparse.ArgumentParser(description="Сквозной нагрузочный прогон без оборудования")
+    parser.add_argument("--containers", type=int, default=1000, help="Контейнеров")
+    parser.add_argument("--rate", type=float, default=30.0, help="Контейнеров в минуту")
+    parser.add_argument("--mix", type=_parse_mix, default={"plastic": 1.0},
+                        help="Доли типов (stub отвечает STUB_CLASS, поэтому по умолчанию только plastic)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed сценария")
+    parser.add_argument("--clients", type=int, default=1, help="Клиентов backend (app и мониторы)")
+    parser.add_argument("--batch", action="store_true", help="Клиенты запрашивают пакетную отправку событий")
+    parser.add_argument("--backend", choices=("stub", "yolo"), default="stub", help="Движок vision")
+    parser.add_argument("--model", type=Path, help="Модель для yolo (ONNX/RKNN)")
+    parser.add_argument("--stub-latency-ms", type=float, default=150.0, help="Задержка stub движка")
+    parser.add_argument("--camera", choices=("synthetic", "images"), default="synthetic",
+                        help="Источник кадров vision")
+    parser.add_argument("--images", type=Path, default=Path("imgs"), help="Папка кадров для --camera images")
+    parser.add_argument("--ws-port", type=int, default=18765, help="Порт WebSocket Application")
+    parser.add_argument("--metrics-port", type=int, default=19108, help="Порт метрик Application")
+    parser.add_argument("--vision-metrics-port", type=int, default=19109, help="Порт метрик vision")
+    parser.add_argument("--workdir", type=Path, help="Папка логов и журнала (по умолчанию временная)")
+    parser.add_argument("--sample-interval", type=float, default=5.0, help="Период замера памяти (сек)")
+    parser.add_argument("--probe-interval", type=float, default=5.0, help="Период get_device_info (сек)")
+    parser.add_argument("--stuck-after", type=float, default=15.0, help="Порог зависания (сек)")
+    parser.add_argument("--warmup", type=float, default=60.0, help="Замеры памяти до этого времени не в тренде")
+    parser.add_argument("--startup-timeout", type=float, default=120.0, help="Ожидание запуска сервисов")
+    parser.add_argument("--max-lost", type=int, default=0, help="Допустимо потерянных событий")
+    parser.add_argument("--max-growth-mb", type=float, default=50.0, help="Допустимый рост памяти (МБ)")
+    parser.add_argument("--report", type=Path, help="Сохранить отчёт в JSON (по умолчанию в workdir)")
+    return parser.parse_args()
+
+
+def main():
+    """Точка входа."""
+    args = parse_args()
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="fandomat-soak-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    print(f"[Soak] Рабочая папка: {workdir}")
+
+    link = PtyLink(workdir / "ttyPLC")
+    env = dict(os.environ, PYTHONUNBUFFERED="1", WEBSOCKET_HOST="localhost", WEBSOCKET_PORT=str(args.ws_port))
+    app_env = dict(env, PLC_SERIAL_PORT=link.port, METRICS_PORT=str(args.metrics_port),
+                   JOURNAL_DIR=str(workdir / "journal"))
+    vision_env = dict(
+        env,
+        INFERENCE_BACKEND=args.backend,
+        STUB_CLASS="plastic",
+        STUB_LATENCY_MS=str(args.stub_latency_ms),
+        CAMERA_SOURCE=args.camera,
+        CAMERA_SOURCE_PATH=str(args.images.resolve()),
+        SAVE_FRAMES="false",
+        OUTPUT_DIR=str(workdir / "frames"),
+        VISION_METRICS_PORT=str(args.vision_metrics_port),
+    )
+    if args.model:
+        vision_env["MODEL_PATH"] = str(args.model.resolve())
+
+    application = _start([sys.executable, "-m", "plc.application"], app_env, workdir / "application.log")
+    vision = _start([sys.executable, "-m", "vision.inference_service"], vision_env, workdir / "vision.log")
+    processes = {"application": application, "vision": vision}
+
+    stop = threading.Event()
+    uri = f"ws://localhost:{args.ws_port}"
+    clients = [BackendClient(uri, "app", args.probe_interval, batch=args.batch)]
+    clients += [BackendClient(uri, f"soak-monitor-{i}", role="monitor", batch=args.batch)
+                for i in range(1, args.clients)]
+
+    def run_clients():
+        async def all_clients():
+            await asyncio.gather(*(client.run(stop) for client in clients))
+        asyncio.run(all_clients())
+
+    clients_thread = threading.Thread(target=run_clients, name="SoakClients", daemon=True)
+    clients_thread.start()
+
+    memory: dict[str, list[tuple[float, float]]] = {name: [] for name in processes}
+    started = time.monotonic()
+
+    def sample_memory():
+        while not stop.wait(args.sample_interval):
+            for name, process in processes.items():
+                rss = read_rss_mb(process.pid)
+                if rss is not None:
+                    memory[name].append((time.monotonic() - started, rss))
+
+    threading.Thread(target=sample_memory, name="SoakMemory", daemon=True).start()
+
+    master = RtuMaster(link.master_fd, slave=int(os.getenv("PLC_SLAVE_ADDRESS", "2")))
+    plc = SimulatedPlc(random_scenario(args.rate, args.containers, args.mix, args.seed))
+    elapsed = 0.0
+    try:
+        # Ждём Application (ответ по Modbus), клиента app и vision
+        deadline = time.monotonic() + args.startup_timeout
+        while True:
+            if any(p.poll() is not None for p in processes.values()):
+                print("[Soak] Сервис завершился при запуске, см. логи в рабочей папке")
+                sys.exit(1)
+            try:
+                master.read_registers(REG_CMD, 1)
+                ws_clients = fetch_metrics(args.metrics_port).get("fandomat_ws_clients", 0)
+                if clients[0].connected.is_set() and ws_clients >= len(clients) + 1:
+                    break
+            except ModbusError:
+                link.flush()
+            if time.monotonic() > deadline:
+                print("[Soak] Сервисы не запустились за отведённое время")
+                sys.exit(1)
+            time.sleep(0.5)
+        master.errors.clear()
+        master.latencies.clear()
+
+        print(f"[Soak] Сервисы готовы, контейнеров: {args.containers} ({args.rate}/мин)")
+        elapsed = run_simulation(master, plc, link=link, progress_s=30.0)
+
+        # Даём дойти последним событиям
+        time.sleep(3.0)
+    finally:
+        app_metrics = fetch_metrics(args.metrics_port)
+        vision_metrics = fetch_metrics(args.vision_metrics_port)
+        stop.set()
+        clients_thread.join(timeout=5)
+        crashed = {name: p.poll() for name, p in processes.items() if p.poll() is not None}
+        for process in processes.values():
+            _stop(process)
+        link.close()
+
+    app_client = clients[0]
+    events = account_events(plc.results, app_client)
+    stuck = find_stuck(app_client.states, args.stuck_after)
+    memory_summary = {name: memory_trend(samples, args.warmup) for name, samples in memory.items()}
+    report = {
+        "elapsed_s": round(elapsed, 1),
+        "crashed": crashed,
+        "plc": {
+            "containers": len(plc.results),
+            "per_min": round(len(plc.results) / elapsed * 60, 1) if elapsed else None,
+            "outcomes": dict(Counter(r["outcome"] for r in plc.results)),
+            "decision_ms": distribution([r["decision_ms"] for r in plc.results if "decision_ms" in r]),
+            "modbus_errors": dict(master.errors),
+            "modbus_latency_ms": {k: distribution(v) for k, v in sorted(master.latencies.items())},
+        },
+        "events": events,
+        "stuck": stuck,
+        "probe_rtt_ms": distribution(app_client.probe_rtts),
+        "clients": {
+            c.name: {
+                "events": len(c.events),
+                "frames": c.frames,
+                "seq_gaps": c.seq_gaps,
+                "disconnects": c.disconnects,
+                "lost": account_events(plc.results, c)["lost_outcome"],
+            }
+            for c in clients
+        },
+        "memory": memory_summary,
+        "application": {
+            "containers_total": app_metrics.get("fandomat_containers_total"),
+            "container_seconds": app_metrics.get("fandomat_container_seconds"),
+            "vision_reply_seconds": app_metrics.get("fandomat_vision_reply_seconds"),
+            "modbus_requests_total": app_metrics.get("fandomat_modbus_requests_total"),
+            "modbus_errors_total": app_metrics.get("fandomat_modbus_errors_total"),
+            "modbus_poll_gap_seconds": app_metrics.get("fandomat_modbus_poll_gap_seconds"),
+        },
+        "vision": {
+            "request_seconds": vision_metrics.get("fandomat_vision_request_seconds"),
+            "inference_seconds": vision_metrics.get("fandomat_inference_seconds"),
+        },
+    }
+
+    report_path = args.report or workdir / "soak_report.json"
+    report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    plc_summary = report["plc"]
+    print(f"[Soak] {report['elapsed_s']} сек, контейнеров {plc_summary['containers']} "
+          f"({plc_summary['per_min']}/мин), исходы ПЛК {plc_summary['outcomes']}")
+    print(f"[Soak] События app: {events['events']}, потеряно: detected {events['lost_detected']}, "
+          f"итог {events['lost_outcome']}")
+    for name, dist in (("решение Radxa", plc_summary["decision_ms"]),
+                       ("задержка backend", events["backend_latency_ms"]),
+                       ("ответ device_info", report["probe_rtt_ms"])):
+        if dist.get("count"):
+            print(f"    {name:<18} p50={dist['p50']} p90={dist['p90']} p99={dist['p99']} max={dist['max']} мс")
+    for name, trend in memory_summary.items():
+        if trend.get("samples"):
+            print(f"[Soak] Память {name}: {trend['start_mb']} → {trend['end_mb']} МБ "
+                  f"(max {trend['max_mb']}, {trend['slope_mb_per_hour']} МБ/ч)")
+    monitors_lost = {name: c["lost"] for name, c in report["clients"].items() if name != "app" and c["lost"]}
+    if monitors_lost:
+        print(f"[Soak] Потеряно мониторами: {monitors_lost}")
+    if stuck:
+        print(f"[Soak] Зависания: {stuck}")
+    if crashed:
+        print(f"[Soak] Сервисы завершились во время прогона: {crashed}")
+    print(f"[Soak] Отчёт: {report_path}")
+
+    lost = events["lost_detected"] + events["lost_outcome"] + sum(monitors_lost.values())
+    growth = max((t.get("growth_mb", 0) for t in memory_summary.values() if t.get("samples")), default=0)
+    if crashed or stuck or lost > args.max_lost or growth > args.max_growth_mb:
+        print("[Soak] ПРОВАЛ")
+        sys.exit(1)
+    print("[Soak] OK")
+
+
+if __name__ == "__main__":
+    main()
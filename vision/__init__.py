@@ -1,9 +1,18 @@
 """Vision модуль: камера, инференс, классификация."""
 
 from vision.camera_manager import CameraManager
+from vision.engine_pool import EnginePool, create_engine
 from vision.inference_engine import InferenceEngine
+from vision.stub_engine import StubEngine
 
-__all__ = ["CameraManager", "InferenceEngine", "InferenceClient"]
+__all__ = [
+    "CameraManager",
+    "EnginePool",
+    "InferenceEngine",
+    "StubEngine",
+    "create_engine",
+    "InferenceClient",
+]
 
 
 def __getattr__(name):
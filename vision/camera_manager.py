@@ -3,18 +3,27 @@ CameraManager - управление камерой с буферизацией
 
 Обеспечивает:
 - Открытие/закрытие камеры с retry
+- Источник кадров по настройкам: камера, видеофайл, папка кадров, синтетика
 - Фоновый захват кадров в кольцевой буфер
 - Thread-safe доступ к последнему кадру
+- Обрезку кадров по ROI (копируются только пиксели ROI)
 """
 import threading
 import time
 from collections import deque
 from typing import Optional
 
-import cv2
 import numpy as np
 
 from core.config import Settings
+from core.logging_config import get_logger, get_rate_limited_logger
+from core.metrics import get_registry
+from vision.frame_source import FrameSource, create_frame_source
+from vision.roi import crop_roi
+
+logger = get_logger(__name__)
+# Ошибки цикла захвата могут повторяться на каждом кадре
+frame_logger = get_rate_limited_logger(__name__, interval=5.0)
 
 
 class CameraManager:
@@ -40,12 +49,13 @@ class CameraManager:
             settings: Настройки приложения.
         """
         self._settings = settings
-        self._cap: Optional[cv2.VideoCapture] = None
+        self._source: Optional[FrameSource] = None
         self._is_open = False
 
         # Буфер кадров
         self._buffer: deque = deque(maxlen=settings.frame_buffer_size)
         self._buffer_lock = threading.Lock()
+        self._frame_ready = threading.Condition(self._buffer_lock)
 
         # Поток захвата
         self._capture_thread: Optional[threading.Thread] = None
@@ -56,6 +66,12 @@ class CameraManager:
         self._frames_captured = 0
         self._last_capture_time: Optional[float] = None
 
+        # Метрики захвата
+        registry = get_registry()
+        self._frames_metric = registry.counter("fandomat_camera_frames_total", "Захвачено кадров")
+        self._errors_metric = registry.counter("fandomat_camera_read_errors_total", "Ошибок чтения кадра")
+        self._read_seconds = registry.histogram("fandomat_camera_read_seconds", "Время чтения кадра с камеры")
+
     def open(self, camera_index: Optional[int] = None) -> bool:
         """
         Открыть камеру с retry при ошибке.
@@ -74,78 +90,60 @@ class CameraManager:
 
         for attempt in range(1, self._settings.retry_count + 1):
             try:
-                self._cap = cv2.VideoCapture(idx)
+                self._source = create_frame_source(self._settings, idx)
 
-                if not self._cap.isOpened():
-                    print(f"[CameraManager] Попытка {attempt}/{self._settings.retry_count}: "
-                          f"не удалось открыть камеру {idx}")
-                    self._cap.release()
-                    self._cap = None
+                if not self._source.open():
+                    logger.warning(f"Попытка {attempt}/{self._settings.retry_count}: "
+                                   f"не удалось открыть {self._source.describe()}")
+                    self._release_source()
                     time.sleep(self._settings.retry_delay)
                     continue
 
-                # Настройка камеры
-                fourcc = cv2.VideoWriter_fourcc(*self._settings.camera_fourcc)
-                self._cap.set(cv2.CAP_PROP_FOURCC, fourcc)
-                self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, self._settings.camera_width)
-                self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self._settings.camera_height)
-                self._cap.set(cv2.CAP_PROP_FPS, self._settings.camera_fps)
-
-                # Даем камере время на инициализацию
-                time.sleep(0.1)
-
                 # Проверка захвата тестового кадра (несколько попыток)
                 test_frame = None
                 for read_attempt in range(5):  # До 5 попыток захвата тестового кадра
-                    ret, test_frame = self._cap.read()
+                    ret, test_frame = self._source.read()
                     if ret and test_frame is not None and test_frame.size > 0:
                         break
                     time.sleep(0.1)  # Небольшая задержка между попытками
                 
                 if test_frame is None or test_frame.size == 0:
-                    print(f"[CameraManager] Попытка {attempt}/{self._settings.retry_count}: "
-                          f"не удалось захватить тестовый кадр (индекс {idx})")
-                    self._cap.release()
-                    self._cap = None
+                    logger.warning(f"Попытка {attempt}/{self._settings.retry_count}: "
+                                   f"не удалось захватить тестовый кадр ({self._source.describe()})")
+                    self._release_source()
                     time.sleep(self._settings.retry_delay)
                     continue
 
                 # Успешно
-                actual_width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                actual_height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                actual_fps = self._cap.get(cv2.CAP_PROP_FPS)
-                if actual_fps <= 0:
-                    actual_fps = self._settings.camera_fps
-
-                print(f"[CameraManager] Камера открыта: {actual_width}x{actual_height} @ {actual_fps:.1f} fps")
+                logger.info(f"Камера открыта: {self._source.describe()}")
                 self._is_open = True
                 return True
 
+            except ValueError as e:
+                # Некорректный CAMERA_SOURCE - повтор не поможет
+                logger.error(f"Ошибка конфигурации камеры: {e}")
+                return False
+
             except Exception as e:
-                print(f"[CameraManager] Попытка {attempt}/{self._settings.retry_count}: ошибка - {e}")
-                if self._cap:
-                    self._cap.release()
-                    self._cap = None
+                logger.warning(f"Попытка {attempt}/{self._settings.retry_count}: ошибка - {e}")
+                self._release_source()
                 time.sleep(self._settings.retry_delay)
 
-        print(f"[CameraManager] Не удалось открыть камеру после {self._settings.retry_count} попыток")
+        logger.error(f"Не удалось открыть камеру после {self._settings.retry_count} попыток")
         return False
 
     def close(self) -> None:
         """Закрыть камеру и освободить ресурсы."""
         self.stop_capture()
-
-        if self._cap:
-            self._cap.release()
-            self._cap = None
+        self._release_source()
 
         self._is_open = False
         self._clear_buffer()
-        print("[CameraManager] Камера закрыта")
+        logger.info("Камера закрыта")
 
     def is_open(self) -> bool:
         """Проверить, открыта ли камера."""
-        return self._is_open and self._cap is not None and self._cap.isOpened()
+        return self._is_open and self._source is not None and self._source.is_opened()
 
     def start_capture(self) -> bool:
         """
@@ -155,7 +153,7 @@ class CameraManager:
             True если поток запущен, False если камера не открыта.
         """
         if not self.is_open():
-            print("[CameraManager] Невозможно запустить захват: камера не открыта")
+            logger.error("Невозможно запустить захват: камера не открыта")
             return False
 
         if self._capture_running:
@@ -169,7 +167,7 @@ class CameraManager:
             daemon=True
         )
         self._capture_thread.start()
-        print("[CameraManager] Фоновый захват запущен")
+        logger.info("Фоновый захват запущен")
         return True
 
     def stop_capture(self) -> None:
@@ -184,37 +182,77 @@ class CameraManager:
             self._capture_thread.join(timeout=2.0)
 
         self._capture_thread = None
-        print(f"[CameraManager] Фоновый захват остановлен (захвачено кадров: {self._frames_captured})")
+        logger.info(f"Фоновый захват остановлен (захвачено кадров: {self._frames_captured})")
 
-    def get_frame(self) -> Optional[np.ndarray]:
+    def get_frame(self, full: bool = False) -> Optional[np.ndarray]:
         """
         Получить последний захваченный кадр из буфера.
 
+        Args:
+            full: Вернуть полный кадр без обрезки по ROI.
+
         Returns:
             Кадр как numpy array или None если буфер пуст.
         """
         with self._buffer_lock:
             if not self._buffer:
                 return None
-            return self._buffer[-1].copy()
+            return self._crop(self._buffer[-1], full).copy()
 
-    def get_frame_with_timestamp(self) -> tuple[Optional[np.ndarray], Optional[float]]:
+    def get_frame_with_timestamp(self, full: bool = False) -> tuple[Optional[np.ndarray], Optional[float]]:
         """
         Получить последний кадр и время его захвата.
 
+        Args:
+            full: Вернуть полный кадр без обрезки по ROI.
+
         Returns:
             Кортеж (кадр, timestamp) или (None, None).
         """
         with self._buffer_lock:
             if not self._buffer:
                 return None, None
-            return self._buffer[-1].copy(), self._last_capture_time
+            return self._crop(self._buffer[-1], full).copy(), self._last_capture_time
+
+    def wait_for_frame(
+        self,
+        newer_than: Optional[float] = None,
+        timeout: float = 1.0,
+        full: bool = False,
+    ) -> tuple[Optional[np.ndarray], Optional[float]]:
+        """
+        Дождаться кадра, захваченного позже newer_than.
+
+        Используется при захвате серии кадров, чтобы не брать один
+        и тот же кадр из буфера несколько раз.
+
+        Args:
+            newer_than: Время захвата предыдущего кадра (None - любой кадр).
+            timeout: Максимальное время ожидания (секунды).
+            full: Вернуть полный кадр без обрезки по ROI.
 
-    def capture_single_frame(self) -> Optional[np.ndarray]:
+        Returns:
+            Кортеж (кадр, timestamp) или (None, None) при таймауте.
+        """
+        deadline = time.monotonic() + timeout
+        with self._frame_ready:
+            while not self._buffer or (
+                newer_than is not None and self._last_capture_time <= newer_than
+            ):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._capture_running:
+                    return None, None
+                self._frame_ready.wait(remaining)
+            return self._crop(self._buffer[-1], full).copy(), self._last_capture_time
+
+    def capture_single_frame(self, full: bool = False) -> Optional[np.ndarray]:
         """
         Захватить один кадр напрямую (без буфера).
         Полезно когда фоновый захват не запущен.
 
+        Args:
+            full: Вернуть полный кадр без обрезки по ROI.
+
         Returns:
             Кадр или None при ошибке.
         """
@@ -222,11 +260,11 @@ class CameraManager:
             return None
 
         try:
-            ret, frame = self._cap.read()
+            ret, frame = self._source.read()
             if ret and frame is not None:
-                return frame.copy()
+                return self._crop(frame, full).copy()
         except Exception as e:
-            print(f"[CameraManager] Ошибка при захвате кадра: {e}")
+            frame_logger.warning("Ошибка при захвате кадра: %s", e)
 
         return None
 
@@ -248,16 +286,18 @@ class CameraManager:
 
         while self._capture_running and not self._capture_stop_event.is_set():
             try:
-                if not self._cap or not self._cap.isOpened():
-                    print("[CameraManager] Камера отключена, останавливаем захват")
+                if not self._source or not self._source.is_opened():
+                    logger.warning("Камера отключена, останавливаем захват")
                     break
 
-                ret, frame = self._cap.read()
+                read_start = time.perf_counter()
+                ret, frame = self._source.read()
 
                 if not ret or frame is None:
+                    self._errors_metric.inc()
                     consecutive_failures += 1
                     if consecutive_failures >= max_failures:
-                        print(f"[CameraManager] Слишком много ошибок захвата ({max_failures}), останавливаем")
+                        logger.error("Слишком много ошибок захвата (%d), останавливаем", max_failures)
                         break
                     time.sleep(0.01)
                     continue
@@ -269,11 +309,14 @@ class CameraManager:
                 with self._buffer_lock:
                     self._buffer.append(frame)
                     self._last_capture_time = capture_time
+                    self._frame_ready.notify_all()
 
                 self._frames_captured += 1
+                self._frames_metric.inc()
+                self._read_seconds.observe(time.perf_counter() - read_start)
 
             except Exception as e:
-                print(f"[CameraManager] Ошибка в цикле захвата: {e}")
+                frame_logger.warning("Ошибка в цикле захвата: %s", e)
                 consecutive_failures += 1
                 if consecutive_failures >= max_failures:
                     break
@@ -281,6 +324,18 @@ class CameraManager:
 
         self._capture_running = False
 
+    def _release_source(self) -> None:
+        """Освободить источник кадров."""
+        if self._source:
+            self._source.release()
+            self._source = None
+
+    def _crop(self, frame: np.ndarray, full: bool) -> np.ndarray:
+        """Обрезать кадр по ROI из настроек (view, без копирования)."""
+        if full:
+            return frame
+        return crop_roi(frame, self._settings.roi)
+
     def _clear_buffer(self) -> None:
         """Очистить буфер кадров."""
         with self._buffer_lock:
@@ -0,0 +1,283 @@
+"""
+EnginePool - пул движков инференса.
+
+Обеспечивает:
+- N экземпляров модели, каждый в своём рабочем потоке
+- Привязку потока к ядру CPU и экземпляра RKNN к ядру NPU
+- Диспетчеризацию round_robin или least_loaded
+- Тот же интерфейс, что у InferenceEngine (predict блокирующий)
+- Горячую замену модели сразу во всех экземплярах (swap_model)
+"""
+import dataclasses
+import itertools
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+from core.config import Settings
+from core.logging_config import get_logger
+from vision.inference_engine import InferenceEngine
+from vision.model_swap import ModelSwapError, validate_model
+from vision.stub_engine import StubEngine
+
+logger = get_logger(__name__)
+
+# Фабрики движков по значению INFERENCE_BACKEND
+ENGINE_BACKENDS: dict[str, Callable] = {
+    "yolo": InferenceEngine,
+    "stub": StubEngine,
+}
+
+_STOP = object()
+
+
+def create_engine(settings: Settings):
+    """
+    Создать движок инференса по настройкам.
+
+    Args:
+        settings: Настройки приложения (inference_backend, engine_pool_size,
+            inference_isolation).
+
+    Returns:
+        InferenceWorkerProcess при inference_isolation,
+        EnginePool при engine_pool_size > 1,
+        иначе InferenceEngine/StubEngine.
+    """
+    if settings.inference_isolation:
+        from vision.worker_process import InferenceWorkerProcess
+        return InferenceWorkerProcess(settings)
+    if settings.engine_pool_size > 1:
+        return EnginePool(settings)
+    factory = ENGINE_BACKENDS.get(settings.inference_backend, InferenceEngine)
+    return factory(settings)
+
+
+class _EngineWorker:
+    """Рабочий поток с собственным экземпляром модели."""
+
+    def __init__(self, index: int, engine, cpu_core: Optional[int], npu_core: Optional[int]):
+        self.index = index
+        self.engine = engine
+        self.cpu_core = cpu_core
+        self.npu_core = npu_core
+        self.queue: queue.Queue = queue.Queue()
+        self.busy = 0
+        self.processed = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def load(self) -> int:
+        """Текущая нагрузка: задачи в очереди + в работе."""
+        return self.queue.qsize() + self.busy
+
+    def start(self) -> None:
+        """Запустить рабочий поток."""
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"EnginePool-{self.index}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Остановить рабочий поток."""
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        """Цикл рабочего потока."""
+        self._pin_cpu()
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            frame, future = item
+            self.busy += 1
+            try:
+                # self.engine читается на каждый кадр - swap_model подменяет его атомарно
+                future.set_result(self.engine.predict(frame))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self.busy -= 1
+                self.processed += 1
+
+    def _pin_cpu(self) -> None:
+        """Привязать поток к ядру CPU (Linux, 0 - текущий поток)."""
+        if self.cpu_core is None or not hasattr(os, "sched_setaffinity"):
+            return
+        try:
+            os.sched_setaffinity(0, {self.cpu_core})
+            logger.debug(f"Воркер {self.index}: привязан к CPU {self.cpu_core}")
+        except OSError as e:
+            logger.warning(f"Воркер {self.index}: не удалось привязать к CPU {self.cpu_core}: {e}")
+
+
+class EnginePool:
+    """
+    Пул из N движков инференса.
+
+    Использование:
+        pool = EnginePool(settings)
+        pool.load_model()
+        pool.warmup()
+
+        class_name, confidence = pool.predict(frame)   # из любого потока
+        future = pool.submit(frame)                    # асинхронно
+    """
+
+    POLICIES = ("round_robin", "least_loaded")
+
+    def __init__(
+        self,
+        settings: Settings,
+        size: Optional[int] = None,
+        policy: Optional[str] = None,
+        engine_factory: Optional[Callable] = None,
+    ):
+        """
+        Инициализация пула.
+
+        Args:
+            settings: Настройки приложения.
+            size: Количество экземпляров (по умолчанию engine_pool_size).
+            policy: Политика диспетчеризации (по умолчанию engine_pool_policy).
+            engine_factory: Фабрика движка (settings, npu_core=...) - для тестов.
+        """
+        self._settings = settings
+        self.size = max(1, size if size is not None else settings.engine_pool_size)
+        self.policy = policy or settings.engine_pool_policy
+        if self.policy not in self.POLICIES:
+            logger.warning(f"Неизвестная политика пула '{self.policy}', используется least_loaded")
+            self.policy = "least_loaded"
+
+        factory = engine_factory or ENGINE_BACKENDS.get(settings.inference_backend, InferenceEngine)
+        self._factory = factory
+        cpu_cores = settings.engine_cpu_cores
+        npu_cores = settings.engine_npu_cores
+
+        self._workers = []
+        for i in range(self.size):
+            npu_core = npu_cores[i % len(npu_cores)] if npu_cores else None
+            cpu_core = cpu_cores[i % len(cpu_cores)] if cpu_cores else None
+            engine = factory(settings, npu_core=npu_core)
+            self._workers.append(_EngineWorker(i, engine, cpu_core, npu_core))
+
+        self._rr = itertools.cycle(range(self.size))
+        self._dispatch_lock = threading.Lock()
+        self._started = False
+
+    def load_model(self) -> bool:
+        """Загрузить модель во все экземпляры."""
+        logger.info(f"Пул движков: {self.size} экземпляров, политика {self.policy}")
+        return all(w.engine.load_model() for w in self._workers)
+
+    def warmup(self, runs: Optional[int] = None) -> bool:
+        """Прогреть все экземпляры и запустить рабочие потоки."""
+        if not all(w.engine.warmup(runs) for w in self._workers):
+            return False
+        if not self._started:
+            for worker in self._workers:
+                worker.start()
+            self._started = True
+        return True
+
+    def is_ready(self) -> bool:
+        """Пул готов, если запущен и все экземпляры готовы."""
+        return self._started and all(w.engine.is_ready() for w in self._workers)
+
+    def preprocess(self, frame: np.ndarray) -> np.ndarray:
+        """Препроцессинг не зависит от экземпляра модели."""
+        return self._workers[0].engine.preprocess(frame)
+
+    def submit(self, frame: np.ndarray) -> Future:
+        """
+        Поставить кадр на инференс.
+
+        Returns:
+            Future с кортежем (class_name, confidence).
+        """
+        future: Future = Future()
+        if not self._started:
+            future.set_result(("NONE", 0.0))
+            return future
+        self._select_worker().queue.put((frame, future))
+        return future
+
+    def predict(self, frame: np.ndarray) -> tuple[str, float]:
+        """Выполнить предсказание (блокирующий вызов)."""
+        return self.submit(frame).result()
+
+    @property
+    def model_path(self) -> Path:
+        """Путь к текущей модели."""
+        return Path(self._settings.model_path)
+
+    def swap_model(self, model_path: Path) -> None:
+        """
+        Загрузить новую модель во все экземпляры и подменить их разом.
+
+        Новые экземпляры загружаются и прогреваются, пока старые обслуживают
+        запросы. Если хотя бы один не загрузился, подмена отменяется целиком.
+
+        Raises:
+            ModelSwapError: модель не прошла проверку или не загрузилась.
+        """
+        model_path = Path(model_path)
+        validate_model(model_path, InferenceEngine.CLASS_MAPPING)
+
+        settings = dataclasses.replace(self._settings, model_path=model_path)
+        candidates = []
+        for worker in self._workers:
+            engine = self._factory(settings, npu_core=worker.npu_core)
+            candidates.append(engine)
+            if not (engine.load_model() and engine.warmup()):
+                for candidate in candidates:
+                    candidate.release()
+                raise ModelSwapError("model_load_failed",
+                                     f"Экземпляр {worker.index}: не удалось загрузить {model_path}")
+
+        with self._dispatch_lock:
+            old_engines = [worker.engine for worker in self._workers]
+            for worker, engine in zip(self._workers, candidates):
+                worker.engine = engine
+            self._settings = settings
+        # Запросы, уже взятые рабочими потоками, завершаются на старых экземплярах
+        for engine in old_engines:
+            engine.release()
+        logger.info(f"Пул движков: модель заменена на {model_path}")
+
+    def close(self) -> None:
+        """Остановить рабочие потоки."""
+        for worker in self._workers:
+            worker.stop()
+        self._started = False
+
+    def stats(self) -> list[dict]:
+        """Нагрузка и количество обработанных кадров по экземплярам."""
+        return [
+            {
+                "index": w.index,
+                "cpu_core": w.cpu_core,
+                "queue_depth": w.queue.qsize(),
+                "busy": w.busy,
+                "processed": w.processed,
+            }
+            for w in self._workers
+        ]
+
+    def _select_worker(self) -> _EngineWorker:
+        """Выбрать экземпляр по политике диспетчеризации."""
+        with self._dispatch_lock:
+            if self.policy == "round_robin":
+                return self._workers[next(self._rr)]
+            return min(self._workers, key=lambda w: w.load)
@@ -0,0 +1,370 @@
+"""
+Frame source - источники кадров для CameraManager.
+
+Обеспечивает:
+- V4L2Source: USB камера через cv2.VideoCapture (рабочий режим)
+- VideoFileSource: видеофайл по кругу
+- ImageDirSource: папка кадров (imgs/, real_time/) по кругу
+- SyntheticSource: детерминированные сгенерированные кадры
+- Выдачу кадров с заданной частотой (read блокируется, как у камеры)
+
+Источники без камеры позволяют измерить захват и конвейер
+capture → inference на любой Linux машине и в тестах.
+
+Использование:
+    source = create_frame_source(settings)   # CAMERA_SOURCE=v4l2|video|images|synthetic
+    if source.open():
+        ok, frame = source.read()
+        source.release()
+"""
+import time
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from core.config import Settings
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Расширения кадров для ImageDirSource
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class _Pacer:
+    """
+    Ограничение частоты выдачи кадров.
+
+    Если потребитель отстал больше чем на период, расписание сдвигается
+    (кадры пропускаются, как у камеры), а не выдаются пачкой.
+    """
+
+    def __init__(self, fps: float):
+        self._period = 1.0 / fps if fps > 0 else 0.0
+        self._next: Optional[float] = None
+
+    def wait(self) -> None:
+        """Дождаться времени следующего кадра."""
+        if not self._period:
+            return
+        now = time.monotonic()
+        if self._next is None or now - self._next > self._period:
+            self._next = now
+        elif self._next > now:
+            time.sleep(self._next - now)
+        self._next += self._period
+
+
+class FrameSource:
+    """
+    Базовый источник кадров (интерфейс в духе cv2.VideoCapture).
+
+    read() блокируется до следующего кадра и возвращает (ok, frame).
+    """
+
+    def open(self) -> bool:
+        """Открыть источник. Возвращает True при успехе."""
+        raise NotImplementedError
+
+    def read(self) -> tuple[bool, Optional[np.ndarray]]:
+        """Прочитать следующий кадр (BGR)."""
+        raise NotImplementedError
+
+    def release(self) -> None:
+        """Освободить ресурсы."""
+
+    def is_opened(self) -> bool:
+        """Проверить, открыт ли источник."""
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        """Описание источника для логов."""
+        return type(self).__name__
+
+
+class V4L2Source(FrameSource):
+    """USB камера (V4L2) через cv2.VideoCapture."""
+
+    def __init__(self, index: int, width: int, height: int, fps: int, fourcc: str = "MJPG"):
+        """
+        Инициализация источника.
+
+        Args:
+            index: Индекс камеры (/dev/videoN).
+            width: Запрашиваемая ширина кадра.
+            height: Запрашиваемая высота кадра.
+            fps: Запрашиваемая частота кадров.
+            fourcc: Формат потока камеры.
+        """
+        self.index = index
+        self._width = width
+        self._height = height
+        self._fps = fps
+        self._fourcc = fourcc
+        self._cap: Optional[cv2.VideoCapture] = None
+
+    def open(self) -> bool:
+        """Открыть камеру и задать формат, разрешение и частоту кадров."""
+        self._cap = cv2.VideoCapture(self.index)
+        if not self._cap.isOpened():
+            self.release()
+            return False
+
+        self._cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self._fourcc))
+        self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, self._width)
+        self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self._height)
+        self._cap.set(cv2.CAP_PROP_FPS, self._fps)
+
+        # Даем камере время на инициализацию
+        time.sleep(0.1)
+        return True
+
+    def read(self) -> tuple[bool, Optional[np.ndarray]]:
+        """Прочитать кадр с камеры."""
+        if self._cap is None:
+            return False, None
+        return self._cap.read()
+
+    def release(self) -> None:
+        """Закрыть камеру."""
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def is_opened(self) -> bool:
+        """Проверить, открыта ли камера."""
+        return self._cap is not None and self._cap.isOpened()
+
+    def describe(self) -> str:
+        """Фактические разрешение и частота кадров камеры."""
+        if self._cap is None:
+            return f"камера {self.index}"
+        width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = self._cap.get(cv2.CAP_PROP_FPS)
+        if fps <= 0:
+            fps = self._fps
+        return f"камера {self.index}: {width}x{height} @ {fps:.1f} fps"
+
+
+class VideoFileSource(FrameSource):
+    """Видеофайл, воспроизводимый по кругу с заданной частотой."""
+
+    def __init__(self, path: Path, fps: float = 0.0, loop: bool = True):
+        """
+        Инициализация источника.
+
+        Args:
+            path: Путь к видеофайлу.
+            fps: Частота выдачи кадров. 0 - частота из файла.
+            loop: Начинать сначала по окончании файла.
+        """
+        self.path = Path(path)
+        self._fps = fps
+        self._loop = loop
+        self._cap: Optional[cv2.VideoCapture] = None
+        self._pacer: Optional[_Pacer] = None
+
+    def open(self) -> bool:
+        """Открыть видеофайл."""
+        if not self.path.is_file():
+            logger.warning(f"Видеофайл не найден: {self.path}")
+            return False
+        self._cap = cv2.VideoCapture(str(self.path))
+        if not self._cap.isOpened():
+            self.release()
+            return False
+        if self._fps <= 0:
+            self._fps = self._cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self._pacer = _Pacer(self._fps)
+        return True
+
+    def read(self) -> tuple[bool, Optional[np.ndarray]]:
+        """Следующий кадр файла (после последнего - снова первый)."""
+        if self._cap is None:
+            return False, None
+        self._pacer.wait()
+        ok, frame = self._cap.read()
+        if not ok and self._loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._cap.read()
+        return ok, frame
+
+    def release(self) -> None:
+        """Закрыть файл."""
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def is_opened(self) -> bool:
+        """Проверить, открыт ли файл."""
+        return self._cap is not None and self._cap.isOpened()
+
+    def describe(self) -> str:
+        """Путь и частота выдачи."""
+        return f"видео {self.path} @ {self._fps:.1f} fps"
+
+
+class ImageDirSource(FrameSource):
+    """
+    Папка кадров, выдаваемых по кругу с заданной частотой.
+
+    Кадры декодируются при чтении (как MJPG поток камеры), поэтому
+    время read() сопоставимо с реальной камерой, а память не растёт
+    с размером папки.
+    """
+
+    def __init__(self, directory: Path, fps: float = 30.0, loop: bool = True):
+        """
+        Инициализация источника.
+
+        Args:
+            directory: Папка с кадрами (сортируются по имени).
+            fps: Частота выдачи кадров. 0 - без ограничения.
+            loop: Начинать сначала после последнего кадра.
+        """
+        self.directory = Path(directory)
+        self._fps = fps
+        self._loop = loop
+        self._paths: list[Path] = []
+        self._position = 0
+        self._pacer = _Pacer(fps)
+
+    def open(self) -> bool:
+        """Найти кадры в папке."""
+        if not self.directory.is_dir():
+            logger.warning(f"Папка кадров не найдена: {self.directory}")
+            return False
+        self._paths = sorted(
+            p for p in self.directory.iterdir()
+            if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+        )
+        self._position = 0
+        return bool(self._paths)
+
+    def read(self) -> tuple[bool, Optional[np.ndarray]]:
+        """Следующий кадр папки (повреждённые файлы пропускаются)."""
+        for _ in range(len(self._paths)):
+            if self._position >= len(self._paths):
+                if not self._loop:
+                    return False, None
+                self._position = 0
+            path = self._paths[self._position]
+            self._position += 1
+
+            self._pacer.wait()
+            frame = cv2.imread(str(path))
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def release(self) -> None:
+        """Сбросить список кадров."""
+        self._paths = []
+
+    def is_opened(self) -> bool:
+        """Проверить, есть ли кадры."""
+        return bool(self._paths)
+
+    def describe(self) -> str:
+        """Папка, количество кадров и частота выдачи."""
+        return f"кадры {self.directory} ({len(self._paths)} шт.) @ {self._fps:.1f} fps"
+
+
+class SyntheticSource(FrameSource):
+    """
+    Сгенерированные кадры: фиксированный шумовой фон и движущийся
+    прямоугольник с номером кадра. Последовательность одинакова
+    при одинаковом seed.
+    """
+
+    def __init__(self, width: int, height: int, fps: float = 30.0, seed: int = 0):
+        """
+        Инициализация источника.
+
+        Args:
+            width: Ширина кадра.
+            height: Высота кадра.
+            fps: Частота выдачи кадров. 0 - без ограничения.
+            seed: Seed генератора фона.
+        """
+        self._width = width
+        self._height = height
+        self._fps = fps
+        self._seed = seed
+        self._background: Optional[np.ndarray] = None
+        self._index = 0
+        self._pacer = _Pacer(fps)
+
+    def open(self) -> bool:
+        """Сгенерировать фон."""
+        rng = np.random.default_rng(self._seed)
+        self._background = rng.integers(0, 64, size=(self._height, self._width, 3), dtype=np.uint8)
+        self._index = 0
+        return True
+
+    def read(self) -> tuple[bool, Optional[np.ndarray]]:
+        """Следующий кадр последовательности."""
+        if self._background is None:
+            return False, None
+        self._pacer.wait()
+
+        frame = self._background.copy()
+        size = max(8, min(self._width, self._height) // 4)
+        span = max(1, self._width - size)
+        x = (self._index * max(1, self._width // 100)) % span
+        y = (self._height - size) // 2
+        cv2.rectangle(frame, (x, y), (x + size, y + size), (200, 200, 200), -1)
+        cv2.putText(frame, str(self._index), (x + 4, y + size // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                    max(0.5, size / 100), (0, 0, 255), 2)
+        self._index += 1
+        return True, frame
+
+    def release(self) -> None:
+        """Освободить фон."""
+        self._background = None
+
+    def is_opened(self) -> bool:
+        """Проверить, сгенерирован ли фон."""
+        return self._background is not None
+
+    def describe(self) -> str:
+        """Разрешение и частота выдачи."""
+        return f"синтетика {self._width}x{self._height} @ {self._fps:.1f} fps"
+
+
+# Значения CAMERA_SOURCE
+FRAME_SOURCES = ("v4l2", "video", "images", "synthetic")
+
+
+def create_frame_source(settings: Settings, camera_index: Optional[int] = None) -> FrameSource:
+    """
+    Создать источник кадров по настройкам.
+
+    Args:
+        settings: Настройки приложения (camera_source, camera_source_path,
+            camera_width/height/fps/fourcc).
+        camera_index: Индекс камеры для v4l2. None - из настроек.
+
+    Returns:
+        Источник кадров (не открытый).
+
+    Raises:
+        ValueError: неизвестный CAMERA_SOURCE или не задан CAMERA_SOURCE_PATH.
+    """
+    kind = settings.camera_source
+    if kind == "v4l2":
+        index = camera_index if camera_index is not None else settings.camera_index
+        return V4L2Source(index, settings.camera_width, settings.camera_height,
+                          settings.camera_fps, settings.camera_fourcc)
+    if kind == "synthetic":
+        return SyntheticSource(settings.camera_width, settings.camera_height, settings.camera_fps)
+    if kind in ("video", "images"):
+        if settings.camera_source_path is None:
+            raise ValueError(f"CAMERA_SOURCE={kind} требует CAMERA_SOURCE_PATH")
+        if kind == "video":
+            return VideoFileSource(settings.camera_source_path, settings.camera_fps)
+        return ImageDirSource(settings.camera_source_path, settings.camera_fps)
+    raise ValueError(f"Неизвестный CAMERA_SOURCE: {kind} (допустимо: {', '.join(FRAME_SOURCES)})")
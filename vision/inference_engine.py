@@ -5,15 +5,22 @@ InferenceEngine - обёртка над YOLO моделью для класси
 - Загрузку модели один раз при старте
 - Прогрев модели для стабильного времени инференса
 - Единый интерфейс для предсказаний
+- Отдельный препроцессинг (для конвейера vision.pipeline)
+- Горячую замену модели без остановки сервиса (swap_model)
 """
+import dataclasses
+import threading
 import time
 from pathlib import Path
 from typing import Optional
 
+import cv2
 import numpy as np
 
 from core.config import Settings
 from core.logging_config import get_logger
+from core.metrics import get_registry
+from vision.model_swap import ModelSwapError, validate_class_names, validate_model
 
 logger = get_logger(__name__)
 
@@ -37,16 +44,26 @@ class InferenceEngine:
         "FOREIGN": "none",
     }
 
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, npu_core: Optional[int] = None):
         """
         Инициализация движка.
 
         Args:
             settings: Настройки приложения.
+            npu_core: Ядро NPU RK3588 (0-2) для RKNN модели. None - выбор драйвера.
         """
         self._settings = settings
+        self._npu_core = npu_core
         self._model = None
         self._is_ready = False
+        # Запросы в работе по моделям: старая модель освобождается после последнего
+        self._inflight_lock = threading.Lock()
+        self._inflight: dict[int, int] = {}
+        self._retired: dict[int, object] = {}
+
+        registry = get_registry()
+        self._predict_seconds = registry.histogram("fandomat_inference_seconds", "Время инференса модели")
+        self._predict_errors = registry.counter("fandomat_inference_errors_total", "Ошибок инференса")
 
     def load_model(self) -> bool:
         """
@@ -93,6 +110,10 @@ class InferenceEngine:
 
         warmup_runs = runs if runs is not None else self._settings.warmup_runs
         if warmup_runs <= 0:
+            if self._npu_core is not None:
+                # RKNN runtime создаётся ultralytics при первом predict
+                logger.warning("Привязка к ядру NPU %d не применена: прогрев отключён (WARMUP_RUNS=0)",
+                               self._npu_core)
             self._is_ready = True
             return True
 
@@ -110,6 +131,9 @@ class InferenceEngine:
 
                 logger.debug(f"Прогрев #{i}: {elapsed_ms:.1f} мс")
 
+            if self._npu_core is not None:
+                self._pin_npu_core()
+
             self._is_ready = True
             logger.info("Прогрев завершён, модель готова")
             return True
@@ -118,6 +142,35 @@ class InferenceEngine:
             logger.error(f"Ошибка при прогреве: {e}")
             return False
 
+    def preprocess(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Привести кадр к квадрату image_size.
+
+        Повторяет classify-трансформ ultralytics (resize по короткой стороне
+        + center crop), поэтому predict() на результате даёт тот же ответ,
+        а сама модель получает кадр без повторного ресайза.
+
+        Args:
+            frame: Изображение как numpy array (BGR формат).
+
+        Returns:
+            Изображение image_size x image_size (BGR).
+        """
+        imgsz = self._settings.image_size
+        h, w = frame.shape[:2]
+        if h == imgsz and w == imgsz:
+            return frame
+
+        scale = imgsz / min(h, w)
+        new_w = max(imgsz, round(w * scale))
+        new_h = max(imgsz, round(h * scale))
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=interpolation)
+
+        top = (new_h - imgsz) // 2
+        left = (new_w - imgsz) // 2
+        return resized[top:top + imgsz, left:left + imgsz]
+
     def predict(self, frame: np.ndarray) -> tuple[str, float]:
         """
         Выполнить предсказание для кадра.
@@ -130,20 +183,36 @@ class InferenceEngine:
             - class_name: "PET", "CAN" или "NONE"
             - confidence: уверенность предсказания (0.0 - 1.0)
         """
-        if not self._is_ready or self._model is None:
+        # Локальная ссылка: swap_model может подменить модель во время вызова
+        with self._inflight_lock:
+            model = self._model
+            if not self._is_ready or model is None:
+                model = None
+            else:
+                self._inflight[id(model)] = self._inflight.get(id(model), 0) + 1
+        if model is None:
             logger.warning("Модель не готова к инференсу")
             return "NONE", 0.0
 
+        try:
+            return self._predict(model, frame)
+        finally:
+            self._finish_request(model)
+
+    def _predict(self, model, frame: np.ndarray) -> tuple[str, float]:
+        """Предсказание на конкретной модели (см. predict)."""
         try:
             start = time.perf_counter()
 
-            results = self._model.predict(
+            results = model.predict(
                 source=frame,
                 imgsz=self._settings.image_size,
                 verbose=False
             )
 
-            elapsed_ms = (time.perf_counter() - start) * 1000
+            elapsed = time.perf_counter() - start
+            elapsed_ms = elapsed * 1000
+            self._predict_seconds.observe(elapsed)
 
             if not results:
                 logger.warning("Пустой результат предсказания")
@@ -156,10 +225,11 @@ class InferenceEngine:
             # Маппинг на выходные значения
             class_name = self.CLASS_MAPPING.get(raw_class_name.upper(), "NONE")
 
-            logger.debug(f"Предсказание: {class_name} ({confidence:.3f}) за {elapsed_ms:.1f} мс")
+            logger.debug("Предсказание: %s (%.3f) за %.1f мс", class_name, confidence, elapsed_ms)
             return class_name, confidence
 
         except Exception as e:
+            self._predict_errors.inc()
             logger.error(f"Ошибка при предсказании: {e}")
             return "NONE", 0.0
 
@@ -167,6 +237,148 @@ class InferenceEngine:
         """Проверить, готова ли модель к инференсу."""
         return self._is_ready and self._model is not None
 
+    @property
+    def model_path(self) -> Path:
+        """Путь к текущей модели."""
+        return Path(self._settings.model_path)
+
+    def swap_model(self, model_path: Path) -> None:
+        """
+        Загрузить и прогреть новую модель, затем подменить текущую.
+
+        Пока новая модель загружается, predict() продолжает работать на старой.
+        Подмена - замена ссылки, поэтому запросы, уже начатые на старой
+        модели, завершаются на ней; RKNN runtime старой модели освобождается
+        после последнего такого запроса.
+
+        Args:
+            model_path: Путь к новой модели.
+
+        Raises:
+            ModelSwapError: модель не прошла проверку классов или не загрузилась.
+                Текущая модель при этом остаётся в работе.
+        """
+        model_path = Path(model_path)
+        validate_model(model_path, self.CLASS_MAPPING)
+
+        candidate = InferenceEngine(
+            dataclasses.replace(self._settings, model_path=model_path),
+            npu_core=self._npu_core,
+        )
+        if not candidate.load_model():
+            raise ModelSwapError("model_load_failed", f"Не удалось загрузить {model_path}")
+
+        try:
+            # Классы загруженной модели (могут отличаться от metadata.yaml рядом)
+            names = getattr(candidate._model, "names", None)
+            if names:
+                validate_class_names(names.values() if isinstance(names, dict) else names, self.CLASS_MAPPING)
+
+            if not candidate.warmup():
+                raise ModelSwapError("model_warmup_failed", f"Не удалось прогреть {model_path}")
+        except ModelSwapError:
+            candidate.release()
+            raise
+
+        with self._inflight_lock:
+            old = self._model
+            self._model, self._settings = candidate._model, candidate._settings
+            self._is_ready = True
+        logger.info(f"Модель заменена: {model_path}")
+        if old is not None:
+            self._retire(old)
+
+    def release(self) -> None:
+        """Освободить текущую модель (после завершения запросов, уже начатых на ней)."""
+        with self._inflight_lock:
+            model, self._model = self._model, None
+            self._is_ready = False
+        if model is not None:
+            self._retire(model)
+
+    def _retire(self, model) -> None:
+        """Освободить модель сразу или после последнего запроса на ней."""
+        with self._inflight_lock:
+            if self._inflight.get(id(model)):
+                self._retired[id(model)] = model
+                return
+        self._release_model(model)
+
+    def _finish_request(self, model) -> None:
+        """Завершить запрос; выведенная из работы модель освобождается последним запросом."""
+        with self._inflight_lock:
+            count = self._inflight[id(model)] - 1
+            if count:
+                self._inflight[id(model)] = count
+                return
+            del self._inflight[id(model)]
+            retired = self._retired.pop(id(model), None)
+        if retired is not None:
+            self._release_model(retired)
+
+    @staticmethod
+    def _release_model(model) -> None:
+        """Освободить RKNN runtime модели (NPU память и контекст); PyTorch/ONNX - сборщик мусора."""
+        backend = getattr(getattr(model, "predictor", None), "model", None)
+        runtime = getattr(backend, "rknn_model", None)
+        if runtime is None:
+            return
+        try:
+            runtime.release()
+            logger.info("RKNN runtime предыдущей модели освобождён")
+        except Exception as e:
+            logger.warning(f"Не удалось освободить RKNN runtime: {e}")
+
+    def _pin_npu_core(self) -> bool:
+        """
+        Перезапустить RKNN runtime на заданном ядре NPU.
+
+        ultralytics создаёт RKNNLite без core_mask при первом predict,
+        поэтому после прогрева runtime пересоздаётся с нужной маской.
+        Runtime берётся из predictor.model.rknn_model (AutoBackend
+        ultralytics) - это не публичный API: если структура другая,
+        привязка не применяется, о чём пишется предупреждение.
+
+        Returns:
+            True если runtime привязан к ядру.
+        """
+        predictor = getattr(self._model, "predictor", None)
+        backend = getattr(predictor, "model", None)
+        if predictor is None or backend is None:
+            logger.warning("Привязка к ядру NPU %d не применена: predictor ultralytics не создан",
+                           self._npu_core)
+            return False
+        if getattr(backend, "rknn_model", None) is None:
+            logger.warning("Привязка к ядру NPU %d не применена: backend %s не RKNN",
+                           self._npu_core, type(backend).__name__)
+            return False
+        if self._npu_core not in (0, 1, 2):
+            logger.warning("Привязка к ядру NPU %d не применена: у RK3588 ядра 0-2", self._npu_core)
+            return False
+
+        rknn_file = next(Path(self._settings.model_path).rglob("*.rknn"), None)
+        if rknn_file is None:
+            logger.warning("Привязка к ядру NPU %d не применена: .rknn файл не найден в %s",
+                           self._npu_core, self._settings.model_path)
+            return False
+
+        try:
+            from rknnlite.api import RKNNLite
+
+            masks = [RKNNLite.NPU_CORE_0, RKNNLite.NPU_CORE_1, RKNNLite.NPU_CORE_2]
+            runtime = RKNNLite()
+            runtime.load_rknn(str(rknn_file))
+            if runtime.init_runtime(core_mask=masks[self._npu_core]) != 0:
+                raise RuntimeError("init_runtime вернул ошибку")
+        except Exception as e:
+            logger.warning("Привязка к ядру NPU %d не применена: %s", self._npu_core, e)
+            return False
+
+        backend.rknn_model.release()
+        backend.rknn_model = runtime
+        logger.info("RKNN runtime привязан к ядру NPU %d", self._npu_core)
+        return True
+
     @staticmethod
     def _get_top1(result) -> tuple[int, float]:
         """
@@ -7,6 +7,7 @@ Inference Service - WebSocket клиент для классификации о
     Получение "bottle_exist" → выполнение инференса → отправка "bottle" или "bank"
     Получение "bank_exist" → выполнение инференса → отправка "bottle" или "bank"
     Получение "none" → отправка "none"
+    Получение {"command": "reload_model", "model_path": "..."} → горячая замена модели
 
 Использование:
     python inference_service.py              # Запуск WebSocket клиента
@@ -18,7 +19,9 @@ import base64
 import json
 import os
 import sys
+import threading
 import time
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
@@ -33,7 +36,12 @@ from websockets.exceptions import ConnectionClosed
 
 from vision.camera_manager import CameraManager
 from core.config import Settings, get_settings
+from core.metrics import MetricsServer, get_registry
+from vision.engine_pool import create_engine
 from vision.inference_engine import InferenceEngine
+from vision.model_swap import ModelSwapError, ModelWatcher
+from vision.pipeline import Pipeline, Stage
+from vision.worker_process import WorkerUnavailableError
 from core.logging_config import get_logger, setup_logging
 
 # Инициализация логирования
@@ -61,9 +69,43 @@ class InferenceClient:
         """
         self._settings = settings
         self._camera = CameraManager(settings)
-        self._engine = InferenceEngine(settings)
+        self._engine = create_engine(settings)
         self._running = False
         self._websocket = None
+        self._pending_tasks: set[asyncio.Task] = set()
+
+        # Конвейер классификации: capture → preprocess → infer → postprocess.
+        # Очередь capture не ограничена: серия кадров ставится целиком,
+        # backpressure действует между последующими стадиями.
+        queue_size = settings.pipeline_queue_size
+        self._pipeline = Pipeline([
+            Stage("capture", self._stage_capture, maxsize=0),
+            Stage("preprocess", self._stage_preprocess, maxsize=queue_size),
+            Stage("infer", self._stage_infer, maxsize=queue_size,
+                  workers=max(1, settings.engine_pool_size)),
+            Stage("postprocess", self._stage_postprocess, maxsize=queue_size),
+        ])
+        # Кодирование фото - отдельный поток, параллельно с инференсом
+        self._photo_pipeline = Pipeline([
+            Stage("encode", self._stage_encode_photo, maxsize=queue_size),
+        ])
+        self._last_frame_time: Optional[float] = None
+
+        # Горячая замена модели: одна замена за раз
+        self._swap_lock = threading.Lock()
+
+        # Метрики запросов классификации
+        self._metrics = get_registry()
+        self._request_seconds = self._metrics.histogram(
+            "fandomat_vision_request_seconds", "Время обработки запроса классификации")
+        self._metrics_server: Optional[MetricsServer] = None
+        self._model_watcher: Optional[ModelWatcher] = None
+        if settings.model_watch:
+            self._model_watcher = ModelWatcher(
+                Path(settings.model_path).parent,
+                self.reload_model,
+                interval=settings.model_watch_interval,
+            )
 
     def initialize(self) -> bool:
         """
@@ -84,6 +126,14 @@ class InferenceClient:
         if self._settings.save_frames:
             self._settings.output_dir.mkdir(parents=True, exist_ok=True)
 
+        self._pipeline.start()
+        self._photo_pipeline.start()
+        if self._model_watcher:
+            self._model_watcher.start()
+        if self._settings.metrics_port:
+            self._metrics_server = MetricsServer(self._metrics, self._settings.metrics_port)
+            self._metrics_server.start()
+
         logger.info("Инициализация завершена")
         return True
 
@@ -110,23 +160,27 @@ class InferenceClient:
                     # Открываем камеру и запускаем захват (с попыткой разных индексов)
                     if not self._camera.is_open():
                         camera_opened = False
-                        camera_idx_used = None
-                        # Пробуем разные индексы камеры
-                        for camera_idx in range(5):  # Пробуем индексы 0-4
+                        # Индексы перебираются только для USB камеры; видео, папка
+                        # кадров и синтетика открываются по настройкам
+                        if self._settings.camera_source == "v4l2":
+                            camera_indexes = range(5)  # Пробуем индексы 0-4
+                        else:
+                            camera_indexes = [None]
+                        for camera_idx in camera_indexes:
                             logger.debug(f"Попытка открыть камеру с индексом {camera_idx}...")
                             if self._camera.open(camera_index=camera_idx):
                                 camera_opened = True
-                                camera_idx_used = camera_idx
-                                # Обновляем индекс в настройках для дальнейшего использования
-                                self._settings.camera_index = camera_idx
-                                logger.info(f"Камера успешно открыта с индексом {camera_idx}")
+                                if camera_idx is not None:
+                                    # Обновляем индекс в настройках для дальнейшего использования
+                                    self._settings.camera_index = camera_idx
+                                    logger.info(f"Камера успешно открыта с индексом {camera_idx}")
                                 break
                             else:
                                 # Сбрасываем состояние камеры перед следующей попыткой
                                 self._camera.close()
 
                         if not camera_opened:
-                            logger.error("Не удалось открыть камеру ни с одним индексом (0-4)")
+                            logger.error(f"Не удалось открыть камеру (CAMERA_SOURCE={self._settings.camera_source})")
                             await asyncio.sleep(self._settings.websocket_reconnect_delay)
                             continue
 
@@ -138,7 +192,9 @@ class InferenceClient:
 
                     logger.info("Камера открыта, захват запущен")
 
-                    # Основной цикл обработки сообщений
+                    # Основной цикл обработки сообщений. Задача последнего
+                    # ответа: следующий ответ отправляется только после неё
+                    last_reply: Optional[asyncio.Task] = None
                     while self._running:
                         try:
                             # Получаем сообщение от сервера
@@ -147,9 +203,13 @@ class InferenceClient:
                                 timeout=1.0
                             )
                             
-                            response = await self._handle_message(message)
-                            if response:
-                                await websocket.send(response)
+                            # Каждое сообщение - отдельная задача: get_photo
+                            # обрабатывается параллельно с инференсом, но
+                            # ответы уходят в порядке запросов
+                            task = asyncio.create_task(self._respond(websocket, message, last_reply))
+                            last_reply = task
+                            self._pending_tasks.add(task)
+                            task.add_done_callback(self._pending_tasks.discard)
 
                         except asyncio.TimeoutError:
                             # Таймаут - это нормально, продолжаем слушать
@@ -179,6 +239,29 @@ class InferenceClient:
         """Остановить клиент."""
         self._running = False
 
+    async def _respond(self, websocket, message: str, previous: Optional[asyncio.Task] = None) -> None:
+        """
+        Обработать сообщение и отправить ответ (если он есть).
+
+        Сервер сопоставляет ответы vision с запросами по порядку, поэтому
+        ответ отправляется только после ответа на предыдущее сообщение.
+
+        Args:
+            websocket: Соединение с сервером.
+            message: Сообщение от сервера.
+            previous: Задача ответа на предыдущее сообщение этого соединения.
+        """
+        try:
+            response = await self._handle_message(message)
+            if previous is not None:
+                await asyncio.wait({previous})
+            if response:
+                await websocket.send(response)
+        except ConnectionClosed:
+            logger.warning("Соединение закрыто до отправки ответа")
+        except Exception as e:
+            logger.error(f"Ошибка обработки сообщения: {e}")
+
     async def _handle_message(self, message: str) -> Optional[str]:
         """
         Обработка сообщения от сервера.
@@ -186,6 +269,7 @@ class InferenceClient:
         Поддерживает форматы:
         - Строки: "bottle_exist", "bank_exist", "none"
         - JSON: {"command": "get_photo"}
+        - JSON: {"command": "bottle_exist", "trace_id": "..."}
 
         Args:
             message: Сообщение от сервера.
@@ -193,16 +277,33 @@ class InferenceClient:
         Returns:
             Ответ клиенту или None если ответ не требуется.
         """
-        logger.debug(f"Получено сообщение: {message}")
+        logger.debug("Получено сообщение: %s", message)
 
         # Попытка парсинга JSON команды
         try:
             data = json.loads(message)
             command = data.get("command")
 
+            if command in ("bottle_exist", "bank_exist"):
+                # Запрос с trace_id: ответ JSON с метками времени стадий
+                return await self._handle_inference(trace_id=data.get("trace_id"))
+
             if command == "get_photo":
                 return await self._handle_get_photo()
 
+            if command == "get_pipeline_stats":
+                return json.dumps(self.pipeline_stats())
+
+            if command == "get_metrics":
+                return json.dumps({"metrics": self._metrics.snapshot()})
+
+            if command == "reload_model":
+                # Загрузка в потоке: инференс продолжается на текущей модели
+                result = await asyncio.to_thread(self.reload_model, data.get("model_path"))
+                if data.get("request_id"):
+                    result["request_id"] = data["request_id"]  # Ответ забирается по request_id
+                return json.dumps(result)
+
             logger.warning(f"Неизвестная JSON команда: {command}")
             return json.dumps({"error": "unknown_command"})
 
@@ -218,73 +319,207 @@ class InferenceClient:
         if message in ("bottle_exist", "bank_exist"):
             return await self._handle_inference()
 
-        logger.debug(f"Неизвестное сообщение: {message}")
+        logger.debug("Неизвестное сообщение: %s", message)
         return None
 
-    async def _handle_inference(self) -> str:
+    async def _handle_inference(self, trace_id: Optional[str] = None) -> str:
         """
-        Выполнить мульти-инференс (3 кадра) и вернуть результат по большинству.
+        Выполнить мульти-инференс (inference_frames кадров) и вернуть результат по большинству.
+
+        Кадры серии проходят через конвейер: препроцессинг кадра k+1
+        выполняется параллельно с инференсом кадра k.
+
+        Args:
+            trace_id: Идентификатор трассы Application. Если задан, ответ - JSON
+                с результатом, уверенностью и метками времени стадий.
 
         Returns:
-            "bottle", "bank" или "none".
+            "plastic", "aluminum" или "none".
+            Если инференс недоступен (воркер перезапускается) -
+            JSON {"result": "none", "error_code": "..."}.
+            С trace_id - JSON {"result": ..., "trace_id": ..., "confidence": ..., "trace": {...}}.
         """
-        # Фиксируем время начала распознавания
-       
-        
+        received_at = time.time()
         if not self._camera.is_open():
             logger.warning("Камера не открыта")
-            return "none"
+            return self._inference_reply("none", trace_id=trace_id, received_at=received_at)
+
+        num_frames = max(1, self._settings.inference_frames)
+        futures = [self._pipeline.submit({"index": i + 1}) for i in range(num_frames)]
+        outcomes = await asyncio.gather(
+            *(asyncio.wrap_future(f) for f in futures),
+            return_exceptions=True,
+        )
 
-        num_frames = 1#3
         results = []
         confidences = []
-
-        for i in range(num_frames):
-            # Получаем кадр
-            frame = self._camera.get_frame()
-            if frame is None:
-                frame = self._camera.capture_single_frame()
-                if frame is None:
-                    logger.warning(f"Не удалось получить кадр {i+1}/{num_frames}")
-                    continue
-
-            # Сохраняем кадр если нужно
-            if self._settings.save_frames:
-                self._save_frame(frame, suffix=f"_inf{i+1}")
-
-            # Выполняем инференс
-            inference_start_time = time.time()
-            class_name, confidence = self._engine.predict(frame)
-            inference_delta_ms = (time.time() - inference_start_time) * 1000
-            print(f"[TIMING] Дельта распознавания: {inference_delta_ms:.2f}")
-
-            # Маппим результат
-            if class_name == "plastic":
-                result = "plastic"
-            elif class_name == "aluminum":
-                result = "aluminum"
-            else:
-                result = "none"
-
-            results.append(result)
-            confidences.append(confidence)
-            logger.debug(f"Кадр {i+1}/{num_frames}: {class_name} ({confidence:.3f}) -> {result}")
+        captured = []
+        error_code = None
+        for i, outcome in enumerate(outcomes, 1):
+            if isinstance(outcome, Exception):
+                logger.warning(f"Кадр {i}/{num_frames}: {outcome}")
+                if isinstance(outcome, WorkerUnavailableError):
+                    error_code = outcome.error_code
+                continue
+            results.append(outcome["result"])
+            confidences.append(outcome["confidence"])
+            captured.append(outcome["captured_at"])
+
+        # Суммарное время стадий конвейера по всем кадрам серии
+        stages = Counter()
+        for future in futures:
+            stages.update(future.job.timings)
 
         if not results:
             logger.warning("Не удалось получить ни одного кадра")
-            return "none"
+            return self._inference_reply("none", error_code=error_code, trace_id=trace_id,
+                                         received_at=received_at, stages=stages)
 
         # Голосование по большинству
-        from collections import Counter
         vote_counts = Counter(results)
         final_result, count = vote_counts.most_common(1)[0]
         avg_confidence = sum(confidences) / len(confidences)
 
-        # Вычисляем дельту времени между запросом и завершением распознавания
-        
+        logger.info("Итог: %s (голосов: %d/%d, средняя уверенность: %.3f)",
+                    final_result, count, len(results), avg_confidence)
+        return self._inference_reply(final_result, confidence=avg_confidence, trace_id=trace_id,
+                                     received_at=received_at, captured_at=min(captured), stages=stages)
+
+    def _inference_reply(
+        self,
+        result: str,
+        confidence: float = 0.0,
+        error_code: Optional[str] = None,
+        trace_id: Optional[str] = None,
+        received_at: Optional[float] = None,
+        captured_at: Optional[float] = None,
+        stages: Optional[dict] = None,
+    ) -> str:
+        """
+        Сформировать ответ на запрос классификации.
+
+        Без trace_id и error_code - строка результата (исходный протокол).
+        """
+        if received_at is not None:
+            self._request_seconds.observe(time.time() - received_at)
+        self._metrics.counter("fandomat_vision_requests_total", "Запросов классификации",
+                              result=error_code or result).inc()
+        if trace_id is None and error_code is None:
+            return result
+
+        reply = {"result": result}
+        if error_code:
+            reply["error_code"] = error_code
+        if trace_id is not None:
+            reply["trace_id"] = trace_id
+            reply["confidence"] = round(confidence, 4)
+            reply["trace"] = {
+                "received_at": received_at,
+                "frame_captured_at": captured_at,
+                "replied_at": time.time(),
+                "stages": {name: round(ms, 3) for name, ms in (stages or {}).items()},
+            }
+        return json.dumps(reply)
+
+    # === СТАДИИ КОНВЕЙЕРА (выполняются в потоках vision.pipeline) ===
+
+    def _stage_capture(self, item: dict) -> dict:
+        """Стадия capture: получить новый кадр (не повторяя предыдущий)."""
+        frame, captured_at = self._camera.wait_for_frame(
+            newer_than=self._last_frame_time,
+            timeout=1.0 / max(1, self._settings.camera_fps) * 3,
+        )
+        if frame is None:
+            # Нового кадра нет - последний из буфера со своим временем захвата
+            frame, captured_at = self._camera.get_frame_with_timestamp()
+        if frame is None:
+            frame = self._camera.capture_single_frame()
+            captured_at = time.time()
+        if frame is None:
+            raise RuntimeError("frame_capture_failed")
+
+        self._last_frame_time = captured_at
+        item["frame"] = frame
+        item["captured_at"] = captured_at
+        return item
+
+    def _stage_preprocess(self, item: dict) -> dict:
+        """Стадия preprocess: привести кадр ко входу модели."""
+        item["input"] = self._engine.preprocess(item["frame"])
+        return item
+
+    def _stage_infer(self, item: dict) -> dict:
+        """Стадия infer: инференс модели."""
+        item["class_name"], item["confidence"] = self._engine.predict(item.pop("input"))
+        return item
+
+    def _stage_postprocess(self, item: dict) -> dict:
+        """Стадия postprocess: маппинг результата и сохранение кадра."""
+        class_name = item["class_name"]
+        if class_name in ("plastic", "aluminum"):
+            item["result"] = class_name
+        else:
+            item["result"] = "none"
+
+        # Сохранение кадра перекрывается с инференсом следующего кадра
+        if self._settings.save_frames:
+            self._save_frame(item["frame"], suffix=f"_inf{item['index']}")
+        item.pop("frame", None)
+
+        logger.debug("Кадр %d: %s (%.3f) -> %s", item["index"], class_name, item["confidence"], item["result"])
+        return item
+
+    def _stage_encode_photo(self, frame) -> str:
+        """Стадия encode: JPEG + base64 для get_photo."""
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if not ok:
+            raise RuntimeError("encoding_failed")
+        return base64.b64encode(buffer).decode('utf-8')
+
+    def pipeline_stats(self) -> dict:
+        """Статистика конвейеров (глубина очередей и время обслуживания стадий)."""
+        stats = {
+            "pipeline": self._pipeline.stats(),
+            "photo": self._photo_pipeline.stats(),
+            "frames_captured": self._camera.frames_captured,
+        }
+        if hasattr(self._engine, "stats"):
+            stats["engines"] = self._engine.stats()
+        return stats
+
+    def reload_model(self, model_path=None) -> dict:
+        """
+        Горячая замена модели (из потока, не из event loop).
+
+        Новая модель проверяется по metadata.yaml, загружается и прогревается,
+        пока текущая обслуживает запросы, затем подменяется между запросами.
 
-        logger.info(f"Итог: {final_result} (голосов: {count}/{len(results)}, средняя уверенность: {avg_confidence:.3f})")
-        return final_result
+        Args:
+            model_path: Путь к новой модели. None - перезагрузить текущую.
+
+        Returns:
+            {"model_reload": "ok", "model_path": ..., "elapsed_s": ...} или
+            {"model_reload": "failed", "model_path": ..., "error_code": ..., "message": ...}.
+        """
+        path = Path(model_path) if model_path else Path(self._settings.model_path)
+        if not self._swap_lock.acquire(blocking=False):
+            return {"model_reload": "failed", "model_path": str(path), "error_code": "model_swap_in_progress"}
+
+        try:
+            logger.info(f"Замена модели: {self._settings.model_path} → {path}")
+            start = time.perf_counter()
+            self._engine.swap_model(path)
+            elapsed = time.perf_counter() - start
+        except ModelSwapError as e:
+            logger.error(f"Замена модели отменена ({e.error_code}): {e}")
+            return {"model_reload": "failed", "model_path": str(path),
+                    "error_code": e.error_code, "message": str(e)}
+        finally:
+            self._swap_lock.release()
+
+        self._settings.model_path = path
+        logger.info(f"Модель {path} в работе (замена за {elapsed:.1f} сек)")
+        return {"model_reload": "ok", "model_path": str(path), "elapsed_s": round(elapsed, 2)}
 
     async def _handle_get_photo(self) -> str:
         """
@@ -299,10 +534,10 @@ class InferenceClient:
             logger.warning("Камера не открыта")
             return json.dumps({"error": "camera_unavailable"})
 
-        # Получаем кадр
-        frame = self._camera.get_frame()
+        # Получаем кадр (полный, без ROI - фото используется и для калибровки ROI)
+        frame = self._camera.get_frame(full=True)
         if frame is None:
-            frame = self._camera.capture_single_frame()
+            frame = self._camera.capture_single_frame(full=True)
             if frame is None:
                 logger.warning("Не удалось получить кадр для get_photo")
                 return json.dumps({"error": "frame_capture_failed"})
@@ -310,10 +545,9 @@ class InferenceClient:
         # Сохраняем фото в папку для тестирования
         saved_path = self._save_frame(frame, suffix="_get_photo")
 
-        # Кодируем в JPEG и base64
+        # Кодируем в JPEG и base64 (в потоке конвейера фото)
         try:
-            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            photo_b64 = base64.b64encode(buffer).decode('utf-8')
+            photo_b64 = await asyncio.wrap_future(self._photo_pipeline.submit(frame))
 
             return json.dumps({
                 "photo_base64": photo_b64,
@@ -340,7 +574,7 @@ class InferenceClient:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
             filename = self._settings.output_dir / f"{timestamp}{suffix}.jpg"
             cv2.imwrite(str(filename), frame)
-            logger.debug(f"Сохранено: {filename}")
+            logger.debug("Сохранено: %s", filename)
 
             # Ротация: удаляем самые старые файлы при превышении лимита
             self._rotate_saved_frames()
@@ -369,12 +603,20 @@ class InferenceClient:
                         old_file.unlink()
                     except OSError as e:
                         logger.warning(f"Не удалось удалить старый файл {old_file}: {e}")
-                logger.debug(f"Ротация: удалено {overflow} старых кадров")
+                logger.debug("Ротация: удалено %d старых кадров", overflow)
         except Exception as e:
             logger.warning(f"Ошибка при ротации кадров: {e}")
 
     def _cleanup(self) -> None:
         """Освободить ресурсы."""
+        if self._model_watcher:
+            self._model_watcher.stop()
+        if self._metrics_server:
+            self._metrics_server.stop()
+        self._pipeline.stop()
+        self._photo_pipeline.stop()
+        if hasattr(self._engine, "close"):
+            self._engine.close()
         self._camera.stop_capture()
         self._camera.close()
         logger.info("Остановлен")
@@ -421,13 +663,13 @@ def run_interactive_camera(settings: Settings) -> None:
                     continue
 
                 class_name, confidence = engine.predict(frame)
-                logger.info(f"Результат: {class_name} ({confidence:.3f})")
+                logger.info("Результат: %s (%.3f)", class_name, confidence)
 
                 # Сохраняем кадр
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 filename = settings.output_dir / f"{timestamp}_{class_name}.jpg"
                 cv2.imwrite(str(filename), frame)
-                logger.debug(f"Сохранено: {filename}")
+                logger.debug("Сохранено: %s", filename)
             else:
                 print("Неизвестная команда. Используйте 'c' или 'q'")
 
@@ -0,0 +1,220 @@
+"""
+Model swap - проверка новой модели и отслеживание папки весов.
+
+Обеспечивает:
+- Чтение имён классов из metadata.yaml экспортированной модели
+- Проверку, что классы модели известны сервису (до подмены модели)
+- ModelWatcher: опрос папки весов и вызов перезагрузки при появлении
+  или изменении папки модели (после того как файлы перестали меняться)
+"""
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+from core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+METADATA_FILE = "metadata.yaml"
+
+
+class ModelSwapError(RuntimeError):
+    """Новая модель не прошла проверку или не загрузилась - подмена отменена."""
+
+    def __init__(self, error_code: str, message: str = ""):
+        super().__init__(message or error_code)
+        self.error_code = error_code
+
+
+def metadata_path(model_path: Path) -> Path:
+    """Путь к metadata.yaml: внутри папки модели или рядом с файлом модели."""
+    model_path = Path(model_path)
+    if model_path.is_dir():
+        return model_path / METADATA_FILE
+    return model_path.parent / METADATA_FILE
+
+
+def read_class_names(model_path: Path) -> list[str]:
+    """
+    Прочитать имена классов из metadata.yaml.
+
+    Args:
+        model_path: Папка модели (или файл модели).
+
+    Returns:
+        Имена классов в порядке индексов.
+
+    Raises:
+        ModelSwapError: модель или metadata.yaml не найдены, формат некорректен.
+    """
+    import yaml
+
+    model_path = Path(model_path)
+    if not model_path.exists():
+        raise ModelSwapError("model_not_found", f"Модель не найдена: {model_path}")
+
+    path = metadata_path(model_path)
+    if not path.is_file():
+        raise ModelSwapError("metadata_missing", f"Нет {METADATA_FILE}: {path}")
+
+    try:
+        metadata = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    except (OSError, yaml.YAMLError) as e:
+        raise ModelSwapError("metadata_invalid", f"Ошибка чтения {path}: {e}")
+
+    task = metadata.get("task")
+    if task is not None and task != "classify":
+        raise ModelSwapError("metadata_invalid", f"Модель для задачи '{task}', нужна classify")
+
+    names = metadata.get("names")
+    if isinstance(names, dict):
+        try:
+            names = [names[k] for k in sorted(names, key=int)]
+        except (TypeError, ValueError):
+            names = None
+    if not isinstance(names, list) or not names:
+        raise ModelSwapError("metadata_invalid", f"В {path} нет списка классов (names)")
+    return [str(name) for name in names]
+
+
+def validate_class_names(names, class_mapping: dict) -> None:
+    """
+    Проверить, что сервис умеет интерпретировать все классы модели.
+
+    Все классы должны быть в class_mapping, и модель должна уметь
+    выдавать каждый распознаваемый тип (все значения маппинга кроме "none").
+
+    Raises:
+        ModelSwapError: unknown_classes или missing_classes.
+    """
+    upper = {str(name).upper() for name in names}
+    unknown = sorted(upper - set(class_mapping))
+    if unknown:
+        raise ModelSwapError("unknown_classes", f"Неизвестные классы модели: {', '.join(unknown)}")
+
+    produced = {class_mapping[name] for name in upper}
+    missing = sorted(set(class_mapping.values()) - produced - {"none"})
+    if missing:
+        raise ModelSwapError("missing_classes", f"Модель не распознаёт: {', '.join(missing)}")
+
+
+def validate_model(model_path: Path, class_mapping: dict) -> list[str]:
+    """
+    Проверить модель по metadata.yaml до загрузки.
+
+    Returns:
+        Имена классов модели.
+
+    Raises:
+        ModelSwapError: модель не прошла проверку.
+    """
+    names = read_class_names(model_path)
+    validate_class_names(names, class_mapping)
+    return names
+
+
+class ModelWatcher:
+    """
+    Опрос папки весов в фоновом потоке.
+
+    Папка модели - поддиректория с metadata.yaml. Если такая папка
+    появилась или изменилась и два опроса подряд не менялась
+    (копирование завершено), вызывается callback(path).
+
+    Использование:
+        watcher = ModelWatcher(Path("weights"), on_model_changed, interval=2.0)
+        watcher.start()
+        ...
+        watcher.stop()
+    """
+
+    def __init__(self, directory: Path, callback: Callable[[Path], None], interval: float = 2.0):
+        """
+        Инициализация наблюдателя.
+
+        Args:
+            directory: Папка весов.
+            callback: Вызывается с путём изменившейся папки модели.
+            interval: Период опроса (секунды).
+        """
+        self._directory = Path(directory)
+        self._callback = callback
+        self._interval = interval
+        self._known: dict[Path, tuple] = {}
+        self._pending: dict[Path, tuple] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Запомнить текущее состояние папки и запустить опрос."""
+        if self._thread is not None:
+            return
+        self._known = self._scan()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ModelWatcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Отслеживание моделей в {self._directory} (каждые {self._interval} сек)")
+
+    def stop(self) -> None:
+        """Остановить опрос."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self._interval + 1.0)
+            self._thread = None
+
+    def poll(self) -> list[Path]:
+        """
+        Один опрос папки.
+
+        Returns:
+            Папки моделей, изменения в которых завершены (callback уже вызван).
+        """
+        current = self._scan()
+        ready = []
+        for path, signature in current.items():
+            if self._known.get(path) == signature:
+                self._pending.pop(path, None)
+                continue
+            if self._pending.get(path) == signature:
+                # Не менялась с прошлого опроса - копирование завершено
+                self._pending.pop(path)
+                self._known[path] = signature
+                ready.append(path)
+            else:
+                self._pending[path] = signature
+
+        for path in list(self._known):
+            if path not in current:
+                del self._known[path]
+
+        for path in ready:
+            logger.info(f"Обнаружена новая модель: {path}")
+            try:
+                self._callback(path)
+            except Exception as e:
+                logger.error(f"Ошибка обработки новой модели {path}: {e}")
+        return ready
+
+    def _run(self) -> None:
+        """Цикл опроса."""
+        while not self._stop.wait(self._interval):
+            self.poll()
+
+    def _scan(self) -> dict[Path, tuple]:
+        """Сигнатуры папок моделей: (имя, размер, mtime) всех файлов."""
+        models = {}
+        if not self._directory.is_dir():
+            return models
+        for path in self._directory.iterdir():
+            if not (path / METADATA_FILE).is_file():
+                continue
+            try:
+                signature = tuple(sorted(
+                    (str(f.relative_to(path)), f.stat().st_size, f.stat().st_mtime_ns)
+                    for f in path.rglob("*") if f.is_file()
+                ))
+            except OSError:
+                # Файл удалён во время обхода - повторим на следующем опросе
+                continue
+            models[path] = signature
+        return models
@@ -0,0 +1,226 @@
+"""
+Pipeline - конвейер обработки кадров со стадиями в отдельных потоках.
+
+Обеспечивает:
+- Стадии (capture → preprocess → infer → postprocess) с рабочими потоками
+- Ограниченные очереди между стадиями (backpressure)
+- Перекрытие стадий: препроцессинг кадра k+1 идёт во время инференса кадра k
+- Статистику по стадиям: глубина очереди, время обслуживания
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from core.logging_config import get_logger
+from core.metrics import get_registry
+
+logger = get_logger(__name__)
+
+# Маркер остановки рабочего потока
+_STOP = object()
+
+
+@dataclass
+class Job:
+    """Единица работы, проходящая через стадии конвейера."""
+
+    payload: Any
+    future: Future = field(default_factory=Future)
+    # Время обслуживания по стадиям (мс)
+    timings: dict = field(default_factory=dict)
+    submitted_at: float = field(default_factory=time.perf_counter)
+
+
+class Stage:
+    """
+    Стадия конвейера: входная очередь + один или несколько рабочих потоков.
+
+    Функция стадии получает payload и возвращает payload для следующей стадии.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        maxsize: int = 2,
+        workers: int = 1,
+    ):
+        """
+        Инициализация стадии.
+
+        Args:
+            name: Имя стадии (для статистики и имён потоков).
+            func: Функция обработки payload.
+            maxsize: Размер входной очереди (0 - без ограничения).
+            workers: Количество рабочих потоков.
+        """
+        self.name = name
+        self._func = func
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._workers = workers
+        self._threads: list[threading.Thread] = []
+        self._next: Optional["Stage"] = None
+
+        # Статистика
+        self._stats_lock = threading.Lock()
+        self._processed = 0
+        self._errors = 0
+        self._busy = 0
+        self._total_service = 0.0
+        self._max_service = 0.0
+        self._service_seconds = get_registry().histogram(
+            "fandomat_pipeline_stage_seconds", "Время обслуживания стадии конвейера", stage=name,
+        )
+
+    def connect(self, next_stage: Optional["Stage"]) -> None:
+        """Задать следующую стадию."""
+        self._next = next_stage
+
+    def start(self) -> None:
+        """Запустить рабочие потоки."""
+        if self._threads:
+            return
+        for i in range(self._workers):
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"Pipeline-{self.name}-{i}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Остановить рабочие потоки (после обработки уже поставленных задач)."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def put(self, job: Job, timeout: Optional[float] = None) -> None:
+        """Поставить задачу в очередь (блокируется при заполненной очереди)."""
+        self._queue.put(job, timeout=timeout)
+
+    def stats(self) -> dict:
+        """Статистика стадии."""
+        with self._stats_lock:
+            avg = self._total_service / self._processed if self._processed else 0.0
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "workers": self._workers,
+                "busy": self._busy,
+                "processed": self._processed,
+                "errors": self._errors,
+                "avg_service_ms": round(avg * 1000, 3),
+                "max_service_ms": round(self._max_service * 1000, 3),
+            }
+
+    def _worker(self) -> None:
+        """Цикл рабочего потока."""
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                break
+
+            if job.future.done():
+                # Задача уже отменена или завершена с ошибкой
+                continue
+
+            with self._stats_lock:
+                self._busy += 1
+            start = time.perf_counter()
+            try:
+                job.payload = self._func(job.payload)
+                failed = None
+            except Exception as e:
+                failed = e
+            elapsed = time.perf_counter() - start
+
+            job.timings[self.name] = elapsed * 1000
+            self._service_seconds.observe(elapsed)
+            with self._stats_lock:
+                self._busy -= 1
+                self._processed += 1
+                self._total_service += elapsed
+                self._max_service = max(self._max_service, elapsed)
+                if failed is not None:
+                    self._errors += 1
+
+            if failed is not None:
+                logger.warning("Стадия %s: ошибка - %s", self.name, failed)
+                job.future.set_exception(failed)
+            elif self._next is not None:
+                self._next.put(job)
+            else:
+                job.future.set_result(job.payload)
+
+
+class Pipeline:
+    """
+    Конвейер из последовательных стадий.
+
+    Использование:
+        pipeline = Pipeline([
+            Stage("preprocess", preprocess),
+            Stage("infer", infer),
+        ])
+        pipeline.start()
+        future = pipeline.submit(frame)
+        result = future.result()
+        pipeline.stop()
+    """
+
+    def __init__(self, stages: list[Stage]):
+        """
+        Инициализация конвейера.
+
+        Args:
+            stages: Стадии в порядке обработки.
+        """
+        if not stages:
+            raise ValueError("Pipeline требует хотя бы одну стадию")
+        self._stages = stages
+        for current, nxt in zip(stages, stages[1:] + [None]):
+            current.connect(nxt)
+        self._running = False
+
+    def start(self) -> None:
+        """Запустить все стадии."""
+        for stage in self._stages:
+            stage.start()
+        self._running = True
+
+    def stop(self) -> None:
+        """Остановить все стадии (от первой к последней)."""
+        self._running = False
+        for stage in self._stages:
+            stage.stop()
+
+    def is_running(self) -> bool:
+        """Проверить, запущен ли конвейер."""
+        return self._running
+
+    def submit(self, payload: Any, timeout: Optional[float] = None) -> Future:
+        """
+        Поставить payload на обработку.
+
+        Args:
+            payload: Входные данные первой стадии.
+            timeout: Таймаут ожидания места в очереди первой стадии.
+
+        Returns:
+            Future с результатом последней стадии.
+            Время по стадиям доступно в future.job.timings.
+        """
+        job = Job(payload)
+        job.future.job = job
+        self._stages[0].put(job, timeout=timeout)
+        return job.future
+
+    def stats(self) -> dict:
+        """Статистика по стадиям."""
+        return {stage.name: stage.stats() for stage in self._stages}
@@ -0,0 +1,145 @@
+"""
+ROI (region of interest) - обрезка кадра до области приёмника.
+
+Обеспечивает:
+- Приведение ROI к границам кадра
+- Обрезку кадра без копирования (view)
+- Вычисление ROI по набору сохранённых кадров (калибровка)
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+
+# ROI в пикселях исходного кадра: (x, y, width, height)
+Roi = tuple[int, int, int, int]
+
+
+def clamp_roi(roi: Optional[Roi], width: int, height: int) -> Optional[Roi]:
+    """
+    Привести ROI к границам кадра.
+
+    Args:
+        roi: Область (x, y, width, height) или None.
+        width: Ширина кадра.
+        height: Высота кадра.
+
+    Returns:
+        Обрезанная по границам область или None, если она пустая.
+    """
+    if roi is None:
+        return None
+
+    x, y, w, h = roi
+    x0 = min(max(int(x), 0), width)
+    y0 = min(max(int(y), 0), height)
+    x1 = min(max(int(x + w), 0), width)
+    y1 = min(max(int(y + h), 0), height)
+
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def crop_roi(frame: np.ndarray, roi: Optional[Roi]) -> np.ndarray:
+    """
+    Обрезать кадр по ROI.
+
+    Возвращает view на исходный массив: копирование (если нужно)
+    выполняет вызывающий код, и копируются только пиксели ROI.
+
+    Args:
+        frame: Кадр (H, W, C).
+        roi: Область (x, y, width, height). None - кадр без изменений.
+
+    Returns:
+        Обрезанный кадр.
+    """
+    if roi is None:
+        return frame
+
+    clamped = clamp_roi(roi, frame.shape[1], frame.shape[0])
+    if clamped is None:
+        return frame
+
+    x, y, w, h = clamped
+    return frame[y:y + h, x:x + w]
+
+
+def derive_roi(
+    frames: Iterable[np.ndarray],
+    background: Optional[np.ndarray] = None,
+    threshold: float = 20.0,
+    min_fraction: float = 0.02,
+    margin: float = 0.1,
+    square: bool = True,
+    scale: int = 8,
+) -> Optional[Roi]:
+    """
+    Вычислить ROI по набору кадров с контейнерами.
+
+    Если задан кадр пустого приёмника (background), активные пиксели -
+    те, что отличаются от него. Иначе используется разброс яркости
+    между кадрами: фон статичен, а область приёмника меняется
+    от контейнера к контейнеру.
+
+    Args:
+        frames: Кадры одной камеры (BGR или grayscale, одного размера).
+        background: Кадр пустого приёмника (опционально).
+        threshold: Порог отличия яркости (0-255).
+        min_fraction: Минимальная доля активных пикселей в строке/столбце.
+        margin: Запас вокруг найденной области (доля от её размера).
+        square: Расширить область до квадрата (вход модели квадратный).
+        scale: Коэффициент прореживания для ускорения расчёта.
+
+    Returns:
+        ROI (x, y, width, height) в пикселях исходного кадра или None.
+    """
+    frames = list(frames)
+    if not frames:
+        return None
+
+    full_h, full_w = frames[0].shape[:2]
+    gray = [_to_gray(f[::scale, ::scale]) for f in frames]
+    stack = np.stack(gray).astype(np.float32)
+
+    if background is not None:
+        bg = _to_gray(background[::scale, ::scale]).astype(np.float32)
+        activity = np.abs(stack - bg).max(axis=0)
+    else:
+        if len(gray) < 2:
+            return None
+        activity = stack.std(axis=0)
+
+    mask = activity > threshold
+    rows = np.flatnonzero(mask.mean(axis=1) > min_fraction)
+    cols = np.flatnonzero(mask.mean(axis=0) > min_fraction)
+    if rows.size == 0 or cols.size == 0:
+        return None
+
+    x0, x1 = int(cols[0]) * scale, (int(cols[-1]) + 1) * scale
+    y0, y1 = int(rows[0]) * scale, (int(rows[-1]) + 1) * scale
+    w, h = x1 - x0, y1 - y0
+
+    # Запас вокруг области
+    pad_x, pad_y = int(w * margin), int(h * margin)
+    x0, y0 = x0 - pad_x, y0 - pad_y
+    w, h = w + 2 * pad_x, h + 2 * pad_y
+
+    if square:
+        side = min(max(w, h), full_w, full_h)
+        x0 -= (side - w) // 2
+        y0 -= (side - h) // 2
+        w = h = side
+        # Сдвигаем внутрь кадра, не уменьшая сторону
+        x0 = min(max(x0, 0), full_w - side)
+        y0 = min(max(y0, 0), full_h - side)
+
+    return clamp_roi((int(x0), int(y0), int(w), int(h)), full_w, full_h)
+
+
+def _to_gray(frame: np.ndarray) -> np.ndarray:
+    """Привести кадр к grayscale (без зависимости от cv2)."""
+    if frame.ndim == 2:
+        return frame
+    # BGR → яркость (ITU-R BT.601)
+    return (frame[..., 0] * 0.114 + frame[..., 1] * 0.587 + frame[..., 2] * 0.299)
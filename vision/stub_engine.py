@@ -0,0 +1,98 @@
+"""
+StubEngine - заглушка движка инференса без модели.
+
+Используется для тестов, бенчмарков и стендов без NPU:
+- тот же интерфейс, что у InferenceEngine
+- фиксированный результат и искусственная задержка инференса
+  (sleep отпускает GIL, поэтому пул заглушек работает параллельно)
+"""
+import dataclasses
+import time
+from pathlib import Path
+
+import numpy as np
+
+from core.config import Settings
+from core.logging_config import get_logger
+from vision.inference_engine import InferenceEngine
+from vision.model_swap import validate_model
+
+logger = get_logger(__name__)
+
+
+class StubEngine:
+    """
+    Движок-заглушка с интерфейсом InferenceEngine.
+
+    Использование:
+        engine = StubEngine(settings)
+        engine.load_model()
+        engine.warmup()
+
+        class_name, confidence = engine.predict(frame)
+    """
+
+    def __init__(self, settings: Settings, **_):
+        """
+        Инициализация заглушки.
+
+        Args:
+            settings: Настройки приложения (stub_class, stub_latency_ms).
+        """
+        self._settings = settings
+        self._is_loaded = False
+        self._is_ready = False
+
+    def load_model(self) -> bool:
+        """Имитация загрузки модели."""
+        self._is_loaded = True
+        logger.info(f"Stub движок: результат '{self._settings.stub_class}', "
+                    f"задержка {self._settings.stub_latency_ms} мс")
+        return True
+
+    def warmup(self, runs=None) -> bool:
+        """Имитация прогрева."""
+        if not self._is_loaded:
+            return False
+        self._is_ready = True
+        return True
+
+    def preprocess(self, frame: np.ndarray) -> np.ndarray:
+        """Препроцессинг не нужен - кадр возвращается как есть."""
+        return frame
+
+    def predict(self, frame: np.ndarray) -> tuple[str, float]:
+        """
+        Вернуть фиксированный результат после задержки.
+
+        Returns:
+            Кортеж (stub_class, 1.0) или ("NONE", 0.0) если не прогрет.
+        """
+        if not self._is_ready:
+            return "NONE", 0.0
+        if self._settings.stub_latency_ms > 0:
+            time.sleep(self._settings.stub_latency_ms / 1000)
+        return self._settings.stub_class, 1.0
+
+    def is_ready(self) -> bool:
+        """Проверить, готова ли заглушка."""
+        return self._is_ready
+
+    @property
+    def model_path(self) -> Path:
+        """Путь к "модели" (для заглушки - только проверяемый metadata.yaml)."""
+        return Path(self._settings.model_path)
+
+    def release(self) -> None:
+        """Освобождать нечего."""
+
+    def swap_model(self, model_path: Path) -> None:
+        """
+        Проверить metadata.yaml новой модели и переключиться на неё.
+
+        Raises:
+            ModelSwapError: модель не прошла проверку классов.
+        """
+        validate_model(Path(model_path), InferenceEngine.CLASS_MAPPING)
+        self._settings = dataclasses.replace(self._settings, model_path=Path(model_path))
+        logger.info(f"Stub движок: модель заменена на {model_path}")
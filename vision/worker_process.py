@@ -0,0 +1,509 @@
+"""
+InferenceWorkerProcess - инференс в изолированном дочернем процессе.
+
+Обеспечивает:
+- Модель (ultralytics/RKNN) живёт в отдельном процессе: зависание или
+  падение не затрагивает камеру и WebSocket соединение
+- Передачу кадров через shared memory (без сериализации пикселей)
+- Watchdog: таймаут запроса и контроль жизни процесса
+- Горячий резерв: второй процесс с уже загруженной моделью,
+  который подменяет упавший без прогрева
+- Горячую замену модели: новый процесс загружает модель, пока старый
+  обслуживает запросы (swap_model)
+- Тот же интерфейс, что у InferenceEngine (predict блокирующий)
+"""
+import dataclasses
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from core.config import Settings
+from core.logging_config import get_logger
+from vision.model_swap import ModelSwapError, validate_model
+
+logger = get_logger(__name__)
+
+# spawn: дочерний процесс не наследует потоки камеры и event loop
+_mp = mp.get_context("spawn")
+
+# Пауза между неудачными перезапусками воркера (удваивается до максимума)
+RESPAWN_BACKOFF_INITIAL = 1.0
+RESPAWN_BACKOFF_MAX = 30.0
+
+
+class WorkerUnavailableError(RuntimeError):
+    """Воркер инференса недоступен (упал, завис или перезапускается)."""
+
+    def __init__(self, error_code: str):
+        super().__init__(error_code)
+        self.error_code = error_code
+
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    """
+    Подключиться к shared memory родителя.
+
+    Дочерний процесс (spawn) использует resource tracker родителя, поэтому
+    сегмент там уже зарегистрирован и освобождается родителем (unlink).
+    """
+    return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(settings: Settings, conn, shm_name: str, slot_size: int) -> None:
+    """
+    Точка входа дочернего процесса.
+
+    Протокол (через Pipe):
+        ← ("ready", ok)
+        → ("predict", seq, slot, shape, dtype)   ← ("result", seq, class_name, confidence)
+        → ("stop",)
+    """
+    from vision.engine_pool import create_engine
+
+    # Внутри воркера изоляция уже не нужна
+    engine = create_engine(dataclasses.replace(settings, inference_isolation=False))
+    ok = engine.load_model() and engine.warmup()
+    conn.send(("ready", ok))
+    if not ok:
+        return
+
+    shm = _attach_shm(shm_name)
+    send_lock = threading.Lock()
+    frame = None
+
+    def reply(seq, result):
+        with send_lock:
+            conn.send(("result", seq, result[0], float(result[1])))
+
+    def reply_future(seq, future):
+        # На каждый seq ровно один ответ: ошибка пула - пустой результат,
+        # иначе родитель ждёт его до таймаута
+        error = CancelledError() if future.cancelled() else future.exception()
+        if error is not None:
+            logger.error("Воркер: ошибка инференса в пуле: %s", error)
+            reply(seq, ("NONE", 0.0))
+        else:
+            reply(seq, future.result())
+
+    try:
+        while True:
+            msg = conn.recv()
+            if msg[0] == "stop":
+                break
+            _, seq, slot, shape, dtype = msg
+            frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=slot * slot_size)
+
+            if hasattr(engine, "submit"):
+                # Пул внутри воркера: ответы приходят из его потоков
+                future = engine.submit(frame)
+                future.add_done_callback(lambda f, seq=seq: reply_future(seq, f))
+            else:
+                reply(seq, engine.predict(frame))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if hasattr(engine, "close"):
+            engine.close()
+        del frame
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+
+class _WorkerHandle:
+    """Один дочерний процесс с моделью, его shared memory и ожидающие запросы."""
+
+    def __init__(self, settings: Settings, slots: int, slot_size: int, generation: int):
+        self.generation = generation
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        self.free_slots: queue.Queue = queue.Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+
+        self.pending: dict[int, tuple[Future, int, float]] = {}
+        self.pending_lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.ready = threading.Event()
+        self.failed = False
+
+        self.conn, child_conn = _mp.Pipe()
+        self.process = _mp.Process(
+            target=_worker_main,
+            args=(settings, child_conn, self.shm.name, slot_size),
+            name=f"inference-worker-{generation}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+        self._reader = threading.Thread(
+            target=self._read_loop,
+            name=f"InferenceWorkerReader-{generation}",
+            daemon=True,
+        )
+        self._reader.start()
+
+    def _read_loop(self) -> None:
+        """Приём ответов дочернего процесса."""
+        try:
+            while True:
+                msg = self.conn.recv()
+                if msg[0] == "ready":
+                    if msg[1]:
+                        self.ready.set()
+                    else:
+                        self.failed = True
+                        return
+                elif msg[0] == "result":
+                    _, seq, class_name, confidence = msg
+                    with self.pending_lock:
+                        entry = self.pending.pop(seq, None)
+                    if entry is not None:
+                        future, slot, _ = entry
+                        self.free_slots.put(slot)
+                        future.set_result((class_name, confidence))
+        except (EOFError, OSError):
+            # Процесс завершился - watchdog обработает
+            self.failed = True
+
+    def submit(self, seq: int, frame: np.ndarray, timeout: float) -> Future:
+        """Записать кадр в свободный слот и отправить запрос."""
+        if frame.nbytes > self.slot_size:
+            raise ValueError(f"Кадр {frame.shape} не помещается в слот shared memory")
+        try:
+            slot = self.free_slots.get(timeout=timeout)
+        except queue.Empty:
+            raise WorkerUnavailableError("inference_worker_busy")
+
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf,
+                          offset=slot * self.slot_size)
+        view[...] = frame
+        del view
+
+        future: Future = Future()
+        with self.pending_lock:
+            self.pending[seq] = (future, slot, time.monotonic())
+        try:
+            with self.send_lock:
+                self.conn.send(("predict", seq, slot, frame.shape, frame.dtype.str))
+        except OSError:
+            # Процесс уже завершился, а watchdog ещё не заменил воркер
+            self.failed = True
+            with self.pending_lock:
+                self.pending.pop(seq, None)
+            self.free_slots.put(slot)
+            raise WorkerUnavailableError("inference_worker_crashed")
+        return future
+
+    def oldest_pending_age(self) -> float:
+        """Возраст самого старого ожидающего запроса (секунды)."""
+        with self.pending_lock:
+            if not self.pending:
+                return 0.0
+            oldest = min(started for _, _, started in self.pending.values())
+        return time.monotonic() - oldest
+
+    def fail_pending(self, error_code: str) -> None:
+        """Завершить все ожидающие запросы ошибкой."""
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+        for future, _, _ in pending.values():
+            if not future.done():
+                future.set_exception(WorkerUnavailableError(error_code))
+
+    def terminate(self) -> None:
+        """Остановить процесс и освободить shared memory."""
+        try:
+            if self.process.is_alive():
+                with self.send_lock:
+                    self.conn.send(("stop",))
+                self.process.join(timeout=1.0)
+        except (OSError, ValueError):
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1.0)
+        self.conn.close()
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class InferenceWorkerProcess:
+    """
+    Супервизор изолированного воркера инференса.
+
+    Использование:
+        worker = InferenceWorkerProcess(settings)
+        worker.load_model()      # запуск процесса (и резерва), ожидание прогрева
+        worker.warmup()
+
+        class_name, confidence = worker.predict(frame)
+        # WorkerUnavailableError(error_code) пока воркер перезапускается
+    """
+
+    def __init__(self, settings: Settings):
+        """
+        Инициализация супервизора.
+
+        Args:
+            settings: Настройки приложения (inference_timeout, inference_standby).
+        """
+        from vision.engine_pool import ENGINE_BACKENDS, InferenceEngine
+
+        self._settings = settings
+        self._slots = max(1, settings.engine_pool_size)
+        frame_pixels = max(settings.camera_width * settings.camera_height, settings.image_size ** 2)
+        self._slot_size = frame_pixels * 3
+
+        # Препроцессинг выполняется в основном процессе (модель не нужна)
+        self._preprocessor = ENGINE_BACKENDS.get(settings.inference_backend, InferenceEngine)(settings)
+
+        self._active: Optional[_WorkerHandle] = None
+        self._standby: Optional[_WorkerHandle] = None
+        self._lock = threading.Lock()
+        # Восстановление (watchdog) и замена модели не выполняются одновременно
+        self._supervise_lock = threading.RLock()
+        self._generation = itertools.count(1)
+        self._seq = itertools.count(1)
+        self._restarts = 0
+        self._last_error: Optional[str] = None
+        self._respawn_delay = RESPAWN_BACKOFF_INITIAL
+        self._next_respawn = 0.0
+
+        self._watchdog: Optional[threading.Thread] = None
+        self._watchdog_stop = threading.Event()
+
+    def load_model(self) -> bool:
+        """Запустить воркер (и резерв) и дождаться загрузки модели."""
+        handle = self._spawn()
+        if not self._wait_ready(handle):
+            handle.terminate()
+            logger.error("Воркер инференса не смог загрузить модель")
+            return False
+
+        with self._lock:
+            self._active = handle
+        if self._settings.inference_standby:
+            self._standby = self._spawn()
+
+        self._watchdog_stop.clear()
+        self._watchdog = threading.Thread(target=self._watchdog_loop, name="InferenceWatchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Воркер инференса запущен (pid {handle.process.pid})")
+        return True
+
+    def warmup(self, runs: Optional[int] = None) -> bool:
+        """Прогрев выполняется в дочернем процессе при запуске."""
+        return self.is_ready()
+
+    def is_ready(self) -> bool:
+        """Готов ли активный воркер."""
+        active = self._active
+        return active is not None and active.ready.is_set() and not active.failed
+
+    def preprocess(self, frame: np.ndarray) -> np.ndarray:
+        """Препроцессинг в основном процессе: в shared memory копируется уже уменьшенный кадр."""
+        return self._preprocessor.preprocess(frame)
+
+    def submit(self, frame: np.ndarray) -> Future:
+        """
+        Отправить кадр в воркер.
+
+        Returns:
+            Future с (class_name, confidence) или WorkerUnavailableError.
+        """
+        with self._lock:
+            active = self._active
+        if active is None or not active.ready.is_set():
+            future: Future = Future()
+            future.set_exception(WorkerUnavailableError(self._last_error or "inference_worker_restarting"))
+            return future
+        return active.submit(next(self._seq), np.ascontiguousarray(frame), self._settings.inference_timeout)
+
+    def predict(self, frame: np.ndarray) -> tuple[str, float]:
+        """
+        Выполнить предсказание (блокирующий вызов).
+
+        Raises:
+            WorkerUnavailableError: воркер упал, завис или перезапускается.
+        """
+        future = self.submit(frame)
+        try:
+            return future.result(timeout=self._settings.inference_timeout + 1.0)
+        except TimeoutError:
+            raise WorkerUnavailableError("inference_worker_hung")
+
+    @property
+    def model_path(self) -> Path:
+        """Путь к текущей модели."""
+        return Path(self._settings.model_path)
+
+    def swap_model(self, model_path: Path) -> None:
+        """
+        Запустить процесс с новой моделью и переключить запросы на него.
+
+        Старый процесс дообрабатывает начатые запросы и завершается,
+        резерв пересоздаётся уже с новой моделью.
+
+        Raises:
+            ModelSwapError: модель не прошла проверку или не загрузилась.
+        """
+        from vision.engine_pool import InferenceEngine
+
+        model_path = Path(model_path)
+        validate_model(model_path, InferenceEngine.CLASS_MAPPING)
+        settings = dataclasses.replace(self._settings, model_path=model_path)
+
+        with self._supervise_lock:
+            handle = self._spawn(settings)
+            if not self._wait_ready(handle):
+                handle.terminate()
+                raise ModelSwapError("model_load_failed", f"Воркер не смог загрузить {model_path}")
+
+            with self._lock:
+                old, self._active = self._active, handle
+                self._settings = settings
+            old_standby, self._standby = self._standby, None
+            if self._settings.inference_standby:
+                self._standby = self._spawn()
+
+        if old_standby is not None:
+            old_standby.terminate()
+        if old is not None:
+            threading.Thread(target=self._retire, args=(old,), name="InferenceWorkerRetire", daemon=True).start()
+        logger.info(f"Модель заменена: {model_path} (pid {handle.process.pid})")
+
+    def close(self) -> None:
+        """Остановить воркеры."""
+        self._watchdog_stop.set()
+        if self._watchdog:
+            self._watchdog.join(timeout=2.0)
+        with self._lock:
+            handles = [h for h in (self._active, self._standby) if h is not None]
+            self._active = self._standby = None
+        for handle in handles:
+            handle.fail_pending("inference_worker_stopped")
+            handle.terminate()
+
+    def stats(self) -> dict:
+        """Состояние воркера для диагностики."""
+        active, standby = self._active, self._standby
+        return {
+            "isolated": True,
+            "pid": active.process.pid if active else None,
+            "ready": self.is_ready(),
+            "standby_ready": bool(standby and standby.ready.is_set()),
+            "restarts": self._restarts,
+            "last_error": self._last_error,
+        }
+
+    # === WATCHDOG ===
+
+    def _spawn(self, settings: Optional[Settings] = None) -> _WorkerHandle:
+        """Запустить новый дочерний процесс."""
+        return _WorkerHandle(settings or self._settings, self._slots, self._slot_size, next(self._generation))
+
+    def _retire(self, handle: _WorkerHandle) -> None:
+        """Дождаться завершения начатых запросов и остановить процесс."""
+        deadline = time.monotonic() + self._settings.inference_timeout
+        while handle.pending and time.monotonic() < deadline:
+            time.sleep(0.05)
+        handle.fail_pending("inference_worker_restarting")
+        handle.terminate()
+
+    def _wait_ready(self, handle: _WorkerHandle) -> bool:
+        """Дождаться загрузки модели в процессе."""
+        deadline = time.monotonic() + self._settings.inference_start_timeout
+        while time.monotonic() < deadline:
+            if handle.ready.wait(0.1):
+                return True
+            if handle.failed or not handle.process.is_alive():
+                return False
+        return False
+
+    def _watchdog_loop(self) -> None:
+        """Контроль жизни и зависаний активного воркера."""
+        while not self._watchdog_stop.wait(0.2):
+            active = self._active
+            if active is None:
+                # Перезапуск не удался: повтор с нарастающей паузой
+                if time.monotonic() >= self._next_respawn:
+                    with self._supervise_lock:
+                        if self._active is None and not self._watchdog_stop.is_set():
+                            self._replace_active(None)
+                continue
+
+            error_code = None
+            if not active.process.is_alive() or active.failed:
+                error_code = "inference_worker_crashed"
+            elif active.oldest_pending_age() > self._settings.inference_timeout:
+                error_code = "inference_worker_hung"
+
+            if error_code:
+                self._recover(active, error_code)
+
+    def _recover(self, failed: _WorkerHandle, error_code: str) -> None:
+        """Заменить упавший воркер резервом или новым процессом."""
+        with self._supervise_lock:
+            if self._active is not failed:
+                # Воркер уже заменён (swap_model)
+                return
+            self._recover_locked(failed, error_code)
+
+    def _recover_locked(self, failed: _WorkerHandle, error_code: str) -> None:
+        """Замена упавшего воркера (под _supervise_lock)."""
+        logger.error(f"Воркер инференса (pid {failed.process.pid}): {error_code}, перезапуск")
+        self._restarts += 1
+        self._last_error = error_code
+
+        with self._lock:
+            self._active = None
+        failed.fail_pending(error_code)
+        failed.terminate()
+
+        standby, self._standby = self._standby, None
+        self._replace_active(standby)
+
+    def _replace_active(self, standby: Optional[_WorkerHandle]) -> None:
+        """
+        Назначить активным резерв или новый процесс (под _supervise_lock).
+
+        При неудаче _active остаётся None: submit отвечает WorkerUnavailableError,
+        watchdog повторяет попытку через _respawn_delay (удваивается до
+        RESPAWN_BACKOFF_MAX, сбрасывается после успешного запуска).
+        """
+        if standby is not None and self._wait_ready(standby):
+            with self._lock:
+                self._active = standby
+            logger.info(f"Резервный воркер (pid {standby.process.pid}) переведён в активные")
+        else:
+            if standby is not None:
+                standby.terminate()
+            replacement = self._spawn()
+            if not self._wait_ready(replacement):
+                replacement.terminate()
+                self._next_respawn = time.monotonic() + self._respawn_delay
+                logger.error("Не удалось перезапустить воркер инференса, повтор через %.0f сек",
+                             self._respawn_delay)
+                self._respawn_delay = min(self._respawn_delay * 2, RESPAWN_BACKOFF_MAX)
+                return
+            with self._lock:
+                self._active = replacement
+            logger.info(f"Воркер инференса перезапущен (pid {replacement.process.pid})")
+
+        self._respawn_delay = RESPAWN_BACKOFF_INITIAL
+        if self._settings.inference_standby and self._standby is None and not self._watchdog_stop.is_set():
+            self._standby = self._spawn()
@@ -1,13 +1,19 @@
 import asyncio
+import ipaddress
 import websockets
 import json
+from collections import OrderedDict, deque
 from typing import Set
+from urllib.parse import parse_qs, urlsplit
 import threading
 import signal
 import time
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
 from core.logging_config import get_logger
+from core.metrics import get_registry
 
 logger = get_logger(__name__)
+metrics = get_registry()
 
 command_list = {
     "open_shutter": "NONE",
@@ -20,6 +26,10 @@ command_list = {
     "restore_device": "NONE",
     "unlock_door": "NONE",
     "lock_door": "NONE",
+    "reload_model": "NONE",
+    "get_traces": "NONE",
+    "get_metrics": "NONE",
+    "dump_traces": "NONE",
 
     #состояние
     "shutter_opened": "NONE",
@@ -34,8 +44,11 @@ command_list = {
     "device_info_updated": "NONE",
     "service_mode_exited": "NONE",
     "hardware_error": "NONE",
+    "plc_link_degraded": "NONE",
+    "plc_link_restored": "NONE",
     "photo_ready": "NONE",
     "device_info": "NONE",
+    "device_info_delta": "NONE",
     "container_dumped": "NONE",
     "unload_completed": "NONE",
     "restore_started": "NONE",
@@ -44,12 +57,276 @@ command_list = {
     "door_unlocked": "NONE",
     "door_opened": "NONE",
     "door_closed": "NONE",
+    "model_reloaded": "NONE",
+    "traces": "NONE",
+    "metrics": "NONE",
+    "traces_dumped": "NONE",
 }
 
+# Политики переполнения очереди отправки (WS_OVERFLOW_POLICY):
+#   drop_oldest - выбросить самое старое сообщение
+#   coalesce    - выбросить более старое событие того же типа (нет такого - самое старое)
+#   disconnect  - закрыть соединение: клиент переподключится и запросит состояние заново
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Темы событий Application для подписчиков
+TOPICS = ("container", "hardware", "device_info", "metrics", "replies")
+
+# Событие → тема (не указанные - "replies": ответы на команды, *_ack, command_error)
+EVENT_TOPICS = {
+    "container_detected": "container",
+    "container_recognized": "container",
+    "container_not_recognized": "container",
+    "container_accepted": "container",
+    "container_dumped": "container",
+    "receiver_empty": "container",
+    "receiver_not_empty": "container",
+    "hardware_error": "hardware",
+    "plc_link_degraded": "hardware",
+    "plc_link_restored": "hardware",
+    "device_info": "device_info",
+    "device_info_delta": "device_info",
+    "up_door_locked": "device_info",
+    "up_door_unlocked": "device_info",
+    "metrics": "metrics",
+    "traces": "metrics",
+    "traces_dumped": "metrics",
+}
+
+# Роль → темы по умолчанию. Команды Application принимает только от клиента "app";
+# app и vision при повторной регистрации заменяют прежнее подключение, остальные
+# клиенты с занятым именем получают суффикс (#2, #3...).
+ROLE_TOPICS = {
+    "app": TOPICS,
+    "monitor": ("container", "hardware", "device_info"),
+    "vision": (),
+    "client": (),
+}
+EXCLUSIVE_ROLES = ("app", "vision")
+
+# Пакетная отправка (клиент регистрируется с "batch": true): сообщения из очереди
+# уходят одним кадром - JSON массивом. Клиенты без "batch" получают по кадру на сообщение.
+BATCH_MAX_MESSAGES = 64
+
+# Сжатие permessage-deflate по ролям (WS_COMPRESSION_ROLES). Расширение согласуется
+# при handshake, до сообщения регистрации, поэтому роль берётся из URI
+# (ws://host:8765/?role=monitor или ?client_id=app), а без неё - по адресу клиента:
+# "local" (loopback) или "remote". По умолчанию сжимаются удалённые каналы backend;
+# vision на той же плате передаёт фото base64, которые deflate почти не уменьшает.
+COMPRESSION_ROLES = ("app", "monitor", "remote")
+HANDSHAKE_ROLES = tuple(ROLE_TOPICS) + ("local", "remote")
+# Окно LZ77 и memLevel как у websockets по умолчанию: память на подключение мала
+DEFLATE_WINDOW_BITS = 12
+DEFLATE_MEM_LEVEL = 5
+
+# Максимальный размер входящего сообщения: фото 2560x1440 в base64 от vision
+# близко к 1 МБ - пределу websockets по умолчанию
+MAX_MESSAGE_SIZE = 8 * 2**20
+# Верхняя граница буфера записи на подключение (websockets по умолчанию 32 КБ)
+WRITE_LIMIT = 2**15
+
+
+def topic_for_event(event: str) -> str:
+    """Тема события для подписчиков."""
+    return EVENT_TOPICS.get(event, "replies")
+
+
+def handshake_role(path: str, remote_address=None) -> str:
+    """
+    Роль подключения на этапе handshake (для выбора сжатия).
+
+    Args:
+        path: Путь запроса с query (?role=... или ?client_id=...).
+        remote_address: Адрес клиента (host, port, ...).
+
+    Returns:
+        Роль из HANDSHAKE_ROLES.
+    """
+    query = parse_qs(urlsplit(path).query)
+    role = (query.get("role") or [None])[0]
+    if role in ROLE_TOPICS:
+        return role
+    name = (query.get("client_id") or [None])[0]
+    if name in ROLE_TOPICS:
+        return name
+    try:
+        loopback = ipaddress.ip_address(remote_address[0]).is_loopback
+    except (TypeError, ValueError, IndexError):
+        loopback = False
+    return "local" if loopback else "remote"
+
+
+_EVENT_PREFIX = '{"event": "'
+
+
+def _event_name(message: str):
+    """
+    Тип события по префиксу сообщения (None - не событие).
+
+    События Application начинаются с {"event": "<имя>" (core.events), поэтому
+    имя берётся без разбора JSON всего сообщения.
+    """
+    if not message.startswith(_EVENT_PREFIX):
+        return None
+    end = message.find('"', len(_EVENT_PREFIX))
+    return message[len(_EVENT_PREFIX):end] if end > 0 else None
+
+
+# Ответов с request_id, которые хранятся до take_reply (старые вытесняются)
+MAX_PENDING_REPLIES = 32
+
+
+def reply_request_id(message: str):
+    """request_id ответа клиента (JSON объект с полем request_id) или None."""
+    if not message.startswith("{") or '"request_id"' not in message:
+        return None
+    try:
+        data = json.loads(message)
+    except json.JSONDecodeError:
+        return None
+    request_id = data.get("request_id") if isinstance(data, dict) else None
+    return request_id if isinstance(request_id, str) and request_id else None
+
+class _Outbox:
+    """
+    Очередь отправки одного подключения с собственной задачей-писателем.
+
+    Сообщения уходят строго в порядке постановки; при переполнении
+    срабатывает политика. Методы вызываются только в цикле сервера.
+
+    В пакетном режиме писатель ждёт batch_window секунд после первого
+    сообщения и отправляет всё накопленное (события одного шага state
+    machine и окна) одним кадром-массивом.
+    """
+
+    def __init__(self, name: str, websocket, maxsize: int, policy: str,
+                 role: str = "client", topics=(), batch: bool = False,
+                 batch_window: float = 0.0):
+        self.name = name
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.role = role
+        self.topics = frozenset(topics)
+        self.batch = batch
+        self.batch_window = batch_window
+        self.task = None
+        self._queue = deque()
+        self._ready = asyncio.Event()
+        self._depth = metrics.gauge("fandomat_ws_send_queue_depth",
+                                    "Сообщений в очереди отправки клиента", client=name)
+        self._dropped = metrics.counter("fandomat_ws_send_dropped_total",
+                                        "Сообщений выброшено при переполнении очереди", client=name)
+        self._sent = metrics.counter("fandomat_ws_messages_sent_total",
+                                     "Сообщений отправлено клиентам", client=name)
+        self._frames = metrics.counter("fandomat_ws_frames_sent_total",
+                                       "Кадров отправлено клиентам", client=name)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def put(self, message: str, event: str = None) -> bool:
+        """
+        Поставить сообщение в очередь.
+
+        Args:
+            message: Сообщение.
+            event: Тип события (None - определить по префиксу для coalesce).
+
+        Returns:
+            False - очередь переполнена и политика disconnect.
+        """
+        if event is None and self.policy == "coalesce":
+            event = _event_name(message)
+        if len(self._queue) >= self.maxsize:
+            if self.policy == "disconnect":
+                return False
+            self._dropped.inc()
+            if self.policy != "coalesce" or not self._drop_same_event(event):
+                self._queue.popleft()
+        # Тип события хранится рядом с сообщением: coalesce сравнивает строки
+        self._queue.append((event, message))
+        self._depth.set(len(self._queue))
+        self._ready.set()
+        return True
+
+    def _drop_same_event(self, event) -> bool:
+        """Выбросить самое старое сообщение с тем же типом события."""
+        if event is None:
+            return False
+        for index, (queued_event, _) in enumerate(self._queue):
+            if queued_event == event:
+                del self._queue[index]
+                return True
+        return False
+
+    def _take(self) -> tuple:
+        """Снять с очереди кадр: одно сообщение или пакет (JSON массив)."""
+        if not self.batch:
+            return self._queue.popleft()[1], 1
+        count = min(len(self._queue), BATCH_MAX_MESSAGES)
+        if count == 1:
+            return self._queue.popleft()[1], 1
+        messages = [self._queue.popleft()[1] for _ in range(count)]
+        return "[" + ",".join(messages) + "]", count
+
+    async def run(self):
+        """Отправлять сообщения (по одному или пакетами), пока соединение открыто."""
+        while True:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            if self.batch and self.batch_window > 0 and len(self._queue) < BATCH_MAX_MESSAGES:
+                await asyncio.sleep(self.batch_window)
+                if not self._queue:
+                    continue
+            frame, count = self._take()
+            self._depth.set(len(self._queue))
+            try:
+                await self.websocket.send(frame)
+            except websockets.exceptions.ConnectionClosed:
+                return
+            except Exception as e:
+                metrics.counter("fandomat_ws_send_errors_total", "Ошибок отправки клиентам").inc()
+                logger.error(f"Ошибка отправки клиенту {self.name}: {e}")
+                continue
+            self._sent.inc(count)
+            self._frames.inc()
+
+    def close(self):
+        """Остановить писателя и очистить очередь."""
+        if self.task is not None:
+            self.task.cancel()
+        self._queue.clear()
+        self._depth.set(0)
+
+
 class WebSocket:
-    def __init__(self, PLC, host = "localhost", port= 8765):
+    def __init__(self, PLC, host = "localhost", port= 8765, send_queue_size = 256, overflow_policy = "drop_oldest", batch_window = 0.005,
+                 compression_roles = COMPRESSION_ROLES, compression_level = 6, max_message_size = MAX_MESSAGE_SIZE, write_limit = WRITE_LIMIT):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {overflow_policy} "
+                             f"(допустимо: {', '.join(OVERFLOW_POLICIES)})")
+        unknown = [role for role in compression_roles if role not in HANDSHAKE_ROLES]
+        if unknown:
+            raise ValueError(f"Неизвестные роли для сжатия: {unknown} "
+                             f"(допустимо: {', '.join(HANDSHAKE_ROLES)})")
         self.host = host
         self.port = port
+        self.send_queue_size = send_queue_size  # Сообщений в очереди отправки на клиента
+        self.overflow_policy = overflow_policy
+        self.batch_window = batch_window  # Окно пакетной отправки для клиентов с "batch" (секунды)
+        self.compression_roles = frozenset(compression_roles)  # Роли handshake со сжатием deflate
+        self.compression_level = compression_level  # Уровень zlib 1-9
+        self.max_message_size = max_message_size    # Байт во входящем сообщении
+        self.write_limit = write_limit              # Байт в буфере записи подключения
+        self._outboxes = {}  # {"client_name": _Outbox}, только в цикле сервера
+        self._subscribers = {topic: set() for topic in TOPICS}  # тема → {_Outbox}
+        self._published = {topic: metrics.counter("fandomat_ws_events_published_total",
+                                                  "Событий опубликовано подписчикам", topic=topic)
+                           for topic in TOPICS}
+        self._closing = set()  # Задачи закрытия соединений при переполнении
         self.PLC = PLC
         self.clients = {}  # Словарь: {"client_name": websocket}
         self._clients_lock = threading.Lock()  # Lock для потокобезопасного доступа к clients
@@ -61,24 +338,39 @@ class WebSocket:
         # Новая архитектура: словарь последних сообщений
         self.client_messages = {}
         self.message_lock = threading.Lock()
+        # Ответы с request_id (reload_model и т.п.): не попадают в слот последнего сообщения
+        self._replies = OrderedDict()
         
         # Старые переменные для обратной совместимости (deprecated)
         self.request = "NONE"
         self.response = ""
         self.message_app = ""
+
+        # Метрики
+        self._clients_gauge = metrics.gauge("fandomat_ws_clients", "Подключённых WebSocket клиентов")
+
+        # Уведомление о сообщениях (сервер в event loop Application)
+        self.on_message = None          # callback(client_name), вызывается в цикле сервера
+        self._message_event = None      # Событие для wait_message (пересоздаётся после срабатывания)
         
     async def _handler(self, websocket):
         client_name = None
-        logger.debug(f"Новое подключение. Всего клиентов: {len(self.clients)}")
+        logger.debug("Новое подключение. Всего клиентов: %d", len(self.clients))
         
         try:
             # Первое сообщение - регистрация
             raw_msg = await websocket.recv()
+            role = None
+            topics = None
+            batch = False
             try:
                 # Пытаемся распарсить JSON
                 data = json.loads(raw_msg)
                 # Поддержка разных форматов ключей для гибкости
                 client_name = data.get("client_id") or data.get("name") or data.get("client")
+                role = data.get("role")
+                topics = data.get("topics")
+                batch = data.get("batch") is True
             except json.JSONDecodeError:
                 # Fallback для старых клиентов (plain text)
                 client_name = raw_msg.strip()
@@ -89,8 +381,28 @@ class WebSocket:
                 await websocket.close()
                 return
 
+            role, topics = self._resolve_subscription(client_name, role, topics)
             with self._clients_lock:
+                if client_name in self.clients and role not in EXCLUSIVE_ROLES:
+                    suffix = 2
+                    while f"{client_name}#{suffix}" in self.clients:
+                        suffix += 1
+                    client_name = f"{client_name}#{suffix}"
+                elif client_name in self.clients:
+                    logger.warning(f"Клиент '{client_name}' зарегистрирован повторно → прежнее подключение заменено")
                 self.clients[client_name] = websocket
+                self._clients_gauge.set(len(self.clients))
+            previous = self._outboxes.pop(client_name, None)
+            if previous is not None:
+                self._remove_outbox(previous)
+            outbox = _Outbox(client_name, websocket, self.send_queue_size, self.overflow_policy, role, topics,
+                             batch=batch, batch_window=self.batch_window)
+            outbox.task = asyncio.create_task(outbox.run())
+            self._outboxes[client_name] = outbox
+            for topic in outbox.topics:
+                self._subscribers[topic].add(outbox)
+            received = metrics.counter("fandomat_ws_messages_received_total",
+                                       "Сообщений получено от клиентов", client=client_name)
 
             # Инициализируем хранилище для этого клиента
             with self.message_lock:
@@ -100,12 +412,27 @@ class WebSocket:
                     "just_connected": True  # Флаг нового подключения
                 }
             
-            logger.info(f"Клиент зарегистрирован: '{client_name}'. Всего: {len(self.clients)}")
+            compressed = bool(getattr(websocket.protocol, "extensions", None))
+            logger.info("Клиент зарегистрирован: '%s' (роль %s, темы: %s%s%s). Всего: %d",
+                        client_name, role, ", ".join(sorted(outbox.topics)) or "-",
+                        ", пакеты" if batch else "", ", deflate" if compressed else "", len(self.clients))
+            self._notify(client_name)
             
             # Дальше обрабатываем обычные сообщения
             while True:
                 message = await websocket.recv()
-                
+                received.inc()
+
+                # Ответы vision на запросы с request_id - в отдельное хранилище
+                request_id = reply_request_id(message) if role == "vision" else None
+                if request_id is not None:
+                    with self.message_lock:
+                        self._replies[request_id] = message
+                        while len(self._replies) > MAX_PENDING_REPLIES:
+                            self._replies.popitem(last=False)
+                    self._notify(client_name)
+                    continue
+
                 # Сохраняем в новую структуру
                 with self.message_lock:
                     self.client_messages[client_name] = {
@@ -117,31 +444,64 @@ class WebSocket:
                 self.request = message
                 if client_name == "app":
                     self.message_app = message
+
+                self._notify(client_name)
                 
         except websockets.exceptions.ConnectionClosed:
-            logger.debug(f"Соединение закрыто ({client_name})")
+            logger.debug("Соединение закрыто (%s)", client_name)
         finally:
-            if client_name:
-                with self._clients_lock:
-                    if client_name in self.clients:
-                        del self.clients[client_name]
+            # Имя могло быть занято новым подключением - удаляем только своё
+            with self._clients_lock:
+                own = client_name is not None and self.clients.get(client_name) is websocket
+                if own:
+                    del self.clients[client_name]
+                    self._clients_gauge.set(len(self.clients))
+            if own:
                 with self.message_lock:
                     if client_name in self.client_messages:
                         del self.client_messages[client_name]
+                outbox = self._outboxes.pop(client_name, None)
+                if outbox is not None:
+                    self._remove_outbox(outbox)
             with self._clients_lock:
                 remaining = len(self.clients)
-            logger.info(f"Клиент отключен ({client_name}). Осталось: {remaining}")
+            logger.info("Клиент отключен (%s). Осталось: %s", client_name, remaining)
 
 
 
 
     
-    async def _run_server(self):
-        self.server = await websockets.serve(
+    def _serve(self):
+        """websockets.serve с политикой сжатия и размеров."""
+        extensions = []
+        if self.compression_roles:
+            extensions.append(ServerPerMessageDeflateFactory(
+                server_max_window_bits=DEFLATE_WINDOW_BITS,
+                client_max_window_bits=DEFLATE_WINDOW_BITS,
+                compress_settings={"level": self.compression_level, "memLevel": DEFLATE_MEM_LEVEL},
+            ))
+        return websockets.serve(
             self._handler,
             self.host,
-            self.port
+            self.port,
+            compression=None,
+            extensions=extensions,
+            process_request=self._process_request,
+            max_size=self.max_message_size,
+            write_limit=self.write_limit,
         )
+
+    def _process_request(self, connection, request):
+        """Handshake: отключить сжатие для ролей вне compression_roles."""
+        role = handshake_role(request.path, connection.remote_address)
+        if role not in self.compression_roles:
+            connection.protocol.available_extensions = []
+        logger.debug("Handshake %s: роль %s, сжатие %s", connection.remote_address, role,
+                     "deflate" if connection.protocol.available_extensions else "нет")
+        return None
+
+    async def _run_server(self):
+        self.server = await self._serve()
         logger.info(f"Сервер запущен на ws://{self.host}:{self.port}")
         
         # Бесконечный цикл
@@ -154,6 +514,56 @@ class WebSocket:
         asyncio.set_event_loop(self.loop)
         self.loop.run_until_complete(self._run_server())
     
+    async def start_async(self):
+        """Запустить сервер в текущем event loop (asyncio runtime Application)."""
+        self.loop = asyncio.get_running_loop()
+        self.server = await self._serve()
+        self._running = True
+        logger.info(f"Сервер запущен на ws://{self.host}:{self.port}")
+
+    async def stop_async(self):
+        """Остановить сервер, запущенный через start_async."""
+        self._running = False
+        await self._stop_async()
+        self.loop = None
+        logger.info("Сервер остановлен")
+
+    async def wait_message(self, timeout: float) -> bool:
+        """
+        Дождаться сообщения или регистрации любого клиента.
+
+        Вызывается только из цикла сервера. Само сообщение забирается
+        через get_command/get_state.
+
+        Args:
+            timeout: Максимальное ожидание (секунды).
+
+        Returns:
+            True - пришло сообщение, False - таймаут.
+        """
+        if self._message_event is None:
+            self._message_event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._message_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _notify(self, client_name: str):
+        """Разбудить ожидающих сообщения (в цикле сервера)."""
+        if self._message_event is not None:
+            self._message_event.set()
+            self._message_event = None
+        if self.on_message is not None:
+            self.on_message(client_name)
+
+    def _in_loop(self) -> bool:
+        """Вызов из потока цикла сервера (без перехода между потоками)."""
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
     def start(self):
         if self._thread and self._thread.is_alive():
             logger.warning("Сервер уже запущен")
@@ -179,45 +589,108 @@ class WebSocket:
             await self.server.wait_closed()
     
     def is_running(self):
-        return self._running and self._thread and self._thread.is_alive()
+        if self._thread is None:
+            return self._running
+        return self._running and self._thread.is_alive()
     
+    def _resolve_subscription(self, client_name: str, role, topics) -> tuple:
+        """Роль и темы клиента: из регистрации или по умолчанию для имени."""
+        if role not in ROLE_TOPICS:
+            if role is not None:
+                logger.warning(f"Неизвестная роль клиента '{client_name}': {role}")
+            role = client_name if client_name in ROLE_TOPICS else "client"
+        if topics is None:
+            return role, ROLE_TOPICS[role]
+        if not isinstance(topics, list):
+            topics = [topics]
+        unknown = [t for t in topics if t not in TOPICS]
+        if unknown:
+            logger.warning(f"Неизвестные темы клиента '{client_name}': {unknown}")
+        return role, [t for t in topics if t in TOPICS]
+
+    def _remove_outbox(self, outbox: _Outbox):
+        """Отписать очередь от тем и остановить писателя."""
+        for topic in outbox.topics:
+            self._subscribers[topic].discard(outbox)
+        outbox.close()
+
+    def _put(self, outbox: _Outbox, message: str, event: str = None):
+        """Поставить сообщение в очередь подключения; при политике disconnect - закрыть его."""
+        if outbox.put(message, event):
+            return
+        logger.warning("Очередь отправки клиента %s переполнена (%d) → отключение",
+                       outbox.name, len(outbox))
+        if self._outboxes.get(outbox.name) is outbox:
+            del self._outboxes[outbox.name]
+        self._remove_outbox(outbox)
+        task = asyncio.create_task(outbox.websocket.close(code=1013, reason="send queue overflow"))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _enqueue(self, client_name: str, message: str):
+        """Поставить сообщение в очередь клиента (в цикле сервера)."""
+        outbox = self._outboxes.get(client_name)
+        if outbox is None:
+            logger.debug("Клиент %s не найден", client_name)
+            return
+        self._put(outbox, message)
+
+    def _fanout(self, event: str, message: str):
+        """Поставить событие в очереди подписчиков его темы (в цикле сервера)."""
+        topic = topic_for_event(event)
+        self._published[topic].inc()
+        for outbox in list(self._subscribers[topic]):
+            self._put(outbox, message, event)
+
+    def publish(self, event: str, message: str):
+        """
+        Опубликовать событие подписчикам темы (из любого потока, порядок сохраняется).
+
+        Сообщение сериализуется вызывающим один раз; каждый подписчик получает
+        его через свою очередь, поэтому медленный подписчик не задерживает остальных.
+
+        Args:
+            event: Название события (определяет тему).
+            message: JSON сообщение события.
+        """
+        if self.loop and self.loop.is_running():
+            if self._in_loop():
+                self._fanout(event, message)
+            else:
+                self.loop.call_soon_threadsafe(self._fanout, event, message)
+
+    def subscribers(self, topic: str) -> list:
+        """Имена клиентов, подписанных на тему."""
+        return sorted(outbox.name for outbox in list(self._subscribers.get(topic, ())))
+
     async def send_to_client_async(self, client_name: str, message: str):
-        """Отправить сообщение конкретному клиенту"""
-        with self._clients_lock:
-            websocket = self.clients.get(client_name)
-        if websocket:
-            try:
-                await websocket.send(message)
-            except Exception as e:
-                logger.error(f"Ошибка отправки клиенту {client_name}: {e}")
-        else:
-            logger.debug(f"Клиент {client_name} не найден")
+        """Отправить сообщение конкретному клиенту (через очередь отправки)"""
+        self._enqueue(client_name, message)
     
     def send_to_client(self, client_name: str, message: str):
-        """Отправить сообщение конкретному клиенту (из синхронного кода)"""
+        """Отправить сообщение конкретному клиенту (из синхронного кода, порядок сохраняется)"""
         if self.loop and self.loop.is_running():
-            asyncio.run_coroutine_threadsafe(
-                self.send_to_client_async(client_name, message),
-                self.loop
-            )
+            if self._in_loop():
+                self._enqueue(client_name, message)
+            else:
+                self.loop.call_soon_threadsafe(self._enqueue, client_name, message)
     
+    def _enqueue_all(self, message: str):
+        """Поставить сообщение в очереди всех клиентов (в цикле сервера)."""
+        for outbox in list(self._outboxes.values()):
+            self._put(outbox, message)
+
     async def broadcast_async(self, message: str):
         """Отправить сообщение всем клиентам"""
-        with self._clients_lock:
-            clients_copy = list(self.clients.values())
-        if clients_copy:
-            await asyncio.gather(
-                *[client.send(message) for client in clients_copy],
-                return_exceptions=True
-            )
+        self._enqueue_all(message)
     
     def broadcast(self, message: str):
         """Отправить сообщение всем клиентам (из синхронного кода)"""
         if self.loop and self.loop.is_running():
-            asyncio.run_coroutine_threadsafe(
-                self.broadcast_async(message),
-                self.loop
-            )
+            if self._in_loop():
+                self._enqueue_all(message)
+            else:
+                self.loop.call_soon_threadsafe(self._enqueue_all, message)
     
     def get_command(self, client_name: str) -> str:
         """Получить команду от клиента (одноразовое действие) и обнулить её"""
@@ -240,6 +713,11 @@ class WebSocket:
                     return True
         return False
     
+    def take_reply(self, request_id: str) -> str:
+        """Забрать ответ с request_id (пустая строка - ещё не пришёл)."""
+        with self.message_lock:
+            return self._replies.pop(request_id, "")
+
     def get_state(self, client_name: str) -> str:
         """Получить состояние от клиента (непрерывное значение)"""
         with self.message_lock: